@@ -1,33 +1,60 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, flash, session
-from models import db, Stock, APICredential, User, UserStock
+"""Dad's Stocks web application
+
+Importing this module has no side effects and loads no upstream SDKs; call
+``create_app()`` to build a configured app. The Alpaca SDK is imported on the
+first real-mode upstream call, pandas only when bars are first built or parsed.
+"""
+from flask import (Flask, render_template, jsonify, request, redirect, url_for, flash, session,
+                   send_from_directory, abort, current_app, has_request_context)
+from models import (db, Stock, APICredential, User, UserStock, PriceAlert, AlertEvent, HoldingLot,
+                    HoldingsRevision, IndicatorState, PerformanceSummary)
 from config import Config
 from datetime import datetime, timedelta, timezone
+import logging
+import os
 import threading
 import time
 from functools import wraps
 from flask_wtf import CSRFProtect
 from flask_wtf.form import FlaskForm
+from sqlalchemy import insert, update
 import secrets
-from alpaca.data import StockHistoricalDataClient, StockBarsRequest, TimeFrame
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import GetAssetsRequest
-from alpaca.trading.enums import AssetClass
-import requests
+from services.alerts import KINDS as ALERT_KINDS, KIND_LABELS as ALERT_KIND_LABELS, AlertIndex, PriceMove, describe as describe_alert
 from services.alpaca_factory import AlpacaFactory
-import pandas as pd
-from alpaca.data.timeframe import TimeFrame
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.enums import Adjustment
-import pytz
-import os
+from services.compression import Compressor
+from services.downsampling import METHODS as DOWNSAMPLE_METHODS
+from services.fragment_cache import FragmentCache, VersionedCache
+from services.bars import DAY, FIVE_MINUTE, INTRADAY, session_start
+from services.history import RANGES as HISTORY_RANGES, HistoryStore, series_payload
+from services.indicators import NAMES as INDICATOR_NAMES, WARMUP_BARS, WARMUP_SPAN, IndicatorEngine, RollingState
+from services.metrics import AppMetrics
+from services.news import (page as news_rows, parse_cursor as parse_news_cursor, save_articles as save_news,
+                           to_dict as news_dict)
+from services.performance import (ANCHORS as PERFORMANCE_ANCHORS, FIELDS as PERFORMANCE_FIELDS,
+                                  SPAN as PERFORMANCE_SPAN, summary_rows)
+from services.portfolio import PortfolioValuer, prices_from_table
+from services.structured_logging import configure_logging
+from services.profiling import MODES as PROFILE_MODES, REFRESH_TARGET, Profiler
+from services.quotes import Quote, QuoteBatch, quotes_from_bars
+from services.sparklines import HEIGHT as SPARKLINE_HEIGHT, SparklineBook
+from services.symbol_search import SymbolSearch
+from services.static_assets import StaticAssets
+from services.upstream_guard import StaleResult, UpstreamGuard, fallback_reason
+from services.watchlist import ADDED as WATCHLIST_ADDED, AssetCatalog, add_symbols, parse_csv, parse_symbols
+
+refresh_log = logging.getLogger('dadstocks.refresh')
 
 # Create a base form for CSRF protection
 class CSRFForm(FlaskForm):
     pass
 
-def create_app():
+def create_app(config_object=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_object)
+    
+    configure_logging(app.config['LOG_LEVEL'], app.config['LOG_FORMAT'],
+                      error_burst=app.config['LOG_ERROR_BURST'],
+                      error_window=app.config['LOG_ERROR_WINDOW'])
     
     # Ensure we have a strong secret key
     if app.config['SECRET_KEY'] == 'dev':
@@ -41,30 +68,150 @@ def create_app():
     
     def initialize_alpaca():
         """Initialize Alpaca services based on configuration"""
+        from services.fault_injection import load_profile
+        
         simulation_mode = app.config['SIMULATION_MODE']
         if isinstance(simulation_mode, str):
             simulation_mode = simulation_mode.lower() == 'true'
         
-        # In simulation mode, we don't need real API credentials
-        if simulation_mode:
+        capture = {
+            'record_path': app.config['UPSTREAM_RECORD_PATH'] or None,
+            'replay_path': app.config['UPSTREAM_REPLAY_PATH'] or None,
+            'replay_timing': app.config['UPSTREAM_REPLAY_TIMING']
+        }
+        if capture['record_path']:
+            app.logger.info(f"Recording upstream responses to {capture['record_path']}")
+        
+        # In simulation or replay mode, we don't need real API credentials
+        if capture['replay_path']:
+            app.logger.info(f"Replaying upstream responses from {capture['replay_path']}")
+            alpaca_factory.initialize(simulation_mode=True, **capture)
+        elif simulation_mode:
             app.logger.info("Running in simulation mode")
-            alpaca_factory.initialize(simulation_mode=True)
+            alpaca_factory.initialize(
+                simulation_mode=True,
+                universe_size=app.config['SIMULATION_UNIVERSE_SIZE'],
+                seed=app.config['SIMULATION_SEED'],
+                fault_profile=load_profile(
+                    app.config['SIMULATION_FAULT_PROFILE'],
+                    app.config['SIMULATION_FAULT_OVERRIDES']
+                ),
+                **capture
+            )
         else:
             app.logger.info("Running with real Alpaca API")
             # We'll get credentials per user when needed
-            alpaca_factory.initialize(simulation_mode=False)
+            alpaca_factory.initialize(simulation_mode=False, **capture)
         
         return alpaca_factory
     
+    def initialize_quote_table():
+        """Attach to the shared quote table used by every worker process"""
+        if not app.config.get('QUOTE_TABLE_ENABLED'):
+            return None
+        from services.quote_table import QuoteTable
+        try:
+            return QuoteTable.open(app.config['QUOTE_TABLE_NAME'],
+                                   capacity=app.config['QUOTE_TABLE_CAPACITY'])
+        except Exception as e:
+            app.logger.warning(f"Shared quote table unavailable, falling back to direct lookups: {str(e)}")
+            return None
+    
     with app.app_context():
         db.create_all()
         app.alpaca_factory = initialize_alpaca()
+        app.quote_table = initialize_quote_table()
+    
+    # Request, SQL, upstream and refresher metrics, scraped from /metrics
+    app.metrics = AppMetrics()
+    if app.config['METRICS_ENABLED']:
+        app.metrics.init_app(app, db)
+        alpaca_factory.instrument(app.metrics.wrap_upstream)
+    else:
+        app.metrics.enabled = False
+    
+    # Per-endpoint circuit breakers and deadlines around every upstream call,
+    # plus the last known good data served when they trip
+    app.upstream_guard = UpstreamGuard(
+        timeout=app.config['UPSTREAM_TIMEOUT'],
+        failure_threshold=app.config['UPSTREAM_BREAKER_THRESHOLD'],
+        reset_timeout=app.config['UPSTREAM_BREAKER_RESET'],
+        stale_max_age=app.config['UPSTREAM_STALE_MAX_AGE']
+    )
+    alpaca_factory.instrument(app.upstream_guard.wrap)
+    app.metrics.watch_breakers(app.upstream_guard.breakers)
+    
+    # Admin-armed request/refresh profiling; no hooks at all unless enabled
+    app.profiler = None
+    if app.config['PROFILING_ENABLED']:
+        app.profiler = Profiler(app.config['PROFILE_DIR'],
+                                sample_interval=app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000.0)
+        app.profiler.init_app(app)
+    
+    # Content-hashed static URLs with immutable caching; compressed responses
+    app.static_assets = StaticAssets(max_age=app.config['STATIC_MAX_AGE'])
+    app.static_assets.init_app(app)
+    app.compressor = None
+    if app.config['COMPRESSION_ENABLED']:
+        app.compressor = Compressor(min_size=app.config['COMPRESSION_MIN_SIZE'])
+        app.compressor.init_app(app)
+    
+    # Shared page regions render once per data version; other workers see
+    # the refresher's updates through the quote table's sequence
+    quote_table = app.quote_table
+    app.fragment_cache = FragmentCache(
+        version=(lambda: quote_table.sequence) if quote_table is not None else None,
+        max_age=app.config['FRAGMENT_CACHE_MAX_AGE'],
+        enabled=app.config['FRAGMENT_CACHE_ENABLED']
+    )
+    app.fragment_cache.init_app(app)
+    
+    # Price alerts, loaded by the refresher on its first cycle
+    app.alert_index = AlertIndex()
+    
+    # Every user's holdings valued in one pass per holdings revision and
+    # data version; the refresher revalues after each cycle
+    app.portfolio = PortfolioValuer(
+        load_holding_lots, load_portfolio_prices, HoldingsRevision.current,
+        version=(lambda: quote_table.sequence) if quote_table is not None else None
+    )
+    
+    # Stored price bars for charts, filled by the refresher and backfilled
+    # from upstream; downsampled series are cached per cycle like fragments
+    app.history = HistoryStore(
+        fetch_history_bars,
+        minute_retention=timedelta(days=app.config['HISTORY_MINUTE_RETENTION_DAYS'])
+    )
+    app.history_cache = VersionedCache(
+        version=(lambda: quote_table.sequence) if quote_table is not None else None,
+        max_age=app.config['FRAGMENT_CACHE_MAX_AGE'],
+        max_entries=app.config['HISTORY_CACHE_ENTRIES'],
+        enabled=app.config['FRAGMENT_CACHE_ENABLED']
+    )
+    
+    # Rolling SMA/EMA/RSI/VWAP state per symbol, advanced by the refresher
+    # as daily bars complete and saved so a restart resumes where it was
+    app.indicators = IndicatorEngine()
+    # Performance summary rows as last written: symbol -> (session, price, *anchors)
+    app.performance = {}
+    
+    # Recent prices per symbol for the watchlist sparklines, in fixed-length
+    # rings each process keeps up to date from the published quotes
+    app.sparklines = SparklineBook(app.config['SPARKLINE_POINTS'])
+    
+    # When the refresher last stored the latest news, see store_news
+    app.news_stored_at = 0.0
+    
+    # Tradable symbols bulk imports are checked against, fetched once a day
+    app.asset_catalog = AssetCatalog(fetch_asset_names, ttl=app.config['ASSET_CATALOG_TTL'])
+    # Ticker and company name search over the same catalog, reindexed when it refreshes
+    app.symbol_search = SymbolSearch(app.asset_catalog.names)
+    
+    register_routes(app)
+    app.before_request(start_background_refresh)
     
     return app
 
-app = create_app()
-alpaca_factory = app.alpaca_factory
-
 def user_login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -84,7 +231,6 @@ def admin_login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -101,7 +247,6 @@ def login():
     
     return render_template('splash.html')
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -132,12 +277,10 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/logout')
 def logout():
     session.clear()
     return redirect(url_for('login'))
 
-@app.route('/', methods=['GET', 'POST'])
 @user_login_required
 def index():
     form = CSRFForm()
@@ -165,7 +308,9 @@ def index():
                             raise ValueError(f"Could not fetch data for {symbol}")
                         
                         stock = Stock(symbol=symbol)
+                        stock.apply_quote(Quote.coerce(symbol, stock_data[symbol]))
                         db.session.add(stock)
+                        db.session.flush()  # Assign an id for the association below
                     
                     # Create user-stock association
                     user_stock = UserStock(user_id=user.id, stock_id=stock.id)
@@ -178,16 +323,14 @@ def index():
             flash('Stock symbol is required', 'error')
         return redirect(url_for('index'))
     
-    # Get market indexes data
-    index_symbols = ['SPY', 'DIA', 'QQQ', 'IWM']
-    index_data = get_stock_data(index_symbols)
-    indexes = {symbol: index_data.get(symbol, {}) for symbol in index_symbols}
+    for event in deliver_alerts(user.id):
+        flash(describe_alert(event.symbol, event.kind, event.threshold, event.value), 'success')
     
     # Get user's tracked stocks
     user_stocks = UserStock.query.filter_by(user_id=user.id).all()
     
     # Get news for all symbols
-    all_symbols = [us.stock.symbol for us in user_stocks] + index_symbols
+    all_symbols = [us.stock.symbol for us in user_stocks] + Config.INDEX_SYMBOLS
     news_articles = get_news_for_symbols(all_symbols)
     
     # Create a set of symbols that have news
@@ -199,13 +342,73 @@ def index():
     for user_stock in user_stocks:
         user_stock.has_news = user_stock.stock.symbol in symbols_with_news
     
+    indicators = indicator_values([user_stock.stock for user_stock in user_stocks])
+    performance = performance_values([user_stock.stock.symbol for user_stock in user_stocks])
+    for user_stock in user_stocks:
+        user_stock.indicators = indicators.get(user_stock.stock.symbol, dict.fromkeys(INDICATOR_NAMES))
+        user_stock.performance = performance.get(user_stock.stock.symbol, dict.fromkeys(PERFORMANCE_FIELDS))
+    sparklines = sparkline_paths([user_stock.stock.symbol for user_stock in user_stocks])
+    for user_stock in user_stocks:
+        user_stock.sparkline = sparklines[user_stock.stock.symbol]
+    
+    # The market index panel is a shared fragment; it loads its data only
+    # when it has to be rendered again
+    valuation = current_app.portfolio.valuation()
     return render_template('index.html', 
                          stocks=user_stocks,
+                         portfolio=valuation.summary(user.id),
+                         positions=valuation.positions(user.id),
                          form=form,
-                         indexes=indexes,
+                         load_indexes=get_market_indexes,
+                         sparkline_box=f"0 0 {current_app.sparklines.length - 1} {SPARKLINE_HEIGHT}",
                          user=user)
 
-@app.route('/api/stocks')
+@user_login_required
+def import_watchlist():
+    """Bulk add from the dashboard: pasted symbols and/or an uploaded CSV"""
+    form = CSRFForm()
+    if not form.validate():
+        flash('Invalid form submission', 'error')
+        return redirect(url_for('index'))
+    
+    symbols = parse_symbols(request.form.get('symbols', ''))
+    upload = request.files.get('file')
+    if upload and upload.filename:
+        symbols += parse_csv(upload.read().decode('utf-8-sig', errors='replace'))
+    symbols = list(dict.fromkeys(symbols))
+    error = check_import_size(symbols)
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('index'))
+    
+    try:
+        results = add_watchlist_symbols(session['user_id'], symbols)
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error importing stocks: {str(e)}', 'error')
+        return redirect(url_for('index'))
+    
+    added = [result['symbol'] for result in results if result['status'] == WATCHLIST_ADDED]
+    if added:
+        flash(f"Added {len(added)} stock{'s' if len(added) != 1 else ''}: {', '.join(added)}", 'success')
+    skipped = [f"{result['symbol']} ({result['message'].lower()})" for result in results
+               if result['status'] != WATCHLIST_ADDED]
+    if skipped:
+        flash(f"Not added: {', '.join(skipped)}", 'error')
+    return redirect(url_for('index'))
+
+def get_market_indexes():
+    """Current data for the market index ETFs, keyed by symbol
+    
+    Symbols without data, e.g. while upstream fails before any quote was
+    seen, are left out.
+    """
+    index_data = get_stock_data(Config.INDEX_SYMBOLS)
+    indexes = {symbol: index_data[symbol] for symbol in Config.INDEX_SYMBOLS if symbol in index_data}
+    if getattr(index_data, 'stale', False):
+        return StaleResult(indexes, index_data.as_of, index_data.reason)
+    return indexes
+
 @user_login_required
 def get_stocks():
     user = User.query.get(session['user_id'])
@@ -213,9 +416,14 @@ def get_stocks():
     # Get user's stocks
     user_stocks = UserStock.query.filter_by(user_id=user.id).all()
     stock_data = [us.to_dict() for us in user_stocks]
+    indicators = indicator_values([us.stock for us in user_stocks])
+    performance = performance_values([data['symbol'] for data in stock_data])
+    for data in stock_data:
+        data['indicators'] = indicators.get(data['symbol'], dict.fromkeys(INDICATOR_NAMES))
+        data['performance'] = performance.get(data['symbol'], dict.fromkeys(PERFORMANCE_FIELDS))
     
     # Add index data
-    index_symbols = ['SPY', 'DIA', 'QQQ', 'IWM']
+    index_symbols = Config.INDEX_SYMBOLS
     index_data = get_stock_data(index_symbols)
     
     # Get news for all symbols
@@ -231,42 +439,304 @@ def get_stocks():
     now = datetime.now(timezone.utc)
     
     # Combine the data
+    index_names = {
+        'SPY': 'S&P 500',
+        'DIA': 'Dow Jones',
+        'QQQ': 'NASDAQ',
+        'IWM': 'Russell 2000'
+    }
     for symbol in index_symbols:
-        if symbol in index_data:
-            data = index_data[symbol]
-            timestamp = data['timestamp']
-            
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            elif isinstance(timestamp, datetime):
-                if not timestamp.tzinfo:
-                    timestamp = timestamp.replace(tzinfo=timezone.utc)
-            
-            time_diff = now - timestamp
-            minutes = int(time_diff.total_seconds() / 60)
-            
-            friendly_time = "Just now" if minutes < 1 else f"{minutes} minute{'s' if minutes != 1 else ''} ago"
-            
-            stock_data.append({
-                'symbol': symbol,
-                'name': {
-                    'SPY': 'S&P 500',
-                    'DIA': 'Dow Jones',
-                    'QQQ': 'NASDAQ',
-                    'IWM': 'Russell 2000'
-                }.get(symbol, symbol),
-                'current_price': data['price'],
-                'previous_close': data['previous_close'],
-                'price_change': data['price'] - data['previous_close'],
-                'price_change_percent': ((data['price'] - data['previous_close']) / data['previous_close']) * 100,
-                'last_updated': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'friendly_time': friendly_time,
-                'has_news': symbol in symbols_with_news
-            })
+        quote = Quote.coerce(symbol, index_data.get(symbol))
+        if quote is None:
+            continue
+        
+        timestamp = quote.timestamp or now
+        minutes = int((now - timestamp).total_seconds() / 60)
+        friendly_time = "Just now" if minutes < 1 else f"{minutes} minute{'s' if minutes != 1 else ''} ago"
+        
+        stock_data.append({
+            'symbol': symbol,
+            'name': index_names.get(symbol, symbol),
+            'current_price': quote.price,
+            'previous_close': quote.previous_close,
+            'price_change': quote.change,
+            'price_change_percent': quote.change_percent,
+            'last_updated': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'friendly_time': friendly_time,
+            'has_news': symbol in symbols_with_news,
+            # Last known data served while upstream is failing
+            'stale': getattr(index_data, 'stale', False)
+        })
+    
+    sparklines = sparkline_paths([data['symbol'] for data in stock_data])
+    for data in stock_data:
+        data['sparkline'] = sparklines[data['symbol']]
     
     return jsonify(stock_data)
 
-@app.route('/admin/login', methods=['GET', 'POST'])
+@user_login_required
+def add_stocks():
+    """Add a batch of symbols to the user's watchlist, with a result per symbol
+    
+    Takes ``{"symbols": [...]}`` (a list or one delimited string), an uploaded
+    CSV ``file``, or the symbols as plain text.
+    """
+    if request.is_json:
+        symbols = (request.get_json(silent=True) or {}).get('symbols') or []
+        if isinstance(symbols, str):
+            symbols = parse_symbols(symbols)
+        elif not isinstance(symbols, list) or not all(isinstance(symbol, str) for symbol in symbols):
+            return jsonify({'error': 'symbols must be a list of strings'}), 400
+    elif 'file' in request.files:
+        symbols = parse_csv(request.files['file'].read().decode('utf-8-sig', errors='replace'))
+    else:
+        symbols = parse_symbols(request.get_data(as_text=True))
+    error = check_import_size(symbols)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    results = add_watchlist_symbols(session['user_id'], symbols)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return jsonify({'results': results, 'counts': counts})
+
+@user_login_required
+def search_symbols():
+    """Assets whose symbol or company name starts with the query, best matches first"""
+    query = request.args.get('q', '')[:64]
+    try:
+        limit = int(request.args.get('limit', '10'))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = min(max(limit, 1), current_app.config['SYMBOL_SEARCH_MAX_RESULTS'])
+    return jsonify({'query': query, 'results': current_app.symbol_search.search(query, limit)})
+
+def check_import_size(symbols):
+    """Why a bulk import can't go ahead, or None"""
+    limit = current_app.config['WATCHLIST_IMPORT_MAX']
+    if not symbols:
+        return 'No symbols given'
+    if len(symbols) > limit:
+        return f"At most {limit} symbols can be imported at once"
+    return None
+
+def add_watchlist_symbols(user_id, symbols):
+    """Add symbols to a user's watchlist in one batch and commit"""
+    results = add_symbols(user_id, symbols, current_app.asset_catalog.names(), get_stock_data)
+    db.session.commit()
+    return results
+
+def fetch_asset_names():
+    """Symbol -> name for every tradable asset, or None without credentials to ask with"""
+    alpaca_factory = current_app.alpaca_factory
+    if alpaca_factory.is_simulation_mode:
+        return alpaca_factory.get_trading_client().get_asset_names()
+    
+    user_id = session.get('user_id') if has_request_context() else None
+    credentials = APICredential.get_active_credentials(user_id) if user_id else None
+    if not credentials:
+        return None
+    from alpaca.trading.client import TradingClient
+    trading_client = alpaca_factory.wrap_client(TradingClient(
+        api_key=credentials['api_key'],
+        secret_key=credentials['secret_key'],
+        paper=True
+    ))
+    return {asset.symbol: asset.name for asset in trading_client.get_all_assets() if asset.tradable}
+
+@user_login_required
+def get_alerts():
+    """Fired alerts not yet delivered to the user; they are marked delivered"""
+    events = deliver_alerts(session['user_id'])
+    return jsonify([dict(event.to_dict(), message=describe_alert(event.symbol, event.kind, event.threshold, event.value))
+                    for event in events])
+
+@user_login_required
+def get_portfolio():
+    """The user's holdings valued at the latest prices"""
+    valuation = current_app.portfolio.valuation()
+    user_id = session['user_id']
+    return jsonify({
+        'summary': valuation.summary(user_id),
+        'positions': valuation.positions(user_id),
+        'as_of': datetime.fromtimestamp(valuation.computed_at, timezone.utc).isoformat()
+    })
+
+@user_login_required
+def get_stock_history(symbol):
+    """Close prices for one symbol over a chart range, downsampled to ``points``"""
+    symbol = symbol.strip().upper()
+    range_ = request.args.get('range', '1M').upper()
+    method = request.args.get('method', 'lttb').lower()
+    if range_ not in HISTORY_RANGES:
+        return jsonify({'error': f"Unknown range: {range_}", 'ranges': list(HISTORY_RANGES)}), 400
+    if method not in DOWNSAMPLE_METHODS:
+        return jsonify({'error': f"Unknown method: {method}", 'methods': list(DOWNSAMPLE_METHODS)}), 400
+    try:
+        points = int(request.args.get('points', '300'))
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+    points = min(max(points, 2), current_app.config['HISTORY_MAX_POINTS'])
+    # Only tracked symbols, so a request can't trigger arbitrary backfills
+    if symbol not in Config.INDEX_SYMBOLS and Stock.query.filter_by(symbol=symbol).first() is None:
+        return jsonify({'error': f"Unknown symbol: {symbol}"}), 404
+    
+    def build():
+        timeframe, bars = current_app.history.load_range(symbol, range_)
+        return series_payload(symbol, range_, timeframe, bars, points, method)
+    
+    body = current_app.history_cache.get_or_compute((symbol, range_, points, method), build)
+    return current_app.response_class(body, mimetype='application/json')
+
+def indicator_values(stocks):
+    """Indicator readings per symbol, with each stock's current price as today's bar so far"""
+    prices = {stock.symbol: stock.current_price for stock in stocks}
+    symbols = list(prices)
+    values = {}
+    for start in range(0, len(symbols), 500):
+        for symbol, state in db.session.query(IndicatorState.symbol, IndicatorState.state) \
+                .filter(IndicatorState.symbol.in_(symbols[start:start + 500])):
+            values[symbol] = RollingState.from_json(state).values(prices[symbol])
+    return values
+
+def performance_values(symbols):
+    """1W/1M/YTD returns and 52-week range per symbol, as the refresher last stored them"""
+    columns = [getattr(PerformanceSummary, name) for name in PERFORMANCE_FIELDS]
+    values = {}
+    for start in range(0, len(symbols), 500):
+        for row in db.session.query(PerformanceSummary.symbol, *columns) \
+                .filter(PerformanceSummary.symbol.in_(symbols[start:start + 500])):
+            values[row[0]] = dict(zip(PERFORMANCE_FIELDS, row[1:]))
+    return values
+
+def fetch_history_bars(symbols, timeframe, start, end):
+    """Upstream OHLCV bars for ``symbols`` between ``start`` and ``end``, indexed by (symbol, timestamp)"""
+    alpaca_factory = current_app.alpaca_factory
+    if alpaca_factory.is_simulation_mode:
+        client = alpaca_factory.get_data_client()
+        if timeframe == '1Day':
+            return client.get_daily_bars(symbols, days=max(int((end - start).days * 5 / 7), 1), end=end)
+        return client.get_intraday_bars(symbols, bars=int((end - start).total_seconds() // 60), end=end)
+    
+    user_id = session.get('user_id') if has_request_context() else None
+    credentials = APICredential.get_active_credentials(user_id) if user_id else None
+    if not credentials:
+        return None
+    
+    from alpaca.data import StockHistoricalDataClient
+    from alpaca.data.enums import Adjustment
+    from alpaca.data.requests import StockBarsRequest
+    from alpaca.data.timeframe import TimeFrame
+    
+    client = alpaca_factory.wrap_client(StockHistoricalDataClient(
+        api_key=credentials['api_key'],
+        secret_key=credentials['secret_key']
+    ))
+    return client.get_stock_bars(StockBarsRequest(
+        symbol_or_symbols=symbols,
+        timeframe=TimeFrame.Day if timeframe == '1Day' else TimeFrame.Minute,
+        start=start,
+        end=end,
+        adjustment=Adjustment.ALL
+    ))
+
+def record_history(stock_data):
+    """Fold this cycle's quotes into the stored bars"""
+    history = current_app.history
+    # A savepoint, so a failure here doesn't roll back the price updates
+    try:
+        with db.session.begin_nested():
+            history.record_quotes(stock_data)
+            history.prune()
+    except Exception:
+        history.forget()
+        raise
+
+def record_sparklines(stock_data):
+    """Add this cycle's prices to the sparklines, before they are stored as bars"""
+    prices = {symbol: quote['price'] for symbol, quote in stock_data.items()}
+    sync_sparklines(list(prices), prices)
+    quote_table = current_app.quote_table
+    if quote_table is not None and quote_table.is_writer:
+        current_app.sparklines.version = quote_table.sequence
+
+def sync_sparklines(symbols, prices=None):
+    """Bring this process's sparklines up to date for ``symbols``
+    
+    A symbol's ring is seeded from its stored 5-minute bars the first time
+    it is needed, then gets one price per cycle: from the refresher in its
+    own process, from the shared quote table in the others. A process that
+    missed a published cycle starts over from the stored bars.
+    """
+    book = current_app.sparklines
+    quote_table = current_app.quote_table
+    if prices is None and quote_table is not None:
+        sequence = quote_table.sequence
+        if sequence != book.version and not sequence & 1:
+            # Each publish moves the seqlock sequence on by two
+            if book.version is not None and sequence - book.version == 2:
+                try:
+                    rows = quote_table.snapshot()
+                except TimeoutError:
+                    rows = None
+            else:
+                rows = None
+            if rows is not None:
+                prices = {symbol.decode('ascii'): price
+                          for symbol, price, version in zip(rows['symbol'], rows['price'].tolist(),
+                                                            rows['version'].tolist()) if version}
+            else:
+                book.reset()
+            book.version = sequence
+    missing = [symbol for symbol in symbols if symbol not in book]
+    if missing:
+        start = int(time.time()) - book.length * INTRADAY[FIVE_MINUTE]
+        series = current_app.history.load_many(missing, FIVE_MINUTE, start)
+        book.seed({symbol: series[symbol].close if symbol in series else () for symbol in missing})
+    if prices:
+        book.append(prices)
+
+def sparkline_paths(symbols):
+    """Encoded sparkline path per symbol, see services.sparklines"""
+    sync_sparklines(symbols)
+    return current_app.sparklines.paths(symbols)
+
+def load_holding_lots():
+    """Every lot as (user_id, symbol, quantity, unit_cost)"""
+    return db.session.query(UserStock.user_id, Stock.symbol, HoldingLot.quantity, HoldingLot.unit_cost) \
+        .join(UserStock, HoldingLot.user_stock_id == UserStock.id) \
+        .join(Stock, UserStock.stock_id == Stock.id) \
+        .all()
+
+def load_portfolio_prices(symbols):
+    """Prices for ``symbols`` from the shared quote table, the stocks table for the rest"""
+    prices, previous = prices_from_table(getattr(current_app, 'quote_table', None), symbols)
+    missing = [symbol for symbol, price in zip(symbols, prices) if price != price]
+    if missing:
+        rows = {}
+        for start in range(0, len(missing), 500):
+            rows.update((symbol, (price, previous_close)) for symbol, price, previous_close in
+                        db.session.query(Stock.symbol, Stock.current_price, Stock.previous_close)
+                        .filter(Stock.symbol.in_(missing[start:start + 500])))
+        positions = {symbol: i for i, symbol in enumerate(symbols)}
+        for symbol, (price, previous_close) in rows.items():
+            if price is not None:
+                i = positions[symbol]
+                prices[i] = price
+                previous[i] = previous_close if previous_close is not None else price
+    return prices, previous
+
+def deliver_alerts(user_id):
+    """Take the user's pending alert events, oldest first"""
+    events = AlertEvent.query.filter_by(user_id=user_id, delivered_at=None).order_by(AlertEvent.id).all()
+    if events:
+        now = datetime.utcnow()
+        for event in events:
+            event.delivered_at = now
+        db.session.commit()
+    return events
+
 def admin_login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -283,11 +753,11 @@ def admin_login():
     
     return render_template('admin_login.html')
 
-@app.route('/admin/dashboard', methods=['GET', 'POST'])
 @admin_login_required
 def admin_dashboard():
     form = CSRFForm()
     admin = User.query.get(session['user_id'])
+    profiler = current_app.profiler
     
     if request.method == 'POST' and form.validate():
         action = request.form.get('action', '')
@@ -324,6 +794,8 @@ def admin_dashboard():
                 try:
                     user = User.query.get(user_id)
                     if user:
+                        # Their lots go with them
+                        HoldingsRevision.bump()
                         db.session.delete(user)
                         db.session.commit()
                         flash('User deleted successfully', 'success')
@@ -331,16 +803,52 @@ def admin_dashboard():
                         flash('User not found', 'error')
                 except Exception as e:
                     flash(f'Error deleting user: {str(e)}', 'error')
+        
+        elif action in ('profile_route', 'profile_refresh', 'profile_disarm') and profiler is not None:
+            mode = request.form.get('mode', 'cprofile')
+            try:
+                if action == 'profile_route':
+                    route = request.form.get('route', '')
+                    count = int(request.form.get('count', 1))
+                    profiler.arm(route, count, mode)
+                    flash(f'Profiling the next {count} request(s) to {route}', 'success')
+                elif action == 'profile_refresh':
+                    # Run one cycle now, in this request, so the result is ready when it returns
+                    profiler.arm(REFRESH_TARGET, 1, mode)
+                    update_stock_prices(manual=True)
+                    profiler.disarm(REFRESH_TARGET)
+                else:
+                    profiler.disarm()
+                    flash('Profiling disarmed', 'success')
+            except ValueError as e:
+                flash(f'Error arming profiler: {str(e)}', 'error')
     
     # Get all users for display
     users = User.query.all()
     
+    profiling = None
+    if profiler is not None:
+        profiling = {
+            'routes': sorted({rule.rule for rule in current_app.url_map.iter_rules() if rule.endpoint != 'static'}),
+            'modes': PROFILE_MODES,
+            'pending': profiler.pending(),
+            'results': profiler.results()[:50]
+        }
+    
     return render_template('admin_dashboard.html',
                          users=users,
                          form=form,
-                         admin=admin)
+                         admin=admin,
+                         profiling=profiling)
+
+@admin_login_required
+def admin_download_profile(name):
+    """Download a saved profile (.pstats or .folded)"""
+    profiler = current_app.profiler
+    if profiler is None:
+        abort(404)
+    return send_from_directory(profiler.output_dir, name, as_attachment=True)
 
-@app.route('/user/dashboard', methods=['GET', 'POST'])
 @user_login_required
 def user_dashboard():
     form = CSRFForm()
@@ -355,6 +863,9 @@ def user_dashboard():
             
             if api_key and secret_key:
                 try:
+                    from alpaca.data import StockHistoricalDataClient
+                    from alpaca.trading.client import TradingClient
+                    
                     # Test the API keys
                     data_client = StockHistoricalDataClient(
                         api_key=api_key,
@@ -395,6 +906,8 @@ def user_dashboard():
                     ).first()
                     
                     if user_stock:
+                        if user_stock.lots:
+                            HoldingsRevision.bump()
                         db.session.delete(user_stock)
                         db.session.commit()
                         flash(f'Stock {symbol} removed successfully', 'success')
@@ -404,6 +917,75 @@ def user_dashboard():
                     flash(f'Error removing stock: {str(e)}', 'error')
             else:
                 flash('Stock symbol is required', 'error')
+        
+        elif action == 'add_alert':
+            symbol = request.form.get('symbol', '').strip().upper()
+            kind = request.form.get('kind', '')
+            try:
+                threshold = float(request.form.get('threshold', ''))
+            except ValueError:
+                threshold = None
+            user_stock = UserStock.query.join(Stock).filter(
+                Stock.symbol == symbol,
+                UserStock.user_id == user.id
+            ).first()
+            if user_stock is None:
+                flash(f'Stock {symbol} is not being tracked', 'error')
+            elif kind not in ALERT_KINDS or threshold is None or threshold != threshold:
+                flash('A valid alert type and threshold are required', 'error')
+            else:
+                db.session.add(PriceAlert(user_stock_id=user_stock.id, kind=kind, threshold=threshold))
+                db.session.commit()
+                flash(f'Alert added for {symbol}', 'success')
+        
+        elif action == 'add_lot':
+            symbol = request.form.get('symbol', '').strip().upper()
+            try:
+                quantity = float(request.form.get('quantity', ''))
+                unit_cost = float(request.form.get('unit_cost', ''))
+                acquired = request.form.get('acquired_at') or None
+                acquired_at = datetime.strptime(acquired, '%Y-%m-%d').date() if acquired else None
+            except ValueError:
+                quantity = unit_cost = None
+            user_stock = UserStock.query.join(Stock).filter(
+                Stock.symbol == symbol,
+                UserStock.user_id == user.id
+            ).first()
+            if user_stock is None:
+                flash(f'Stock {symbol} is not being tracked', 'error')
+            elif quantity is None or not quantity > 0 or not unit_cost >= 0 or unit_cost == float('inf'):
+                flash('A positive quantity and a valid price are required', 'error')
+            else:
+                db.session.add(HoldingLot(user_stock_id=user_stock.id, quantity=quantity,
+                                          unit_cost=unit_cost, acquired_at=acquired_at))
+                HoldingsRevision.bump()
+                db.session.commit()
+                flash(f'Added {quantity:g} shares of {symbol}', 'success')
+        
+        elif action == 'remove_lot':
+            lot = HoldingLot.query.join(UserStock).filter(
+                HoldingLot.id == request.form.get('lot_id', type=int),
+                UserStock.user_id == user.id
+            ).first()
+            if lot:
+                db.session.delete(lot)
+                HoldingsRevision.bump()
+                db.session.commit()
+                flash('Lot removed', 'success')
+            else:
+                flash('Lot not found', 'error')
+        
+        elif action == 'remove_alert':
+            alert = PriceAlert.query.join(UserStock).filter(
+                PriceAlert.id == request.form.get('alert_id', type=int),
+                UserStock.user_id == user.id
+            ).first()
+            if alert:
+                db.session.delete(alert)
+                db.session.commit()
+                flash('Alert removed', 'success')
+            else:
+                flash('Alert not found', 'error')
     
     current_creds = APICredential.get_active_credentials(user.id)
     last_updated = None
@@ -412,8 +994,18 @@ def user_dashboard():
         last_updated = credential.last_updated.strftime('%Y-%m-%d %H:%M:%S')
     
     user_stocks = UserStock.query.filter_by(user_id=user.id).all()
+    alerts = PriceAlert.query.join(UserStock).filter(
+        UserStock.user_id == user.id,
+        PriceAlert.active.is_(True)
+    ).order_by(PriceAlert.id).all()
+    lots = HoldingLot.query.join(UserStock).filter(
+        UserStock.user_id == user.id
+    ).order_by(HoldingLot.user_stock_id, HoldingLot.acquired_at, HoldingLot.id).all()
     
     return render_template('user_dashboard.html',
+                         alerts=alerts,
+                         lots=lots,
+                         alert_kinds=ALERT_KIND_LABELS,
                          current_key=current_creds['api_key'] if current_creds else None,
                          current_secret=current_creds['secret_key'] if current_creds else None,
                          last_updated=last_updated,
@@ -421,13 +1013,101 @@ def user_dashboard():
                          form=form,
                          user=user)
 
+def get_cached_quotes(symbols):
+    """Read quotes from the shared quote table, or None if any are missing or stale"""
+    quote_table = getattr(current_app, 'quote_table', None)
+    if quote_table is None or not symbols:
+        return None
+    
+    age = quote_table.age()
+    metrics = current_app.metrics
+    if age is None or age > current_app.config['QUOTE_TABLE_MAX_AGE']:
+        metrics.record_cache_lookup('stale')
+        return None
+    
+    try:
+        quotes = quote_table.get_many(symbols)
+    except TimeoutError:
+        # A write in progress for too long, e.g. its writer died mid-publish
+        metrics.record_cache_lookup('stale')
+        return None
+    if len(quotes) != len(set(symbols)):
+        metrics.record_cache_lookup('miss')
+        return None
+    metrics.record_cache_lookup('hit')
+    return quotes
+
+def publish_quotes(stock_data):
+    """Publish freshly fetched quotes, a dict or QuoteBatch, to the shared table if we are its writer"""
+    quote_table = getattr(current_app, 'quote_table', None)
+    if quote_table is None or not stock_data:
+        return
+    if quote_table.try_acquire_writer():
+        quote_table.publish(stock_data)
+
 def get_stock_data(symbols):
-    """Get current stock data for the given symbols"""
+    """Get current stock data for a request
+    
+    Served from the shared quote table when fresh, else fetched upstream. If
+    upstream fails, times out or its circuit is open, the last known quotes
+    are returned as a StaleResult and refreshed in the background.
+    """
+    cached = get_cached_quotes(symbols)
+    if cached is not None:
+        return cached
+    user_id = session.get('user_id') if has_request_context() else None
+    try:
+        return _fetch_stock_data(symbols, user_id)
+    except Exception as e:
+        return get_stale_quotes(symbols, user_id, e)
+
+def get_stale_quotes(symbols, user_id, error):
+    """Last known quotes for ``symbols`` after a failed upstream lookup"""
+    app = current_app._get_current_object()
+    reason = fallback_reason(error)
+    current_app.logger.warning('Serving last known quotes (%s): %s', reason, error)
+    app.metrics.record_fallback('bars', reason)
+    
+    stale = app.upstream_guard.stale_quotes(symbols, reason)
+    # The shared table is last-known-good data too, however old
+    missing = [s for s in symbols if s not in stale]
+    if missing and app.quote_table is not None:
+        try:
+            stale.update(app.quote_table.get_many(missing))
+        except Exception:
+            pass
+    
+    def revalidate():
+        with app.app_context():
+            try:
+                _fetch_stock_data(symbols, user_id)
+            except Exception:
+                app.metrics.record_revalidation('bars', 'error')
+                return
+            app.metrics.record_revalidation('bars', 'ok')
+            app.fragment_cache.invalidate()
+    
+    app.upstream_guard.revalidate(('bars', tuple(sorted(symbols))), revalidate)
+    return stale
+
+def fetch_stock_data(symbols):
+    """Fetch current stock data for the given symbols from upstream, {} on failure"""
+    user_id = session.get('user_id') if has_request_context() else None
+    try:
+        return _fetch_stock_data(symbols, user_id)
+    except Exception as e:
+        current_app.logger.error('Error fetching stock data: %s', e)
+        return {}
+
+def _fetch_stock_data(symbols, user_id=None):
+    """Fetch quotes from upstream, remembering them as last known good"""
+    alpaca_factory = current_app.alpaca_factory
     if alpaca_factory.is_simulation_mode:
-        return alpaca_factory.get_stock_data(symbols)
+        quotes = alpaca_factory.get_stock_data(symbols)
+        current_app.upstream_guard.remember_quotes(quotes)
+        return quotes
     
-    # Get the current user's credentials
-    user_id = session.get('user_id')
+    # Real mode uses the requesting user's credentials
     if not user_id:
         return {}
     
@@ -435,15 +1115,22 @@ def get_stock_data(symbols):
     if not credentials:
         return {}
     
-    client = StockHistoricalDataClient(
+    # The SDK is only needed here, on the first real-mode upstream call
+    from alpaca.data import StockHistoricalDataClient
+    from alpaca.data.enums import Adjustment
+    from alpaca.data.requests import StockBarsRequest
+    from alpaca.data.timeframe import TimeFrame
+    from alpaca.trading.client import TradingClient
+    
+    client = alpaca_factory.wrap_client(StockHistoricalDataClient(
         api_key=credentials['api_key'],
         secret_key=credentials['secret_key']
-    )
+    ))
     
-    now = datetime.now(pytz.UTC)
+    now = datetime.now(timezone.utc)
     start = now - timedelta(days=2)
     
-    request = StockBarsRequest(
+    bars_request = StockBarsRequest(
         symbol_or_symbols=symbols,
         timeframe=TimeFrame.Day,
         start=start,
@@ -451,122 +1138,378 @@ def get_stock_data(symbols):
         adjustment=Adjustment.ALL
     )
     
-    try:
-        bars = client.get_stock_bars(request)
-        trading_client = TradingClient(
-            api_key=credentials['api_key'],
-            secret_key=credentials['secret_key'],
-            paper=True
-        )
-        assets = {asset.symbol: asset for asset in trading_client.get_all_assets()}
-        
-        result = {}
-        for symbol in symbols:
-            if symbol in assets:
-                symbol_bars = bars[bars.index.get_level_values('symbol') == symbol]
-                if len(symbol_bars) >= 1:
-                    current_price = float(symbol_bars.iloc[-1]['close'])
-                    previous_close = float(symbol_bars.iloc[-2]['close']) if len(symbol_bars) > 1 else current_price
-                    
-                    result[symbol] = {
-                        'price': current_price,
-                        'previous_close': previous_close,
-                        'name': assets[symbol].name,
-                        'timestamp': symbol_bars.iloc[-1].name[1]
-                    }
-        
-        return result
-    except Exception as e:
-        app.logger.error(f"Error fetching stock data: {str(e)}")
-        return {}
+    bars = client.get_stock_bars(bars_request)
+    trading_client = alpaca_factory.wrap_client(TradingClient(
+        api_key=credentials['api_key'],
+        secret_key=credentials['secret_key'],
+        paper=True
+    ))
+    names = {asset.symbol: asset.name for asset in trading_client.get_all_assets()}
+    quotes = quotes_from_bars(bars, names, symbols)
+    current_app.upstream_guard.remember_quotes(quotes)
+    return quotes
 
 def update_stock_prices(manual=False):
     """Background task to update stock prices using Alpaca API"""
+    profiler = current_app.profiler
+    capture = profiler.take(REFRESH_TARGET) if profiler is not None and profiler.armed else None
+    if capture is None:
+        return _update_stock_prices(manual)
+    
+    capture.start()
     try:
+        return _update_stock_prices(manual)
+    finally:
+        name = capture.stop()
         if manual:
-            print(f"[{datetime.now()}] Starting manual stock price update...")
-        else:
-            print(f"[{datetime.now()}] Starting scheduled stock price update...")
-            
+            flash(f'Refresh profile saved as {name}', 'success')
+
+def _update_stock_prices(manual):
+    metrics = current_app.metrics
+    started = time.perf_counter()
+    trigger = 'manual' if manual else 'scheduled'
+    try:
+        refresh_log.debug('Starting %s stock price update', trigger)
+        
         stocks = Stock.query.all()
         
         # Get all stock symbols
         symbols = [stock.symbol for stock in stocks]
+        updated = missing = failed = 0
         
         if symbols:  # Only make API call if we have stocks to update
-            # Fetch data for all stocks
-            stock_data = get_stock_data(symbols)
+            # Fetch data for all stocks plus the market indexes, bypassing the
+            # shared table since this cycle is what refreshes it
+            index_symbols = [s for s in Config.INDEX_SYMBOLS if s not in symbols]
+            stock_data = fetch_stock_data(symbols + index_symbols)
+            if not stock_data:
+                refresh_log.warning('No stock data returned from upstream',
+                                    extra={'trigger': trigger, 'symbols': len(symbols)})
+                metrics.record_refresh(time.perf_counter() - started, 'empty')
+                return False
+            
+            # One array per field, for the column-wise writes of the shared table
+            batch = QuoteBatch.from_quotes(Quote.coerce(symbol, data) for symbol, data in stock_data.items())
+            try:
+                publish_quotes(batch)
+            except Exception as e:
+                refresh_log.warning('Error publishing quotes: %s', e)
             
-            # Update each stock
+            try:
+                record_sparklines(stock_data)
+            except Exception as e:
+                refresh_log.warning('Error recording sparklines: %s', e)
+            
+            # Update each stock; per-symbol detail only at debug level
+            debug = refresh_log.isEnabledFor(logging.DEBUG)
+            moves = []
             for stock in stocks:
                 try:
                     if stock.symbol in stock_data:
-                        data = stock_data[stock.symbol]
-                        
-                        # Update stock name if not set
-                        if not stock.name:
-                            stock.name = data['name']
-                        
-                        stock.update_price(
-                            current_price=data['price'],
-                            previous_close=data['previous_close']
-                        )
-                        stock.last_updated = data['timestamp']  # Explicitly set the last_updated timestamp
-                        print(f"[{datetime.now()}] Updated {stock.symbol}: ${data['price']:.2f} (prev: ${data['previous_close']:.2f})")
+                        quote = Quote.coerce(stock.symbol, stock_data[stock.symbol])
+                        if stock.current_price is not None and quote.price != stock.current_price:
+                            moves.append(PriceMove(stock.symbol, stock.current_price, quote.price,
+                                                   stock.price_change_percent, quote.change_percent))
+                        stock.apply_quote(quote)
+                        updated += 1
+                        if debug:
+                            refresh_log.debug('Updated %s: $%.2f (prev: $%.2f)',
+                                              stock.symbol, quote.price, quote.previous_close)
                     else:
-                        print(f"[{datetime.now()}] No data available for {stock.symbol}")
+                        missing += 1
+                        if debug:
+                            refresh_log.debug('No data available for %s', stock.symbol)
                         
                 except Exception as e:
-                    print(f"[{datetime.now()}] Error updating {stock.symbol}: {str(e)}")
+                    failed += 1
+                    refresh_log.warning('Error updating %s: %s', stock.symbol, e)
+            
+            prices = {stock.symbol: stock.current_price for stock in stocks if stock.current_price is not None}
+            
+            # Chart history and fired alerts go in the same transaction as the prices
+            try:
+                record_history(stock_data)
+            except Exception as e:
+                refresh_log.warning('Error recording price history: %s', e)
+            
+            try:
+                queue_fired_alerts(moves)
+            except Exception as e:
+                refresh_log.warning('Error evaluating alerts: %s', e)
+                # Alerts taken out of the index may not have been queued;
+                # the next cycle reloads every active one
+                current_app.alert_index = AlertIndex()
             
             try:
                 db.session.commit()
                 if manual:
                     flash('Stock prices updated successfully', 'success')
             except Exception as e:
-                print(f"[{datetime.now()}] Error committing updates: {str(e)}")
+                refresh_log.error('Error committing updates: %s', e)
                 db.session.rollback()
+                current_app.history.forget()
+                current_app.alert_index = AlertIndex()
                 if manual:
                     flash(f'Error updating stock prices: {str(e)}', 'error')
         
-        print(f"[{datetime.now()}] Stock price update completed.")
+        duration = time.perf_counter() - started
+        refresh_log.info('Stock price update completed', extra={
+            'trigger': trigger,
+            'symbols': len(symbols),
+            'updated': updated,
+            'missing': missing,
+            'errors': failed,
+            'duration_ms': round(duration * 1000, 1)
+        })
+        metrics.record_refresh(duration, 'ok', stock_data if symbols else ())
+        # Shared page fragments re-render with the new prices
+        current_app.fragment_cache.invalidate()
+        current_app.history_cache.invalidate()
+        revalue_portfolios()
+        if symbols:
+            try:
+                advance_indicators(symbols)
+            except Exception as e:
+                db.session.rollback()
+                refresh_log.warning('Error updating indicators: %s', e)
+            try:
+                update_performance(prices)
+            except Exception as e:
+                db.session.rollback()
+                refresh_log.warning('Error updating performance summaries: %s', e)
+            store_news(symbols + index_symbols)
         return True
     except Exception as e:
+        metrics.record_refresh(time.perf_counter() - started, 'error')
         error_msg = f"Error in update process: {str(e)}"
-        print(f"[{datetime.now()}] {error_msg}")
+        refresh_log.exception('Error in update process', extra={'trigger': trigger})
         if manual:
             flash(error_msg, 'error')
         return False
 
-def background_update_task():
-    """Background task that runs continuously"""
+def advance_indicators(symbols):
+    """Bring each symbol's rolling indicators up to its last completed daily bar
+    
+    Each symbol is checked once per session. Symbols with a state fold in
+    the bars completed since; symbols without one are backfilled if their
+    history is thin and warmed up together, INDICATOR_WARMUP_BATCH per cycle.
+    """
+    engine = current_app.indicators
+    if not engine.loaded:
+        engine.load(db.session.query(IndicatorState.symbol, IndicatorState.state).all())
+    today = session_start(datetime.now(timezone.utc))
+    due = engine.due(symbols, today)
+    if not due:
+        return 0
+    history = current_app.history
+    known = [symbol for symbol in due if symbol in engine.states]
+    cold = [symbol for symbol in due if symbol not in engine.states][:current_app.config['INDICATOR_WARMUP_BATCH']]
+    changed = []
+    
+    if known:
+        since = min(engine.states[symbol].through for symbol in known) + 1
+        series = history.load_many(known, DAY, since, today)
+        changed.extend(symbol for symbol, bars in series.items() if engine.advance(symbol, bars))
+    if cold:
+        start = today - int(WARMUP_SPAN.total_seconds())
+        series = history.load_many(cold, DAY, start, today)
+        thin = [symbol for symbol in cold if len(series.get(symbol, ())) < WARMUP_BARS // 2]
+        if thin and history.backfill(thin, DAY, WARMUP_SPAN):
+            series = history.load_many(cold, DAY, start, today)
+        changed.extend(engine.warm_up(series))
+    
+    save_indicator_states(changed)
+    db.session.commit()
+    engine.mark_checked(known + cold, today)
+    return len(changed)
+
+def save_indicator_states(symbols):
+    """Write the engine's states for ``symbols``"""
+    states = current_app.indicators.states
+    for start in range(0, len(symbols), 500):
+        chunk = symbols[start:start + 500]
+        rows = {row.symbol: row for row in IndicatorState.query.filter(IndicatorState.symbol.in_(chunk))}
+        for symbol in chunk:
+            state = states[symbol]
+            row = rows.get(symbol)
+            if row is None:
+                db.session.add(IndicatorState(symbol=symbol, through=state.through, state=state.to_json()))
+            else:
+                row.through = state.through
+                row.state = state.to_json()
+
+def update_performance(prices):
+    """Bring the performance summaries of ``prices``' symbols up to those prices
+    
+    Anchors are computed from the stored daily bars once per session, for
+    all symbols due in one batch; the figures are recomputed for every
+    symbol together, and only rows whose price moved are written. Rows this
+    process wrote are remembered, so only symbols it hasn't seen this
+    session are read back from the database.
+    """
+    if not prices:
+        return 0
+    stored = current_app.performance
+    today = session_start(datetime.now(timezone.utc))
+    unseen = [symbol for symbol in prices if stored.get(symbol, (None,))[0] != today]
+    columns = [PerformanceSummary.session, PerformanceSummary.price] + \
+        [getattr(PerformanceSummary, name) for name in PERFORMANCE_ANCHORS]
+    for offset in range(0, len(unseen), 500):
+        for row in db.session.query(PerformanceSummary.symbol, *columns) \
+                .filter(PerformanceSummary.symbol.in_(unseen[offset:offset + 500])):
+            stored[row[0]] = tuple(row[1:])
+    start = today - int(PERFORMANCE_SPAN.total_seconds())
+    inserts, updates = summary_rows(
+        prices, stored, today, lambda symbols: current_app.history.load_many(symbols, DAY, start, today))
+    if inserts:
+        db.session.execute(insert(PerformanceSummary), inserts)
+    if updates:
+        db.session.execute(update(PerformanceSummary), updates)
+    db.session.commit()
+    for row in inserts + updates:
+        symbol = row['symbol']
+        anchors = tuple(row[name] for name in PERFORMANCE_ANCHORS) if 'session' in row else stored[symbol][2:]
+        stored[symbol] = (today, row['price'], *anchors)
+    return len(inserts) + len(updates)
+
+def revalue_portfolios():
+    """Value every user's holdings at the prices just published"""
+    portfolio = current_app.portfolio
+    portfolio.invalidate()
+    try:
+        valuation = portfolio.valuation()
+    except Exception as e:
+        refresh_log.warning('Error valuing portfolios: %s', e)
+        return
+    current_app.metrics.record_revaluation(portfolio.last_duration, len(valuation.book))
+
+def sync_alert_index(index):
+    """Add alerts created since the index was last synced"""
+    rows = db.session.query(PriceAlert.id, Stock.symbol, PriceAlert.kind, PriceAlert.threshold) \
+        .join(UserStock, PriceAlert.user_stock_id == UserStock.id) \
+        .join(Stock, UserStock.stock_id == Stock.id) \
+        .filter(PriceAlert.id > index.loaded_through, PriceAlert.active.is_(True)) \
+        .all()
+    if rows:
+        index.load(rows)
+
+def queue_fired_alerts(moves):
+    """Fire the alerts crossed by ``moves`` and queue an event for each
+    
+    The index only sees symbols whose price changed. Its candidates are
+    checked against the database, since alerts deleted by their users stay
+    in the index until they would have fired. A row that no longer matches
+    its entry, e.g. an id reused by a database from before ids were kept
+    unique, is indexed as it is now instead of firing.
+    """
+    index = current_app.alert_index
+    sync_alert_index(index)
+    if not moves:
+        return 0
+    fired = {alert.alert_id: alert for alert in index.evaluate(moves)}
+    if not fired:
+        return 0
+    
+    # Build every event before touching the session, so a failure part way
+    # leaves no alert half fired
+    pending = []
+    ids = list(fired)
+    for start in range(0, len(ids), 500):
+        rows = db.session.query(PriceAlert, UserStock.user_id, Stock.symbol) \
+            .join(UserStock, PriceAlert.user_stock_id == UserStock.id) \
+            .join(Stock, UserStock.stock_id == Stock.id) \
+            .filter(PriceAlert.id.in_(ids[start:start + 500]), PriceAlert.active.is_(True)) \
+            .all()
+        for alert, user_id, symbol in rows:
+            hit = fired[alert.id]
+            if (symbol, alert.kind, alert.threshold) != (hit.symbol, hit.kind, hit.threshold):
+                index.add(alert.id, symbol, alert.kind, alert.threshold)
+                continue
+            pending.append((alert, AlertEvent(user_id=user_id, alert_id=alert.id, symbol=hit.symbol,
+                                              kind=hit.kind, threshold=hit.threshold, value=hit.value)))
+    
+    now = datetime.utcnow()
+    for alert, event in pending:
+        alert.active = False
+        alert.triggered_at = now
+        db.session.add(event)
+    queued = len(pending)
+    current_app.metrics.record_alerts(queued)
+    refresh_log.info('Queued %s price alerts', queued, extra={'alerts': queued})
+    return queued
+
+def background_update_task(app, stop=None):
+    """Background task that runs until ``stop`` is set
+    
+    With a shared quote table only the process holding its writer lock
+    refreshes; the others stand by and take over if that process exits.
+    """
+    stop = stop or threading.Event()
     retry_delay = 60  # Start with 1 minute retry delay
     max_retry_delay = 900  # Maximum 15 minutes between retries
     
-    while True:
+    while not stop.is_set():
         try:
+            quote_table = getattr(app, 'quote_table', None)
+            if quote_table is not None and not quote_table.try_acquire_writer():
+                stop.wait(Config.STOCK_UPDATE_INTERVAL)
+                continue
             with app.app_context():
                 success = update_stock_prices()
                 if success:
                     retry_delay = 60  # Reset delay after successful update
+                    delay = Config.STOCK_UPDATE_INTERVAL
                 else:
+                    # Back off instead of hammering a failing upstream
+                    delay = retry_delay
                     retry_delay = min(retry_delay * 2, max_retry_delay)
                 
-                print(f"[{datetime.now()}] Next update in {Config.STOCK_UPDATE_INTERVAL} seconds.")
-                time.sleep(Config.STOCK_UPDATE_INTERVAL)
-        except Exception as e:
-            print(f"[{datetime.now()}] Error in update loop: {str(e)}")
-            print(f"[{datetime.now()}] Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
+                refresh_log.debug('Next update in %s seconds', delay)
+            stop.wait(delay)
+        except Exception:
+            refresh_log.exception('Error in update loop, retrying in %s seconds', retry_delay)
+            stop.wait(retry_delay)
             retry_delay = min(retry_delay * 2, max_retry_delay)
 
 def get_news_for_symbols(symbols):
-    """Get news articles for the given symbols"""
-    return alpaca_factory.get_news(symbols)
+    """Get news articles for the given symbols, or the last known ones if upstream fails"""
+    app = current_app._get_current_object()
+    guard = app.upstream_guard
+    try:
+        articles = app.alpaca_factory.get_news(symbols)
+    except Exception as e:
+        reason = fallback_reason(e)
+        app.logger.error('Error fetching news (%s): %s', reason, e)
+        app.metrics.record_fallback('news', reason)
+        
+        def revalidate():
+            with app.app_context():
+                try:
+                    guard.remember_news(symbols, app.alpaca_factory.get_news(symbols))
+                except Exception:
+                    app.metrics.record_revalidation('news', 'error')
+                    return
+                app.metrics.record_revalidation('news', 'ok')
+                app.fragment_cache.invalidate()
+        
+        guard.revalidate(('news', tuple(sorted(symbols))), revalidate)
+        return guard.stale_news(symbols)
+    guard.remember_news(symbols, articles)
+    return articles
 
-@app.route('/news')
 def news():
-    """Display news for tracked stocks"""
+    """Display news for tracked stocks, or one page of stored articles for a symbol or search"""
+    symbol = request.args.get('symbol', '').strip().upper()
+    query = request.args.get('q', '').strip()
+    before = request.args.get('before', '').strip()
+    if symbol or query or before:
+        try:
+            articles, next_before = news_page(symbol, query, before, current_app.config['NEWS_PAGE_SIZE'])
+        except ValueError:
+            abort(400)
+        return render_template('news.html', symbol=symbol, query=query, articles=articles,
+                               next_before=next_before, searching=True)
+    
     # Get all tracked stock symbols
     stocks = Stock.query.all()
     symbols = [stock.symbol for stock in stocks]
@@ -574,34 +1517,134 @@ def news():
     # Add market indexes
     symbols.extend(['SPY', 'DIA', 'QQQ'])
     
-    # Get news articles
-    articles = get_news_for_symbols(symbols)
+    # The article list is the same for every user, so it is a cached
+    # fragment keyed by the symbol set; stored articles are read on a miss only
+    return render_template('news.html', 
+                         symbols=symbols,
+                         load_articles=lambda: get_articles_by_symbol(symbols),
+                         stocks=stocks,
+                         searching=False)
+
+@user_login_required
+def get_news():
+    """A page of stored articles, newest first, for ``symbol`` and/or matching ``q``"""
+    try:
+        limit = int(request.args.get('limit', current_app.config['NEWS_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = min(max(limit, 1), current_app.config['NEWS_MAX_PAGE_SIZE'])
+    try:
+        articles, next_before = news_page(request.args.get('symbol', '').strip(), request.args.get('q', '').strip(),
+                                          request.args.get('before', '').strip(), limit)
+    except ValueError:
+        return jsonify({'error': 'before must be a cursor from a previous page'}), 400
+    return jsonify({'articles': articles, 'next_before': next_before})
+
+def news_page(symbol, query, before, limit):
+    """Stored articles as dicts and the next page's cursor; ValueError for a malformed cursor"""
+    rows, next_before = news_rows(symbol or None, query or None, parse_news_cursor(before) if before else None, limit)
+    return [news_dict(row) for row in rows], next_before
+
+def get_articles_by_symbol(symbols):
+    """The newest stored articles for each of ``symbols`` that has any
     
-    # Group articles by stock
+    Each symbol's are the first page of its keyset listing, read through
+    the (symbol, published_at) index; older ones are paged at /news?symbol=.
+    """
+    limit = current_app.config['NEWS_OVERVIEW_SIZE']
     articles_by_stock = {}
-    for article in articles:
-        for symbol in article.get('symbols', []):
-            if symbol in symbols:  # Only include articles for tracked stocks
-                if symbol not in articles_by_stock:
-                    articles_by_stock[symbol] = []
-                articles_by_stock[symbol].append(article)
+    for symbol in symbols:
+        rows, _ = news_rows(symbol, limit=limit)
+        if rows:
+            articles_by_stock[symbol] = [news_dict(row) for row in rows]
+    return articles_by_stock
+
+def store_news(symbols):
+    """Keep the latest articles for ``symbols`` for the news pages and search
     
-    return render_template('news.html', 
-                         articles_by_stock=articles_by_stock,
-                         stocks=stocks)
-
-# Global flag to track if initialization has occurred
-_is_initialized = False
-
-@app.before_request
-def initialize():
-    global _is_initialized
-    if not _is_initialized:
-        # Start the background task for updating stock prices
-        update_thread = threading.Thread(target=background_update_task)
-        update_thread.daemon = True
-        update_thread.start()
-        _is_initialized = True
+    Run by the refresher, at most once per NEWS_STORE_INTERVAL, so requests
+    only ever read stored news. Failures only cost the history.
+    """
+    app = current_app._get_current_object()
+    now = time.time()
+    if now - app.news_stored_at < app.config['NEWS_STORE_INTERVAL']:
+        return 0
+    app.news_stored_at = now
+    try:
+        stored = save_news(get_news_for_symbols(symbols))
+        if stored:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        refresh_log.warning('Could not store news articles: %s', e)
+        return 0
+    return stored
+
+def start_background_refresh():
+    """Start this app's price refresher on its first request"""
+    app = current_app._get_current_object()
+    if app.extensions.get('refresher') is not None or not app.config['BACKGROUND_REFRESH_ENABLED']:
+        return
+    with _refresher_lock:
+        if app.extensions.get('refresher') is None:
+            stop = threading.Event()
+            update_thread = threading.Thread(target=background_update_task, args=(app, stop),
+                                             name='price-refresher', daemon=True)
+            app.extensions['refresher'] = update_thread
+            app.extensions['refresher_stop'] = stop
+            update_thread.start()
+
+def stop_background_refresh(app, timeout=None):
+    """Stop the refresher, letting an in-flight update cycle finish first"""
+    with _refresher_lock:
+        update_thread = app.extensions.pop('refresher', None)
+        stop = app.extensions.pop('refresher_stop', None)
+    if stop is not None:
+        stop.set()
+    if update_thread is not None and update_thread.is_alive():
+        update_thread.join(timeout)
+    quote_table = getattr(app, 'quote_table', None)
+    if quote_table is not None:
+        quote_table.release_writer()
+
+def reset_after_fork(app):
+    """Drop per-process state inherited from a preloading parent
+    
+    Pooled DB connections and upstream HTTP sessions must not be shared
+    across processes, and threads do not survive a fork.
+    """
+    global _refresher_lock
+    _refresher_lock = threading.Lock()
+    app.extensions.pop('refresher', None)
+    app.extensions.pop('refresher_stop', None)
+    with app.app_context():
+        # Leave the parent's connections open for the parent
+        db.engine.dispose(close=False)
+    app.alpaca_factory.reset_clients()
+    app.upstream_guard.reset_after_fork()
+
+_refresher_lock = threading.Lock()
+
+def register_routes(app):
+    """Attach the view functions to ``app``"""
+    app.add_url_rule('/login', 'login', login, methods=['GET', 'POST'])
+    app.add_url_rule('/register', 'register', register, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', 'logout', logout)
+    app.add_url_rule('/', 'index', index, methods=['GET', 'POST'])
+    app.add_url_rule('/api/stocks', 'get_stocks', get_stocks)
+    app.add_url_rule('/api/stocks', 'add_stocks', add_stocks, methods=['POST'])
+    app.add_url_rule('/watchlist/import', 'import_watchlist', import_watchlist, methods=['POST'])
+    app.add_url_rule('/api/stocks/<symbol>/history', 'get_stock_history', get_stock_history)
+    app.add_url_rule('/api/symbols/search', 'search_symbols', search_symbols)
+    app.add_url_rule('/api/alerts', 'get_alerts', get_alerts)
+    app.add_url_rule('/api/portfolio', 'get_portfolio', get_portfolio)
+    app.add_url_rule('/admin/login', 'admin_login', admin_login, methods=['GET', 'POST'])
+    app.add_url_rule('/admin/dashboard', 'admin_dashboard', admin_dashboard, methods=['GET', 'POST'])
+    app.add_url_rule('/admin/profiles/<path:name>', 'admin_download_profile', admin_download_profile)
+    app.add_url_rule('/user/dashboard', 'user_dashboard', user_dashboard, methods=['GET', 'POST'])
+    app.add_url_rule('/news', 'news', news)
+    app.add_url_rule('/api/news', 'get_news', get_news)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001, host='0.0.0.0') 
\ No newline at end of file
+    # Development server; production runs gunicorn with gunicorn.conf.py
+    create_app().run(debug=True, port=int(os.getenv('PORT', '5001')), host='0.0.0.0')
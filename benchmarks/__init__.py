@@ -0,0 +1,7 @@
+"""Performance benchmarks for Dad's Stocks
+
+``python -m benchmarks`` runs the end-to-end suite (routes, refresh cycle and
+both get_stock_data paths) and compares it to ``benchmarks/baseline.json``.
+Focused benchmarks can also be run on their own, e.g.
+``python -m benchmarks.bench_quotes``.
+"""
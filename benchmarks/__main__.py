@@ -0,0 +1,85 @@
+"""End-to-end benchmark suite
+
+Runs the route, refresh and data-path scenarios against the simulated
+backend and prints machine-readable JSON::
+
+    python -m benchmarks --watchlist-size 50 --users 20 --universe 5000
+    python -m benchmarks --output results.json --baseline benchmarks/baseline.json
+    python -m benchmarks --save-baseline
+
+Exits non-zero with ``--fail-on-regression`` when any benchmark's p50 or
+p95 latency grew past the threshold relative to the stored baseline.
+"""
+import argparse
+import json
+import os
+import sys
+
+from .harness import DEFAULT_THRESHOLD, compare, environment, load_json, measure, write_json
+from .scenarios import BenchmarkApp, BenchmarkParams
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def parse_args(argv=None):
+    defaults = BenchmarkParams()
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the benchmark suite')
+    parser.add_argument('--watchlist-size', type=int, default=defaults.watchlist_size)
+    parser.add_argument('--users', type=int, default=defaults.users)
+    parser.add_argument('--universe', type=int, default=defaults.universe)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--quote-table', action='store_true', help='serve quotes from the shared table')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--only', action='append', default=[], help='run only benchmarks with this prefix')
+    parser.add_argument('--output', help='write results JSON here as well as stdout')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    params = BenchmarkParams(
+        watchlist_size=args.watchlist_size,
+        users=args.users,
+        universe=args.universe,
+        seed=args.seed,
+        quote_table=args.quote_table
+    )
+
+    bench = BenchmarkApp(params)
+    try:
+        results = {}
+        for name, fn in bench.scenarios().items():
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            print(f"running {name}...", file=sys.stderr)
+            results[name] = measure(fn, iterations=args.iterations)
+    finally:
+        bench.close()
+
+    run = {'params': params.as_dict(), 'environment': environment(), 'results': results}
+
+    baseline = load_json(args.baseline)
+    if baseline is not None and not args.save_baseline:
+        run['comparison'] = compare(run, baseline, args.threshold)
+
+    print(json.dumps(run, indent=2, sort_keys=True))
+    if args.output:
+        write_json(args.output, run)
+    if args.save_baseline:
+        write_json(args.baseline, run)
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+
+    regressions = run.get('comparison', {}).get('regressions', [])
+    if regressions:
+        print(f"regressions: {', '.join(regressions)}", file=sys.stderr)
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Alert evaluation benchmark: bisect index vs a scan of every alert
+
+Run with ``python -m benchmarks.bench_alerts [--alerts 1000000] [--symbols 10000]``.
+Each cycle moves ``--changed`` of the symbols by a random walk step and
+evaluates the alerts they crossed; the scan checks every alert instead.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from services.alerts import KINDS, AlertIndex, PriceMove
+
+from .harness import measure
+
+
+def build_alerts(alert_count, symbol_count, seed):
+    """Random (id, symbol, kind, threshold) rows around each symbol's price"""
+    rng = np.random.default_rng(seed)
+    symbols = [f"S{i:05d}" for i in range(symbol_count)]
+    prices = rng.uniform(5.0, 500.0, symbol_count)
+    owners = rng.integers(0, symbol_count, alert_count)
+    kinds = rng.integers(0, len(KINDS), alert_count)
+    offsets = rng.normal(0.0, 0.05, alert_count)
+    rows = []
+    for i in range(alert_count):
+        kind = KINDS[kinds[i]]
+        if kind.startswith('price'):
+            threshold = float(prices[owners[i]] * (1.0 + offsets[i]))
+        else:
+            threshold = float(offsets[i] * 100.0)
+        rows.append((i + 1, symbols[owners[i]], kind, threshold))
+    return symbols, prices, rows
+
+
+class Market:
+    """Random-walk prices; each cycle yields the moves of the symbols that changed"""
+
+    def __init__(self, symbols, prices, changed, seed):
+        self.symbols = symbols
+        self.prices = prices.copy()
+        self.previous_close = prices.copy()
+        self.changed = changed
+        self._rng = np.random.default_rng(seed + 1)
+
+    def cycle(self):
+        picked = self._rng.choice(len(self.symbols), self.changed, replace=False)
+        steps = self._rng.normal(0.0, 0.002, self.changed)
+        moves = []
+        for i, step in zip(picked, steps):
+            old = float(self.prices[i])
+            new = old * (1.0 + float(step))
+            close = float(self.previous_close[i])
+            self.prices[i] = new
+            moves.append(PriceMove(self.symbols[i], old, new,
+                                   (old - close) / close * 100, (new - close) / close * 100))
+        return moves
+
+
+def naive_scan(alerts, moves):
+    """Check every alert against the cycle's moves, as a per-alert loop would"""
+    by_symbol = {move.symbol: move for move in moves}
+    fired = []
+    for alert_id, symbol, kind, threshold in alerts:
+        move = by_symbol.get(symbol)
+        if move is None:
+            continue
+        if kind.startswith('price'):
+            old, new = move.old_price, move.new_price
+        else:
+            old, new = move.old_percent, move.new_percent
+        if kind.endswith('above') and old < threshold <= new:
+            fired.append(alert_id)
+        elif kind.endswith('below') and new <= threshold < old:
+            fired.append(alert_id)
+    return fired
+
+
+def run(alert_count=1_000_000, symbol_count=10_000, changed=2_000, iterations=20, seed=1234):
+    symbols, prices, rows = build_alerts(alert_count, symbol_count, seed)
+
+    gc.collect()
+    started = time.perf_counter()
+    index = AlertIndex()
+    index.load(rows)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    # A second load under tracemalloc, which would distort the timing above
+    tracemalloc.start()
+    traced = AlertIndex()
+    traced.load(rows)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced
+
+    market = Market(symbols, prices, changed, seed)
+    fired = []
+
+    def evaluate():
+        fired.append(len(index.evaluate(market.cycle())))
+
+    scan_market = Market(symbols, prices, changed, seed)
+
+    def scan():
+        naive_scan(rows, scan_market.cycle())
+
+    return {
+        'alerts': alert_count,
+        'symbols': symbol_count,
+        'changed_per_cycle': changed,
+        'load_ms': round(load_ms, 1),
+        'index_retained_mib': round(retained / 2 ** 20, 1),
+        'index_peak_mib': round(peak / 2 ** 20, 1),
+        'bisect': measure(evaluate, iterations=iterations, warmup=1, alloc_iterations=1),
+        'fired_per_cycle': round(float(np.mean(fired)), 1),
+        'scan': measure(scan, iterations=max(iterations // 4, 1), warmup=1, alloc_iterations=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=1_000_000)
+    parser.add_argument('--symbols', type=int, default=10_000)
+    parser.add_argument('--changed', type=int, default=2_000, help='symbols whose price moves each cycle')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    print(json.dumps(run(args.alerts, args.symbols, args.changed, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Indicator benchmark: rolling state updates vs recomputing from history
+
+Run with ``python -m benchmarks.bench_indicators [--symbols 10000] [--bars 250]``.
+Reports the batch warm-up of every symbol from its history, one session's
+incremental update (one new bar per symbol), live readings at a new price,
+and a per-symbol recomputation over the full history for reference.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from services.bars import Bars
+from services.indicators import IndicatorEngine, batch_states
+
+from .harness import measure
+
+
+def build_series(symbol_count, bar_count, extra, seed):
+    """History of ``bar_count`` bars per symbol, plus ``extra`` later bars delivered one at a time"""
+    rng = np.random.default_rng(seed)
+    total = bar_count + extra
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbol_count, total)), axis=1))
+    volume = rng.uniform(1e5, 1e6, (symbol_count, total))
+    ts = np.arange(total) * 86400
+    symbols = [f"S{i:05d}" for i in range(symbol_count)]
+
+    def bars(i, sl):
+        return Bars(ts[sl], close[i, sl], close[i, sl] * 1.01, close[i, sl] * 0.99, close[i, sl], volume[i, sl])
+
+    history = {symbol: bars(i, slice(0, bar_count)) for i, symbol in enumerate(symbols)}
+    sessions = [{symbol: bars(i, slice(t, t + 1)) for i, symbol in enumerate(symbols)}
+                for t in range(bar_count, total)]
+    return history, sessions
+
+
+def recompute(series):
+    """SMA, EMA and RSI over each symbol's whole history, as a per-request recomputation would"""
+    for bars in series.values():
+        close = bars.close
+        close[-20:].mean()
+        close[-50:].mean()
+        ema = close[0]
+        for x in close[1:].tolist():
+            ema += 2 / 21 * (x - ema)
+        change = np.diff(close)
+        gain, loss = np.clip(change, 0, None), np.clip(-change, 0, None)
+        avg_gain, avg_loss = gain[:14].mean(), loss[:14].mean()
+        for g, l in zip(gain[14:].tolist(), loss[14:].tolist()):
+            avg_gain, avg_loss = (avg_gain * 13 + g) / 14, (avg_loss * 13 + l) / 14
+
+
+def run(symbol_count=10_000, bar_count=250, iterations=10, seed=1234):
+    history, sessions = build_series(symbol_count, bar_count, iterations + 2, seed)
+    engine = IndicatorEngine()
+    engine.warm_up(history)
+    pending = iter(sessions)
+    prices = {symbol: float(bars.close[-1]) for symbol, bars in history.items()}
+
+    def advance():
+        # Each call delivers the next session's bar for every symbol
+        for symbol, bars in next(pending).items():
+            engine.advance(symbol, bars)
+
+    def live():
+        for symbol, price in prices.items():
+            engine.values(symbol, price)
+
+    return {
+        'symbols': symbol_count,
+        'bars': bar_count,
+        'batch_warm_up': measure(lambda: batch_states(history), iterations=max(iterations // 2, 1),
+                                 warmup=1, alloc_iterations=1),
+        'advance_one_bar': measure(advance, iterations=iterations, warmup=1, alloc_iterations=1),
+        'live_values': measure(live, iterations=iterations, warmup=1, alloc_iterations=1),
+        'recompute': measure(lambda: recompute(history), iterations=max(iterations // 4, 1),
+                             warmup=1, alloc_iterations=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=10_000)
+    parser.add_argument('--bars', type=int, default=250)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    print(json.dumps(run(args.symbols, args.bars, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Overhead benchmark for the metrics subsystem
+
+Times the primitive updates, then the same routes with metrics on and off:
+
+    python -m benchmarks.bench_metrics [--iterations 200]
+"""
+import argparse
+import json
+import time
+
+from services.metrics import AppMetrics
+
+from .harness import measure
+from .scenarios import BenchmarkApp, BenchmarkParams
+
+ROUTES = ('/api/stocks', '/')
+
+
+def primitive_costs(calls=200000):
+    """Nanoseconds per histogram observation and counter increment"""
+    metrics = AppMetrics()
+    started = time.perf_counter()
+    for _ in range(calls):
+        metrics.http_latency.observe(0.004, route='/api/stocks', method='GET', status='200')
+    observe_ns = (time.perf_counter() - started) / calls * 1e9
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        metrics.cache_lookups.inc(result='hit')
+    inc_ns = (time.perf_counter() - started) / calls * 1e9
+    return {'histogram_observe_ns': round(observe_ns, 1), 'counter_inc_ns': round(inc_ns, 1)}
+
+
+def route_overhead(params, iterations, rounds=5):
+    """Best p50 per route with metrics off and on, alternating to cancel drift"""
+    bench = BenchmarkApp(params)
+    try:
+        metrics = bench.app.metrics
+        results = {}
+        for path in ROUTES:
+            request = bench.route(path)
+            best = {False: float('inf'), True: float('inf')}
+            for _ in range(rounds):
+                for enabled in (False, True):
+                    metrics.enabled = enabled
+                    stats = measure(request, iterations=max(1, iterations // rounds), alloc_iterations=1)
+                    best[enabled] = min(best[enabled], stats['p50_ms'])
+            results[path] = {
+                'p50_ms_off': best[False],
+                'p50_ms_on': best[True],
+                'overhead_pct': round((best[True] / best[False] - 1) * 100, 2),
+            }
+        metrics.enabled = True
+        return results
+    finally:
+        bench.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--watchlist-size', type=int, default=BenchmarkParams.watchlist_size)
+    args = parser.parse_args()
+    params = BenchmarkParams(watchlist_size=args.watchlist_size)
+    print(json.dumps({
+        'primitives': primitive_costs(),
+        'routes': route_overhead(params, args.iterations),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Performance summary benchmark: batch anchors and figures vs a per-symbol scan
+
+Run with ``python -m benchmarks.bench_performance [--symbols 10000] [--bars 260]``.
+Reports the once-per-session anchor computation over every symbol's daily
+bars, the per-cycle figures at new prices, and a per-symbol pass over each
+history for reference.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from services.bars import Bars
+from services.performance import bounds, compute_anchors, summarize
+
+from .harness import measure
+
+DAY = 86400
+
+
+def build_series(symbol_count, bar_count, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbol_count, bar_count)), axis=1))
+    # Daily bars ending yesterday, weekends left out
+    days = np.arange(bar_count * 7 // 5 + 7)[::-1]
+    ts = (1_700_000_000 // DAY - days) * DAY
+    ts = ts[((ts // DAY + 3) % 7) < 5][-bar_count:]
+    today = int(ts[-1]) + DAY
+    series = {f"S{i:05d}": Bars(ts, close[i], close[i] * 1.01, close[i] * 0.99, close[i], np.ones(bar_count))
+              for i in range(symbol_count)}
+    return series, today
+
+
+def per_symbol(series, today):
+    """Each symbol's anchors with its own searches and reductions"""
+    week, month, year, window = bounds(today)
+    for bars in series.values():
+        ts = bars.ts
+        for bound in (week, month, year):
+            index = int(np.searchsorted(ts, bound)) - 1
+            bars.close[index] if index >= 0 else None
+        recent = int(np.searchsorted(ts, window))
+        bars.high[recent:].max()
+        bars.low[recent:].min()
+
+
+def run(symbol_count=10_000, bar_count=260, iterations=10, seed=1234):
+    series, today = build_series(symbol_count, bar_count, seed)
+    _, anchors = compute_anchors(series, today)
+    prices = np.array([float(bars.close[-1]) for bars in series.values()])
+    return {
+        'symbols': symbol_count,
+        'bars': bar_count,
+        'batch_anchors': measure(lambda: compute_anchors(series, today), iterations=iterations,
+                                 warmup=1, alloc_iterations=1),
+        'figures': measure(lambda: summarize(anchors, prices), iterations=iterations * 5,
+                           warmup=1, alloc_iterations=1),
+        'per_symbol_anchors': measure(lambda: per_symbol(series, today), iterations=max(iterations // 2, 1),
+                                      warmup=1, alloc_iterations=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=10_000)
+    parser.add_argument('--bars', type=int, default=260)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    print(json.dumps(run(args.symbols, args.bars, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
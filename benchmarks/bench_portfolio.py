@@ -0,0 +1,77 @@
+"""Portfolio revaluation benchmark: every user's holdings in one vectorized pass
+
+Run with ``python -m benchmarks.bench_portfolio [--users 50000] [--lots 10] [--symbols 10000]``.
+Reports the one-off cost of aggregating lots into positions, the cost of
+revaluing the whole book at new prices, and a per-user loop for reference.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from services.portfolio import PositionBook, Valuation
+
+from .harness import measure
+
+
+def build_lots(user_count, lots_per_user, symbol_count, seed):
+    rng = np.random.default_rng(seed)
+    count = user_count * lots_per_user
+    symbols = [f"S{i:05d}" for i in range(symbol_count)]
+    users = np.repeat(np.arange(1, user_count + 1), lots_per_user)
+    picks = rng.integers(0, symbol_count, count)
+    quantity = rng.integers(1, 500, count).astype(float)
+    unit_cost = rng.uniform(5.0, 500.0, count)
+    return symbols, list(zip(users.tolist(), [symbols[i] for i in picks], quantity.tolist(), unit_cost.tolist()))
+
+
+def per_user_loop(lots, prices):
+    """Value each user's lots one by one, as a per-request computation would"""
+    totals = {}
+    for user_id, symbol, quantity, unit_cost in lots:
+        price, previous = prices[symbol]
+        value, cost, day = totals.get(user_id, (0.0, 0.0, 0.0))
+        totals[user_id] = (value + quantity * price, cost + quantity * unit_cost, day + quantity * (price - previous))
+    return totals
+
+
+def run(user_count=50_000, lots_per_user=10, symbol_count=10_000, iterations=20, seed=1234):
+    symbols, lots = build_lots(user_count, lots_per_user, symbol_count, seed)
+    rng = np.random.default_rng(seed + 1)
+
+    started = time.perf_counter()
+    book = PositionBook.from_lots(lots)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    price_by_symbol = dict(zip(symbols, rng.uniform(5.0, 500.0, symbol_count)))
+    prices = np.array([price_by_symbol[symbol] for symbol in book.symbols])
+    previous = prices * 0.99
+    loop_prices = {symbol: (price_by_symbol[symbol], price_by_symbol[symbol] * 0.99) for symbol in symbols}
+
+    return {
+        'users': user_count,
+        'lots': len(lots),
+        'positions': len(book),
+        'symbols': symbol_count,
+        'book_build_ms': round(build_ms, 1),
+        'vectorized': measure(lambda: Valuation(book, prices, previous), iterations=iterations,
+                              warmup=2, alloc_iterations=1),
+        'per_user_loop': measure(lambda: per_user_loop(lots, loop_prices), iterations=max(iterations // 4, 1),
+                                 warmup=1, alloc_iterations=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--lots', type=int, default=10, help='lots per user')
+    parser.add_argument('--symbols', type=int, default=10_000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.lots, args.symbols, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Memory and allocation benchmark: dict-of-dicts vs Quote vs QuoteBatch
+
+Run with ``python -m benchmarks.bench_quotes [--symbols 10000]``.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from services.quotes import Quote, QuoteBatch
+
+
+def _symbols(count):
+    return [f"S{i:05d}" for i in range(count)]
+
+
+def build_dicts(symbols, now):
+    return {
+        symbol: {
+            'price': 100.0 + i,
+            'previous_close': 99.0 + i,
+            'name': f"Company {symbol}",
+            'timestamp': now
+        }
+        for i, symbol in enumerate(symbols)
+    }
+
+
+def build_quotes(symbols, now):
+    return {
+        symbol: Quote(symbol, 100.0 + i, 99.0 + i, f"Company {symbol}", now)
+        for i, symbol in enumerate(symbols)
+    }
+
+
+def build_batch(symbols, now):
+    count = len(symbols)
+    return QuoteBatch(
+        symbols,
+        [100.0 + i for i in range(count)],
+        [99.0 + i for i in range(count)],
+        [now.timestamp()] * count,
+        [f"Company {symbol}" for symbol in symbols]
+    )
+
+
+def measure(builder, symbols, now):
+    """Measure retained bytes, live allocations and build time for one builder"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    result = builder(symbols, now)
+    elapsed = time.perf_counter() - started
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    retained = sum(stat.size_diff for stat in stats)
+    allocations = sum(stat.count_diff for stat in stats)
+    del result
+    return {
+        'retained_bytes': retained,
+        'allocations': allocations,
+        'build_ms': round(elapsed * 1000, 3),
+    }
+
+
+def run(symbol_count=10000):
+    symbols = _symbols(symbol_count)
+    now = datetime.now(timezone.utc)
+    return {
+        'symbols': symbol_count,
+        'dict_of_dicts': measure(build_dicts, symbols, now),
+        'quotes': measure(build_quotes, symbols, now),
+        'quote_batch': measure(build_batch, symbols, now),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=10000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.symbols), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Symbol search benchmark: index build time and query latency vs a linear scan
+
+Run with ``python -m benchmarks.bench_symbol_search [--assets 20000]``.
+Reports building the index over a synthetic asset catalog, a mix of ticker
+and company-name queries against it, and the same queries answered by
+scanning every asset for reference.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from services.symbol_search import SymbolIndex, tokenize
+
+from .harness import measure
+
+WORDS = ['Acme', 'Global', 'American', 'First', 'United', 'Pacific', 'Energy', 'Capital', 'Health', 'Systems',
+         'Technologies', 'Bancorp', 'Therapeutics', 'Resources', 'Industries', 'Holdings', 'Financial', 'Trust',
+         'Realty', 'Pharmaceuticals', 'Semiconductor', 'Media', 'Airlines', 'Foods', 'Motors', 'Networks']
+SUFFIXES = ['Inc.', 'Corp.', 'Ltd.', 'plc', 'ETF', 'Group', 'Co.']
+
+
+def build_catalog(asset_count, seed):
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    names = {}
+    while len(names) < asset_count:
+        symbol = ''.join(letters[rng.integers(0, 26, rng.integers(1, 6))])
+        words = [WORDS[i] for i in rng.integers(0, len(WORDS), rng.integers(1, 4))]
+        names[symbol] = ' '.join(words + [SUFFIXES[rng.integers(0, len(SUFFIXES))]])
+    return names
+
+
+def build_queries(names, query_count, seed):
+    rng = np.random.default_rng(seed)
+    symbols = list(names)
+    queries = []
+    for i in range(query_count):
+        symbol = symbols[rng.integers(0, len(symbols))]
+        kind = i % 3
+        if kind == 0:
+            queries.append(symbol[:rng.integers(1, len(symbol) + 1)])
+        elif kind == 1:
+            word = tokenize(names[symbol])[0]
+            queries.append(word[:rng.integers(2, len(word) + 1)])
+        else:
+            queries.append(' '.join(word[:4] for word in tokenize(names[symbol])[:2]))
+    return queries
+
+
+def linear_search(names, query, limit):
+    """Matches found by checking every asset, ranked like the index"""
+    ticker, words = query.strip().upper(), tokenize(query)
+    symbols = sorted(symbol for symbol in names if ticker and symbol.startswith(ticker))[:limit]
+    seen = set(symbols)
+    named = []
+    for symbol, name in names.items():
+        tokens = tokenize(name)
+        if symbol not in seen and words and all(any(token.startswith(word) for token in tokens) for word in words):
+            named.append((not tokens[0].startswith(words[0]), symbol))
+    return symbols + [symbol for _, symbol in sorted(named)[:limit - len(symbols)]]
+
+
+def run(asset_count=20_000, query_count=300, limit=10, iterations=20, seed=1234):
+    names = build_catalog(asset_count, seed)
+    queries = build_queries(names, query_count, seed)
+    index = SymbolIndex(names)
+
+    def indexed():
+        for query in queries:
+            index.search(query, limit)
+
+    def scanned():
+        for query in queries[:max(query_count // 30, 1)]:
+            linear_search(names, query, limit)
+
+    results = {
+        'assets': asset_count,
+        'build': measure(lambda: SymbolIndex(names), iterations=max(iterations // 4, 1), warmup=1,
+                         alloc_iterations=1),
+        'queries': measure(indexed, iterations=iterations, warmup=1, alloc_iterations=1),
+        'scan_queries': measure(scanned, iterations=max(iterations // 4, 1), warmup=1, alloc_iterations=1),
+    }
+    # Per-query figures, for comparison with the lookup budget
+    results['query_p50_us'] = round(results['queries']['p50_ms'] / len(queries) * 1000, 2)
+    scanned_count = max(query_count // 30, 1)
+    results['scan_query_p50_us'] = round(results['scan_queries']['p50_ms'] / scanned_count * 1000, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--assets', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+    print(json.dumps(run(args.assets, args.queries, args.limit, args.iterations, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Timing, allocation and baseline comparison helpers for the benchmarks"""
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+# A benchmark regresses when a latency percentile grows by more than this factor
+DEFAULT_THRESHOLD = 1.25
+COMPARED_STATS = ('p50_ms', 'p95_ms')
+
+
+def measure(fn: Callable[[], object], iterations: int = 50, warmup: int = 5,
+            alloc_iterations: int = 5) -> Dict:
+    """Time ``fn`` and report latency percentiles plus allocation figures
+
+    Timing and allocation tracking run in separate passes so tracemalloc's
+    overhead doesn't inflate the latency numbers.
+    """
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - started
+    samples *= 1000.0
+
+    peaks, blocks = [], []
+    for _ in range(alloc_iterations):
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        blocks.append(sys.getallocatedblocks() - blocks_before)
+
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'iterations': iterations,
+        'mean_ms': round(float(samples.mean()), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'max_ms': round(float(samples.max()), 4),
+        # Peak bytes traced during one call, and blocks still alive after it
+        'peak_alloc_kib': round(float(np.median(peaks)) / 1024, 1),
+        'retained_blocks': int(np.median(blocks)),
+    }
+
+
+def environment() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> Dict:
+    """Compare a run against a stored baseline, benchmark by benchmark
+
+    Only benchmarks run with the same parameters are compared; ratios above
+    ``threshold`` are reported as regressions.
+    """
+    report = {'threshold': threshold, 'regressions': [], 'ratios': {}}
+    if baseline.get('params') != results.get('params'):
+        report['skipped'] = 'baseline was recorded with different parameters'
+        return report
+
+    for name, stats in results['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratios = {}
+        for key in COMPARED_STATS:
+            if base.get(key):
+                ratios[key] = round(stats[key] / base[key], 3)
+        report['ratios'][name] = ratios
+        if any(ratio > threshold for ratio in ratios.values()):
+            report['regressions'].append(name)
+    return report
+
+
+def load_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_json(path: str, data: Dict):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,385 @@
+"""Multi-user load generator for the dashboard polling workload
+
+Starts the app locally in simulation mode (in this process, or as a child
+running the dev server or gunicorn), registers and logs in N synthetic
+users over HTTP, seeds their watchlists through the add-stock form, then
+replays the real traffic pattern: every user polls ``/api/stocks`` on an
+interval (60s in ``index.html``) and now and then loads ``/`` or ``/news``.
+
+    python -m benchmarks.loadgen --users 200 --concurrency 32 --duration 120 \\
+        --poll-interval 5 --watchlist-size 20
+    python -m benchmarks.loadgen --server gunicorn ...   # or --server dev
+
+Prints a JSON report with throughput, latency percentiles per endpoint,
+error rate and upstream calls per user request.
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import logging
+import os
+import queue
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+
+from services.upstream_capture import RECORDED_METHODS
+
+
+@dataclass(frozen=True)
+class LoadParams:
+    users: int = 50
+    concurrency: int = 16
+    duration: float = 60.0
+    poll_interval: float = 60.0
+    # Chance that a poll is accompanied by a full page load of / or /news
+    page_load_ratio: float = 0.1
+    news_ratio: float = 0.3
+    watchlist_size: int = 10
+    universe: int = 500
+    seed: int = 1234
+    fault_profile: str = 'none'
+    # inprocess (werkzeug, counts upstream calls), dev (python app.py) or gunicorn
+    server: str = 'inprocess'
+
+
+class CountingProxy:
+    """Counts upstream calls, split by whether a user request triggered them"""
+
+    def __init__(self, inner, counts: Dict[str, int], lock: threading.Lock):
+        self._inner = inner
+        self._counts = counts
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name not in RECORDED_METHODS or not callable(attr):
+            return attr
+
+        from flask import has_request_context
+
+        def counted(*args, **kwargs):
+            key = 'request' if has_request_context() else 'background'
+            with self._lock:
+                self._counts[key] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def _server_env(params: LoadParams, tmpdir: str) -> Dict[str, str]:
+    """Environment for a throwaway simulated app with its own DB and quote table"""
+    return {
+        'SIMULATION_MODE': 'true',
+        'SIMULATION_UNIVERSE_SIZE': str(params.universe),
+        'SIMULATION_SEED': str(params.seed),
+        'SIMULATION_FAULT_PROFILE': params.fault_profile,
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+        'BACKGROUND_REFRESH_ENABLED': 'true',
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmpdir, 'load.db')}",
+        'QUOTE_TABLE_NAME': f"dadstocks-load-{uuid.uuid4().hex[:8]}",
+    }
+
+
+class LocalServer:
+    """The app served by werkzeug on an ephemeral port, in this process"""
+
+    def __init__(self, params: LoadParams):
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='dadstocks-load-')
+        os.environ.update(_server_env(params, self._tmpdir.name))
+
+        from werkzeug.serving import make_server
+
+        import app as app_module
+        self.module = app_module
+        self.app = app_module.create_app()
+
+        self.upstream_calls: Optional[Dict[str, int]] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.app.alpaca_factory.instrument(
+            lambda client: CountingProxy(client, self.upstream_calls, self._lock)
+        )
+
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self._server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def universe(self) -> List[str]:
+        return list(self.app.alpaca_factory.get_data_client().get_asset_names())
+
+    def reset_counts(self):
+        with self._lock:
+            self.upstream_calls.clear()
+
+    def close(self):
+        self._server.shutdown()
+        quote_table = getattr(self.app, 'quote_table', None)
+        if quote_table is not None:
+            quote_table.close(unlink=True)
+        self._tmpdir.cleanup()
+
+
+class ProcessServer:
+    """The app in a child process, started the way a deployment would start it
+
+    Upstream calls happen in the child, so they are not counted.
+    """
+
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    COMMANDS = {
+        'dev': [sys.executable, 'app.py'],
+        'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+    }
+
+    def __init__(self, params: LoadParams, startup_timeout: float = 60.0):
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='dadstocks-load-')
+        self.params = params
+        self.upstream_calls: Optional[Dict[str, int]] = None
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, **_server_env(params, self._tmpdir.name),
+                   PORT=str(port), GUNICORN_BIND=f"127.0.0.1:{port}")
+        self._quote_table = env['QUOTE_TABLE_NAME']
+        self.url = f"http://127.0.0.1:{port}"
+        # Own session so the dev server's reloader child is stopped with it
+        self._process = subprocess.Popen(self.COMMANDS[params.server], cwd=self.ROOT, env=env,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                         start_new_session=True)
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                requests.get(f"{self.url}/admin/login", timeout=1).raise_for_status()
+                return
+            except requests.RequestException:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError(f"{params.server} server did not start")
+                time.sleep(0.2)
+
+    def universe(self) -> List[str]:
+        # The simulated universe is determined by its size and seed
+        from services.mock_alpaca import MockAlpacaService
+        return list(MockAlpacaService(universe_size=self.params.universe,
+                                      seed=self.params.seed).get_asset_names())
+
+    def reset_counts(self):
+        pass
+
+    def close(self):
+        if self._process.poll() is None:
+            os.killpg(self._process.pid, signal.SIGTERM)
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(self._process.pid, signal.SIGKILL)
+                self._process.wait()
+        # The dev server leaves its quote table behind
+        from services.quote_table import QuoteTable
+        QuoteTable.open(self._quote_table, capacity=1).close(unlink=True)
+        self._tmpdir.cleanup()
+
+
+SERVERS = {'inprocess': LocalServer, 'dev': ProcessServer, 'gunicorn': ProcessServer}
+
+
+class VirtualUser:
+    """One synthetic, logged-in dashboard user"""
+
+    def __init__(self, base_url: str, index: int):
+        self.base_url = base_url
+        self.email = f"load{index}-{uuid.uuid4().hex[:6]}@example.com"
+        self.http = requests.Session()
+        self.csrf_token = None
+
+    def _fetch_csrf_token(self):
+        # The token is tied to the session, so one from any form will do
+        page = self.http.get(f"{self.base_url}/admin/login").text
+        match = re.search(r'name="csrf_token" value="([^"]+)"', page)
+        self.csrf_token = match.group(1) if match else None
+
+    def register_and_login(self):
+        password = 'loadtest'
+        self._fetch_csrf_token()
+        self.http.post(f"{self.base_url}/register", data={
+            'csrf_token': self.csrf_token,
+            'email': self.email,
+            'password': password,
+            'confirm_password': password,
+            'first_name': 'Load',
+            'last_name': 'Tester'
+        }, allow_redirects=False).raise_for_status()
+        response = self.http.post(f"{self.base_url}/login", data={
+            'csrf_token': self.csrf_token,
+            'email': self.email,
+            'password': password
+        }, allow_redirects=False)
+        if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+            raise RuntimeError(f"Login failed for {self.email}")
+
+    def add_stocks(self, symbols: List[str]):
+        for symbol in symbols:
+            self.http.post(f"{self.base_url}/", data={'symbol': symbol, 'csrf_token': self.csrf_token},
+                           allow_redirects=False).raise_for_status()
+
+    def get(self, path: str) -> requests.Response:
+        return self.http.get(f"{self.base_url}{path}", allow_redirects=False)
+
+
+class LoadRun:
+    """Schedules the polling workload and collects per-request samples"""
+
+    def __init__(self, params: LoadParams, users: List[VirtualUser]):
+        self.params = params
+        self.users = users
+        self._rng = np.random.default_rng(params.seed)
+        self._work: 'queue.Queue[Optional[tuple]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lag: List[float] = []
+
+    def _worker(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                return
+            due, user, path = item
+            started = time.perf_counter()
+            try:
+                ok = user.get(path).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with self._lock:
+                self.samples[path].append(elapsed)
+                self.lag.append(max(0.0, time.monotonic() - due - elapsed / 1000.0))
+                if not ok:
+                    self.errors[path] += 1
+
+    def run(self) -> float:
+        params = self.params
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(params.concurrency)]
+        for worker in workers:
+            worker.start()
+
+        # Spread users' first polls across one interval, like real page opens
+        start = time.monotonic()
+        schedule = [(start + offset, i) for i, offset in
+                    enumerate(self._rng.uniform(0, params.poll_interval, len(self.users)))]
+        heapq.heapify(schedule)
+        end = start + params.duration
+
+        while schedule and schedule[0][0] < end:
+            due, i = heapq.heappop(schedule)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            user = self.users[i]
+            self._work.put((due, user, '/api/stocks'))
+            if self._rng.random() < params.page_load_ratio:
+                path = '/news' if self._rng.random() < params.news_ratio else '/'
+                self._work.put((due, user, path))
+            heapq.heappush(schedule, (due + params.poll_interval, i))
+
+        for _ in workers:
+            self._work.put(None)
+        for worker in workers:
+            worker.join()
+        return time.monotonic() - start
+
+
+def _latency_summary(samples: List[float]) -> Dict:
+    if not samples:
+        return {'requests': 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'requests': len(samples),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(max(samples)), 3),
+    }
+
+
+def run_load(params: LoadParams) -> Dict:
+    if params.server not in SERVERS:
+        raise ValueError(f"Unknown server {params.server!r}; choose from {', '.join(SERVERS)}")
+    server = SERVERS[params.server](params)
+    try:
+        universe = server.universe()
+        rng = np.random.default_rng(params.seed)
+        users = []
+        for i in range(params.users):
+            user = VirtualUser(server.url, i)
+            user.register_and_login()
+            user.add_stocks(list(rng.choice(universe, size=min(params.watchlist_size, len(universe)),
+                                            replace=False)))
+            users.append(user)
+
+        # Only count upstream calls made by the measured workload
+        server.reset_counts()
+
+        load = LoadRun(params, users)
+        elapsed = load.run()
+
+        all_samples = [ms for samples in load.samples.values() for ms in samples]
+        total = len(all_samples)
+        errors = sum(load.errors.values())
+        upstream = dict(server.upstream_calls) if server.upstream_calls is not None else None
+        return {
+            'params': asdict(params),
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'throughput_rps': round(total / elapsed, 3) if elapsed else 0.0,
+            'error_rate': round(errors / total, 5) if total else 0.0,
+            'errors': dict(load.errors),
+            'latency': _latency_summary(all_samples),
+            'endpoints': {path: _latency_summary(samples) for path, samples in load.samples.items()},
+            # Time requests waited for a free worker: a saturation signal
+            'queue_lag_p95_ms': round(float(np.percentile(load.lag, 95)) * 1000, 3) if load.lag else 0.0,
+            'upstream_calls': upstream,
+            'upstream_calls_per_request': (round(upstream.get('request', 0) / total, 4)
+                                           if upstream is not None and total else None),
+        }
+    finally:
+        server.close()
+
+
+def main(argv=None) -> int:
+    defaults = LoadParams()
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadgen', description=__doc__.splitlines()[0])
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument('--output', help='write the report JSON here as well as stdout')
+    args = vars(parser.parse_args(argv))
+    output = args.pop('output')
+
+    # Keep stray prints off stdout, which carries the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = run_load(LoadParams(**args))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 1 if report['requests'] == 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
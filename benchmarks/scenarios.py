@@ -0,0 +1,158 @@
+"""Benchmark scenarios for the Flask routes and the refresh cycle
+
+Everything runs in-process against the simulated upstream with a throwaway
+SQLite database, so results depend only on the parameters below.
+"""
+import contextlib
+import io
+import itertools
+import os
+import tempfile
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class BenchmarkParams:
+    """Inputs every scenario is parameterized by"""
+    watchlist_size: int = 25
+    users: int = 10
+    universe: int = 500
+    seed: int = 1234
+    quote_table: bool = False
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+class BenchmarkApp:
+    """An app instance in simulation mode, seeded with users and watchlists"""
+
+    def __init__(self, params: BenchmarkParams):
+        self.params = params
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='dadstocks-bench-')
+        self._configure_environment()
+
+        # Imported late: config is read from the environment at import time
+        with quiet():
+            import app as app_module
+        self.module = app_module
+        self.app = app_module.create_app()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+
+        self.user_ids: List[int] = []
+        self._seed_data()
+        self._clients = [self._client_for(user_id) for user_id in self.user_ids]
+
+    def _configure_environment(self):
+        params = self.params
+        os.environ['SIMULATION_MODE'] = 'true'
+        os.environ['SIMULATION_UNIVERSE_SIZE'] = str(params.universe)
+        os.environ['SIMULATION_SEED'] = str(params.seed)
+        os.environ['SIMULATION_FAULT_PROFILE'] = 'none'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        # Keep the background refresher out of the measurements
+        os.environ['BACKGROUND_REFRESH_ENABLED'] = 'false'
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(self._tmpdir.name, 'bench.db')}"
+        os.environ['QUOTE_TABLE_ENABLED'] = 'true' if params.quote_table else 'false'
+        os.environ['QUOTE_TABLE_NAME'] = f"dadstocks-bench-{uuid.uuid4().hex[:8]}"
+
+    def _seed_data(self):
+        from models import db, Stock, User, UserStock
+
+        params = self.params
+        rng = np.random.default_rng(params.seed)
+        with self.app.app_context():
+            db.drop_all()
+            db.create_all()
+
+            universe = list(self.app.alpaca_factory.get_data_client().get_asset_names())
+            watchlist_size = min(params.watchlist_size, len(universe))
+            stocks = {}
+            for i in range(params.users):
+                user = User(f"bench{i}@example.com", 'benchmark', 'Bench', f"User{i}")
+                db.session.add(user)
+                db.session.flush()
+                for symbol in rng.choice(universe, size=watchlist_size, replace=False):
+                    if symbol not in stocks:
+                        stocks[symbol] = Stock(symbol)
+                        db.session.add(stocks[symbol])
+                        db.session.flush()
+                    db.session.add(UserStock(user_id=user.id, stock_id=stocks[symbol].id))
+                self.user_ids.append(user.id)
+            db.session.commit()
+
+            # Populate prices (and the quote table, when enabled) once up front
+            with quiet():
+                self.module.update_stock_prices()
+
+    def _client_for(self, user_id: int):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        return client
+
+    def route(self, path: str) -> Callable[[], None]:
+        """A callable that requests ``path`` as the next user in rotation"""
+        clients = itertools.cycle(self._clients)
+
+        def request():
+            response = next(clients).get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} returned {response.status_code}")
+        return request
+
+    def refresh_cycle(self) -> Callable[[], None]:
+        def refresh():
+            with self.app.app_context(), quiet():
+                if not self.module.update_stock_prices():
+                    raise RuntimeError("update_stock_prices failed")
+        return refresh
+
+    def watchlist_symbols(self) -> List[str]:
+        from models import Stock
+        with self.app.app_context():
+            symbols = [stock.symbol for stock in Stock.query.all()]
+        return symbols[:self.params.watchlist_size]
+
+    def request_get_stock_data(self) -> Callable[[], None]:
+        """app.get_stock_data: shared quote table first, upstream fallback"""
+        symbols = self.watchlist_symbols()
+
+        def lookup():
+            with self.app.test_request_context():
+                self.module.get_stock_data(symbols)
+        return lookup
+
+    def factory_get_stock_data(self) -> Callable[[], None]:
+        """AlpacaFactory.get_stock_data: always goes to the (simulated) upstream"""
+        symbols = self.watchlist_symbols()
+        factory = self.app.alpaca_factory
+        return lambda: factory.get_stock_data(symbols)
+
+    def scenarios(self) -> Dict[str, Callable[[], None]]:
+        return {
+            'route.index': self.route('/'),
+            'route.api_stocks': self.route('/api/stocks'),
+            'route.news': self.route('/news'),
+            'route.user_dashboard': self.route('/user/dashboard'),
+            'refresh.update_stock_prices': self.refresh_cycle(),
+            'get_stock_data.request': self.request_get_stock_data(),
+            'get_stock_data.factory': self.factory_get_stock_data(),
+        }
+
+    def close(self):
+        quote_table = getattr(self.app, 'quote_table', None)
+        if quote_table is not None:
+            quote_table.close(unlink=True)
+        self._tmpdir.cleanup()
+
+
+@contextlib.contextmanager
+def quiet():
+    """Keep stray prints (e.g. config's missing .env warning) off stdout"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
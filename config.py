@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -20,9 +21,80 @@ class Config:
     # Stock update interval (in seconds) - 5 minutes
     STOCK_UPDATE_INTERVAL = 300
     
+    # Refresh prices in a background thread, started on the first request
+    BACKGROUND_REFRESH_ENABLED = os.getenv('BACKGROUND_REFRESH_ENABLED', 'true').lower() == 'true'
+    
     # Default stocks to track
     DEFAULT_STOCKS = ['AAPL', 'GOOGL', 'MSFT', 'AMZN', 'META']
     
+    # Market index ETFs shown on the dashboard
+    INDEX_SYMBOLS = ['SPY', 'DIA', 'QQQ', 'IWM']
+    
+    # Shared-memory quote table shared by all worker processes
+    QUOTE_TABLE_ENABLED = os.getenv('QUOTE_TABLE_ENABLED', 'true').lower() == 'true'
+    QUOTE_TABLE_NAME = os.getenv('QUOTE_TABLE_NAME', 'dadstocks-quotes')
+    QUOTE_TABLE_CAPACITY = int(os.getenv('QUOTE_TABLE_CAPACITY', '16384'))
+    # Serve request-time quotes from the table while it is younger than this
+    QUOTE_TABLE_MAX_AGE = STOCK_UPDATE_INTERVAL * 2
+    
+    # Logging: JSON lines (or 'text') on stderr via a background writer thread;
+    # repeated warnings/errors beyond LOG_ERROR_BURST per window are sampled
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_ERROR_BURST = int(os.getenv('LOG_ERROR_BURST', '5'))
+    LOG_ERROR_WINDOW = float(os.getenv('LOG_ERROR_WINDOW', '60'))
+    
+    # Upstream resilience: a circuit breaker per Alpaca endpoint opens after
+    # UPSTREAM_BREAKER_THRESHOLD consecutive failures and retries after
+    # UPSTREAM_BREAKER_RESET seconds; calls give up after UPSTREAM_TIMEOUT
+    # (0 disables). Failed lookups serve data up to UPSTREAM_STALE_MAX_AGE old.
+    UPSTREAM_TIMEOUT = float(os.getenv('UPSTREAM_TIMEOUT', '5'))
+    UPSTREAM_BREAKER_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', '5'))
+    UPSTREAM_BREAKER_RESET = float(os.getenv('UPSTREAM_BREAKER_RESET', '30'))
+    UPSTREAM_STALE_MAX_AGE = float(os.getenv('UPSTREAM_STALE_MAX_AGE', '86400'))
+    
+    # Cache shared template fragments (index panel, news) per refresh cycle;
+    # FRAGMENT_CACHE_MAX_AGE bounds staleness if an invalidation is missed
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+    FRAGMENT_CACHE_MAX_AGE = float(os.getenv('FRAGMENT_CACHE_MAX_AGE', str(STOCK_UPDATE_INTERVAL)))
+    
+    # Chart history: minute bars kept HISTORY_MINUTE_RETENTION_DAYS days,
+    # downsampled series cached per (symbol, range, points, method) and cycle
+    HISTORY_MINUTE_RETENTION_DAYS = int(os.getenv('HISTORY_MINUTE_RETENTION_DAYS', '7'))
+    HISTORY_CACHE_ENTRIES = int(os.getenv('HISTORY_CACHE_ENTRIES', '512'))
+    HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', '2000'))
+    # Symbols without indicator state warmed up from history per refresh cycle
+    INDICATOR_WARMUP_BATCH = int(os.getenv('INDICATOR_WARMUP_BATCH', '500'))
+    # Prices kept per symbol for the watchlist sparklines; a session at the 5-minute refresh
+    SPARKLINE_POINTS = int(os.getenv('SPARKLINE_POINTS', '78'))
+    # Symbols accepted per bulk watchlist import; the asset list they are
+    # checked against is fetched at most once per ASSET_CATALOG_TTL seconds
+    WATCHLIST_IMPORT_MAX = int(os.getenv('WATCHLIST_IMPORT_MAX', '1000'))
+    ASSET_CATALOG_TTL = int(os.getenv('ASSET_CATALOG_TTL', '86400'))
+    # Most matches one symbol search returns
+    SYMBOL_SEARCH_MAX_RESULTS = int(os.getenv('SYMBOL_SEARCH_MAX_RESULTS', '25'))
+    # Stored news articles per page, per symbol on the overview, and the most
+    # /api/news returns at once; the refresher stores the latest at most once
+    # per NEWS_STORE_INTERVAL seconds
+    NEWS_PAGE_SIZE = int(os.getenv('NEWS_PAGE_SIZE', '20'))
+    NEWS_OVERVIEW_SIZE = int(os.getenv('NEWS_OVERVIEW_SIZE', '5'))
+    NEWS_MAX_PAGE_SIZE = int(os.getenv('NEWS_MAX_PAGE_SIZE', '100'))
+    NEWS_STORE_INTERVAL = float(os.getenv('NEWS_STORE_INTERVAL', str(STOCK_UPDATE_INTERVAL)))
+    
+    # gzip/brotli for text responses of at least COMPRESSION_MIN_SIZE bytes
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    # Cache lifetime for content-hashed static URLs (one year)
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 24 * 3600)))
+    
+    # Expose Prometheus metrics at /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # On-demand profiling from the admin dashboard; results land in PROFILE_DIR
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_DIR = os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'dadstocks-profiles')
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+    
     # Alpaca API settings
     ALPACA_API_KEY = os.getenv('ALPACA_API_KEY')
     ALPACA_SECRET_KEY = os.getenv('ALPACA_SECRET_KEY')
@@ -38,6 +110,21 @@ class Config:
     SIMULATION_MODE = os.getenv('SIMULATION_MODE', 'false').lower() == 'true'
     # Shorter update interval in simulation mode (30 seconds)
     SIMULATION_UPDATE_INTERVAL = 30
+    # Number of simulated symbols (named assets plus synthetic ones, max 50k)
+    SIMULATION_UNIVERSE_SIZE = int(os.getenv('SIMULATION_UNIVERSE_SIZE', '0'))
+    # Seed for reproducible simulated prices; unset for a fresh market each run
+    SIMULATION_SEED = int(os.getenv('SIMULATION_SEED')) if os.getenv('SIMULATION_SEED') else None
+    # Upstream fault profile for the mock: none, realistic, slow, flaky, throttled, degraded
+    SIMULATION_FAULT_PROFILE = os.getenv('SIMULATION_FAULT_PROFILE', 'none')
+    # Optional JSON overrides for profile fields, e.g. '{"error_rate": 0.2}'
+    SIMULATION_FAULT_OVERRIDES = os.getenv('SIMULATION_FAULT_OVERRIDES', '')
+    
+    # Upstream capture: record every Alpaca response to an archive, or serve a
+    # recorded archive instead of the mock. Timing is 'fast', or 'original' to
+    # keep each call's recorded latency and offset into the session
+    UPSTREAM_RECORD_PATH = os.getenv('UPSTREAM_RECORD_PATH', '')
+    UPSTREAM_REPLAY_PATH = os.getenv('UPSTREAM_REPLAY_PATH', '')
+    UPSTREAM_REPLAY_TIMING = os.getenv('UPSTREAM_REPLAY_TIMING', 'fast')
 
 class TestConfig(Config):
     """Test configuration"""
@@ -53,6 +140,10 @@ class TestConfig(Config):
     # Limited set of stocks for testing
     DEFAULT_STOCKS = ['AAPL', 'GOOGL']
     
+    # Keep tests from sharing quote state with a running app
+    QUOTE_TABLE_ENABLED = False
+    BACKGROUND_REFRESH_ENABLED = False
+    
     # Test API credentials
     ALPACA_API_KEY = 'test_api_key'
     ALPACA_SECRET_KEY = 'test_secret_key' 
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Gunicorn settings for the production container
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Sizing comes from the CPUs this process may run on; every setting can be
+overridden with the GUNICORN_* variables below or GUNICORN_CMD_ARGS.
+"""
+import multiprocessing
+import os
+
+
+def _cpu_count():
+    """CPUs available to this process, which respects container CPU sets"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def _env_flag(name, default='false'):
+    return os.getenv(name, default).lower() == 'true'
+
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+
+# Requests mostly wait on SQLite and the upstream API, which releases the
+# GIL, so each worker runs a few threads; processes scale with cores for
+# template rendering and JSON encoding. Capped so small hosts with many
+# visible cores don't exhaust SQLite connections or memory.
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', min(_cpu_count() * 2 + 1, 9)))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+# Time a worker gets on SIGTERM to finish requests and the refresh cycle
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# Import the app once in the master so workers fork with it warm;
+# post_fork below drops what must not be shared.
+preload_app = True
+reload = _env_flag('GUNICORN_RELOAD')
+
+# A capture archive is a single gzip stream, so recording needs exactly one
+# process writing it, and the preloading master must not open it either.
+if os.getenv('UPSTREAM_RECORD_PATH'):
+    workers = 1
+    preload_app = False
+if reload:
+    # Code reloading re-imports the app in each worker
+    preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None  # '-' for stdout
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Reset per-process state the worker inherited from the master"""
+    if not server.cfg.preload_app:
+        return
+    from app import reset_after_fork
+    from wsgi import app
+    reset_after_fork(app)
+
+
+def worker_exit(server, worker):
+    """Let the refresher finish its cycle and hand over the writer lock"""
+    from app import stop_background_refresh
+    from services.structured_logging import shutdown_logging
+    from wsgi import app
+    stop_background_refresh(app, timeout=graceful_timeout)
+    shutdown_logging()
+
+
+def on_exit(server):
+    """Remove the shared quote table once the last process is gone"""
+    if not server.cfg.preload_app:
+        return
+    from wsgi import app
+    quote_table = getattr(app, 'quote_table', None)
+    if quote_table is not None and quote_table.created:
+        quote_table.close(unlink=True)
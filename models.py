@@ -1,6 +1,8 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from datetime import timezone
+from werkzeug.security import generate_password_hash, check_password_hash
 import pytz
 
 db = SQLAlchemy()
@@ -29,6 +31,20 @@ class Stock(db.Model):
         self.price_change_percent = (self.price_change / previous_close) * 100
         self.last_updated = datetime.utcnow()
     
+    def apply_quote(self, quote):
+        """Copy a fetched Quote onto this row"""
+        if not self.name and quote.name:
+            self.name = quote.name
+        self.current_price = quote.price
+        self.previous_close = quote.previous_close
+        self.price_change = quote.change
+        self.price_change_percent = quote.change_percent
+        if quote.timestamp is not None:
+            # Stored naive, in UTC, like every other timestamp column
+            self.last_updated = quote.timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            self.last_updated = datetime.utcnow()
+    
     def to_dict(self):
         # Convert UTC to local time
         local_tz = pytz.timezone('America/New_York')  # Using NY time for market hours
@@ -68,19 +84,235 @@ class Stock(db.Model):
             'has_news': getattr(self, 'has_news', False)
         }
 
+class PriceBar(db.Model):
+    """One OHLCV bar of a symbol's price history, see services.history"""
+    __tablename__ = 'price_bars'
+    __table_args__ = (
+        db.Index('ix_price_bars_timeframe_ts', 'timeframe', 'ts'),
+        {'sqlite_with_rowid': False},
+    )
+    
+    symbol = db.Column(db.String(10), primary_key=True)
+    timeframe = db.Column(db.String(8), primary_key=True)
+    ts = db.Column(db.Integer, primary_key=True)  # bar start, epoch seconds UTC
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.Float, nullable=False, default=0.0)
+
+class IndicatorState(db.Model):
+    """A symbol's rolling indicator state as of its last completed daily bar, see services.indicators"""
+    __tablename__ = 'indicator_states'
+    
+    symbol = db.Column(db.String(10), primary_key=True)
+    through = db.Column(db.Integer, nullable=False)  # start of the last bar folded in, epoch seconds
+    state = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PerformanceSummary(db.Model):
+    """A symbol's multi-period performance at its latest price, see services.performance
+
+    The anchors are recomputed once per session; the figures after each refresh.
+    """
+    __tablename__ = 'performance_summaries'
+    
+    symbol = db.Column(db.String(10), primary_key=True)
+    session = db.Column(db.Integer, nullable=False)  # start of the session the anchors are for
+    close_1w = db.Column(db.Float)
+    close_1m = db.Column(db.Float)
+    close_ytd = db.Column(db.Float)
+    prior_high = db.Column(db.Float)
+    prior_low = db.Column(db.Float)
+    price = db.Column(db.Float)  # the price the figures below are at
+    change_1w = db.Column(db.Float)
+    change_1m = db.Column(db.Float)
+    change_ytd = db.Column(db.Float)
+    high_52w = db.Column(db.Float)
+    low_52w = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class NewsArticle(db.Model):
+    """A news article kept for the news page and search, see services.news"""
+    __tablename__ = 'news_articles'
+    __table_args__ = (db.Index('ix_news_articles_published', 'published_at', 'id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    uid = db.Column(db.String(64), unique=True, nullable=False)  # upstream id, or a hash of url and headline
+    headline = db.Column(db.String(500), nullable=False)
+    summary = db.Column(db.Text)
+    author = db.Column(db.String(200))
+    url = db.Column(db.String(500))
+    image_url = db.Column(db.String(500))
+    symbols = db.Column(db.String(500), nullable=False, default='')  # comma-separated
+    published_at = db.Column(db.Integer, nullable=False)  # epoch seconds UTC
+
+class NewsSymbol(db.Model):
+    """One symbol an article mentions; the key is the per-symbol newest-first index"""
+    __tablename__ = 'news_symbols'
+    __table_args__ = ({'sqlite_with_rowid': False},)
+    
+    symbol = db.Column(db.String(10), primary_key=True)
+    published_at = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('news_articles.id', ondelete='CASCADE'), primary_key=True)
+
+# Full-text index over headlines and summaries on SQLite: an FTS5 table over
+# news_articles' own rows, kept in step by triggers
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5("
+    "headline, summary, content='news_articles', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS news_articles_ai AFTER INSERT ON news_articles BEGIN "
+    "INSERT INTO news_fts(rowid, headline, summary) VALUES (new.id, new.headline, new.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS news_articles_ad AFTER DELETE ON news_articles BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, headline, summary) VALUES ('delete', old.id, old.headline, old.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS news_articles_au AFTER UPDATE ON news_articles BEGIN "
+    "INSERT INTO news_fts(news_fts, rowid, headline, summary) VALUES ('delete', old.id, old.headline, old.summary); "
+    "INSERT INTO news_fts(rowid, headline, summary) VALUES (new.id, new.headline, new.summary); END",
+):
+    event.listen(NewsArticle.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(NewsArticle.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS news_fts').execute_if(dialect='sqlite'))
+
+class User(db.Model):
+    __tablename__ = 'users'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
+    first_name = db.Column(db.String(50))
+    last_name = db.Column(db.String(50))
+    is_admin = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime)
+    
+    stocks = db.relationship('UserStock', backref='user', cascade='all, delete-orphan')
+    credentials = db.relationship('APICredential', backref='user', cascade='all, delete-orphan')
+    # Undelivered alerts would otherwise reach whoever is given the id next
+    alert_events = db.relationship('AlertEvent', cascade='all, delete-orphan')
+    
+    def __init__(self, email, password, first_name=None, last_name=None, is_admin=False):
+        self.email = email
+        self.set_password(password)
+        self.first_name = first_name
+        self.last_name = last_name
+        self.is_admin = is_admin
+    
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+    
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password or '')
+
+class UserStock(db.Model):
+    __tablename__ = 'user_stocks'
+    __table_args__ = (db.UniqueConstraint('user_id', 'stock_id'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    stock = db.relationship('Stock', lazy='joined')
+    alerts = db.relationship('PriceAlert', backref='user_stock', cascade='all, delete-orphan')
+    lots = db.relationship('HoldingLot', backref='user_stock', cascade='all, delete-orphan',
+                           order_by='HoldingLot.acquired_at')
+    
+    def to_dict(self):
+        data = self.stock.to_dict()
+        data['has_news'] = getattr(self, 'has_news', False)
+        return data
+
+class HoldingLot(db.Model):
+    """Shares of a tracked stock bought at one price"""
+    __tablename__ = 'holding_lots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_stock_id = db.Column(db.Integer, db.ForeignKey('user_stocks.id'), nullable=False, index=True)
+    quantity = db.Column(db.Float, nullable=False)
+    unit_cost = db.Column(db.Float, nullable=False)
+    acquired_at = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def cost_basis(self):
+        return self.quantity * self.unit_cost
+
+class HoldingsRevision(db.Model):
+    """Single-row counter bumped on every lot change, so each worker can
+    tell cheaply whether its cached positions are out of date"""
+    __tablename__ = 'holdings_revision'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def current(cls):
+        row = db.session.get(cls, 1)
+        return row.value if row else 0
+    
+    @classmethod
+    def bump(cls):
+        """Increment within the caller's transaction"""
+        updated = db.session.query(cls).filter_by(id=1).update({cls.value: cls.value + 1})
+        if not updated:
+            db.session.add(cls(id=1, value=1))
+
+class PriceAlert(db.Model):
+    """A one-shot threshold on a tracked stock, see services.alerts for the kinds"""
+    __tablename__ = 'price_alerts'
+    # Ids are never reused, since the refresher picks up new alerts by id
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_stock_id = db.Column(db.Integer, db.ForeignKey('user_stocks.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    triggered_at = db.Column(db.DateTime)
+
+class AlertEvent(db.Model):
+    """A fired alert waiting to be delivered to its user"""
+    __tablename__ = 'alert_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    alert_id = db.Column(db.Integer, db.ForeignKey('price_alerts.id', ondelete='SET NULL'))
+    symbol = db.Column(db.String(10), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    threshold = db.Column(db.Float, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_alert_events_pending', 'user_id', 'delivered_at'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'symbol': self.symbol,
+            'kind': self.kind,
+            'threshold': self.threshold,
+            'value': self.value,
+            'created_at': self.created_at.replace(tzinfo=timezone.utc).isoformat() if self.created_at else None
+        }
+
 class APICredential(db.Model):
     __tablename__ = 'api_credentials'
     
     id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     api_key = db.Column(db.String(100), nullable=False)
     secret_key = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     @classmethod
-    def get_active_credentials(cls):
-        """Get the most recently updated API credentials"""
-        credential = cls.query.order_by(cls.last_updated.desc()).first()
+    def get_active_credentials(cls, user_id=None):
+        """Get the most recently updated API credentials, optionally for one user"""
+        query = cls.query
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        credential = query.order_by(cls.last_updated.desc()).first()
         if credential:
             return {
                 'api_key': credential.api_key,
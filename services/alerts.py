@@ -0,0 +1,173 @@
+"""Price alerts evaluated incrementally on each refresh cycle
+
+Thresholds are kept per symbol and alert kind in sorted arrays. When a
+symbol's price moves from ``old`` to ``new``, the alerts it crossed are a
+contiguous slice of its arrays, found with two bisections; symbols whose
+price did not change are never looked at. Alerts fire once, when the value
+crosses the threshold, and are then dropped from the index:
+
+* ``price_above`` / ``percent_above`` fire when ``old < threshold <= new``
+* ``price_below`` / ``percent_below`` fire when ``new <= threshold < old``
+
+Percent kinds compare the move against ``previous_close`` (``change_percent``).
+"""
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+PRICE_ABOVE = 'price_above'
+PRICE_BELOW = 'price_below'
+PERCENT_ABOVE = 'percent_above'
+PERCENT_BELOW = 'percent_below'
+KINDS = (PRICE_ABOVE, PRICE_BELOW, PERCENT_ABOVE, PERCENT_BELOW)
+KIND_LABELS = {
+    PRICE_ABOVE: 'Price at or above',
+    PRICE_BELOW: 'Price at or below',
+    PERCENT_ABOVE: 'Day change at or above (%)',
+    PERCENT_BELOW: 'Day change at or below (%)',
+}
+_RISING = (PRICE_ABOVE, PERCENT_ABOVE)
+
+
+class PriceMove(NamedTuple):
+    """A symbol's price and day change before and after a refresh"""
+    symbol: str
+    old_price: float
+    new_price: float
+    old_percent: Optional[float]
+    new_percent: Optional[float]
+
+
+class FiredAlert(NamedTuple):
+    alert_id: int
+    symbol: str
+    kind: str
+    threshold: float
+    value: float
+
+
+class _Thresholds:
+    """Sorted thresholds for one symbol and kind, with their alert ids alongside"""
+
+    __slots__ = ('values', 'ids')
+
+    def __init__(self):
+        self.values = array('d')
+        self.ids = array('q')
+
+    def insert(self, threshold: float, alert_id: int):
+        i = bisect_right(self.values, threshold)
+        self.values.insert(i, threshold)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, threshold: float, alert_id: int) -> bool:
+        i, end = bisect_left(self.values, threshold), bisect_right(self.values, threshold)
+        for j in range(i, end):
+            if self.ids[j] == alert_id:
+                del self.values[j]
+                del self.ids[j]
+                return True
+        return False
+
+    def take(self, lo: int, hi: int) -> List[Tuple[int, float]]:
+        """Remove and return the (id, threshold) pairs in ``[lo, hi)``"""
+        taken = list(zip(self.ids[lo:hi], self.values[lo:hi]))
+        del self.values[lo:hi]
+        del self.ids[lo:hi]
+        return taken
+
+
+class AlertIndex:
+    """In-memory index of active alerts, keyed by symbol and kind
+
+    ``loaded_through`` is the highest alert id added, so the refresher can
+    load only alerts created since its last cycle.
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, Dict[str, _Thresholds]] = {}
+        self._lock = threading.Lock()
+        self._count = 0
+        self.loaded_through = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, alert_id: int, symbol: str, kind: str, threshold: float):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown alert kind: {kind}")
+        with self._lock:
+            by_kind = self._symbols.setdefault(symbol, {})
+            by_kind.setdefault(kind, _Thresholds()).insert(float(threshold), alert_id)
+            self._count += 1
+            self.loaded_through = max(self.loaded_through, alert_id)
+
+    def load(self, alerts: Iterable[Tuple[int, str, str, float]]):
+        """Bulk-add ``(id, symbol, kind, threshold)`` rows, sorting each array once"""
+        grouped: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+        for alert_id, symbol, kind, threshold in alerts:
+            if kind not in KINDS:
+                raise ValueError(f"Unknown alert kind: {kind}")
+            grouped.setdefault((symbol, kind), []).append((float(threshold), alert_id))
+        with self._lock:
+            for (symbol, kind), rows in grouped.items():
+                thresholds = self._symbols.setdefault(symbol, {}).get(kind)
+                if thresholds is not None:
+                    # Merging into an existing array: fall back to inserts
+                    for threshold, alert_id in rows:
+                        thresholds.insert(threshold, alert_id)
+                else:
+                    rows.sort()
+                    thresholds = self._symbols[symbol][kind] = _Thresholds()
+                    thresholds.values.extend(threshold for threshold, _ in rows)
+                    thresholds.ids.extend(alert_id for _, alert_id in rows)
+                self._count += len(rows)
+                self.loaded_through = max(self.loaded_through, max(alert_id for _, alert_id in rows))
+
+    def remove(self, alert_id: int, symbol: str, kind: str, threshold: float) -> bool:
+        with self._lock:
+            thresholds = self._symbols.get(symbol, {}).get(kind)
+            if thresholds is None or not thresholds.remove(float(threshold), alert_id):
+                return False
+            self._count -= 1
+            return True
+
+    def evaluate(self, moves: Iterable[PriceMove]) -> List[FiredAlert]:
+        """Alerts crossed by ``moves``, removed from the index as they fire"""
+        fired: List[FiredAlert] = []
+        with self._lock:
+            for move in moves:
+                by_kind = self._symbols.get(move.symbol)
+                if not by_kind:
+                    continue
+                for kind, thresholds in by_kind.items():
+                    if kind in (PRICE_ABOVE, PRICE_BELOW):
+                        old, new = move.old_price, move.new_price
+                    else:
+                        old, new = move.old_percent, move.new_percent
+                    if old is None or new is None or old == new:
+                        continue
+                    if kind in _RISING:
+                        if new < old:
+                            continue
+                        lo, hi = bisect_right(thresholds.values, old), bisect_right(thresholds.values, new)
+                    else:
+                        if new > old:
+                            continue
+                        lo, hi = bisect_left(thresholds.values, new), bisect_left(thresholds.values, old)
+                    if lo == hi:
+                        continue
+                    for alert_id, threshold in thresholds.take(lo, hi):
+                        fired.append(FiredAlert(alert_id, move.symbol, kind, threshold, new))
+            self._count -= len(fired)
+        return fired
+
+
+def describe(symbol: str, kind: str, threshold: float, value: float) -> str:
+    """One-line message for a fired alert"""
+    if kind in (PRICE_ABOVE, PRICE_BELOW):
+        direction = 'above' if kind == PRICE_ABOVE else 'below'
+        return f"{symbol} crossed {direction} ${threshold:.2f} (now ${value:.2f})"
+    direction = 'up' if kind == PERCENT_ABOVE else 'down'
+    return f"{symbol} moved {direction} past {threshold:+.2f}% on the day (now {value:+.2f}%)"
@@ -1,16 +1,28 @@
-"""Factory for creating Alpaca services"""
-from typing import Optional, Dict, Any
-from alpaca.data import StockHistoricalDataClient
-from alpaca.trading.client import TradingClient
-from .mock_alpaca import MockAlpacaService
+"""Factory for creating Alpaca services
+
+Backends are imported when first initialized: the Alpaca SDK only on the first
+real-mode client, the mock (and pandas) only in simulation or replay mode.
+"""
+from typing import TYPE_CHECKING, Optional, Dict, Any, Callable, List
+from .quotes import Quote, quotes_from_bars
+
+if TYPE_CHECKING:
+    from alpaca.data import StockHistoricalDataClient
+    from alpaca.trading.client import TradingClient
+    from .fault_injection import FaultProfile
+    from .mock_alpaca import MockAlpacaService
+    from .upstream_capture import CaptureRecorder
 
 class AlpacaFactory:
     """Factory for creating Alpaca services"""
     
     _instance: Optional['AlpacaFactory'] = None
-    _mock_service: Optional[MockAlpacaService] = None
-    _data_client: Optional[StockHistoricalDataClient] = None
-    _trading_client: Optional[TradingClient] = None
+    _mock_service: Optional['MockAlpacaService'] = None
+    _data_client: Optional['StockHistoricalDataClient'] = None
+    _trading_client: Optional['TradingClient'] = None
+    _credentials: Optional[tuple] = None
+    _recorder: Optional['CaptureRecorder'] = None
+    _wrappers: List[Callable[[Any], Any]] = []
     
     def __init__(self):
         raise RuntimeError('Use get_instance() instead')
@@ -23,21 +35,80 @@ class AlpacaFactory:
             cls._instance._mock_service = None
             cls._instance._data_client = None
             cls._instance._trading_client = None
+            cls._instance._credentials = None
+            cls._instance._recorder = None
+            cls._instance._wrappers = []
         return cls._instance
     
-    def initialize(self, simulation_mode: bool, api_key: Optional[str] = None, secret_key: Optional[str] = None):
-        """Initialize the factory with either real or mock services"""
-        if simulation_mode:
-            self._mock_service = MockAlpacaService()
-            self._data_client = None
-            self._trading_client = None
+    def initialize(self, simulation_mode: bool, api_key: Optional[str] = None, secret_key: Optional[str] = None,
+                   universe_size: int = 0, seed: Optional[int] = None,
+                   fault_profile: Optional['FaultProfile'] = None,
+                   record_path: Optional[str] = None, replay_path: Optional[str] = None,
+                   replay_timing: str = 'fast'):
+        """Initialize the factory with real, mock or replayed services
+
+        ``replay_path`` serves a recorded capture archive instead of the mock;
+        ``record_path`` appends every upstream response to an archive. In real
+        mode the shared clients are built on first use, and only when app-wide
+        keys are given; otherwise requests use each user's own credentials.
+        """
+        if self._recorder is not None:
+            self._recorder.close()
+        self._recorder = None
+        # Each app instruments the factory again after initializing it
+        self._wrappers = []
+        if record_path:
+            from .upstream_capture import CaptureRecorder
+            self._recorder = CaptureRecorder(record_path)
+        self._data_client = None
+        self._trading_client = None
+        self._credentials = None
+        
+        if replay_path:
+            from .upstream_capture import ReplayAlpacaService
+            self._mock_service = self.wrap_client(ReplayAlpacaService(replay_path, timing=replay_timing))
+        elif simulation_mode:
+            from .fault_injection import PROFILES, FaultInjector
+            from .mock_alpaca import MockAlpacaService
+            
+            # Judged by its fields, since overrides keep the profile's name
+            faults = None
+            if fault_profile is not None and fault_profile != PROFILES['none']:
+                faults = FaultInjector(fault_profile, seed=seed)
+            self._mock_service = self.wrap_client(
+                MockAlpacaService(universe_size=universe_size, seed=seed, faults=faults)
+            )
         else:
-            if not api_key or not secret_key:
-                raise ValueError("API key and secret key are required for real mode")
             self._mock_service = None
-            self._data_client = StockHistoricalDataClient(api_key, secret_key)
-            self._trading_client = TradingClient(api_key, secret_key, paper=True)
+            if api_key and secret_key:
+                self._credentials = (api_key, secret_key)
+    
+    def wrap_client(self, client: Any) -> Any:
+        """Wrap an upstream client for recording and any instrumentation"""
+        if self._recorder is not None:
+            client = self._recorder.wrap(client)
+        for wrapper in self._wrappers:
+            client = wrapper(client)
+        return client
+    
+    def instrument(self, wrapper: Callable[[Any], Any]):
+        """Wrap every active and future upstream client, e.g. with a call-counting proxy"""
+        self._wrappers.append(wrapper)
+        if self._mock_service is not None:
+            self._mock_service = wrapper(self._mock_service)
+        if self._data_client is not None:
+            self._data_client = wrapper(self._data_client)
+        if self._trading_client is not None:
+            self._trading_client = wrapper(self._trading_client)
     
+    def reset_clients(self):
+        """Drop the real-mode clients so they are rebuilt on next use
+
+        Their HTTP connection pools must not be shared with a forked child.
+        """
+        self._data_client = None
+        self._trading_client = None
+
     @property
     def is_simulation_mode(self) -> bool:
         """Check if running in simulation mode"""
@@ -45,37 +116,32 @@ class AlpacaFactory:
     
     def get_data_client(self) -> Any:
         """Get the data client (either real or mock)"""
-        return self._mock_service if self.is_simulation_mode else self._data_client
+        if self.is_simulation_mode:
+            return self._mock_service
+        if self._data_client is None and self._credentials is not None:
+            from alpaca.data import StockHistoricalDataClient
+            self._data_client = self.wrap_client(StockHistoricalDataClient(*self._credentials))
+        return self._data_client
     
     def get_trading_client(self) -> Any:
         """Get the trading client (either real or mock)"""
-        return self._mock_service if self.is_simulation_mode else self._trading_client
+        if self.is_simulation_mode:
+            return self._mock_service
+        if self._trading_client is None and self._credentials is not None:
+            from alpaca.trading.client import TradingClient
+            self._trading_client = self.wrap_client(TradingClient(*self._credentials, paper=True))
+        return self._trading_client
     
-    def get_stock_data(self, symbols: list) -> Dict:
+    def get_stock_data(self, symbols: list) -> Dict[str, Quote]:
         """Get stock data using either real or mock service"""
         if self.is_simulation_mode:
             bars = self._mock_service.get_stock_bars(symbols)
-            assets = {asset.symbol: asset for asset in self._mock_service.get_assets()}
+            names = self._mock_service.get_asset_names()
         else:
-            from app import get_stock_data  # Import here to avoid circular import
-            return get_stock_data(symbols)
-        
-        result = {}
-        for symbol in symbols:
-            if symbol in assets:
-                symbol_bars = bars[bars.index.get_level_values('symbol') == symbol]
-                if len(symbol_bars) >= 1:
-                    current_price = float(symbol_bars.iloc[-1]['close'])
-                    previous_close = float(symbol_bars.iloc[-2]['close']) if len(symbol_bars) > 1 else current_price
-                    
-                    result[symbol] = {
-                        'price': current_price,
-                        'previous_close': previous_close,
-                        'name': assets[symbol].name,
-                        'timestamp': symbol_bars.iloc[-1].name[1]
-                    }
+            from app import fetch_stock_data  # Import here to avoid circular import
+            return fetch_stock_data(symbols)
         
-        return result
+        return quotes_from_bars(bars, names, symbols)
     
     def get_news(self, symbols: list) -> list:
         """Get news using either real or mock service"""
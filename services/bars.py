@@ -0,0 +1,225 @@
+"""OHLCV bars: the columnar container, timeframes and aggregation between them
+
+Coarser bars are built locally instead of requested upstream per timeframe:
+
+* :func:`aggregate` turns a series of finer bars into coarser ones in one
+  vectorized pass, for backfilling a symbol's whole history.
+* :class:`TickAggregator` folds ticks (or finer bars) into the current bar of
+  every timeframe as they arrive, for the refresh cycle.
+
+Intraday buckets are aligned to the clock. Daily bars start at midnight New
+York time and weekly bars at midnight on Monday, as Alpaca stamps them, so
+they follow daylight saving; weekend data only goes into intraday bars.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pytz
+
+MINUTE = '1Min'
+FIVE_MINUTE = '5Min'
+HOUR = '1Hour'
+DAY = '1Day'
+WEEK = '1Week'
+TIMEFRAMES = (MINUTE, FIVE_MINUTE, HOUR, DAY, WEEK)
+# Clock-aligned timeframes and their length in seconds
+INTRADAY = {MINUTE: 60, FIVE_MINUTE: 300, HOUR: 3600}
+# Timeframes that only cover weekdays, starting at New York midnight
+SESSION_TIMEFRAMES = (DAY, WEEK)
+
+COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+NEW_YORK = pytz.timezone('America/New_York')
+
+
+class Bars:
+    """OHLCV bars as parallel arrays, oldest first; ``ts`` is each bar's start in epoch seconds"""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, ts, open_, high, low, close, volume):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open_, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> 'Bars':
+        return cls(*([()] * len(COLUMNS)))
+
+    @classmethod
+    def from_rows(cls, rows) -> 'Bars':
+        """From ``(ts, open, high, low, close, volume)`` rows"""
+        if not rows:
+            return cls.empty()
+        table = np.array(rows, dtype=np.float64)
+        return cls(table[:, 0], *table[:, 1:].T)
+
+    @classmethod
+    def from_frame(cls, frame) -> Dict[str, 'Bars']:
+        """Split a (symbol, timestamp) indexed bars frame, as upstream returns, by symbol"""
+        frame = getattr(frame, 'df', frame)
+        if frame is None or len(frame) == 0:
+            return {}
+        symbols = frame.index.get_level_values(0).to_numpy()
+        stamps = frame.index.get_level_values(1)
+        if stamps.tz is not None:
+            stamps = stamps.tz_convert('UTC').tz_localize(None)
+        ts = stamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        columns = [frame[name].to_numpy(dtype=np.float64) for name in COLUMNS[1:]]
+        result = {}
+        for symbol in dict.fromkeys(symbols):
+            mask = symbols == symbol
+            order = np.argsort(ts[mask], kind='stable')
+            result[str(symbol)] = cls(ts[mask][order], *(column[mask][order] for column in columns))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __getitem__(self, index) -> 'Bars':
+        return Bars(*(getattr(self, name)[index] for name in COLUMNS))
+
+    def since(self, start: int) -> 'Bars':
+        return self[int(np.searchsorted(self.ts, start)):]
+
+    def rows(self) -> Iterable[Tuple]:
+        return zip(self.ts.tolist(), self.open.tolist(), self.high.tolist(), self.low.tolist(),
+                   self.close.tolist(), self.volume.tolist())
+
+
+def session_start(when: datetime) -> int:
+    """Epoch seconds of midnight New York time on ``when``'s date there, a daily bar's start"""
+    local = when.astimezone(NEW_YORK)
+    return int(NEW_YORK.localize(datetime(local.year, local.month, local.day)).timestamp())
+
+
+def bucket_start(ts: int, timeframe: str) -> Optional[int]:
+    """Start of the ``timeframe`` bar holding ``ts``; None for a weekend in a session timeframe"""
+    seconds = INTRADAY.get(timeframe)
+    if seconds is not None:
+        return ts // seconds * seconds
+    local = datetime.fromtimestamp(ts, timezone.utc).astimezone(NEW_YORK)
+    if local.weekday() >= 5:
+        return None
+    day = datetime(local.year, local.month, local.day)
+    if timeframe == WEEK:
+        day -= timedelta(days=local.weekday())
+    return int(NEW_YORK.localize(day).timestamp())
+
+
+def _days(first: int, last: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Midnight New York time of every calendar day from the Monday on or before ``first``
+    through ``last``, and each day's weekday"""
+    local = datetime.fromtimestamp(first, timezone.utc).astimezone(NEW_YORK)
+    day = datetime(local.year, local.month, local.day) - timedelta(days=local.weekday())
+    end = datetime.fromtimestamp(last, timezone.utc).astimezone(NEW_YORK).replace(tzinfo=None)
+    starts, weekdays = [], []
+    while day <= end:
+        starts.append(int(NEW_YORK.localize(day).timestamp()))
+        weekdays.append(day.weekday())
+        day += timedelta(days=1)
+    return np.array(starts, dtype=np.int64), np.array(weekdays, dtype=np.int64)
+
+
+def bucket_starts(ts: np.ndarray, timeframe: str) -> np.ndarray:
+    """Vectorized :func:`bucket_start`; -1 for weekend stamps in a session timeframe"""
+    ts = np.asarray(ts, dtype=np.int64)
+    seconds = INTRADAY.get(timeframe)
+    if seconds is not None:
+        return ts // seconds * seconds
+    if not len(ts):
+        return ts.copy()
+    starts, weekdays = _days(int(ts.min()), int(ts.max()))
+    day = np.searchsorted(starts, ts, side='right') - 1
+    weekday = weekdays[day]
+    if timeframe == WEEK:
+        buckets = starts[day - weekday]
+    else:
+        buckets = starts[day]
+    return np.where(weekday < 5, buckets, -1)
+
+
+def aggregate(bars: Bars, timeframe: str, complete_from: Optional[int] = None) -> Bars:
+    """Coarser ``timeframe`` bars from sorted finer ``bars``
+
+    With ``complete_from``, buckets starting before it are dropped, since the
+    bars they were built from may have started partway through.
+    """
+    buckets = bucket_starts(bars.ts, timeframe)
+    keep = buckets >= (complete_from if complete_from is not None else 0)
+    if not keep.all():
+        bars, buckets = bars[keep], buckets[keep]
+    if not len(bars):
+        return Bars.empty()
+    firsts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    lasts = np.append(firsts[1:] - 1, len(buckets) - 1)
+    return Bars(
+        buckets[firsts],
+        bars.open[firsts],
+        np.maximum.reduceat(bars.high, firsts),
+        np.minimum.reduceat(bars.low, firsts),
+        bars.close[lasts],
+        np.add.reduceat(bars.volume, firsts),
+    )
+
+
+class TickAggregator:
+    """Folds ticks into the current bar of several timeframes at once
+
+    Ticks for a symbol must arrive in time order. ``drain()`` hands back the
+    bars touched since the last drain, as partial bars to be merged into any
+    stored bar with the same start: keep its open, extend high and low, take
+    the new close and add the volume.
+    """
+
+    def __init__(self, timeframes: Iterable[str] = TIMEFRAMES):
+        self.timeframes = tuple(timeframes)
+        # (symbol, timeframe, start) -> [open, high, low, close, volume]
+        self._bars: Dict[Tuple[str, str, int], List[float]] = {}
+        # Session bucket starts per minute, since ticks of one cycle share their time
+        self._starts: Dict[Tuple[int, str], Optional[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._bars)
+
+    def _start(self, ts: int, timeframe: str) -> Optional[int]:
+        if timeframe in INTRADAY:
+            seconds = INTRADAY[timeframe]
+            return ts // seconds * seconds
+        key = (ts // 60, timeframe)
+        start = self._starts.get(key, -1)
+        if start == -1:
+            start = self._starts[key] = bucket_start(ts, timeframe)
+        return start
+
+    def add(self, symbol: str, ts: int, price: float, size: float = 0.0):
+        """One trade or quote"""
+        self.add_bar(symbol, ts, price, price, price, price, size)
+
+    def add_bar(self, symbol: str, ts: int, open_: float, high: float, low: float, close: float,
+                volume: float = 0.0):
+        """One bar of a finer timeframe, e.g. a completed 1-minute bar"""
+        for timeframe in self.timeframes:
+            start = self._start(ts, timeframe)
+            if start is None:
+                continue
+            bar = self._bars.get((symbol, timeframe, start))
+            if bar is None:
+                self._bars[(symbol, timeframe, start)] = [open_, high, low, close, volume]
+            else:
+                if high > bar[1]:
+                    bar[1] = high
+                if low < bar[2]:
+                    bar[2] = low
+                bar[3] = close
+                bar[4] += volume
+
+    def drain(self) -> List[Tuple[str, str, int, float, float, float, float, float]]:
+        """``(symbol, timeframe, start, open, high, low, close, volume)`` per bar touched"""
+        rows = [(symbol, timeframe, start, *bar) for (symbol, timeframe, start), bar in self._bars.items()]
+        self._bars = {}
+        self._starts = {}
+        return rows
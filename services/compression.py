@@ -0,0 +1,133 @@
+"""Response compression negotiated from Accept-Encoding
+
+Text responses at or above ``min_size`` bytes are sent with brotli when the
+client accepts it and the ``brotli`` package is installed, gzip otherwise.
+Static files are compressed once per ETag and kept in a small cache, so a
+stylesheet is not recompressed for every client.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import Flask, Response, request
+
+COMPRESSIBLE_TYPES = frozenset({
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+    'text/css',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+})
+
+
+def _load_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+class Compressor:
+    """gzip/brotli for dynamic responses and cached compression of static files"""
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 max_passthrough_size: int = 1 << 20, cache_size: int = 64):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        # Larger files keep streaming from disk uncompressed
+        self.max_passthrough_size = max_passthrough_size
+        self._brotli = _load_brotli()
+        self._cache: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        """Supported codings, most preferred first"""
+        return ('br', 'gzip') if self._brotli is not None else ('gzip',)
+
+    def init_app(self, app: Flask):
+        app.after_request(self.compress_response)
+
+    def choose(self, accept_encoding: str) -> Optional[str]:
+        """Pick the best supported coding the client accepts, or None"""
+        accepted = parse_accept_encoding(accept_encoding or '')
+        best, best_quality = None, 0.0
+        for coding in self.encodings:
+            quality = accepted.get(coding, accepted.get('*', 0.0))
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def compress(self, data: bytes, coding: str) -> bytes:
+        if coding == 'br':
+            return self._brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def compress_response(self, response: Response) -> Response:
+        if (response.status_code < 200 or response.status_code in (204, 206) or response.status_code >= 300
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or 'Content-Encoding' in response.headers
+                or response.is_streamed and not response.direct_passthrough):
+            return response
+        length = response.content_length if response.direct_passthrough else response.calculate_content_length()
+        if length is None or length < self.min_size:
+            return response
+        if response.direct_passthrough and length > self.max_passthrough_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        coding = self.choose(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+
+        etag, _ = response.get_etag()
+        if response.direct_passthrough:
+            # A file being sent from disk; read it so it can be compressed
+            response.direct_passthrough = False
+        if etag:
+            with self._lock:
+                body = self._cache.get((etag, coding))
+                if body is not None:
+                    self._cache.move_to_end((etag, coding))
+            if body is None:
+                body = self.compress(response.get_data(), coding)
+                with self._lock:
+                    self._cache[(etag, coding)] = body
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+            elif hasattr(response.response, 'close'):
+                response.response.close()
+            # Same content, different bytes: only a weak validator still holds
+            response.set_etag(etag, weak=True)
+        else:
+            body = self.compress(response.get_data(), coding)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,86 @@
+"""Reduce a price series to a point budget for charting
+
+Both methods return the indices of the points to keep, always including the
+first and last, so any column of the series can be sliced with them.
+
+* ``lttb``: Largest-Triangle-Three-Buckets. Keeps the point of each bucket
+  forming the largest triangle with the point kept before it and the average
+  of the next bucket, which preserves the visual shape of a line.
+* ``minmax``: keeps the lowest and highest point of each bucket, so no spike
+  is lost; up to two points per bucket.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def _bucket_edges(length: int, buckets: int) -> np.ndarray:
+    """Edges splitting the interior points ``1 .. length - 2`` into ``buckets`` runs"""
+    return np.linspace(1, length - 1, buckets + 1).astype(np.int64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of at most ``threshold`` points chosen by LTTB"""
+    length = len(y)
+    if threshold >= length or length <= 2:
+        return np.arange(length)
+    if threshold < 3:
+        return np.array([0, length - 1])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = _bucket_edges(length, threshold - 2)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Average of every bucket, computed up front; the last point closes the series
+    sizes = ends - starts
+    avg_x = np.append(np.add.reduceat(x[1:length - 1], starts - 1) / sizes, x[-1])
+    avg_y = np.append(np.add.reduceat(y[1:length - 1], starts - 1) / sizes, y[-1])
+
+    # Each choice depends on the previous one, so buckets are walked in order,
+    # but every bucket's candidates are scored in one vector operation
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, length - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = starts[i], ends[i]
+        bx, by = x[start:end], y[start:end]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        ax, ay = x[a], y[a]
+        areas = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of each bucket's minimum and maximum, at most ``threshold`` points"""
+    length = len(y)
+    if threshold >= length or length <= 2:
+        return np.arange(length)
+    if threshold < 4:
+        # No room for a bucket's two extremes besides the endpoints
+        return np.array([0, length - 1])
+    buckets = (threshold - 2) // 2
+
+    y = np.asarray(y, dtype=np.float64)
+    edges = _bucket_edges(length, buckets)
+    interior = y[1:length - 1]
+    offsets = edges[:-1] - 1
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    keep = [np.array([0, length - 1])]
+    for extreme in (np.minimum.reduceat(interior, offsets), np.maximum.reduceat(interior, offsets)):
+        # First position in each bucket holding that bucket's extreme
+        hits = np.flatnonzero(interior == extreme[bucket])
+        _, first = np.unique(bucket[hits], return_index=True)
+        keep.append(hits[first] + 1)
+    return np.unique(np.concatenate(keep))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, threshold: int, method: str = 'lttb') -> np.ndarray:
+    """Indices to keep for ``method`` (one of ``METHODS``)"""
+    if method == 'lttb':
+        return lttb(x, y, threshold)
+    if method == 'minmax':
+        return minmax(y, threshold)
+    raise ValueError(f"Unknown downsampling method: {method}")
@@ -0,0 +1,211 @@
+"""Upstream fault injection for the simulated Alpaca backend
+
+Lets simulation mode behave like a slow, flaky or throttled upstream so
+request tail latency, worker saturation and refresher backoff can be
+measured without a network. Profiles are picked by name from ``Config``
+(``SIMULATION_FAULT_PROFILE``) and individual fields can be overridden.
+"""
+import json
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field, fields, replace
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class UpstreamError(Exception):
+    """Simulated upstream failure (HTTP 5xx)"""
+    status_code = 500
+
+    def __init__(self, message: str, endpoint: Optional[str] = None):
+        super().__init__(message)
+        self.endpoint = endpoint
+
+
+class UpstreamTimeout(UpstreamError):
+    """Simulated upstream call that never answered in time"""
+    status_code = 504
+
+
+class RateLimited(UpstreamError):
+    """Simulated HTTP 429 with a Retry-After hint"""
+    status_code = 429
+
+    def __init__(self, message: str, endpoint: Optional[str] = None, retry_after: float = 1.0):
+        super().__init__(message, endpoint)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class FaultProfile:
+    """How the simulated upstream misbehaves"""
+    name: str = 'none'
+    # Latency distribution: none | fixed | uniform | lognormal
+    latency: str = 'none'
+    # Fixed latency, uniform lower bound or lognormal median, in milliseconds
+    latency_ms: float = 0.0
+    # Uniform width in ms, or lognormal sigma
+    latency_spread: float = 0.0
+    # Fraction of calls that hang for timeout_ms and then fail
+    timeout_rate: float = 0.0
+    timeout_ms: float = 5000.0
+    # Fraction of calls that fail with a 5xx
+    error_rate: float = 0.0
+    # Token bucket shared by all endpoints; 0 disables throttling
+    rate_limit_per_minute: int = 0
+    # Fraction of symbols the upstream has data for
+    coverage: float = 1.0
+
+    def with_overrides(self, overrides: Dict) -> 'FaultProfile':
+        known = {f.name for f in fields(self)}
+        unknown = set(overrides) - known
+        if unknown:
+            raise ValueError(f"Unknown fault profile fields: {', '.join(sorted(unknown))}")
+        return replace(self, **overrides)
+
+
+PROFILES: Dict[str, FaultProfile] = {
+    'none': FaultProfile(),
+    # Healthy but realistic network latency
+    'realistic': FaultProfile('realistic', latency='lognormal', latency_ms=80, latency_spread=0.5),
+    # Slow upstream with a heavy tail
+    'slow': FaultProfile('slow', latency='lognormal', latency_ms=800, latency_spread=0.8,
+                         timeout_rate=0.02, timeout_ms=10000),
+    # Intermittent 5xx and timeouts
+    'flaky': FaultProfile('flaky', latency='uniform', latency_ms=50, latency_spread=250,
+                          timeout_rate=0.05, timeout_ms=5000, error_rate=0.1),
+    # Alpaca's free tier allows 200 requests per minute
+    'throttled': FaultProfile('throttled', latency='fixed', latency_ms=60, rate_limit_per_minute=200),
+    # Everything at once, with gaps in symbol coverage
+    'degraded': FaultProfile('degraded', latency='lognormal', latency_ms=400, latency_spread=1.0,
+                             timeout_rate=0.05, timeout_ms=8000, error_rate=0.1,
+                             rate_limit_per_minute=200, coverage=0.9),
+}
+
+
+def load_profile(name: str = 'none', overrides: Optional[str] = None) -> FaultProfile:
+    """Resolve a profile by name, applying optional JSON field overrides"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown fault profile {name!r}; choose from {', '.join(PROFILES)}")
+    profile = PROFILES[name]
+    if overrides:
+        profile = profile.with_overrides(json.loads(overrides))
+    return profile
+
+
+@dataclass
+class FaultStats:
+    """Counters for what the injector did, per endpoint"""
+    calls: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    timeouts: Dict[str, int] = field(default_factory=dict)
+    rate_limited: Dict[str, int] = field(default_factory=dict)
+    injected_latency: float = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'calls': dict(self.calls),
+            'errors': dict(self.errors),
+            'timeouts': dict(self.timeouts),
+            'rate_limited': dict(self.rate_limited),
+            'injected_latency': round(self.injected_latency, 3),
+        }
+
+
+class FaultInjector:
+    """Applies a FaultProfile to calls made against the mock upstream"""
+
+    def __init__(self, profile: FaultProfile, seed: Optional[int] = None,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self.profile = profile
+        self.stats = FaultStats()
+        self._rng = np.random.default_rng(seed)
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(profile.rate_limit_per_minute)
+        self._refilled_at = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.profile != PROFILES['none']
+
+    def _count(self, counter: Dict[str, int], endpoint: str):
+        counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    def _sample_latency(self) -> float:
+        """Draw one latency in seconds from the profile's distribution"""
+        profile = self.profile
+        if profile.latency == 'fixed':
+            ms = profile.latency_ms
+        elif profile.latency == 'uniform':
+            ms = profile.latency_ms + self._rng.uniform(0, profile.latency_spread)
+        elif profile.latency == 'lognormal':
+            ms = profile.latency_ms * self._rng.lognormal(0.0, profile.latency_spread)
+        else:
+            ms = 0.0
+        return ms / 1000.0
+
+    def _take_token(self) -> Optional[float]:
+        """Consume one rate-limit token, or return seconds until one is free"""
+        limit = self.profile.rate_limit_per_minute
+        if not limit:
+            return None
+        now = self._clock()
+        self._tokens = min(limit, self._tokens + (now - self._refilled_at) * limit / 60.0)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return None
+        return (1 - self._tokens) * 60.0 / limit
+
+    def before_call(self, endpoint: str):
+        """Simulate latency and failures for one upstream call
+
+        Raises ``RateLimited``, ``UpstreamTimeout`` or ``UpstreamError``.
+        """
+        profile = self.profile
+        with self._lock:
+            self._count(self.stats.calls, endpoint)
+            retry_after = self._take_token()
+            if retry_after is not None:
+                self._count(self.stats.rate_limited, endpoint)
+            else:
+                roll = self._rng.random()
+                latency = self._sample_latency()
+
+        if retry_after is not None:
+            raise RateLimited(f"429 Too Many Requests from {endpoint}", endpoint, retry_after)
+
+        if roll < profile.timeout_rate:
+            self._pause(profile.timeout_ms / 1000.0)
+            with self._lock:
+                self._count(self.stats.timeouts, endpoint)
+            raise UpstreamTimeout(f"Timed out waiting for {endpoint}", endpoint)
+
+        self._pause(latency)
+        if roll < profile.timeout_rate + profile.error_rate:
+            with self._lock:
+                self._count(self.stats.errors, endpoint)
+            raise UpstreamError(f"500 Internal Server Error from {endpoint}", endpoint)
+
+    def _pause(self, seconds: float):
+        if seconds > 0:
+            with self._lock:
+                self.stats.injected_latency += seconds
+            self._sleep(seconds)
+
+    def filter_symbols(self, symbols: List[str]) -> List[str]:
+        """Drop symbols outside the profile's coverage
+
+        Coverage is decided by a stable hash so the same symbols are missing on
+        every call, like an upstream that simply has no data for them.
+        """
+        coverage = self.profile.coverage
+        if coverage >= 1.0:
+            return list(symbols)
+        cutoff = int(coverage * 0xFFFFFFFF)
+        return [symbol for symbol in symbols if zlib.crc32(symbol.encode()) <= cutoff]
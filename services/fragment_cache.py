@@ -0,0 +1,130 @@
+"""Versioned caches for shared template fragments and computed payloads
+
+Regions that look the same for every user, such as the market index panel or
+the news page, are wrapped in a ``{% cache %}`` block::
+
+    {% cache 'market-indexes' %}
+        {% set indexes = load_indexes() %}
+        ...
+    {% endcache %}
+
+The block body renders once per data version and is replayed until the
+version changes. The version combines a local generation, which the refresher
+bumps after each update cycle, with the shared quote table's sequence, so
+workers that don't run the refresher still see new prices. Load data inside
+the block through a callable so a cache hit skips the lookup as well.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from flask import Flask
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class VersionedCache:
+    """Values keyed by name and arguments, valid for one data version
+
+    The version combines a local generation, bumped by ``invalidate()``, with
+    an optional shared version such as the quote table's sequence.
+    """
+
+    def __init__(self, version: Optional[Callable[[], Hashable]] = None, max_age: float = 300.0,
+                 max_entries: int = 256, enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self._shared_version = version
+        # Upper bound on staleness if no invalidation reaches this process
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._clock = clock
+        self._generation = 0
+        # key -> (version, computed at, value)
+        self._entries: 'OrderedDict[Tuple, Tuple[Hashable, float, Any]]' = OrderedDict()
+        self._computing: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> Hashable:
+        shared = self._shared_version() if self._shared_version is not None else None
+        return (self._generation, shared)
+
+    def invalidate(self):
+        """Drop every entry; called when the refresher has new data"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _lookup(self, key: Tuple, version: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or self._clock() - entry[1] >= self.max_age:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, computing it at most once per version"""
+        if not self.enabled:
+            return compute()
+        version = self.version()
+        cached = self._lookup(key, version)
+        if cached is not None:
+            return cached
+
+        # One thread computes; concurrent requests for the same key wait for it
+        with self._lock:
+            compute_lock = self._computing.setdefault(key, threading.Lock())
+        with compute_lock:
+            cached = self._lookup(key, version)
+            if cached is not None:
+                return cached
+            value = compute()
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = (version, self._clock(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._computing.pop(key, None)
+        return value
+
+
+class FragmentCache(VersionedCache):
+    """Rendered template fragments, replayed until the data version changes"""
+
+    def init_app(self, app: Flask):
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+
+    def get_or_render(self, key: Tuple, render: Callable[[], str]) -> Markup:
+        """Return the cached fragment for ``key``, rendering it at most once per version"""
+        return self.get_or_compute(key, lambda: Markup(render()))
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache name[, arg, ...] %}...{% endcache %}`` backed by the app's FragmentCache"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_render(tuple(key), caller)
@@ -0,0 +1,311 @@
+"""Local price history: stored OHLCV bars and downsampled chart series
+
+Bars live in the ``price_bars`` table keyed by (symbol, timeframe, start).
+The refresher folds every quote it fetches into the current bar of each
+timeframe (see services.bars for how they are bucketed). Longer history is
+backfilled from upstream the first time a range is requested for a symbol:
+1-minute and daily bars are fetched, and the coarser intraday and weekly bars
+are aggregated from them locally. Reads come back as :class:`Bars`, parallel
+NumPy columns, so a year of daily bars is one query and six arrays.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import PriceBar, db
+
+from .bars import DAY, FIVE_MINUTE, HOUR, MINUTE, TIMEFRAMES, WEEK, Bars, TickAggregator, aggregate
+from .downsampling import downsample
+from .inserts import insert
+from .quotes import to_utc_datetime
+
+log = logging.getLogger('dadstocks.history')
+
+# Chart range -> (stored timeframe, span); the span ends at the newest bar
+RANGES: Dict[str, Tuple[str, timedelta]] = {
+    '1D': (MINUTE, timedelta(days=1)),
+    '5D': (FIVE_MINUTE, timedelta(days=5)),
+    '1M': (DAY, timedelta(days=31)),
+    '3M': (DAY, timedelta(days=92)),
+    '6M': (DAY, timedelta(days=183)),
+    '1Y': (DAY, timedelta(days=366)),
+    '5Y': (WEEK, timedelta(days=1827)),
+}
+# Timeframes aggregated locally, and the stored timeframe they are built from
+SOURCES = {FIVE_MINUTE: MINUTE, HOUR: MINUTE, WEEK: DAY}
+# How much to backfill the first time a fetched timeframe is requested
+BACKFILL_SPAN = {MINUTE: timedelta(days=5), DAY: timedelta(days=1827)}
+# Kept for the minute retention only; coarser bars are kept indefinitely
+SHORT_LIVED = (MINUTE, FIVE_MINUTE)
+
+
+def _upsert(table, update):
+    """INSERT ... ON CONFLICT DO UPDATE for the engine's dialect, to execute with a list of rows
+
+    Rows are passed at execution, not as VALUES, so the statement compiles
+    once and is run with the driver's executemany however many rows there are.
+    """
+    statement = insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=['symbol', 'timeframe', 'ts'],
+        set_=update(statement.excluded)
+    )
+
+
+def _greatest(a, b):
+    return func.greatest(a, b) if db.engine.dialect.name == 'postgresql' else func.max(a, b)
+
+
+def _least(a, b):
+    return func.least(a, b) if db.engine.dialect.name == 'postgresql' else func.min(a, b)
+
+
+class HistoryStore:
+    """Reads and writes ``price_bars``; ``fetch`` backfills from upstream
+
+    ``fetch(symbols, timeframe, start, end)`` returns a (symbol, timestamp)
+    indexed frame of OHLCV bars, like the Alpaca SDK's ``BarSet.df``.
+    """
+
+    def __init__(self, fetch: Optional[Callable] = None, minute_retention: timedelta = timedelta(days=7),
+                 backfill_retry: float = 3600.0):
+        self.fetch = fetch
+        self.minute_retention = minute_retention
+        self.backfill_retry = backfill_retry
+        self._backfilled: Dict[Tuple[str, str, timedelta], float] = {}
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        # (symbol, timeframe) -> (start, high, low, close) of the current bar as
+        # merged by this process, to leave out merges that wouldn't change it
+        self._merged: Dict[Tuple[str, str], Tuple[int, float, float, float]] = {}
+        # symbol -> (timestamp, price) of the last quote recorded
+        self._quoted: Dict[str, Tuple[int, float]] = {}
+
+    # Writes
+
+    def write(self, symbol: str, timeframe: str, bars: Bars):
+        """Store ``bars``, replacing any bars with the same start"""
+        rows = [
+            {'symbol': symbol, 'timeframe': timeframe, 'ts': ts, 'open': o, 'high': h, 'low': l,
+             'close': c, 'volume': v}
+            for ts, o, h, l, c, v in bars.rows()
+        ]
+        if rows:
+            db.session.execute(_upsert(PriceBar.__table__, lambda new: {
+                'open': new.open, 'high': new.high, 'low': new.low, 'close': new.close, 'volume': new.volume
+            }), rows)
+        self._merged.pop((symbol, timeframe), None)
+
+    def record_quotes(self, quotes: Mapping[str, Any], when: Optional[datetime] = None) -> int:
+        """Fold one price per symbol into its bar of every timeframe, as of the quote's timestamp
+
+        Quotes without a timestamp are taken as of ``when``, by default now.
+        A quote already recorded, with the same timestamp and price, is left
+        out: upstream repeats its last bar overnight and on market holidays,
+        and those must not open bars of their own.
+        """
+        default = int((when or datetime.now(timezone.utc)).timestamp())
+        quoted = self._quoted
+        ticks = []
+        for symbol, quote in quotes.items():
+            price = float(quote['price'])
+            timestamp = quote.get('timestamp')
+            if timestamp is None:
+                ticks.append((symbol, default, price, 0.0))
+                continue
+            ts = int(to_utc_datetime(timestamp).timestamp())
+            if quoted.get(symbol) == (ts, price):
+                continue
+            quoted[symbol] = (ts, price)
+            ticks.append((symbol, ts, price, 0.0))
+        return self.record_ticks(ticks)
+
+    def record_ticks(self, ticks: Iterable[Tuple[str, int, float, float]]) -> int:
+        """Fold ``(symbol, ts, price, size)`` ticks, in time order, into the stored bars"""
+        aggregator = TickAggregator(TIMEFRAMES)
+        for symbol, ts, price, size in ticks:
+            aggregator.add(symbol, ts, price, size)
+        return self.merge(aggregator.drain())
+
+    def merge(self, bars: List[Tuple[str, str, int, float, float, float, float, float]]) -> int:
+        """Merge partial ``(symbol, timeframe, start, open, high, low, close, volume)`` bars
+        into the stored ones: the stored open stays, high and low widen, the close is
+        replaced and volume adds up
+
+        Bars this process already merged a wider range and the same close into,
+        with no volume to add, would come out unchanged and are left out. A
+        caller whose transaction rolls back must :meth:`forget` them. Returns
+        the bars written.
+        """
+        merged, written = self._merged, {}
+        rows = []
+        for symbol, timeframe, ts, o, h, l, c, v in bars:
+            key = (symbol, timeframe)
+            known = written.get(key) or merged.get(key)
+            if known is not None and known[0] == ts:
+                if not v and h <= known[1] and l >= known[2] and c == known[3]:
+                    continue
+                written[key] = (ts, max(h, known[1]), min(l, known[2]), c)
+            else:
+                written[key] = (ts, h, l, c)
+            rows.append({'symbol': symbol, 'timeframe': timeframe, 'ts': ts, 'open': o, 'high': h, 'low': l,
+                         'close': c, 'volume': v})
+        table = PriceBar.__table__
+        if rows:
+            db.session.execute(_upsert(table, lambda new: {
+                'high': _greatest(table.c.high, new.high),
+                'low': _least(table.c.low, new.low),
+                'close': new.close,
+                'volume': table.c.volume + new.volume,
+            }), rows)
+        merged.update(written)
+        return len(rows)
+
+    def forget(self):
+        """Drop what :meth:`merge` and :meth:`record_quotes` remember, after the bars
+        they wrote were rolled back"""
+        self._merged.clear()
+        self._quoted.clear()
+
+    def derive(self, symbol: str, timeframe: str, start: Optional[int] = None) -> int:
+        """Rebuild a symbol's ``timeframe`` bars from its stored source bars since ``start``
+
+        Buckets that begin before the first source bar used are left alone,
+        since the source may not cover them fully. Returns the bars written.
+        """
+        source = self.load(symbol, SOURCES[timeframe], start)
+        if not len(source):
+            return 0
+        bars = aggregate(source, timeframe, complete_from=int(source.ts[0]) if start is None else start)
+        self.write(symbol, timeframe, bars)
+        return len(bars)
+
+    def prune(self, now: Optional[float] = None, interval: float = 3600.0) -> int:
+        """Delete 1- and 5-minute bars past retention, at most once per ``interval`` seconds"""
+        now = now or time.time()
+        if now - self._pruned_at < interval:
+            return 0
+        self._pruned_at = now
+        cutoff = int(now - self.minute_retention.total_seconds())
+        result = db.session.execute(
+            PriceBar.__table__.delete().where(PriceBar.timeframe.in_(SHORT_LIVED), PriceBar.ts < cutoff))
+        return result.rowcount or 0
+
+    # Reads
+
+    def load(self, symbol: str, timeframe: str, start: Optional[int] = None) -> Bars:
+        table = PriceBar.__table__
+        query = select(table.c.ts, table.c.open, table.c.high, table.c.low, table.c.close, table.c.volume) \
+            .where(table.c.symbol == symbol, table.c.timeframe == timeframe)
+        if start is not None:
+            query = query.where(table.c.ts >= start)
+        return Bars.from_rows(db.session.execute(query.order_by(table.c.ts)).all())
+
+    def load_many(self, symbols: List[str], timeframe: str, start: Optional[int] = None,
+                  end: Optional[int] = None) -> Dict[str, Bars]:
+        """Bars in ``[start, end)`` for many symbols, a few hundred per query"""
+        table = PriceBar.__table__
+        rows: Dict[str, List[Tuple]] = {}
+        for offset in range(0, len(symbols), 500):
+            query = select(table.c.symbol, table.c.ts, table.c.open, table.c.high, table.c.low, table.c.close,
+                           table.c.volume) \
+                .where(table.c.timeframe == timeframe, table.c.symbol.in_(symbols[offset:offset + 500]))
+            if start is not None:
+                query = query.where(table.c.ts >= start)
+            if end is not None:
+                query = query.where(table.c.ts < end)
+            for row in db.session.execute(query.order_by(table.c.symbol, table.c.ts)):
+                rows.setdefault(row[0], []).append(row[1:])
+        return {symbol: Bars.from_rows(symbol_rows) for symbol, symbol_rows in rows.items()}
+
+    def latest(self, symbol: str, timeframe: str) -> Optional[int]:
+        return db.session.execute(
+            select(func.max(PriceBar.ts)).where(PriceBar.symbol == symbol, PriceBar.timeframe == timeframe)
+        ).scalar()
+
+    def load_range(self, symbol: str, range_: str) -> Tuple[str, Bars]:
+        """The bars for a chart range, backfilling from upstream if there are none yet
+
+        An aggregated timeframe is rebuilt from the stored source bars when
+        there is nothing new to fetch, e.g. for bars stored before it existed.
+        """
+        timeframe, span = RANGES[range_]
+        latest = self.latest(symbol, timeframe)
+        if latest is None or self._needs_backfill(symbol, timeframe, latest, span):
+            if self.backfill([symbol], timeframe):
+                latest = self.latest(symbol, timeframe)
+            elif timeframe in SOURCES and self.derive(symbol, timeframe):
+                db.session.commit()
+                latest = self.latest(symbol, timeframe)
+        if latest is None:
+            return timeframe, Bars.empty()
+        return timeframe, self.load(symbol, timeframe, latest - int(span.total_seconds()))
+
+    def _needs_backfill(self, symbol: str, timeframe: str, latest: int, span: timedelta) -> bool:
+        # Only minute bars recorded by the refresher, or too few to cover the range
+        oldest = db.session.execute(
+            select(func.min(PriceBar.ts)).where(PriceBar.symbol == symbol, PriceBar.timeframe == timeframe)
+        ).scalar()
+        return latest - oldest < span.total_seconds() / 2
+
+    def backfill(self, symbols: List[str], timeframe: str, span: Optional[timedelta] = None) -> List[str]:
+        """Fetch and store upstream history, at most once per symbol and span per retry interval
+
+        An aggregated timeframe is backfilled through its source: the source
+        bars are fetched, and every timeframe built from them is aggregated
+        again over the fetched span. Returns the symbols that got bars.
+        ``span`` defaults to the source timeframe's full backfill.
+        """
+        if self.fetch is None:
+            return []
+        timeframe = SOURCES.get(timeframe, timeframe)
+        span = span or BACKFILL_SPAN[timeframe]
+        now = time.monotonic()
+        with self._lock:
+            due = [symbol for symbol in symbols
+                   if now - self._backfilled.get((symbol, timeframe, span), -self.backfill_retry)
+                   >= self.backfill_retry]
+            for symbol in due:
+                self._backfilled[(symbol, timeframe, span)] = now
+        if not due:
+            return []
+        end = datetime.now(timezone.utc)
+        try:
+            frame = self.fetch(due, timeframe, end - span, end)
+        except Exception as e:
+            log.warning('History backfill failed for %s %s symbols: %s', len(due), timeframe, e)
+            return []
+        wanted = set(due)
+        stored = []
+        for symbol, bars in Bars.from_frame(frame).items():
+            if symbol in wanted and len(bars):
+                self.write(symbol, timeframe, bars)
+                for derived, source in SOURCES.items():
+                    if source == timeframe:
+                        self.derive(symbol, derived, int(bars.ts[0]))
+                stored.append(symbol)
+        if stored:
+            db.session.commit()
+            log.info('Backfilled %s bars for %s symbols', timeframe, len(stored))
+        return stored
+
+
+def series_payload(symbol: str, range_: str, timeframe: str, bars: Bars, points: int, method: str) -> str:
+    """Compact JSON for a chart: close prices downsampled to ``points``, as columns"""
+    keep = downsample(bars.ts, bars.close, points, method) if len(bars) else np.empty(0, dtype=np.int64)
+    return json.dumps({
+        'symbol': symbol,
+        'range': range_,
+        'timeframe': timeframe,
+        'method': method,
+        'source_points': len(bars),
+        'points': len(keep),
+        't': bars.ts[keep].tolist(),
+        'c': np.round(bars.close[keep], 4).tolist(),
+    }, separators=(',', ':'))
@@ -0,0 +1,290 @@
+"""Technical indicators kept as rolling per-symbol state
+
+Each symbol's :class:`RollingState` is advanced one completed daily bar at
+a time in O(1): moving-average sums are updated from a ring buffer of recent
+closes, the EMA and Wilder's RSI averages are recursive, and the rolling VWAP
+keeps ring buffers of price-volume and volume. ``values(price)`` adds the
+live price as the bar in progress without changing the state, so every
+refresh cycle gets current readings for the cost of a few float operations.
+
+:func:`batch_states` builds the same states for many symbols at once from
+stored history, with the series stacked into one matrix so each step is a
+vector operation across all symbols; it is used to warm up symbols that have
+no saved state yet.
+"""
+import json
+import math
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .bars import Bars
+
+SMA_PERIODS = (20, 50)
+EMA_PERIOD = 20
+RSI_PERIOD = 14
+VWAP_PERIOD = 20
+NAMES = tuple(f"sma_{n}" for n in SMA_PERIODS) + (f"ema_{EMA_PERIOD}", f"rsi_{RSI_PERIOD}", f"vwap_{VWAP_PERIOD}")
+
+# Ring buffer length: enough closes for the longest moving average
+RING = max(SMA_PERIODS)
+# Bars used to warm up a symbol without state; the EMA and RSI forget older ones
+WARMUP_BARS = 250
+# Calendar span holding WARMUP_BARS weekdays
+WARMUP_SPAN = timedelta(days=WARMUP_BARS * 7 // 5 + 10)
+_ALPHA = 2.0 / (EMA_PERIOD + 1)
+
+
+def _rsi(gain: float, loss: float) -> float:
+    if loss == 0:
+        return 100.0 if gain > 0 else 50.0
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+class RollingState:
+    """Indicator state for one symbol after ``count`` completed bars, the last starting at ``through``"""
+
+    __slots__ = ('through', 'count', 'closes', 'sums', 'ema', 'gain', 'loss',
+                 'pv', 'volume', 'pv_sum', 'volume_sum')
+
+    def __init__(self):
+        self.through = 0
+        self.count = 0
+        self.closes = [0.0] * RING
+        self.sums = [0.0] * len(SMA_PERIODS)
+        self.ema = 0.0
+        # Summed while the first RSI_PERIOD changes come in, Wilder averages after
+        self.gain = 0.0
+        self.loss = 0.0
+        self.pv = [0.0] * VWAP_PERIOD
+        self.volume = [0.0] * VWAP_PERIOD
+        self.pv_sum = 0.0
+        self.volume_sum = 0.0
+
+    def fold(self, ts: int, high: float, low: float, close: float, volume: float):
+        """Advance by one completed bar"""
+        count = self.count
+        slot = count % RING
+        for k, n in enumerate(SMA_PERIODS):
+            self.sums[k] += close
+            if count >= n:
+                self.sums[k] -= self.closes[(count - n) % RING]
+
+        if count == 0:
+            self.ema = close
+        else:
+            self.ema += _ALPHA * (close - self.ema)
+            change = close - self.closes[(count - 1) % RING]
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if count <= RSI_PERIOD:
+                self.gain += gain
+                self.loss += loss
+                if count == RSI_PERIOD:
+                    self.gain /= RSI_PERIOD
+                    self.loss /= RSI_PERIOD
+            else:
+                self.gain = (self.gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.loss = (self.loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+
+        v_slot = count % VWAP_PERIOD
+        pv = (high + low + close) / 3.0 * volume
+        self.pv_sum += pv - self.pv[v_slot]
+        self.volume_sum += volume - self.volume[v_slot]
+        self.pv[v_slot] = pv
+        self.volume[v_slot] = volume
+
+        self.closes[slot] = close
+        self.count = count + 1
+        self.through = int(ts)
+        if slot == RING - 1:
+            self._resum()
+
+    def _resum(self):
+        """Recompute the running sums exactly, so rounding error can't build up"""
+        count = self.count
+        for k, n in enumerate(SMA_PERIODS):
+            self.sums[k] = math.fsum(self.closes[(count - 1 - i) % RING] for i in range(min(n, count)))
+        self.pv_sum = math.fsum(self.pv)
+        self.volume_sum = math.fsum(self.volume)
+
+    def values(self, price: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Current readings; ``price`` is the close so far of the bar in progress
+
+        An indicator is None until enough bars have completed. The VWAP only
+        covers completed bars, since a live price carries no volume.
+        """
+        count = self.count
+        result: Dict[str, Optional[float]] = dict.fromkeys(NAMES)
+        if price is None:
+            for k, n in enumerate(SMA_PERIODS):
+                if count >= n:
+                    result[NAMES[k]] = self.sums[k] / n
+            if count:
+                result[NAMES[-3]] = self.ema
+            if count > RSI_PERIOD:
+                result[NAMES[-2]] = _rsi(self.gain, self.loss)
+        else:
+            for k, n in enumerate(SMA_PERIODS):
+                if count + 1 >= n:
+                    leaving = self.closes[(count - n) % RING] if count >= n else 0.0
+                    # The window of n ends at the live price, so the oldest close it held drops out
+                    result[NAMES[k]] = (self.sums[k] - leaving + price) / n
+            result[NAMES[-3]] = self.ema + _ALPHA * (price - self.ema) if count else price
+            if count >= RSI_PERIOD:
+                change = price - self.closes[(count - 1) % RING]
+                gain, loss = max(change, 0.0), max(-change, 0.0)
+                if count == RSI_PERIOD:
+                    gain, loss = (self.gain + gain) / RSI_PERIOD, (self.loss + loss) / RSI_PERIOD
+                else:
+                    gain = (self.gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                    loss = (self.loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+                result[NAMES[-2]] = _rsi(gain, loss)
+        if count >= VWAP_PERIOD and self.volume_sum > 0:
+            result[NAMES[-1]] = self.pv_sum / self.volume_sum
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps({name: getattr(self, name) for name in self.__slots__}, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text: str) -> 'RollingState':
+        state = cls()
+        for name, value in json.loads(text).items():
+            if name in cls.__slots__:
+                setattr(state, name, value)
+        return state
+
+
+def _stack(series: List[Bars], counts: np.ndarray, width: int) -> Tuple[np.ndarray, ...]:
+    """Right-aligned (symbols x width) matrices of the last ``counts`` closes, highs, lows and volumes"""
+    shape = (len(series), width)
+    close, high, low, volume = (np.full(shape, np.nan) for _ in range(4))
+    for row, (bars, n) in enumerate(zip(series, counts.tolist())):
+        close[row, width - n:] = bars.close[-n:]
+        high[row, width - n:] = bars.high[-n:]
+        low[row, width - n:] = bars.low[-n:]
+        volume[row, width - n:] = bars.volume[-n:]
+    return close, high, low, volume
+
+
+def _ring(values: np.ndarray, counts: np.ndarray, size: int) -> np.ndarray:
+    """The last ``size`` columns placed at the ring positions fold() would have written"""
+    rows = np.arange(len(values))[:, None]
+    age = np.arange(size)[None, :]
+    index = counts[:, None] - size + age
+    ring = np.zeros((len(values), size))
+    ring[rows, index % size] = np.where(index >= 0, np.nan_to_num(values[:, -size:]), 0.0)
+    return ring
+
+
+def batch_states(series: Dict[str, Bars], max_bars: int = WARMUP_BARS) -> Dict[str, RollingState]:
+    """Rolling states for many symbols from their last ``max_bars`` bars, computed together"""
+    symbols = [symbol for symbol, bars in series.items() if len(bars)]
+    if not symbols:
+        return {}
+    bars = [series[symbol] for symbol in symbols]
+    counts = np.array([min(len(b), max_bars) for b in bars], dtype=np.int64)
+    width = max(int(counts.max()), RING, VWAP_PERIOD)
+    close, high, low, volume = _stack(bars, counts, width)
+    first = width - counts
+
+    # Moving-average sums over the last n closes, as many as there are
+    sums = np.stack([np.nansum(close[:, -n:], axis=1) for n in SMA_PERIODS], axis=1)
+
+    # EMA and Wilder's RSI are recursive: walk the columns, all symbols at once
+    ema = np.full(len(symbols), np.nan)
+    gain = np.zeros(len(symbols))
+    loss = np.zeros(len(symbols))
+    change = np.diff(close, axis=1, prepend=np.nan)
+    up, down = np.clip(change, 0.0, None), np.clip(-change, 0.0, None)
+    for t in range(width):
+        x = close[:, t]
+        ema = np.where(np.isnan(x), ema, np.where(np.isnan(ema), x, ema + _ALPHA * (x - ema)))
+        step = t - first
+        warming = (step >= 1) & (step <= RSI_PERIOD)
+        gain = np.where(warming, gain + up[:, t], gain)
+        loss = np.where(warming, loss + down[:, t], loss)
+        seeded = step == RSI_PERIOD
+        gain = np.where(seeded, gain / RSI_PERIOD, gain)
+        loss = np.where(seeded, loss / RSI_PERIOD, loss)
+        wilder = step > RSI_PERIOD
+        gain = np.where(wilder, (gain * (RSI_PERIOD - 1) + up[:, t]) / RSI_PERIOD, gain)
+        loss = np.where(wilder, (loss * (RSI_PERIOD - 1) + down[:, t]) / RSI_PERIOD, loss)
+
+    pv = np.nan_to_num((high + low + close) / 3.0 * volume)
+    pv_ring = _ring(pv, counts, VWAP_PERIOD)
+    volume_ring = _ring(np.nan_to_num(volume), counts, VWAP_PERIOD)
+    close_ring = _ring(close, counts, RING)
+
+    states = {}
+    for row, symbol in enumerate(symbols):
+        state = RollingState()
+        state.through = int(bars[row].ts[-1])
+        state.count = int(counts[row])
+        state.closes = close_ring[row].tolist()
+        state.sums = sums[row].tolist()
+        state.ema = float(ema[row])
+        state.gain = float(gain[row])
+        state.loss = float(loss[row])
+        state.pv = pv_ring[row].tolist()
+        state.volume = volume_ring[row].tolist()
+        state.pv_sum = math.fsum(state.pv)
+        state.volume_sum = math.fsum(state.volume)
+        states[symbol] = state
+    return states
+
+
+class IndicatorEngine:
+    """Rolling indicator states for every tracked symbol
+
+    The refresher checks each symbol once per session: bars completed since
+    its state's ``through`` are folded in, and symbols without state are
+    warmed up in batches from history. ``loaded`` is False until the saved
+    states have been read back after a restart.
+    """
+
+    def __init__(self):
+        self.states: Dict[str, RollingState] = {}
+        self.loaded = False
+        # symbol -> session start it was last brought up to date for
+        self._checked: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def load(self, rows: Iterable[Tuple[str, str]]):
+        """Restore ``(symbol, state json)`` rows"""
+        for symbol, text in rows:
+            self.states[symbol] = RollingState.from_json(text)
+        self.loaded = True
+
+    def due(self, symbols: Iterable[str], session: int) -> List[str]:
+        """Symbols not yet brought up to date for ``session``"""
+        checked = self._checked
+        return [symbol for symbol in symbols if checked.get(symbol) != session]
+
+    def mark_checked(self, symbols: Iterable[str], session: int):
+        for symbol in symbols:
+            self._checked[symbol] = session
+
+    def advance(self, symbol: str, bars: Bars) -> bool:
+        """Fold the bars after the symbol's state; False if there were none"""
+        state = self.states[symbol]
+        new = bars.since(state.through + 1)
+        for ts, high, low, close, volume in zip(new.ts.tolist(), new.high.tolist(), new.low.tolist(),
+                                                 new.close.tolist(), new.volume.tolist()):
+            state.fold(ts, high, low, close, volume)
+        return len(new) > 0
+
+    def warm_up(self, series: Dict[str, Bars]) -> List[str]:
+        """Build states for symbols from history in one batch; returns those built"""
+        built = batch_states(series)
+        self.states.update(built)
+        return list(built)
+
+    def values(self, symbol: str, price: Optional[float] = None) -> Dict[str, Optional[float]]:
+        state = self.states.get(symbol)
+        if state is None:
+            return dict.fromkeys(NAMES)
+        return state.values(price)
@@ -0,0 +1,18 @@
+"""Bulk INSERT statements for the engine's dialect, with its ON CONFLICT clauses"""
+from typing import Dict, List
+
+from models import db
+
+
+def insert(table):
+    """An INSERT into ``table`` supporting ON CONFLICT on PostgreSQL and SQLite alike"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def insert_ignoring_duplicates(table, rows: List[Dict], keys: List[str]):
+    """One INSERT of ``rows``, skipping any that would duplicate ``keys``"""
+    db.session.execute(insert(table).on_conflict_do_nothing(index_elements=keys), rows)
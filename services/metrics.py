@@ -0,0 +1,396 @@
+"""In-process metrics exposed in the Prometheus text format
+
+A small, dependency-free registry of counters, gauges and histograms, plus
+the Flask, SQLAlchemy and upstream-client hooks that feed it. Every update is
+a dict lookup and a few additions under a per-metric lock, cheap enough to
+leave on in production (see ``python -m benchmarks.bench_metrics``).
+
+Metrics are per process; with several workers, scrape each one or sum them
+in Prometheus.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstreams
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down
+
+    ``collect`` computes label/value pairs at scrape time instead, for values
+    like staleness that change continuously.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels) -> Optional[float]:
+        return self._values.get(self._key(labels))
+
+    def _samples(self):
+        if self._collect is not None:
+            items = sorted(self._collect())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations, e.g. latencies in seconds"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def total(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """A named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics:
+    """The dashboard's metrics and the hooks that record them"""
+
+    def __init__(self, registry: Optional[Registry] = None, clock: Callable[[], float] = time.time):
+        self.registry = registry or Registry()
+        self.enabled = True
+        self._clock = clock
+        self._symbol_updated: Dict[str, float] = {}
+        r = self.registry
+
+        self.http_latency = r.histogram(
+            'http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+        self.http_queries = r.histogram(
+            'http_request_db_queries', 'SQL statements executed per request', ('route',), QUERY_COUNT_BUCKETS)
+        self.http_query_time = r.histogram(
+            'http_request_db_duration_seconds', 'Time spent in SQL per request', ('route',))
+        self.db_queries = r.counter('db_queries_total', 'SQL statements executed')
+        self.db_query_time = r.histogram('db_query_duration_seconds', 'Latency of individual SQL statements')
+        self.upstream_latency = r.histogram(
+            'upstream_request_duration_seconds', 'Alpaca call latency by endpoint', ('endpoint',))
+        self.upstream_errors = r.counter(
+            'upstream_errors_total', 'Failed Alpaca calls by endpoint and error type', ('endpoint', 'error'))
+        self.refresh_latency = r.histogram(
+            'refresh_cycle_duration_seconds', 'Duration of update_stock_prices cycles', ('outcome',),
+            (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+        self.refresh_symbols = r.gauge('refresh_symbols', 'Symbols updated by the last refresh cycle')
+        self.staleness = r.gauge(
+            'quote_staleness_seconds', 'Seconds since each symbol was last refreshed', ('symbol',),
+            collect=self._collect_staleness)
+        self.cache_lookups = r.counter(
+            'quote_cache_lookups_total', 'Shared quote table lookups by result', ('result',))
+        self._breakers: Dict[str, object] = {}
+        self.circuit_state = r.gauge(
+            'upstream_circuit_state', 'Breaker state per endpoint: 0 closed, 1 half-open, 2 open', ('endpoint',),
+            collect=self._collect_breakers)
+        self.fallbacks = r.counter(
+            'upstream_fallbacks_total', 'Lookups served from last known data, by endpoint and reason',
+            ('endpoint', 'reason'))
+        self.revalidations = r.counter(
+            'upstream_revalidations_total', 'Background refreshes after a fallback, by outcome',
+            ('endpoint', 'outcome'))
+        self.alerts_fired = r.counter('alerts_fired_total', 'Price alerts fired and queued for delivery')
+        self.revaluation_latency = r.histogram(
+            'portfolio_revaluation_duration_seconds', 'Time to value every user\'s holdings')
+        self.portfolio_positions = r.gauge('portfolio_positions', 'Positions valued by the last revaluation')
+
+    # Flask hooks
+
+    def init_app(self, app, db=None, endpoint: str = '/metrics'):
+        """Register request hooks, SQL listeners and the scrape endpoint"""
+        from flask import Response, g, request
+
+        def start_timer():
+            if self.enabled:
+                g._metrics = [time.perf_counter(), 0, 0.0]
+
+        def record_request(response):
+            state = g.pop('_metrics', None)
+            if state is not None:
+                route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+                self.http_latency.observe(time.perf_counter() - state[0], route=route,
+                                          method=request.method, status=str(response.status_code))
+                self.http_queries.observe(state[1], route=route)
+                self.http_query_time.observe(state[2], route=route)
+            return response
+
+        def scrape():
+            return Response(self.registry.render(), content_type=CONTENT_TYPE)
+
+        app.before_request(start_timer)
+        app.after_request(record_request)
+        app.add_url_rule(endpoint, 'metrics', scrape)
+        if db is not None:
+            with app.app_context():
+                self.watch_engine(db.engine)
+        app.extensions['metrics'] = self
+
+    def watch_engine(self, engine):
+        """Count and time every statement executed through ``engine``"""
+        from flask import g, has_app_context
+        from sqlalchemy import event
+
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+        def after(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info['_metrics_started'].pop()
+            if not self.enabled:
+                return
+            elapsed = time.perf_counter() - started
+            self.db_queries.inc()
+            self.db_query_time.observe(elapsed)
+            state = g.get('_metrics') if has_app_context() else None
+            if state is not None:
+                state[1] += 1
+                state[2] += elapsed
+
+        def failed(context):
+            started = context.connection.info.get('_metrics_started')
+            if started:
+                started.pop()
+
+        event.listen(engine, 'before_cursor_execute', before)
+        event.listen(engine, 'after_cursor_execute', after)
+        event.listen(engine, 'handle_error', failed)
+
+    # Upstream
+
+    def wrap_upstream(self, client):
+        """Proxy an Alpaca client so its calls are timed and errors counted"""
+        return UpstreamMetricsProxy(client, self)
+
+    def watch_breakers(self, breakers: Dict[str, object]):
+        """Export the state of an UpstreamGuard's circuit breakers"""
+        self._breakers = breakers
+
+    def _collect_breakers(self):
+        from .upstream_guard import STATE_VALUES
+        return [((endpoint,), STATE_VALUES[breaker.state]) for endpoint, breaker in self._breakers.items()]
+
+    def record_fallback(self, endpoint: str, reason: str):
+        if self.enabled:
+            self.fallbacks.inc(endpoint=endpoint, reason=reason)
+
+    def record_revalidation(self, endpoint: str, outcome: str):
+        if self.enabled:
+            self.revalidations.inc(endpoint=endpoint, outcome=outcome)
+
+    # Refresher
+
+    def record_refresh(self, duration: float, outcome: str, symbols: Iterable[str] = ()):
+        if not self.enabled:
+            return
+        self.refresh_latency.observe(duration, outcome=outcome)
+        now = self._clock()
+        updated = 0
+        for symbol in symbols:
+            self._symbol_updated[symbol] = now
+            updated += 1
+        if outcome == 'ok':
+            self.refresh_symbols.set(updated)
+
+    def _collect_staleness(self):
+        now = self._clock()
+        return [((symbol,), round(now - updated, 3)) for symbol, updated in list(self._symbol_updated.items())]
+
+    def record_alerts(self, fired: int):
+        if self.enabled and fired:
+            self.alerts_fired.inc(fired)
+
+    def record_revaluation(self, duration: float, positions: int):
+        if self.enabled:
+            self.revaluation_latency.observe(duration)
+            self.portfolio_positions.set(positions)
+
+    # Quote cache
+
+    def record_cache_lookup(self, result: str):
+        if self.enabled:
+            self.cache_lookups.inc(result=result)
+
+
+class UpstreamMetricsProxy:
+    """Transparent proxy timing the upstream methods it wraps"""
+
+    def __init__(self, inner, metrics: AppMetrics):
+        # Imported here: upstream_capture pulls in pandas
+        from .upstream_capture import RECORDED_METHODS
+        self._inner = inner
+        self._metrics = metrics
+        self._methods = RECORDED_METHODS
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        metrics = self._metrics
+
+        def timed(*args, **kwargs):
+            if not metrics.enabled:
+                return attr(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                metrics.upstream_errors.inc(endpoint=name, error=type(e).__name__)
+                raise
+            finally:
+                metrics.upstream_latency.observe(time.perf_counter() - started, endpoint=name)
+
+        return timed
@@ -1,9 +1,16 @@
 """Mock Alpaca services for simulation mode"""
-import random
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
 from dataclasses import dataclass
 from typing import Dict, List, Optional
+from .fault_injection import FaultInjector
+
+# Largest synthetic universe we support; keeps state arrays well under 10 MB
+MAX_UNIVERSE_SIZE = 50000
+
+# Trading minutes in a regular US equity session
+SESSION_MINUTES = 390
 
 @dataclass
 class MockAsset:
@@ -18,113 +25,237 @@ class MockAsset:
     shortable: bool = True
     easy_to_borrow: bool = True
     fractionable: bool = True
-    
+
     def __init__(self, symbol: str, name: str):
         self.symbol = symbol
         self.name = name
 
+# Well-known assets that are always part of the universe, with realistic base prices
+NAMED_ASSETS = [
+    ('AAPL', 'Apple Inc.', 175.0),
+    ('GOOGL', 'Alphabet Inc.', 140.0),
+    ('MSFT', 'Microsoft Corporation', 400.0),
+    ('AMZN', 'Amazon.com Inc.', 175.0),
+    ('META', 'Meta Platforms Inc.', 485.0),
+    ('SPY', 'SPDR S&P 500 ETF Trust', 510.0),
+    ('DIA', 'SPDR Dow Jones Industrial Average ETF', 385.0),
+    ('QQQ', 'Invesco QQQ Trust', 430.0),
+    ('IWM', 'iShares Russell 2000 ETF', 200.0),
+]
+
+def _synthetic_tickers(count: int, taken: set) -> List[str]:
+    """Generate deterministic four-letter tickers that don't clash with real ones"""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    tickers = []
+    n = 0
+    while len(tickers) < count:
+        code, value = [], n
+        for _ in range(4):
+            value, digit = divmod(value, 26)
+            code.append(letters[digit])
+        ticker = 'X' + ''.join(reversed(code))
+        if ticker not in taken:
+            tickers.append(ticker)
+        n += 1
+    return tickers
+
 class MockAlpacaService:
-    """Mock Alpaca service that simulates stock price movements"""
-    
-    def __init__(self):
-        self._prices: Dict[str, float] = {}
-        self._previous_closes: Dict[str, float] = {}
-        self._assets = {
-            'AAPL': MockAsset('AAPL', 'Apple Inc.'),
-            'GOOGL': MockAsset('GOOGL', 'Alphabet Inc.'),
-            'MSFT': MockAsset('MSFT', 'Microsoft Corporation'),
-            'AMZN': MockAsset('AMZN', 'Amazon.com Inc.'),
-            'META': MockAsset('META', 'Meta Platforms Inc.'),
-            'SPY': MockAsset('SPY', 'SPDR S&P 500 ETF Trust'),
-            'DIA': MockAsset('DIA', 'SPDR Dow Jones Industrial Average ETF'),
-            'QQQ': MockAsset('QQQ', 'Invesco QQQ Trust'),
-            'IWM': MockAsset('IWM', 'iShares Russell 2000 ETF')
-        }
-        
-        # Initialize with some realistic base prices
-        self._base_prices = {
-            'AAPL': 175.0,
-            'GOOGL': 140.0,
-            'MSFT': 400.0,
-            'AMZN': 175.0,
-            'META': 485.0,
-            'SPY': 510.0,
-            'DIA': 385.0,
-            'QQQ': 430.0,
-            'IWM': 200.0
-        }
-        
+    """Mock Alpaca service that simulates stock price movements
+
+    Prices follow a one-factor geometric Brownian motion with mean reversion
+    towards each symbol's base price: every step draws one market shock shared
+    by all symbols plus an idiosyncratic shock per symbol. All state lives in
+    NumPy arrays so a step costs the same handful of array operations whether
+    the universe holds nine symbols or fifty thousand.
+
+    An optional ``FaultInjector`` adds latency, errors, throttling and gaps
+    in symbol coverage to every upstream-style call.
+    """
+
+    def __init__(self, universe_size: int = 0, seed: Optional[int] = None,
+                 faults: Optional[FaultInjector] = None):
+        if universe_size > MAX_UNIVERSE_SIZE:
+            raise ValueError(f"Simulation universe is limited to {MAX_UNIVERSE_SIZE} symbols")
+
+        self._rng = np.random.default_rng(seed)
+        self.faults = faults
+
+        # Named assets first, then synthetic ones up to the requested size
+        symbols = [symbol for symbol, _, _ in NAMED_ASSETS]
+        names = [name for _, name, _ in NAMED_ASSETS]
+        base_prices = [price for _, _, price in NAMED_ASSETS]
+
+        synthetic_count = max(0, universe_size - len(symbols))
+        if synthetic_count:
+            tickers = _synthetic_tickers(synthetic_count, set(symbols))
+            symbols.extend(tickers)
+            names.extend(f"{ticker} Holdings Inc." for ticker in tickers)
+            # Log-normal spread of prices, roughly $5 - $500
+            base_prices.extend(np.exp(self._rng.uniform(np.log(5.0), np.log(500.0), synthetic_count)).round(2))
+
+        count = len(symbols)
+        self._symbols = np.array(symbols, dtype=object)
+        self._names = dict(zip(symbols, names))
+        self._slots = {symbol: i for i, symbol in enumerate(symbols)}
+        self._assets: Optional[Dict[str, MockAsset]] = None
+
+        self._base_prices = np.asarray(base_prices, dtype=np.float64)
+        # Per-step volatility, loading on the market factor and mean reversion speed
+        self._volatility = self._rng.uniform(0.005, 0.012, count)
+        self._market_beta = self._rng.uniform(0.3, 0.9, count)
+        self._reversion = 0.1
+
         # Initialize current prices and previous closes
-        for symbol, price in self._base_prices.items():
-            self._prices[symbol] = price
-            self._previous_closes[symbol] = price * (1 + random.uniform(-0.02, 0.02))
-    
-    def _simulate_price_movement(self, symbol: str) -> float:
-        """Simulate a price movement for a stock"""
-        current_price = self._prices[symbol]
-        base_price = self._base_prices[symbol]
-        
-        # Calculate maximum allowed movement (more volatile for higher-priced stocks)
-        max_movement = current_price * 0.02  # 2% maximum movement
-        
-        # Add mean reversion tendency
-        reversion_force = (base_price - current_price) * 0.1
-        
-        # Generate random movement with mean reversion
-        movement = random.uniform(-max_movement, max_movement) + reversion_force
-        
-        # Update price
-        new_price = round(current_price + movement, 2)
-        
+        self._prices = self._base_prices.copy()
+        self._previous_closes = (self._base_prices * (1 + self._rng.uniform(-0.02, 0.02, count))).round(2)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def _upstream_call(self, endpoint: str, symbols: Optional[List[str]] = None) -> Optional[List[str]]:
+        """Apply injected faults for one call and return the symbols the upstream covers"""
+        if self.faults is None:
+            return symbols
+        self.faults.before_call(endpoint)
+        return None if symbols is None else self.faults.filter_symbols(symbols)
+
+    def _slots_for(self, symbols: List[str]) -> np.ndarray:
+        """Map symbols to state slots, dropping unknown and duplicate symbols"""
+        slots = self._slots
+        return np.fromiter(
+            (slots[symbol] for symbol in dict.fromkeys(symbols) if symbol in slots),
+            dtype=np.intp
+        )
+
+    def _shocks(self, slots: np.ndarray, shape: tuple) -> np.ndarray:
+        """Correlated standard normal shocks: shared market factor plus idiosyncratic noise"""
+        beta = self._market_beta[slots].reshape((-1,) + (1,) * (len(shape) - 1))
+        market = self._rng.standard_normal(shape[1:] or ())
+        idiosyncratic = self._rng.standard_normal(shape)
+        return beta * market + np.sqrt(1 - beta ** 2) * idiosyncratic
+
+    def _simulate_price_movement(self, slots: np.ndarray) -> np.ndarray:
+        """Simulate one price movement for the given slots"""
+        current = self._prices[slots]
+        base = self._base_prices[slots]
+        sigma = self._volatility[slots]
+
+        # Mean-reverting GBM step in log space
+        log_price = np.log(current)
+        log_price += self._reversion * (np.log(base) - log_price)
+        log_price += sigma * self._shocks(slots, (len(slots),)) - 0.5 * sigma ** 2
+
         # Ensure price doesn't go too far from base price (±20%)
-        min_price = base_price * 0.8
-        max_price = base_price * 1.2
-        new_price = max(min_price, min(max_price, new_price))
-        
-        return new_price
+        return np.clip(np.exp(log_price).round(2), base * 0.8, base * 1.2)
 
     def get_stock_bars(self, symbols: List[str]) -> pd.DataFrame:
         """Get simulated stock bars data"""
-        data = []
-        now = datetime.now(timezone.utc)
-        yesterday = now - timedelta(days=1)
-        
-        for symbol in symbols:
-            if symbol in self._assets:
-                # Update the price
-                new_price = self._simulate_price_movement(symbol)
-                self._previous_closes[symbol] = self._prices[symbol]
-                self._prices[symbol] = new_price
-                
-                # Add current and previous day's data
-                data.extend([
-                    {
-                        'symbol': symbol,
-                        'timestamp': yesterday,
-                        'close': self._previous_closes[symbol]
-                    },
-                    {
-                        'symbol': symbol,
-                        'timestamp': now,
-                        'close': new_price
-                    }
-                ])
-        
-        if not data:
+        symbols = self._upstream_call('bars', symbols)
+        slots = self._slots_for(symbols)
+        if not len(slots):
             return pd.DataFrame()
-        
-        df = pd.DataFrame(data)
-        return df.set_index(['symbol', 'timestamp'])
-    
+
+        # Update the prices
+        new_prices = self._simulate_price_movement(slots)
+        self._previous_closes[slots] = self._prices[slots]
+        self._prices[slots] = new_prices
+
+        # Current and previous day's close per symbol, built column-wise
+        now = pd.Timestamp(datetime.now(timezone.utc))
+        times = pd.DatetimeIndex([now - pd.Timedelta(days=1), now])
+        closes = np.empty(2 * len(slots))
+        closes[0::2] = self._previous_closes[slots]
+        closes[1::2] = new_prices
+
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(self._symbols[slots], 2), times[np.tile([0, 1], len(slots))]],
+            names=['symbol', 'timestamp']
+        )
+        return pd.DataFrame({'close': closes}, index=index)
+
+    def get_intraday_bars(self, symbols: List[str], bars: int = SESSION_MINUTES,
+                          timeframe_minutes: int = 1, end: Optional[datetime] = None) -> pd.DataFrame:
+        """Get simulated intraday OHLCV bars ending at each symbol's current price
+
+        Generates a (symbols x bars) path matrix in one shot; does not move the
+        live prices returned by ``get_stock_bars``.
+        """
+        symbols = self._upstream_call('bars', symbols)
+        slots = self._slots_for(symbols)
+        if not len(slots) or bars <= 0:
+            return pd.DataFrame()
+
+        if end is None:
+            end = datetime.now(timezone.utc)
+        end = pd.Timestamp(end).floor(f"{timeframe_minutes}min")
+        times = pd.date_range(end=end, periods=bars, freq=f"{timeframe_minutes}min")
+        # Scale per-session volatility down to the bar interval
+        return self._bar_frame(slots, times, SESSION_MINUTES / timeframe_minutes)
+
+    def get_daily_bars(self, symbols: List[str], days: int = 252,
+                       end: Optional[datetime] = None) -> pd.DataFrame:
+        """Get simulated daily OHLCV bars for the last ``days`` weekdays
+
+        Bars are stamped at midnight America/New_York, as Alpaca's are, and
+        end at each symbol's current price.
+        """
+        symbols = self._upstream_call('bars', symbols)
+        slots = self._slots_for(symbols)
+        if not len(slots) or days <= 0:
+            return pd.DataFrame()
+
+        if end is None:
+            end = datetime.now(timezone.utc)
+        session = pd.Timestamp(end).tz_convert('America/New_York').normalize().tz_localize(None)
+        times = pd.bdate_range(end=session, periods=days).tz_localize('America/New_York').tz_convert('UTC')
+        return self._bar_frame(slots, times, 1.0)
+
+    def _bar_frame(self, slots: np.ndarray, times: pd.DatetimeIndex, steps_per_session: float) -> pd.DataFrame:
+        """OHLCV paths for ``slots`` at ``times``, anchored so the last close is the current price"""
+        bars = len(times)
+        sigma = (self._volatility[slots] / np.sqrt(steps_per_session))[:, None]
+        returns = sigma * self._shocks(slots, (len(slots), bars))
+
+        cumulative = np.cumsum(returns, axis=1)
+        log_close = np.log(self._prices[slots])[:, None] - (cumulative[:, -1:] - cumulative)
+        close = np.exp(log_close)
+        open_ = np.exp(log_close - returns)
+        wick = np.abs(self._rng.standard_normal((2, len(slots), bars))) * sigma * 0.5
+        high = np.maximum(open_, close) * np.exp(wick[0])
+        low = np.minimum(open_, close) * np.exp(-wick[1])
+        volume = self._rng.lognormal(mean=8.0, sigma=1.0, size=(len(slots), bars)).round()
+        volume *= max(1.0, SESSION_MINUTES / steps_per_session)
+
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(self._symbols[slots], bars), times[np.tile(np.arange(bars), len(slots))]],
+            names=['symbol', 'timestamp']
+        )
+        return pd.DataFrame({
+            'open': open_.round(2).ravel(),
+            'high': high.round(2).ravel(),
+            'low': low.round(2).ravel(),
+            'close': close.round(2).ravel(),
+            'volume': volume.ravel()
+        }, index=index)
+
     def get_assets(self) -> List[MockAsset]:
         """Get list of available assets"""
+        self._upstream_call('assets')
+        if self._assets is None:
+            self._assets = {symbol: MockAsset(symbol, name) for symbol, name in self._names.items()}
         return list(self._assets.values())
-    
+
+    def get_asset_names(self) -> Dict[str, str]:
+        """Get symbol -> company name for every simulated asset"""
+        self._upstream_call('assets')
+        return self._names
+
     def get_news(self, symbols: Optional[List[str]] = None) -> List[Dict]:
         """Get simulated news articles"""
         if symbols is None:
-            symbols = list(self._assets.keys())
-        
+            symbols = list(self._names.keys())
+        symbols = self._upstream_call('news', symbols)
+
         # Generate some random news
         headlines = [
             "Company Reports Strong Quarterly Results",
@@ -136,17 +267,23 @@ class MockAlpacaService:
             "Expansion Plans Revealed",
             "Industry Recognition Achievement"
         ]
-        
+
+        known = [symbol for symbol in symbols if symbol in self._names]
+        has_news = self._rng.random(len(known)) < 0.3  # 30% chance of news
+        choices = self._rng.integers(0, len(headlines), len(known))
+        updated_at = datetime.now().isoformat()
+
         news_articles = []
-        for symbol in symbols:
-            if symbol in self._assets and random.random() < 0.3:  # 30% chance of news
+        for symbol, flag, choice in zip(known, has_news, choices):
+            if flag:
+                name = self._names[symbol]
                 news_articles.append({
-                    'headline': f"{self._assets[symbol].name} {random.choice(headlines)}",
-                    'summary': f"Latest updates about {self._assets[symbol].name} and its market performance.",
+                    'headline': f"{name} {headlines[choice]}",
+                    'summary': f"Latest updates about {name} and its market performance.",
                     'author': "Market Analyst",
                     'url': f"http://example.com/news/{symbol.lower()}",
-                    'updated_at': datetime.now().isoformat(),
+                    'updated_at': updated_at,
                     'symbols': [symbol]
                 })
-        
-        return news_articles 
\ No newline at end of file
+
+        return news_articles
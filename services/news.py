@@ -0,0 +1,151 @@
+"""Stored news: articles kept in the database, paged newest first and searchable
+
+Articles fetched from upstream are saved once each, keyed by their upstream
+id, in ``news_articles``, with one ``news_symbols`` row per symbol they
+mention. That table's key, (symbol, published_at, article_id), is the index
+a symbol's articles are read from, so a page costs the same however many
+articles are stored. Pages continue from a ``before`` cursor, the position
+of the last article shown, rather than an offset. Text search goes through
+the ``news_fts`` FTS5 index on SQLite (see models.py).
+"""
+import hashlib
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from sqlalchemy import or_, select, text, tuple_
+
+from models import NewsArticle, NewsSymbol, db
+
+from .inserts import insert_ignoring_duplicates
+from .quotes import to_utc_datetime
+
+_WORD = re.compile(r'\w+')
+Cursor = Tuple[int, int]
+
+
+def article_uid(article: Mapping[str, Any]) -> str:
+    """The upstream id, or a hash of the url and headline for sources without one"""
+    if article.get('id') is not None:
+        return str(article['id'])
+    key = f"{article.get('url') or ''}\n{article.get('headline') or ''}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def published_ts(article: Mapping[str, Any]) -> int:
+    """Epoch seconds the article was published, falling back to its last update"""
+    published = article.get('created_at') or article.get('updated_at')
+    return int(to_utc_datetime(published).timestamp()) if published else int(datetime.utcnow().timestamp())
+
+
+def encode_cursor(row: NewsArticle) -> str:
+    return f"{row.published_at}-{row.id}"
+
+
+def parse_cursor(before: str) -> Cursor:
+    """``"<epoch>-<id>"`` as returned with a page, or just ``"<epoch>"``; ValueError otherwise"""
+    ts, _, article_id = before.partition('-')
+    # With no id, everything published at that second is still to come
+    return int(ts), int(article_id) if article_id else 0
+
+
+def match_query(query: str) -> Optional[str]:
+    """An FTS5 query matching articles with every word of ``query`` as a word prefix"""
+    words = _WORD.findall(query.lower())
+    return ' '.join(f'"{word}"*' for word in words) if words else None
+
+
+def save_articles(articles: Iterable[Mapping[str, Any]]) -> int:
+    """Store articles not seen before, with their symbols; returns how many were new. The caller commits."""
+    rows = {}
+    for article in articles:
+        if not article.get('headline'):
+            continue
+        images = article.get('images') or []
+        symbols = [str(symbol).upper() for symbol in dict.fromkeys(article.get('symbols') or [])]
+        rows.setdefault(article_uid(article), {
+            'headline': article['headline'][:500],
+            'summary': article.get('summary'),
+            'author': (article.get('author') or '')[:200] or None,
+            'url': article.get('url'),
+            'image_url': (images[0].get('url') if isinstance(images[0], Mapping) else None) if images else None,
+            'symbols': ','.join(symbols),
+            'published_at': published_ts(article),
+        })
+    if not rows:
+        return 0
+
+    uids = list(rows)
+    known = set()
+    for start in range(0, len(uids), 500):
+        known.update(db.session.execute(
+            select(NewsArticle.uid).where(NewsArticle.uid.in_(uids[start:start + 500]))).scalars())
+    new = [uid for uid in uids if uid not in known]
+    if not new:
+        return 0
+    insert_ignoring_duplicates(NewsArticle.__table__, [dict(rows[uid], uid=uid) for uid in new], ['uid'])
+
+    links = []
+    for start in range(0, len(new), 500):
+        for article_id, uid in db.session.execute(
+                select(NewsArticle.id, NewsArticle.uid).where(NewsArticle.uid.in_(new[start:start + 500]))):
+            row = rows[uid]
+            links.extend({'symbol': symbol, 'published_at': row['published_at'], 'article_id': article_id}
+                         for symbol in row['symbols'].split(',') if symbol)
+    if links:
+        insert_ignoring_duplicates(NewsSymbol.__table__, links, ['symbol', 'published_at', 'article_id'])
+    return len(new)
+
+
+def page(symbol: Optional[str] = None, query: Optional[str] = None, before: Optional[Cursor] = None,
+         limit: int = 20) -> Tuple[List[NewsArticle], Optional[str]]:
+    """Newest articles first, optionally for one symbol and/or matching ``query``
+
+    Returns the articles and the cursor for the next page, None on the last.
+    """
+    if symbol:
+        # Walk the symbol's index and join each entry to its article
+        ts, article_id = NewsSymbol.published_at, NewsSymbol.article_id
+        statement = (select(NewsArticle).join(NewsSymbol, NewsSymbol.article_id == NewsArticle.id)
+                     .where(NewsSymbol.symbol == symbol.upper()))
+    else:
+        ts, article_id = NewsArticle.published_at, NewsArticle.id
+        statement = select(NewsArticle)
+
+    if query:
+        if db.engine.dialect.name == 'sqlite':
+            terms = match_query(query)
+            if terms is None:
+                return [], None
+            statement = statement.where(NewsArticle.id.in_(
+                text('SELECT rowid FROM news_fts WHERE news_fts MATCH :terms').bindparams(terms=terms)))
+        else:
+            words = _WORD.findall(query)
+            if not words:
+                return [], None
+            for word in words:
+                pattern = f"%{word}%"
+                statement = statement.where(or_(NewsArticle.headline.ilike(pattern),
+                                                NewsArticle.summary.ilike(pattern)))
+    if before is not None:
+        statement = statement.where(tuple_(ts, article_id) < tuple_(*before))
+
+    rows = db.session.execute(statement.order_by(ts.desc(), article_id.desc()).limit(limit + 1)).scalars().all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+def to_dict(article: NewsArticle) -> Dict[str, Any]:
+    """An article in the shape upstream returns them, as the templates expect"""
+    return {
+        'id': article.id,
+        'headline': article.headline,
+        'summary': article.summary,
+        'author': article.author,
+        'url': article.url,
+        'images': [{'url': article.image_url}] if article.image_url else [],
+        'symbols': article.symbols.split(',') if article.symbols else [],
+        'published_at': datetime.utcfromtimestamp(article.published_at).isoformat() + 'Z',
+        'updated_at': datetime.utcfromtimestamp(article.published_at).isoformat() + 'Z',
+    }
@@ -0,0 +1,145 @@
+"""Multi-period performance: 1-week, 1-month and year-to-date returns and the 52-week range
+
+The slow-moving part is the anchors: each symbol's close a week and a month
+ago, its last close of the previous year, and the high and low of its
+completed daily bars over the past 52 weeks. They only change when a session
+completes, so :func:`compute_anchors` builds them once per session for every
+symbol in one vectorized pass over the stored daily bars. :func:`summarize`
+then turns anchors and current prices into the displayed figures for all
+symbols at once, which is cheap enough to do every refresh cycle.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .bars import NEW_YORK, Bars
+
+# Stored per symbol and session; prior_* exclude the session in progress
+ANCHORS = ('close_1w', 'close_1m', 'close_ytd', 'prior_high', 'prior_low')
+# Derived from the anchors and the current price
+FIELDS = ('change_1w', 'change_1m', 'change_ytd', 'high_52w', 'low_52w')
+# Daily bars to load: enough to reach back to the previous year's last close
+SPAN = timedelta(days=372)
+
+
+def _midnight(year: int, month: int, day: int) -> int:
+    return int(NEW_YORK.localize(datetime(year, month, day)).timestamp())
+
+
+def bounds(today: int) -> Tuple[int, int, int, int]:
+    """For the session starting at ``today``: the session starts that the 1W, 1M and YTD
+    reference closes come before, and the start of the 52-week window
+
+    A week ago means the same weekday last week, so the reference is that
+    day's close, or the last one before it after a holiday.
+    """
+    local = datetime.fromtimestamp(today, timezone.utc).astimezone(NEW_YORK)
+    week = local.date() - timedelta(days=6)
+    # A year back from February 29 starts on the 28th
+    year_ago = local.date().replace(year=local.year - 1, day=28 if (local.month, local.day) == (2, 29) else local.day)
+    year, month = (local.year, local.month - 1) if local.month > 1 else (local.year - 1, 12)
+    # The same day last month, or that month's last day if it is shorter
+    last_day = (datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+    month_ago = datetime(year, month, min(local.day, last_day)) + timedelta(days=1)
+    return (
+        _midnight(week.year, week.month, week.day),
+        _midnight(month_ago.year, month_ago.month, month_ago.day),
+        _midnight(local.year, 1, 1),
+        _midnight(year_ago.year, year_ago.month, year_ago.day),
+    )
+
+
+def compute_anchors(series: Dict[str, Bars], today: int) -> Tuple[List[str], np.ndarray]:
+    """Anchors for every symbol with bars, from its daily bars before ``today``
+
+    Returns the symbols and a (symbols x ANCHORS) matrix; an anchor is NaN
+    when the history doesn't reach back far enough. All symbols' bars are
+    concatenated, so each anchor is one ``searchsorted`` or ``reduceat``
+    over the whole batch rather than a loop per symbol.
+    """
+    parts = [(symbol, bars) for symbol, bars in series.items() if len(bars) and bars.ts[0] < today]
+    symbols = [symbol for symbol, _ in parts]
+    anchors = np.full((len(symbols), len(ANCHORS)), np.nan)
+    if not symbols:
+        return symbols, anchors
+
+    lengths = np.array([len(bars) for _, bars in parts])
+    firsts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    ts, close, high, low = (np.concatenate([getattr(bars, name) for _, bars in parts])
+                            for name in ('ts', 'close', 'high', 'low'))
+    # Bar starts are well below 2**40, so this key sorts by symbol, then time
+    segment = np.repeat(np.arange(len(symbols), dtype=np.int64), lengths)
+    key = (segment << 40) + ts
+    base = np.arange(len(symbols), dtype=np.int64) << 40
+
+    week, month, year, window = bounds(today)
+    for column, bound in enumerate((week, month, year)):
+        last = np.searchsorted(key, base + bound) - 1
+        found = last >= firsts
+        anchors[found, column] = close[last[found]]
+
+    recent = (ts >= window) & (ts < today)
+    anchors[:, 3] = np.maximum.reduceat(np.where(recent, high, -np.inf), firsts)
+    anchors[:, 4] = np.minimum.reduceat(np.where(recent, low, np.inf), firsts)
+    anchors[~np.isfinite(anchors)] = np.nan
+    return symbols, anchors
+
+
+def summarize(anchors: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    """(symbols x FIELDS) figures at ``prices``: returns in percent, and the
+    52-week range widened by the current price; NaN where unknown"""
+    prices = np.asarray(prices, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = (prices[:, None] / anchors[:, :3] - 1.0) * 100.0
+    changes[~np.isfinite(changes)] = np.nan
+    high = np.fmax(anchors[:, 3], prices)
+    low = np.fmin(anchors[:, 4], prices)
+    return np.column_stack((changes, high, low))
+
+
+def summary_rows(prices: Dict[str, float], stored: Dict[str, Tuple], today: int,
+                 load: Callable[[List[str]], Dict[str, Bars]]) -> Tuple[List[dict], List[dict]]:
+    """New and changed ``performance_summaries`` rows for symbols at ``prices``
+
+    ``stored`` maps symbols to their saved ``(session, price, *ANCHORS)``.
+    Symbols without anchors for the ``today`` session get new ones from
+    ``load(symbols)``, their daily bars; the rest keep theirs, NaN included
+    where the history is too short, until the session rolls over. Only rows
+    whose anchors or price changed are returned, as (inserts, updates); an
+    update that keeps its anchors leaves out ``session`` and ``ANCHORS``.
+    """
+    symbols = list(prices)
+    positions = {symbol: i for i, symbol in enumerate(symbols)}
+    anchors = np.full((len(symbols), len(ANCHORS)), np.nan)
+    previous = np.full(len(symbols), np.nan)
+    stale = []
+    for i, symbol in enumerate(symbols):
+        row = stored.get(symbol)
+        if row is None or row[0] != today:
+            stale.append(symbol)
+        else:
+            anchors[i] = np.array(row[2:], dtype=np.float64)
+            previous[i] = row[1]
+    if stale:
+        for symbol, values in zip(*compute_anchors(load(stale), today)):
+            anchors[positions[symbol]] = values
+
+    current = np.array([prices[symbol] for symbol in symbols], dtype=np.float64)
+    figures = summarize(anchors, current)
+    changed = current != previous
+    renewed = set(stale)
+    inserts, updates = [], []
+    for i in np.flatnonzero(changed).tolist():
+        symbol = symbols[i]
+        row = {'symbol': symbol, 'price': float(current[i])}
+        if symbol in renewed:
+            row['session'] = today
+            row.update(zip(ANCHORS, _nullable(anchors[i])))
+        row.update(zip(FIELDS, _nullable(figures[i])))
+        (updates if symbol in stored else inserts).append(row)
+    return inserts, updates
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if value != value else value for value in values.tolist()]
@@ -0,0 +1,222 @@
+"""Holdings valuation for every user in one vectorized pass
+
+Lots are aggregated into positions, one row per (user, symbol), held as
+parallel NumPy arrays sorted by user. A revaluation gathers each position's
+price from a symbol-aligned price array and sums per user with ``bincount``,
+so the whole user base costs a handful of array operations however many
+users there are. Results are cached per (holdings revision, data version):
+the refresher revalues once per cycle and requests only read the result.
+"""
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Percentages with 0 where the denominator is 0"""
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out * 100.0
+
+
+class PositionBook:
+    """Positions aggregated from lots, sorted by user"""
+
+    def __init__(self, users: np.ndarray, symbol_codes: np.ndarray, symbols: List[str],
+                 quantity: np.ndarray, cost: np.ndarray):
+        self.users = users
+        self.symbol_codes = symbol_codes
+        self.symbols = symbols
+        self.quantity = quantity
+        # Total cost of the position, not per share
+        self.cost = cost
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    @classmethod
+    def from_lots(cls, lots: Iterable[Tuple[int, str, float, float]]) -> 'PositionBook':
+        """Build from ``(user_id, symbol, quantity, unit_cost)`` rows"""
+        lots = list(lots)
+        if not lots:
+            empty = np.empty(0)
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), [], empty, empty)
+        users, symbols, quantity, unit_cost = zip(*lots)
+        users = np.asarray(users, dtype=np.int64)
+        quantity = np.asarray(quantity, dtype=np.float64)
+        cost = quantity * np.asarray(unit_cost, dtype=np.float64)
+        codes: Dict[str, int] = {}
+        symbol_codes = np.fromiter((codes.setdefault(symbol, len(codes)) for symbol in symbols),
+                                   dtype=np.int64, count=len(lots))
+
+        # One position per (user, symbol); np.unique sorts by user first
+        keys = users * len(codes) + symbol_codes
+        position_keys, position = np.unique(keys, return_inverse=True)
+        return cls(
+            position_keys // len(codes),
+            position_keys % len(codes),
+            list(codes),
+            np.bincount(position, weights=quantity, minlength=len(position_keys)),
+            np.bincount(position, weights=cost, minlength=len(position_keys)),
+        )
+
+
+class Valuation:
+    """Per-position and per-user values for one book and one set of prices"""
+
+    def __init__(self, book: PositionBook, prices: np.ndarray, previous_closes: np.ndarray,
+                 version: Hashable = None):
+        self.book = book
+        self.version = version
+        self.computed_at = time.time()
+
+        codes = book.symbol_codes
+        price = prices[codes]
+        previous = previous_closes[codes]
+        priced = ~np.isnan(price)
+        previous = np.where(np.isnan(previous), price, previous)
+        # Unpriced positions count at cost with no day change
+        self.priced = priced
+        self.market_value = np.where(priced, book.quantity * price, book.cost)
+        self.day_change = np.where(priced, book.quantity * (price - previous), 0.0)
+        self.unrealized = self.market_value - book.cost
+        self.prices = price
+
+        # Positions are sorted by user, so each user's rows are one run
+        if len(book):
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(book.users)) + 1))
+        else:
+            starts = np.empty(0, dtype=np.int64)
+        self.user_ids = book.users[starts]
+        self._starts = np.append(starts, len(book))
+        users = len(self.user_ids)
+        user_index = np.repeat(np.arange(users), np.diff(self._starts))
+        self.user_value = np.bincount(user_index, weights=self.market_value, minlength=users)
+        self.user_cost = np.bincount(user_index, weights=book.cost, minlength=users)
+        self.user_day_change = np.bincount(user_index, weights=self.day_change, minlength=users)
+        self.user_unpriced = np.bincount(user_index, weights=~priced, minlength=users).astype(np.int64)
+
+    def _user(self, user_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return i
+        return None
+
+    def __contains__(self, user_id: int) -> bool:
+        return self._user(user_id) is not None
+
+    def summary(self, user_id: int) -> Optional[Dict]:
+        """Totals for one user, or None if they hold nothing"""
+        i = self._user(user_id)
+        if i is None:
+            return None
+        value, cost, day = float(self.user_value[i]), float(self.user_cost[i]), float(self.user_day_change[i])
+        return {
+            'market_value': value,
+            'cost_basis': cost,
+            'unrealized_pnl': value - cost,
+            'unrealized_pnl_percent': float(_ratio(np.array([value - cost]), np.array([cost]))[0]),
+            'day_change': day,
+            'day_change_percent': float(_ratio(np.array([day]), np.array([value - day]))[0]),
+            'positions': int(self._starts[i + 1] - self._starts[i]),
+            'unpriced': int(self.user_unpriced[i]),
+        }
+
+    def positions(self, user_id: int) -> List[Dict]:
+        """One dict per symbol the user holds"""
+        i = self._user(user_id)
+        if i is None:
+            return []
+        book = self.book
+        sl = slice(self._starts[i], self._starts[i + 1])
+        cost_pct = _ratio(self.unrealized[sl], book.cost[sl])
+        return [
+            {
+                'symbol': book.symbols[code],
+                'quantity': float(quantity),
+                'cost_basis': float(cost),
+                'price': None if np.isnan(price) else float(price),
+                'market_value': float(value),
+                'day_change': float(day),
+                'unrealized_pnl': float(pnl),
+                'unrealized_pnl_percent': float(pct),
+            }
+            for code, quantity, cost, price, value, day, pnl, pct in zip(
+                book.symbol_codes[sl], book.quantity[sl], book.cost[sl], self.prices[sl],
+                self.market_value[sl], self.day_change[sl], self.unrealized[sl], cost_pct)
+        ]
+
+
+def prices_from_table(quote_table, symbols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Price and previous close per symbol from one quote table snapshot
+
+    NaN where a symbol is not in the table, or for all of them without one.
+    """
+    prices = np.full(len(symbols), np.nan)
+    previous = np.full(len(symbols), np.nan)
+    if quote_table is None or not symbols:
+        return prices, previous
+    try:
+        rows = quote_table.snapshot()
+    except TimeoutError:
+        return prices, previous
+    slots = np.array([-1 if slot is None else slot for slot in map(quote_table.slot, symbols)],
+                     dtype=np.int64)
+    present = (slots >= 0) & (slots < len(rows))
+    present[present] = rows['version'][slots[present]] > 0
+    prices[present] = rows['price'][slots[present]]
+    previous[present] = rows['previous_close'][slots[present]]
+    return prices, previous
+
+
+class PortfolioValuer:
+    """Valuation of all holdings, cached per holdings revision and data version
+
+    ``load_lots`` returns ``(user_id, symbol, quantity, unit_cost)`` rows,
+    ``load_prices`` maps the book's symbols to price and previous-close
+    arrays, ``revision`` identifies the current holdings (cheap to read) and
+    ``version`` the current prices, as in FragmentCache.
+    """
+
+    def __init__(self, load_lots: Callable[[], Iterable[Tuple[int, str, float, float]]],
+                 load_prices: Callable[[List[str]], Tuple[np.ndarray, np.ndarray]],
+                 revision: Callable[[], Hashable], version: Optional[Callable[[], Hashable]] = None):
+        self._load_lots = load_lots
+        self._load_prices = load_prices
+        self._revision = revision
+        self._shared_version = version
+        self._generation = 0
+        self._book: Optional[PositionBook] = None
+        self._book_revision: Hashable = None
+        self._valuation: Optional[Valuation] = None
+        self._lock = threading.Lock()
+        self.last_duration: Optional[float] = None
+
+    def version(self) -> Hashable:
+        shared = self._shared_version() if self._shared_version is not None else None
+        return (self._generation, shared)
+
+    def invalidate(self):
+        """Prices changed; the next read revalues"""
+        self._generation += 1
+
+    def valuation(self) -> Valuation:
+        """The current valuation, recomputed at most once per version"""
+        key = (self._revision(), self.version())
+        valuation = self._valuation
+        if valuation is not None and valuation.version == key:
+            return valuation
+        with self._lock:
+            valuation = self._valuation
+            if valuation is not None and valuation.version == key:
+                return valuation
+            started = time.perf_counter()
+            if self._book is None or self._book_revision != key[0]:
+                self._book = PositionBook.from_lots(self._load_lots())
+                self._book_revision = key[0]
+            prices, previous = self._load_prices(self._book.symbols)
+            self._valuation = Valuation(self._book, prices, previous, key)
+            self.last_duration = time.perf_counter() - started
+            return self._valuation
@@ -0,0 +1,203 @@
+"""On-demand profiling of requests and refresh cycles
+
+An admin arms the profiler for the next N requests to one route, or for the
+next refresh cycle. Each captured run is written to ``output_dir`` as either:
+
+- ``.pstats`` (cProfile): open with ``python -m pstats``, snakeviz, etc.
+- ``.folded`` (sampling): collapsed stacks for flamegraph.pl or speedscope
+
+While disarmed the request hook is a single attribute check; with
+``PROFILING_ENABLED`` off no hooks are registered at all.
+"""
+import collections
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+MODES = ('cprofile', 'sampling')
+REFRESH_TARGET = 'refresh'
+RESULT_EXTENSIONS = {'cprofile': '.pstats', 'sampling': '.folded'}
+
+
+class Capture:
+    """One profiled run: a request or a refresh cycle"""
+
+    def __init__(self, profiler: 'Profiler', target: str, mode: str):
+        self._profiler = profiler
+        self.target = target
+        self.mode = mode
+        self._started = 0.0
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), self._profiler.sample_interval)
+            self._sampler.start()
+
+    def stop(self) -> str:
+        """Stop profiling and write the result, returning its file name"""
+        elapsed_ms = (time.perf_counter() - self._started) * 1000
+        try:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+            else:
+                self._sampler.stop()
+            return self._profiler._save(self, elapsed_ms)
+        finally:
+            self._profiler._release(self)
+
+    def write(self, path: str):
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                for stack, count in sorted(self._sampler.stacks.items()):
+                    f.write(f"{stack} {count}\n")
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack at a fixed interval into folded-stack counts
+
+    Cheaper than cProfile for the profiled thread, since nothing hooks its
+    function calls; the cost is this thread waking up every interval.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """Arms and runs captures; thread-safe, one capture at a time
+
+    Only one capture runs at once: cProfile can't run concurrently in one
+    interpreter on newer Pythons, and overlapping requests would muddle each
+    other's profiles anyway. Requests arriving mid-capture are not profiled.
+    """
+
+    def __init__(self, output_dir: str, sample_interval: float = 0.005, max_requests: int = 100):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.max_requests = max_requests
+        # The only state the request path reads while disarmed
+        self.armed = False
+        self._lock = threading.Lock()
+        self._targets: Dict[str, List] = {}
+        self._active: Optional[Capture] = None
+
+    def arm(self, target: str, count: int = 1, mode: str = 'cprofile'):
+        """Profile the next ``count`` runs of ``target`` (a route rule or 'refresh')"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {', '.join(MODES)}")
+        count = max(1, min(int(count), self.max_requests))
+        with self._lock:
+            self._targets[target] = [count, mode]
+            self.armed = True
+
+    def disarm(self, target: Optional[str] = None):
+        with self._lock:
+            if target is None:
+                self._targets.clear()
+            else:
+                self._targets.pop(target, None)
+            self.armed = bool(self._targets)
+
+    def pending(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {target: {'remaining': count, 'mode': mode}
+                    for target, (count, mode) in self._targets.items()}
+
+    def take(self, target: str) -> Optional[Capture]:
+        """Claim a capture for this run of ``target`` if one is armed and free"""
+        with self._lock:
+            armed = self._targets.get(target)
+            if armed is None or self._active is not None:
+                return None
+            armed[0] -= 1
+            if armed[0] <= 0:
+                del self._targets[target]
+                self.armed = bool(self._targets)
+            self._active = Capture(self, target, armed[1])
+            return self._active
+
+    def _release(self, capture: Capture):
+        with self._lock:
+            if self._active is capture:
+                self._active = None
+
+    def _save(self, capture: Capture, elapsed_ms: float) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', capture.target).strip('_') or 'root'
+        name = f"{stamp}-{slug}-{int(elapsed_ms)}ms{RESULT_EXTENSIONS[capture.mode]}"
+        capture.write(os.path.join(self.output_dir, name))
+        return name
+
+    def results(self) -> List[Dict]:
+        """Saved profiles, newest first"""
+        try:
+            names = os.listdir(self.output_dir)
+        except FileNotFoundError:
+            return []
+        results = []
+        for name in names:
+            if not name.endswith(tuple(RESULT_EXTENSIONS.values())):
+                continue
+            stat = os.stat(os.path.join(self.output_dir, name))
+            results.append({
+                'name': name,
+                'size': stat.st_size,
+                'created': datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            })
+        return sorted(results, key=lambda r: r['name'], reverse=True)
+
+    def init_app(self, app):
+        """Profile armed routes from Flask's request hooks"""
+        from flask import g, request
+
+        def start():
+            if not self.armed:
+                return
+            rule = request.url_rule.rule if request.url_rule is not None else None
+            capture = self.take(rule) if rule else None
+            if capture is not None:
+                g._profile_capture = capture
+                capture.start()
+
+        def stop(exc=None):
+            capture = g.pop('_profile_capture', None)
+            if capture is not None:
+                capture.stop()
+
+        app.before_request(start)
+        app.teardown_request(stop)
+        app.extensions['profiler'] = self
@@ -0,0 +1,286 @@
+"""Cross-process quote table backed by shared memory
+
+Every gunicorn worker attaches to the same fixed-layout segment, so all
+workers see identical prices without a DB or upstream round trip. A single
+refresher (whoever holds the writer lock) publishes updates under a seqlock;
+readers never block and simply retry if they observe a write in progress.
+"""
+import fcntl
+import os
+import tempfile
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .quotes import Quote, QuoteBatch
+
+# Header layout: magic, capacity, count, seqlock sequence, last publish (ms)
+_MAGIC = 0x51544231  # 'QTB1'
+_HEADER_FIELDS = 5
+_HEADER_BYTES = 64
+_SYMBOL_BYTES = 16
+
+QUOTE_DTYPE = np.dtype([
+    ('symbol', f'S{_SYMBOL_BYTES}'),
+    ('symbol_id', np.uint32),
+    ('price', np.float64),
+    ('previous_close', np.float64),
+    ('timestamp', np.float64),  # epoch seconds, UTC
+    ('version', np.uint64),
+])
+
+
+class QuoteTableFull(Exception):
+    """Raised when a new symbol does not fit in the table"""
+
+
+class QuoteTable:
+    """Fixed-capacity quote table in ``multiprocessing.shared_memory``"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, created: bool):
+        self._shm = shm
+        self.created = created
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        capacity = int(self._header[1])
+        self._rows = np.ndarray((capacity,), dtype=QUOTE_DTYPE, buffer=shm.buf, offset=_HEADER_BYTES)
+        # Per-process symbol -> slot index, rebuilt lazily when count grows
+        self._index: Dict[str, int] = {}
+        self._indexed = 0
+        self._lock_file = None
+
+    @classmethod
+    def open(cls, name: str, capacity: int = 4096) -> 'QuoteTable':
+        """Attach to the named table, creating it if it does not exist yet"""
+        size = _HEADER_BYTES + capacity * QUOTE_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            created = True
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=name)
+            created = False
+
+        # The segment must outlive whichever worker created it; cleanup is
+        # explicit via close(unlink=True) from the process manager.
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        if created:
+            header[1] = capacity
+            header[2] = 0
+            header[3] = 0
+            header[4] = 0
+            header[0] = _MAGIC
+        else:
+            # A creator may still be filling in the header
+            deadline = time.monotonic() + 1.0
+            while int(header[0]) != _MAGIC and time.monotonic() < deadline:
+                time.sleep(0.001)
+            if int(header[0]) != _MAGIC:
+                shm.close()
+                raise RuntimeError(f"Shared memory segment {name!r} is not a quote table")
+        del header
+        return cls(shm, created)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def capacity(self) -> int:
+        return len(self._rows)
+
+    def __len__(self) -> int:
+        return int(self._header[2])
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.slot(symbol) is not None
+
+    @property
+    def sequence(self) -> int:
+        """Current seqlock sequence; even when no write is in progress"""
+        return int(self._header[3])
+
+    @property
+    def published_at(self) -> Optional[float]:
+        """Epoch seconds of the last publish, or None if never written"""
+        published_ms = int(self._header[4])
+        return published_ms / 1000.0 if published_ms else None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last publish, or None if never written"""
+        published_at = self.published_at
+        return None if published_at is None else time.time() - published_at
+
+    def _refresh_index(self):
+        count = int(self._header[2])
+        if count == self._indexed:
+            return
+        for slot in range(self._indexed, count):
+            self._index[self._rows['symbol'][slot].decode('ascii')] = slot
+        self._indexed = count
+
+    def slot(self, symbol: str) -> Optional[int]:
+        """Get the slot for a symbol, or None if it has never been written"""
+        slot = self._index.get(symbol)
+        if slot is None:
+            self._refresh_index()
+            slot = self._index.get(symbol)
+        return slot
+
+    # Writer side -----------------------------------------------------------
+
+    def try_acquire_writer(self) -> bool:
+        """Try to become the single writer for this table (non-blocking)"""
+        if self._lock_file is not None:
+            return True
+        path = os.path.join(tempfile.gettempdir(), f"{self.name.lstrip('/')}.writer.lock")
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        # A writer that died mid-publish left the sequence odd, which would
+        # make every reader time out; its half-written rows are overwritten
+        # by the next publish, so only the sequence needs putting right
+        if int(self._header[3]) & 1:
+            self._header[3] += 1
+        return True
+
+    def release_writer(self):
+        """Give up the writer lock so another process can take over"""
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def is_writer(self) -> bool:
+        return self._lock_file is not None
+
+    def publish(self, quotes) -> int:
+        """Write a batch of quotes under one seqlock section, returns the version
+
+        ``quotes`` is a ``QuoteBatch``, or maps symbol to a ``Quote`` (or
+        anything with ``price``, ``previous_close`` and ``timestamp`` keys) as
+        returned by ``get_stock_data``. Columns are written a whole array at a
+        time. Only the process holding the writer lock may call this.
+        """
+        if not self.is_writer:
+            raise RuntimeError("publish() requires the writer lock")
+        if not isinstance(quotes, QuoteBatch):
+            quotes = QuoteBatch.from_quotes(Quote.coerce(symbol, data) for symbol, data in quotes.items())
+
+        self._refresh_index()
+        header = self._header
+        version = int(header[3]) // 2 + 1
+
+        header[3] += 1  # odd: write in progress
+        try:
+            rows = self._rows
+            slots = np.empty(len(quotes), dtype=np.intp)
+            for i, symbol in enumerate(quotes.symbols):
+                slot = self._index.get(symbol)
+                if slot is None:
+                    slot = int(header[2])
+                    if slot >= len(rows):
+                        raise QuoteTableFull(f"Quote table is full ({len(rows)} symbols)")
+                    encoded = symbol.encode('ascii')
+                    if len(encoded) > _SYMBOL_BYTES:
+                        raise ValueError(f"Symbol too long for quote table: {symbol}")
+                    rows['symbol'][slot] = encoded
+                    rows['symbol_id'][slot] = slot
+                    header[2] = slot + 1
+                    self._index[symbol] = slot
+                    self._indexed = slot + 1
+                slots[i] = slot
+
+            # Quotes without a timestamp are stamped with the publish time
+            timestamps = quotes.timestamps
+            undated = np.isnan(timestamps)
+            if undated.any():
+                timestamps = np.where(undated, time.time(), timestamps)
+            rows['price'][slots] = quotes.prices
+            rows['previous_close'][slots] = quotes.previous_closes
+            rows['timestamp'][slots] = timestamps
+            rows['version'][slots] = version
+            header[4] = int(time.time() * 1000)
+        finally:
+            header[3] += 1  # even: consistent again
+        return version
+
+    # Reader side -----------------------------------------------------------
+
+    def get(self, symbol: str, max_retries: int = 100) -> Optional[Quote]:
+        """Read one quote, or None if the symbol is not in the table"""
+        result = self.get_many([symbol], max_retries=max_retries)
+        return result.get(symbol)
+
+    def get_many(self, symbols: Iterable[str], max_retries: int = 100) -> Dict[str, Quote]:
+        """Read a consistent set of quotes for the given symbols
+
+        Reads straight from the shared buffer; the seqlock sequence is checked
+        before and after so a torn read is detected and retried.
+        """
+        slots = []
+        for symbol in symbols:
+            slot = self.slot(symbol)
+            if slot is not None:
+                slots.append((symbol, slot))
+        if not slots:
+            return {}
+
+        header = self._header
+        rows = self._rows
+        for _ in range(max_retries):
+            start = int(header[3])
+            if start & 1:
+                time.sleep(0)
+                continue
+            values = [
+                (symbol, float(rows['price'][slot]), float(rows['previous_close'][slot]),
+                 float(rows['timestamp'][slot]), int(rows['version'][slot]))
+                for symbol, slot in slots
+            ]
+            if int(header[3]) == start:
+                return {
+                    symbol: Quote(symbol, price, previous_close, timestamp=timestamp, version=version)
+                    for symbol, price, previous_close, timestamp, version in values
+                    if version
+                }
+        raise TimeoutError("Quote table is being rewritten too often to read")
+
+    def snapshot(self, max_retries: int = 100) -> np.ndarray:
+        """Copy all populated rows out of the table as one consistent array"""
+        header = self._header
+        for _ in range(max_retries):
+            start = int(header[3])
+            if start & 1:
+                time.sleep(0)
+                continue
+            rows = self._rows[:int(header[2])].copy()
+            if int(header[3]) == start:
+                return rows
+        raise TimeoutError("Quote table is being rewritten too often to read")
+
+    def close(self, unlink: bool = False):
+        """Detach from the segment, optionally destroying it"""
+        self.release_writer()
+        # Drop the numpy views first so the buffer can be released
+        self._header = None
+        self._rows = None
+        self._shm.close()
+        if unlink:
+            # unlink() unregisters from the resource tracker; re-register so
+            # the tracker doesn't log a KeyError for a name it never held
+            resource_tracker.register(self._shm._name, 'shared_memory')
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                resource_tracker.unregister(self._shm._name, 'shared_memory')
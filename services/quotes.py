@@ -0,0 +1,231 @@
+"""Compact quote records used throughout the stock data path"""
+from datetime import date, datetime, time, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+def to_utc_datetime(timestamp) -> Optional[datetime]:
+    """Normalize the timestamp shapes upstream returns to an aware UTC datetime"""
+    if timestamp is None:
+        return None
+    if type(timestamp) is datetime and timestamp.tzinfo is timezone.utc:
+        return timestamp
+    if isinstance(timestamp, float):
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    if isinstance(timestamp, (int, np.floating)):
+        return datetime.fromtimestamp(float(timestamp), tz=timezone.utc)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if hasattr(timestamp, 'to_pydatetime'):
+        timestamp = timestamp.to_pydatetime()
+    if not isinstance(timestamp, datetime) and isinstance(timestamp, date):
+        timestamp = datetime.combine(timestamp, time())
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+class Quote:
+    """Immutable price snapshot for one symbol
+
+    Change fields are derived lazily on first access and cached. Item access
+    with the legacy dict keys (``price``, ``previous_close``, ``name``,
+    ``timestamp``) is kept so existing callers keep working.
+    """
+
+    __slots__ = ('symbol', 'price', 'previous_close', 'name', 'timestamp', 'version',
+                 '_change', '_change_percent')
+
+    _KEYS = ('price', 'previous_close', 'name', 'timestamp', 'version')
+
+    def __init__(self, symbol: str, price: float, previous_close: float,
+                 name: Optional[str] = None, timestamp=None, version: int = 0):
+        set_ = object.__setattr__
+        set_(self, 'symbol', symbol)
+        set_(self, 'price', float(price))
+        set_(self, 'previous_close', float(previous_close))
+        set_(self, 'name', name)
+        set_(self, 'timestamp', to_utc_datetime(timestamp))
+        set_(self, 'version', version)
+        set_(self, '_change', None)
+        set_(self, '_change_percent', None)
+
+    @classmethod
+    def coerce(cls, symbol: str, data) -> Optional['Quote']:
+        """Accept either a Quote or a legacy ``{'price', 'previous_close', ...}`` dict"""
+        if data is None or isinstance(data, Quote):
+            return data
+        return cls(symbol, data['price'], data['previous_close'], data.get('name'),
+                   data.get('timestamp'), data.get('version', 0))
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Quote is immutable')
+
+    def __delattr__(self, key):
+        raise AttributeError('Quote is immutable')
+
+    @property
+    def change(self) -> float:
+        if self._change is None:
+            object.__setattr__(self, '_change', self.price - self.previous_close)
+        return self._change
+
+    @property
+    def change_percent(self) -> float:
+        if self._change_percent is None:
+            percent = (self.change / self.previous_close) * 100 if self.previous_close else 0.0
+            object.__setattr__(self, '_change_percent', percent)
+        return self._change_percent
+
+    def __getitem__(self, key):
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __eq__(self, other):
+        if not isinstance(other, Quote):
+            return NotImplemented
+        return (self.symbol, self.price, self.previous_close, self.name, self.timestamp) == \
+            (other.symbol, other.price, other.previous_close, other.name, other.timestamp)
+
+    def __hash__(self):
+        return hash((self.symbol, self.price, self.previous_close, self.timestamp))
+
+    def __repr__(self):
+        return f"Quote({self.symbol!r}, price={self.price}, previous_close={self.previous_close})"
+
+    def __reduce__(self):
+        return (Quote, (self.symbol, self.price, self.previous_close, self.name,
+                        self.timestamp, self.version))
+
+    def with_name(self, name: Optional[str]) -> 'Quote':
+        """Copy of this quote carrying a display name"""
+        return Quote(self.symbol, self.price, self.previous_close, name, self.timestamp, self.version)
+
+
+def quotes_from_bars(bars, names: Dict[str, str], symbols: Optional[Iterable[str]] = None) -> Dict[str, Quote]:
+    """Build one Quote per symbol from a (symbol, timestamp) indexed bars frame
+
+    Uses the last close as the price and the close before it as the previous
+    close. Works on whole columns at once instead of filtering the frame per
+    symbol, so cost stays linear in the number of bars. Accepts the SDK's
+    BarSet as well as a plain frame.
+    """
+    bars = getattr(bars, 'df', bars)
+    if bars is None or len(bars) == 0:
+        return {}
+    if not bars.index.is_monotonic_increasing:
+        bars = bars.sort_index()
+
+    bar_symbols = bars.index.get_level_values('symbol').to_numpy()
+    timestamps = bars.index.get_level_values('timestamp')
+    closes = bars['close'].to_numpy(dtype=np.float64).tolist()
+
+    # Rows are grouped by symbol: find the last row of each run and the one before it
+    is_last = np.ones(len(bar_symbols), dtype=bool)
+    is_last[:-1] = bar_symbols[1:] != bar_symbols[:-1]
+    last_rows = np.flatnonzero(is_last)
+    first_rows = np.concatenate(([0], last_rows[:-1] + 1))
+    prev_rows = np.where(last_rows > first_rows, last_rows - 1, last_rows)
+
+    last_times = timestamps[last_rows]
+    if hasattr(last_times, 'as_unit'):
+        # Datetime index: convert to epoch seconds in one pass instead of boxing each value
+        epochs = (last_times.as_unit('ns').asi8 / 1e9).tolist()
+        # Bars from one request usually share a handful of timestamps
+        converted = {epoch: to_utc_datetime(epoch) for epoch in set(epochs)}
+        last_times = [converted[epoch] for epoch in epochs]
+    else:
+        last_times = list(last_times)
+
+    wanted = None if symbols is None else set(symbols)
+    result = {}
+    for last, prev, timestamp in zip(last_rows.tolist(), prev_rows.tolist(), last_times):
+        symbol = bar_symbols[last]
+        if symbol not in names or (wanted is not None and symbol not in wanted):
+            continue
+        result[symbol] = Quote(symbol, closes[last], closes[prev], names[symbol], timestamp)
+    return result
+
+
+class QuoteBatch:
+    """Quotes for many symbols stored as parallel NumPy arrays
+
+    Holds one float array per field instead of one object per symbol, which
+    keeps large refreshes compact. Individual ``Quote`` objects are only
+    materialized on access.
+    """
+
+    __slots__ = ('symbols', 'prices', 'previous_closes', 'timestamps', 'names', '_index')
+
+    def __init__(self, symbols: List[str], prices, previous_closes, timestamps=None,
+                 names: Optional[List[Optional[str]]] = None):
+        self.symbols = list(symbols)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.previous_closes = np.asarray(previous_closes, dtype=np.float64)
+        if timestamps is None:
+            timestamps = np.full(len(self.symbols), np.nan)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)  # epoch seconds
+        self.names = names if names is not None else [None] * len(self.symbols)
+        self._index = None
+
+    @classmethod
+    def from_quotes(cls, quotes: Iterable[Quote]) -> 'QuoteBatch':
+        quotes = list(quotes)
+        return cls(
+            [q.symbol for q in quotes],
+            [q.price for q in quotes],
+            [q.previous_close for q in quotes],
+            [q.timestamp.timestamp() if q.timestamp else np.nan for q in quotes],
+            [q.name for q in quotes],
+        )
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._slot_index()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.symbols)
+
+    def _slot_index(self) -> Dict[str, int]:
+        if self._index is None:
+            self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        return self._index
+
+    def quote(self, i: int) -> Quote:
+        timestamp = self.timestamps[i]
+        return Quote(self.symbols[i], self.prices[i], self.previous_closes[i], self.names[i],
+                     None if np.isnan(timestamp) else float(timestamp))
+
+    def __getitem__(self, symbol: str) -> Quote:
+        return self.quote(self._slot_index()[symbol])
+
+    def get(self, symbol: str, default=None):
+        i = self._slot_index().get(symbol)
+        return default if i is None else self.quote(i)
+
+    def items(self):
+        for i, symbol in enumerate(self.symbols):
+            yield symbol, self.quote(i)
+
+    @property
+    def changes(self) -> np.ndarray:
+        return self.prices - self.previous_closes
+
+    @property
+    def change_percents(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percents = self.changes / self.previous_closes * 100
+        return np.where(self.previous_closes != 0, percents, 0.0)
+
+    def to_dict(self) -> Dict[str, Quote]:
+        return dict(self.items())
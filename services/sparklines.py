@@ -0,0 +1,130 @@
+"""Sparklines: a fixed-length ring of recent prices per symbol, kept as tiny SVG paths
+
+:class:`SparklineBook` holds one row per symbol in a (symbols x length)
+array, used as a ring buffer: each refresh cycle writes every symbol's price
+into its next slot in one vectorized step, overwriting the oldest, so memory
+stays bounded however long the app runs. A symbol's ring is encoded once per
+change into the ``d`` attribute of an SVG path over a ``length - 1`` by
+``HEIGHT`` box, which is what the watchlist payload carries.
+"""
+import threading
+from typing import Dict, Iterable, Mapping, Optional
+
+import numpy as np
+
+HEIGHT = 20
+
+
+def encode(values: np.ndarray, length: int, height: int = HEIGHT) -> Optional[str]:
+    """SVG path data for ``values``, oldest first, right-aligned in the box
+
+    Each point is on integer coordinates, one unit apart horizontally, with
+    the highest price at the top; None for fewer than two points.
+    """
+    if len(values) < 2:
+        return None
+    low, high = float(values.min()), float(values.max())
+    if high > low:
+        y = np.rint((high - values) / (high - low) * height).astype(np.int64)
+    else:
+        y = np.full(len(values), height // 2)
+    x = np.arange(length - len(values), length)
+    # After the moveto, further coordinate pairs are implicit linetos
+    pairs = ' '.join(f"{a} {b}" for a, b in zip(x.tolist(), y.tolist()))
+    return 'M' + pairs
+
+
+class SparklineBook:
+    """Recent prices per symbol in fixed-length rings, with their encoded paths
+
+    ``version`` records the data version the rings were last appended for,
+    so a process can tell whether it has seen every published cycle.
+    """
+
+    def __init__(self, length: int = 78):
+        self.length = length
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.version: Optional[int] = None
+        self._index: Dict[str, int] = {}
+        self._prices = np.full((0, self.length), np.nan)
+        # Points held, and the slot the next price goes in, per row
+        self._count = np.zeros(0, dtype=np.int64)
+        self._next = np.zeros(0, dtype=np.int64)
+        self._paths: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def _add_rows(self, symbols: Iterable[str]):
+        new = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._index]
+        if not new:
+            return
+        size = len(self._index) + len(new)
+        if size > len(self._prices):
+            capacity = max(size, 2 * len(self._prices), 64)
+            grown = np.full((capacity, self.length), np.nan)
+            grown[:len(self._prices)] = self._prices
+            self._prices = grown
+            self._count = np.concatenate((self._count, np.zeros(capacity - len(self._count), dtype=np.int64)))
+            self._next = np.concatenate((self._next, np.zeros(capacity - len(self._next), dtype=np.int64)))
+        for symbol in new:
+            self._index[symbol] = len(self._index)
+
+    def seed(self, series: Mapping[str, Iterable[float]]):
+        """Fill symbols' rings from their recent prices, oldest first, replacing what they held"""
+        with self._lock:
+            self._add_rows(series)
+            for symbol, prices in series.items():
+                prices = np.asarray(prices, dtype=np.float64)[-self.length:]
+                row = self._index[symbol]
+                self._prices[row] = np.nan
+                self._prices[row, :len(prices)] = prices
+                self._count[row] = len(prices)
+                self._next[row] = len(prices) % self.length
+                self._paths.pop(symbol, None)
+
+    def append(self, prices: Mapping[str, float]):
+        """Add one price per symbol, e.g. a refresh cycle's; symbols without a ring are skipped"""
+        with self._lock:
+            index = self._index
+            symbols = [symbol for symbol in prices if symbol in index]
+            if not symbols:
+                return
+            rows = np.fromiter((index[symbol] for symbol in symbols), dtype=np.int64, count=len(symbols))
+            values = np.fromiter((prices[symbol] for symbol in symbols), dtype=np.float64, count=len(symbols))
+            self._prices[rows, self._next[rows]] = values
+            self._next[rows] = (self._next[rows] + 1) % self.length
+            self._count[rows] = np.minimum(self._count[rows] + 1, self.length)
+            for symbol in symbols:
+                self._paths.pop(symbol, None)
+
+    def reset(self):
+        """Forget every ring"""
+        with self._lock:
+            self._clear()
+
+    def values(self, symbol: str) -> np.ndarray:
+        """The symbol's prices, oldest first"""
+        row = self._index.get(symbol)
+        if row is None:
+            return np.empty(0)
+        count, prices = int(self._count[row]), self._prices[row]
+        # Until a ring wraps, its prices fill the first slots in order
+        return np.roll(prices, -int(self._next[row])) if count == self.length else prices[:count].copy()
+
+    def paths(self, symbols: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Encoded path per symbol, computed only for rings that changed since last asked"""
+        result = {}
+        with self._lock:
+            paths = self._paths
+            for symbol in symbols:
+                if symbol not in paths:
+                    paths[symbol] = encode(self.values(symbol), self.length)
+                result[symbol] = paths[symbol]
+        return result
@@ -0,0 +1,75 @@
+"""Content-hashed static URLs with long-lived caching
+
+``url_for('static', filename=...)`` gains a ``v`` query argument derived from
+the file's content. Requests carrying the current hash get a far-future
+immutable Cache-Control, so browsers never revalidate; a changed file gets a
+new URL. Anything else is served with ``no-cache`` and revalidated by ETag.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import Flask, Response, request
+from werkzeug.security import safe_join
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+class StaticAssets:
+    """Versioned URLs and cache headers for the app's static folder"""
+
+    def __init__(self, max_age: int = ONE_YEAR):
+        self.max_age = max_age
+        self.static_folder: Optional[str] = None
+        # filename -> ((mtime_ns, size), version)
+        self._versions: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask):
+        self.static_folder = app.static_folder
+        app.url_defaults(self._add_version)
+        app.after_request(self._cache_headers)
+
+    def version(self, filename: str) -> Optional[str]:
+        """Short content hash of a static file, or None if it does not exist"""
+        path = safe_join(self.static_folder, filename) if self.static_folder and filename else None
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._versions.get(filename)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+        version = digest.hexdigest()[:12]
+        with self._lock:
+            self._versions[filename] = (key, version)
+        return version
+
+    def _add_version(self, endpoint: str, values: dict):
+        if endpoint == 'static' and 'v' not in values:
+            version = self.version(values.get('filename'))
+            if version:
+                values['v'] = version
+
+    def _cache_headers(self, response: Response) -> Response:
+        if request.endpoint != 'static' or response.status_code not in (200, 304):
+            return response
+        cache_control = response.cache_control
+        version = request.args.get('v')
+        if version and version == self.version((request.view_args or {}).get('filename')):
+            cache_control.public = True
+            cache_control.max_age = self.max_age
+            cache_control.immutable = True
+            cache_control.no_cache = None
+        else:
+            cache_control.max_age = None
+            cache_control.no_cache = True
+        return response
@@ -0,0 +1,180 @@
+"""Non-blocking structured logging
+
+Records are formatted as one JSON object per line and written by a
+background listener thread, so request handlers and the refresher only pay
+for putting a record on a queue. Repetitive warnings and errors are sampled:
+the first few per message template are kept in each window, the rest are
+counted and reported on the next record that gets through.
+
+Pass structured fields with ``extra``; use %-style arguments rather than
+f-strings so records from the same call site share a sampling key::
+
+    log.info('refresh cycle completed', extra={'updated': 412, 'duration_ms': 85.3})
+    log.warning('Error updating %s: %s', symbol, error)
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with ``extra`` fields at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ErrorSampler(logging.Filter):
+    """Keep the first ``burst`` warnings per message template per ``window`` seconds
+
+    Dropped records are counted; the next record of that template to pass
+    carries the count as ``suppressed``.
+    """
+
+    def __init__(self, burst: int = 5, window: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        # template key -> [window start, passed in window, suppressed since last pass]
+        self._state: Dict[Tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.burst <= 0:
+            return True
+        key = (record.name, record.msg, record.exc_info[0] if record.exc_info else None)
+        now = self._clock()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = self._state[key] = [now, 0, suppressed]
+            if state[1] >= self.burst:
+                state[2] += 1
+                return False
+            state[1] += 1
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue a copy with the message rendered but not yet formatted
+
+    The stock handler pre-formats the record, which would bake the traceback
+    into ``msg`` and leave the JSON formatter nothing structured to work with.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    """Readable single-line output for local development, ``extra`` appended"""
+
+    def __init__(self):
+        super().__init__('[%(asctime)s] %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and not k.startswith('_')}
+        if fields:
+            text += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return text
+
+
+def configure_logging(level: str = 'INFO', fmt: str = 'json', error_burst: int = 5,
+                      error_window: float = 60.0, stream=None) -> logging.handlers.QueueListener:
+    """Route the root logger through a queue to a background writer thread
+
+    Safe to call again (e.g. per app instance): the previous listener is
+    flushed and replaced. Handlers installed by others are left alone.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        root = logging.getLogger()
+        if _listener is not None:
+            _listener.stop()
+            root.removeHandler(_queue_handler)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else _TextFormatter())
+
+        records: 'queue.Queue[logging.LogRecord]' = queue.Queue(-1)
+        _queue_handler = _QueueHandler(records)
+        _queue_handler.addFilter(ErrorSampler(error_burst, error_window))
+        root.addHandler(_queue_handler)
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = None
+        _queue_handler = None
+
+
+def _restart_after_fork():
+    """Give a forked child its own queue and listener thread
+
+    The parent's listener thread does not exist in the child, so records
+    would pile up in the inherited queue unwritten.
+    """
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    records: 'queue.Queue[logging.LogRecord]' = queue.Queue(-1)
+    _queue_handler.queue = records
+    _listener = logging.handlers.QueueListener(records, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,118 @@
+"""Symbol search over the asset catalog, by ticker or company name
+
+:class:`SymbolIndex` is built once per catalog: the symbols in one sorted
+list and every word of every company name in another, each searched for a
+prefix with two bisections. Name matches for a query of several words are
+combined and ranked with a few NumPy operations, well under a millisecond
+at 20k assets. :class:`SymbolSearch` rebuilds the index when the catalog
+behind it is refreshed.
+"""
+import re
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+
+# Sorts after every character that can follow a prefix in the index
+_END = '\uffff'
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a company name or query; "AT&T Inc." -> ["at", "t", "inc"]"""
+    return _WORD.findall(text.lower())
+
+
+class SymbolIndex:
+    """Prefix index over symbols and the words of their names
+
+    Results come as ``{symbol, name}`` dicts in rank order: the exact
+    symbol, then symbols starting with the query, then names with a word
+    starting with every query word, those whose first word matches first.
+    """
+
+    def __init__(self, names: Mapping[str, str]):
+        self.symbols = sorted(names)
+        self.names = [names[symbol] or '' for symbol in self.symbols]
+        words = sorted((word, position, asset)
+                       for asset, name in enumerate(self.names)
+                       for position, word in enumerate(dict.fromkeys(tokenize(name))))
+        # Bisection runs on the words alone; the matching slices of these
+        # parallel arrays are then filtered and ranked in vectorized steps
+        self._words = [word for word, _, _ in words]
+        self._leading = np.fromiter((position == 0 for _, position, _ in words), dtype=bool, count=len(words))
+        self._assets = np.fromiter((asset for _, _, asset in words), dtype=np.int64, count=len(words))
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def _word_matches(self, prefix: str):
+        start = bisect_left(self._words, prefix)
+        return start, bisect_left(self._words, prefix + _END, start)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        if limit <= 0:
+            return []
+        count = len(self.symbols)
+        assets: List[int] = []
+        first = last = 0
+        ticker = query.strip().upper()
+        if ticker:
+            first = bisect_left(self.symbols, ticker)
+            last = min(bisect_left(self.symbols, ticker + _END, first), first + limit)
+            # The exact symbol, if listed, sorts first among its prefix matches
+            assets.extend(range(first, last))
+
+        words = tokenize(query)
+        if words and len(assets) < limit:
+            spans = [self._word_matches(word) for word in words]
+            # Count, per asset, the query words some word of its name starts with
+            hits = np.zeros(count, dtype=np.int64)
+            for start, stop in spans:
+                matched = np.zeros(count, dtype=bool)
+                matched[self._assets[start:stop]] = True
+                hits += matched
+            # Symbols already listed come from one contiguous run
+            hits[first:last] = 0
+            candidates = np.flatnonzero(hits == len(words))
+            if len(candidates):
+                start, stop = spans[0]
+                leading = np.zeros(count, dtype=bool)
+                leading[self._assets[start:stop][self._leading[start:stop]]] = True
+                # Names whose first word matches the first query word rank first
+                keys = candidates + count * ~leading[candidates]
+                wanted = limit - len(assets)
+                if len(keys) > wanted:
+                    keys = np.partition(keys, wanted - 1)[:wanted]
+                assets.extend((np.sort(keys) % count).tolist())
+
+        return [{'symbol': self.symbols[asset], 'name': self.names[asset]} for asset in assets]
+
+
+class SymbolSearch:
+    """A :class:`SymbolIndex` kept in step with a catalog of symbol -> name
+
+    ``names()`` returns the catalog, the same mapping object until it is
+    refreshed, or None when it isn't available. A new mapping is indexed
+    by the first search to see it.
+    """
+
+    def __init__(self, names: Callable[[], Optional[Mapping[str, str]]]):
+        self._names = names
+        self._source: Optional[Mapping[str, str]] = None
+        self._index: Optional[SymbolIndex] = None
+        self._lock = threading.Lock()
+
+    def index(self) -> Optional[SymbolIndex]:
+        names = self._names()
+        if names is not None and names is not self._source:
+            with self._lock:
+                if names is not self._source:
+                    self._index = SymbolIndex(names)
+                    self._source = names
+        return self._index
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        index = self.index()
+        return index.search(query, limit) if index is not None else []
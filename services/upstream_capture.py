@@ -0,0 +1,331 @@
+"""Record and replay upstream Alpaca responses
+
+Recording wraps a data/trading client (or the mock service) and appends
+every bars, assets and news response to a gzip-compressed JSON-lines
+archive. Replaying serves those responses back in order, either as fast as
+possible or on the original schedule, which gives deterministic benchmarks
+and regression tests without live credentials. A call is answered from the
+responses recorded for the same symbols when there are any.
+
+Archive layout: one header line, then one record per upstream call::
+
+    {"kind": "bars", "method": "get_stock_bars", "offset": 1.25,
+     "duration": 0.08, "symbols": [...], "payload": {...}}
+
+Bars payloads are columnar; a payload identical to the previous one of the
+same kind is stored as ``"repeat": true`` to keep archives small.
+"""
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .fault_injection import UpstreamError
+from .mock_alpaca import SESSION_MINUTES, MockAsset
+
+ARCHIVE_FORMAT = 'dadstocks-upstream-capture'
+ARCHIVE_VERSION = 1
+
+# Client methods worth recording, and the kind of response each returns
+RECORDED_METHODS = {
+    'get_stock_bars': 'bars',
+    'get_daily_bars': 'bars',
+    'get_intraday_bars': 'bars',
+    'get_all_assets': 'assets',
+    'get_assets': 'assets',
+    'get_asset_names': 'assets',
+    'get_news': 'news',
+}
+# Chart history calls; replayed apart from the latest bars get_stock_bars returns
+HISTORY_METHODS = ('get_daily_bars', 'get_intraday_bars')
+
+
+def _encode_bars(bars) -> Dict:
+    """Encode a (symbol, timestamp) indexed bars frame column-wise"""
+    frame = getattr(bars, 'df', bars)
+    if frame is None or len(frame) == 0:
+        return {'symbol': [], 'timestamp': [], 'columns': {}}
+    timestamps = pd.DatetimeIndex(frame.index.get_level_values('timestamp'))
+    if timestamps.tz is None:
+        timestamps = timestamps.tz_localize('UTC')
+    return {
+        'symbol': frame.index.get_level_values('symbol').tolist(),
+        'timestamp': timestamps.as_unit('ns').asi8.tolist(),
+        'columns': {column: frame[column].to_numpy(dtype=np.float64).tolist() for column in frame.columns},
+    }
+
+
+def _decode_bars(payload: Dict) -> pd.DataFrame:
+    if not payload['symbol']:
+        return pd.DataFrame()
+    index = pd.MultiIndex.from_arrays(
+        [np.asarray(payload['symbol'], dtype=object),
+         pd.to_datetime(np.asarray(payload['timestamp'], dtype=np.int64), unit='ns', utc=True)],
+        names=['symbol', 'timestamp']
+    )
+    columns = {name: np.asarray(values, dtype=np.float64) for name, values in payload['columns'].items()}
+    return pd.DataFrame(columns, index=index)
+
+
+def _encode_assets(assets) -> List[List[str]]:
+    if isinstance(assets, dict):
+        return [[symbol, name] for symbol, name in assets.items()]
+    return [[asset.symbol, asset.name] for asset in assets]
+
+
+def _encode(kind: str, result) -> Any:
+    if kind == 'bars':
+        return _encode_bars(result)
+    if kind == 'assets':
+        return _encode_assets(result)
+    return result
+
+
+def _request_symbols(args, kwargs) -> Optional[List[str]]:
+    """Pull the requested symbols out of a client call, if it has any"""
+    value = args[0] if args else kwargs.get('symbols')
+    value = getattr(value, 'symbol_or_symbols', value)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    try:
+        return list(value)
+    except TypeError:
+        return None
+
+
+class CaptureRecorder:
+    """Appends upstream responses to a capture archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_payload: Dict[str, str] = {}
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._write({'format': ARCHIVE_FORMAT, 'version': ARCHIVE_VERSION, 'started_at': time.time()})
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, separators=(',', ':'), default=str))
+        self._file.write('\n')
+        self._file.flush()
+
+    def record(self, kind: str, symbols: Optional[List[str]], started: float, duration: float,
+               result=None, error: Optional[BaseException] = None, method: Optional[str] = None):
+        """Write one upstream call; ``started`` is a time.monotonic() reading"""
+        record = {
+            'kind': kind,
+            'method': method,
+            'offset': round(started - self._started, 6),
+            'duration': round(duration, 6),
+            'symbols': symbols,
+        }
+        if error is not None:
+            record['error'] = str(error)
+            record['error_type'] = type(error).__name__
+            encoded = None
+        else:
+            encoded = json.dumps(_encode(kind, result), separators=(',', ':'), default=str)
+
+        with self._lock:
+            payload = None
+            if encoded is not None:
+                if self._last_payload.get(kind) == encoded:
+                    record['repeat'] = True
+                else:
+                    self._last_payload[kind] = encoded
+                    payload = encoded
+            line = json.dumps(record, separators=(',', ':'), default=str)
+            if payload is not None:
+                # Splice the already-encoded payload in rather than encoding twice
+                line = f"{line[:-1]},\"payload\":{payload}}}"
+            self._file.write(line)
+            self._file.write('\n')
+            self._file.flush()
+
+    def wrap(self, client):
+        """Wrap a client so its recorded methods write to this archive"""
+        return RecordingProxy(client, self)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingProxy:
+    """Transparent proxy that records responses of the upstream methods it wraps"""
+
+    def __init__(self, inner, recorder: CaptureRecorder):
+        self._inner = inner
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        kind = RECORDED_METHODS.get(name)
+        if kind is None or not callable(attr):
+            return attr
+
+        recorder = self._recorder
+
+        def recorded(*args, **kwargs):
+            symbols = _request_symbols(args, kwargs) if kind != 'assets' else None
+            started = time.monotonic()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                recorder.record(kind, symbols, started, time.monotonic() - started, error=e, method=name)
+                raise
+            recorder.record(kind, symbols, started, time.monotonic() - started, result=result, method=name)
+            return result
+
+        return recorded
+
+
+def load_archive(path: str) -> List[Dict]:
+    """Read every record from an archive, resolving repeated payloads"""
+    records = []
+    last_payload: Dict[str, Any] = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            record = json.loads(line)
+            if 'kind' not in record:
+                if record.get('format') != ARCHIVE_FORMAT:
+                    raise ValueError(f"{path} is not an upstream capture archive")
+                continue
+            if record.pop('repeat', False):
+                record['payload'] = last_payload[record['kind']]
+            elif 'payload' in record:
+                last_payload[record['kind']] = record['payload']
+            records.append(record)
+    return records
+
+
+def _request_key(symbols) -> Optional[tuple]:
+    """Order-insensitive key for the symbols of a call"""
+    return None if symbols is None else tuple(sorted(set(symbols)))
+
+
+def _stream(record: Dict) -> str:
+    """The queue a record is replayed from: its kind, or its method for history calls"""
+    method = record.get('method')
+    return method if method in HISTORY_METHODS else record['kind']
+
+
+class ReplayAlpacaService:
+    """Serves recorded upstream responses with the MockAlpacaService interface
+
+    Each call returns the next recorded response of its kind, looping back to
+    the start once exhausted; daily and intraday history each have their own.
+    Calls for a symbol set that was recorded replay the responses to that set,
+    other calls take the next response of their kind and filter it.
+
+    ``timing='fast'`` answers immediately. ``timing='original'`` keeps the
+    recorded schedule: a call returns no sooner than its recorded duration,
+    nor before its recorded offset from the first replayed call, shifted by
+    the archive's length for each time round the loop.
+    """
+
+    def __init__(self, path: str, timing: str = 'fast', loop: bool = True, sleep=time.sleep,
+                 clock=time.monotonic):
+        if timing not in ('fast', 'original'):
+            raise ValueError("timing must be 'fast' or 'original'")
+        self.timing = timing
+        self.loop = loop
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Keyed by (stream, symbols); symbols None holds every record of the stream
+        self._records: Dict[tuple, List[Dict]] = defaultdict(list)
+        records = load_archive(path)
+        for record in records:
+            stream = _stream(record)
+            self._records[stream, None].append(record)
+            if record.get('symbols') is not None:
+                self._records[stream, _request_key(record['symbols'])].append(record)
+        self._first = min((record['offset'] for record in records), default=0.0)
+        self._span = max((record['offset'] + record['duration'] for record in records), default=0.0) - self._first
+        self._started: Optional[float] = None
+        self._positions: Dict[tuple, int] = defaultdict(int)
+        self._laps: Dict[tuple, int] = defaultdict(int)
+        self._decoded: Dict[int, Any] = {}
+
+    def _next(self, stream: str, symbols: Optional[List[str]] = None) -> Optional[Dict]:
+        with self._lock:
+            queue = (stream, _request_key(symbols))
+            if queue not in self._records:
+                queue = (stream, None)
+            records = self._records.get(queue)
+            if not records:
+                return None
+            position = self._positions[queue]
+            if position >= len(records):
+                if not self.loop:
+                    raise UpstreamError(f"Replay archive exhausted for {stream}", records[0]['kind'])
+                position = 0
+                self._laps[queue] += 1
+            self._positions[queue] = position + 1
+            record = records[position]
+            lap = self._laps[queue]
+            if self._started is None:
+                self._started = self._clock()
+
+        if self.timing == 'original':
+            due = self._started + self._span * lap + record['offset'] - self._first + record['duration']
+            wait = max(record['duration'], due - self._clock())
+            if wait > 0:
+                self._sleep(wait)
+        if 'error' in record:
+            raise UpstreamError(f"Replayed {record['error_type']}: {record['error']}", record['kind'])
+        return record
+
+    def _payload(self, stream: str, decode, symbols: Optional[List[str]] = None):
+        record = self._next(stream, symbols)
+        if record is None:
+            return None
+        # Repeated payloads share one object, so decode each distinct one once
+        key = id(record['payload'])
+        if key not in self._decoded:
+            self._decoded[key] = decode(record['payload'])
+        return self._decoded[key]
+
+    def _bars(self, stream: str, symbols: List[str]) -> pd.DataFrame:
+        bars = self._payload(stream, _decode_bars, symbols)
+        if bars is None or bars.empty:
+            return pd.DataFrame()
+        return bars[bars.index.get_level_values('symbol').isin(symbols)]
+
+    def get_stock_bars(self, symbols: List[str]) -> pd.DataFrame:
+        """Get the next recorded bars, restricted to the requested symbols"""
+        return self._bars('bars', symbols)
+
+    def get_intraday_bars(self, symbols: List[str], bars: int = SESSION_MINUTES,
+                          timeframe_minutes: int = 1, end: Optional[datetime] = None) -> pd.DataFrame:
+        """Get the next recorded intraday history, restricted to the requested symbols"""
+        return self._bars('get_intraday_bars', symbols)
+
+    def get_daily_bars(self, symbols: List[str], days: int = 252,
+                       end: Optional[datetime] = None) -> pd.DataFrame:
+        """Get the next recorded daily history, restricted to the requested symbols"""
+        return self._bars('get_daily_bars', symbols)
+
+    def get_asset_names(self) -> Dict[str, str]:
+        """Get symbol -> company name from the next recorded asset list"""
+        names = self._payload('assets', dict)
+        return names or {}
+
+    def get_assets(self) -> List[MockAsset]:
+        return [MockAsset(symbol, name) for symbol, name in self.get_asset_names().items()]
+
+    def get_news(self, symbols: Optional[List[str]] = None) -> List[Dict]:
+        articles = self._payload('news', list, symbols) or []
+        if symbols is None:
+            return list(articles)
+        wanted = set(symbols)
+        return [article for article in articles if wanted.intersection(article.get('symbols', []))]
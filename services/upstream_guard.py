@@ -0,0 +1,303 @@
+"""Circuit breakers, call timeouts and last-known-good data for Alpaca calls
+
+Every upstream client is wrapped so its calls go through a breaker for the
+endpoint (bars, assets, news) and a deadline. A call that times out gives
+the request thread back at the deadline and keeps running on a daemon worker.
+After ``failure_threshold`` consecutive failures the breaker opens and calls
+are rejected at once. After ``reset_timeout`` seconds one trial call is let
+through; its result closes the breaker or opens it again.
+
+Successful results are remembered per symbol. When a request-time lookup
+fails or is rejected, the caller serves them as a :class:`StaleResult` and
+schedules a background revalidation.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+log = logging.getLogger('dadstocks.upstream')
+
+ENDPOINTS = ('bars', 'assets', 'news')
+
+STATE_CLOSED = 'closed'
+STATE_HALF_OPEN = 'half_open'
+STATE_OPEN = 'open'
+# Gauge values for the exported breaker state
+STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was not made or not answered in time"""
+
+    def __init__(self, message: str, endpoint: str):
+        super().__init__(message)
+        self.endpoint = endpoint
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Rejected without calling upstream because the breaker is open"""
+
+
+class UpstreamCallTimeout(UpstreamUnavailable):
+    """The call did not return before its deadline"""
+
+
+def fallback_reason(error: BaseException) -> str:
+    """Label for why a lookup fell back: open, timeout or error"""
+    if isinstance(error, CircuitOpenError):
+        return 'open'
+    if isinstance(error, UpstreamCallTimeout):
+        return 'timeout'
+    return 'error'
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; claims the trial slot when half-open"""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = STATE_HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            recovered = self._state != STATE_CLOSED
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+        if recovered:
+            log.info('Circuit closed for %s', self.name, extra={'endpoint': self.name})
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_CLOSED and self._failures < self.failure_threshold:
+                return
+            opened = self._state != STATE_OPEN
+            self._state = STATE_OPEN
+            self._opened_at = self._clock()
+            self._trial_in_flight = False
+            failures = self._failures
+        if opened:
+            log.warning('Circuit opened for %s after %s failures', self.name, failures,
+                        extra={'endpoint': self.name})
+
+
+class _CallPool:
+    """Daemon threads running upstream calls, so a hung call never blocks exit"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._calls: 'queue.SimpleQueue[Tuple]' = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future: Future = Future()
+        self._calls.put((future, fn, args, kwargs))
+        if len(self._threads) < self.size:
+            with self._lock:
+                if len(self._threads) < self.size:
+                    thread = threading.Thread(target=self._run, name=f"upstream-{len(self._threads)}", daemon=True)
+                    self._threads.append(thread)
+                    thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs = self._calls.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class StaleResult(dict):
+    """Last-known-good data served in place of a failed upstream lookup"""
+
+    stale = True
+
+    def __init__(self, data: Mapping, as_of: Optional[float], reason: str):
+        super().__init__(data)
+        self.as_of = as_of
+        self.reason = reason
+
+
+class GuardedClient:
+    """Transparent proxy sending an upstream client's calls through the guard"""
+
+    def __init__(self, inner, guard: 'UpstreamGuard'):
+        # Imported here: upstream_capture pulls in pandas
+        from .upstream_capture import RECORDED_METHODS
+        self._inner = inner
+        self._guard = guard
+        self._methods = RECORDED_METHODS
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        endpoint = self._methods.get(name)
+        if endpoint is None or not callable(attr):
+            return attr
+        guard = self._guard
+
+        def guarded(*args, **kwargs):
+            return guard.call(endpoint, attr, *args, **kwargs)
+
+        return guarded
+
+
+class UpstreamGuard:
+    """Breakers and deadlines for upstream calls, plus the last good data they returned"""
+
+    def __init__(self, timeout: float = 5.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 stale_max_age: float = 86400.0, max_workers: int = 8,
+                 clock: Callable[[], float] = time.monotonic):
+        # 0 disables the deadline; calls then run on the caller's thread
+        self.timeout = timeout
+        self.stale_max_age = stale_max_age
+        self.max_workers = max_workers
+        self.breakers = {endpoint: CircuitBreaker(endpoint, failure_threshold, reset_timeout, clock)
+                         for endpoint in ENDPOINTS}
+        self._pool: Optional[_CallPool] = None
+        self._lock = threading.Lock()
+        self._revalidating: Set[Hashable] = set()
+        # symbol -> (stored at, Quote) and symbol -> (stored at, articles)
+        self._quotes: Dict[str, Tuple[float, object]] = {}
+        self._news: Dict[str, Tuple[float, List[dict]]] = {}
+
+    def wrap(self, client):
+        """Proxy an upstream client; for AlpacaFactory.instrument"""
+        return GuardedClient(client, self)
+
+    def reset_after_fork(self):
+        """Forget worker threads and revalidations inherited from a parent"""
+        self._pool = None
+        self._lock = threading.Lock()
+        self._revalidating = set()
+
+    def _get_pool(self) -> _CallPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = _CallPool(self.max_workers)
+        return self._pool
+
+    def call(self, endpoint: str, fn: Callable, *args, **kwargs):
+        """Call ``fn`` through the endpoint's breaker and the deadline"""
+        breaker = self.breakers.get(endpoint)
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {endpoint}", endpoint)
+        try:
+            if self.timeout:
+                future = self._get_pool().submit(fn, *args, **kwargs)
+                try:
+                    result = future.result(self.timeout)
+                except FutureTimeout:
+                    raise UpstreamCallTimeout(
+                        f"{endpoint} did not answer within {self.timeout:g}s", endpoint) from None
+            else:
+                result = fn(*args, **kwargs)
+        except Exception:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    def revalidate(self, key: Hashable, fn: Callable[[], None]) -> bool:
+        """Run ``fn`` in the background unless a revalidation for ``key`` is already running"""
+        with self._lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                fn()
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, name='upstream-revalidate', daemon=True).start()
+        return True
+
+    # Last known good
+
+    def remember_quotes(self, quotes: Mapping[str, object]):
+        now = time.time()
+        for symbol, quote in quotes.items():
+            self._quotes[symbol] = (now, quote)
+
+    def stale_quotes(self, symbols: Iterable[str], reason: str) -> StaleResult:
+        """The last good quote for each symbol, if not older than ``stale_max_age``"""
+        found, oldest = self._lookup(self._quotes, symbols)
+        return StaleResult(found, oldest, reason)
+
+    def remember_news(self, symbols: Iterable[str], articles: List[dict]):
+        now = time.time()
+        by_symbol: Dict[str, List[dict]] = {symbol: [] for symbol in symbols}
+        for article in articles:
+            for symbol in article.get('symbols', ()):
+                if symbol in by_symbol:
+                    by_symbol[symbol].append(article)
+        for symbol, symbol_articles in by_symbol.items():
+            self._news[symbol] = (now, symbol_articles)
+
+    def stale_news(self, symbols: Iterable[str]) -> List[dict]:
+        """The last good articles for ``symbols``, each marked ``stale``"""
+        found, _ = self._lookup(self._news, symbols)
+        articles, seen = [], set()
+        for symbol_articles in found.values():
+            for article in symbol_articles:
+                key = article.get('id') or article.get('url') or article.get('headline')
+                if key in seen:
+                    continue
+                seen.add(key)
+                articles.append(dict(article, stale=True))
+        return articles
+
+    def _lookup(self, store: Dict, symbols: Iterable[str]) -> Tuple[Dict, Optional[float]]:
+        cutoff = time.time() - self.stale_max_age
+        found, oldest = {}, None
+        for symbol in symbols:
+            entry = store.get(symbol)
+            if entry is None or entry[0] < cutoff:
+                continue
+            found[symbol] = entry[1]
+            oldest = entry[0] if oldest is None else min(oldest, entry[0])
+        return found, oldest
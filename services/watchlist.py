@@ -0,0 +1,170 @@
+"""Bulk watchlist import: symbol lists and CSV files added in one batch
+
+:func:`add_symbols` validates a whole list at once and never goes upstream
+per symbol: symbols already in the ``stocks`` table are linked directly, new
+ones are checked against the cached :class:`AssetCatalog` and quoted with a
+single batched call, and the ``stocks`` and ``user_stocks`` rows are each
+written with one multi-row INSERT. Every symbol gets a result saying what
+happened to it.
+"""
+import csv
+import io
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from sqlalchemy import select
+
+from models import Stock, UserStock, db
+
+from .inserts import insert_ignoring_duplicates
+from .quotes import Quote
+
+log = logging.getLogger('dadstocks.watchlist')
+
+# Fits Stock.symbol; letters, digits, dots and dashes as in BRK.B
+SYMBOL = re.compile(r'[A-Z][A-Z0-9.\-]{0,9}')
+# Headings of the column holding the symbols in an uploaded CSV
+SYMBOL_COLUMNS = ('symbol', 'ticker', 'symbols', 'tickers')
+
+ADDED = 'added'
+TRACKED = 'already_tracked'
+INVALID = 'invalid'
+UNKNOWN = 'unknown'
+NO_DATA = 'no_data'
+MESSAGES = {
+    ADDED: 'Added',
+    TRACKED: 'Already tracked',
+    INVALID: 'Not a valid symbol',
+    UNKNOWN: 'Not a known asset',
+    NO_DATA: 'No price data available',
+}
+
+
+def parse_symbols(text: str) -> List[str]:
+    """Symbols separated by commas, semicolons or whitespace, uppercased, without repeats"""
+    return list(dict.fromkeys(token.upper() for token in re.split(r'[\s,;]+', text) if token))
+
+
+def parse_csv(text: str) -> List[str]:
+    """Symbols from a CSV export, e.g. a broker's positions file
+
+    Taken from the column headed symbol or ticker if the first row names
+    one, otherwise from the first column of every row.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in SYMBOL_COLUMNS if name in header), None)
+    if column is None:
+        column = 0
+    else:
+        rows = rows[1:]
+    return list(dict.fromkeys(row[column].strip().upper() for row in rows
+                              if len(row) > column and row[column].strip()))
+
+
+class AssetCatalog:
+    """Known symbols and their names from upstream, fetched at most once per ``ttl`` seconds
+
+    ``fetch()`` returns a symbol -> name mapping, or None when there is no
+    way to ask (e.g. no credentials). ``names()`` keeps serving the last
+    catalog if a later fetch fails, and returns None if there never was one.
+    """
+
+    def __init__(self, fetch: Callable[[], Optional[Mapping[str, str]]], ttl: float = 86400.0):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._names: Optional[Mapping[str, str]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def names(self) -> Optional[Mapping[str, str]]:
+        with self._lock:
+            now = time.monotonic()
+            if self._names is None or now - self._fetched_at >= self.ttl:
+                try:
+                    names = self.fetch()
+                except Exception as e:
+                    log.warning('Asset catalog fetch failed: %s', e)
+                    names = None
+                if names is not None:
+                    self._names = names
+                    self._fetched_at = now
+            return self._names
+
+
+def _stock_ids(symbols: List[str]) -> Dict[str, int]:
+    ids = {}
+    for start in range(0, len(symbols), 500):
+        ids.update((symbol, stock_id) for stock_id, symbol in db.session.execute(
+            select(Stock.id, Stock.symbol).where(Stock.symbol.in_(symbols[start:start + 500]))))
+    return ids
+
+
+def _stock_row(symbol: str, quote: Quote, name: Optional[str]) -> Dict[str, Any]:
+    timestamp = quote.timestamp
+    return {
+        'symbol': symbol,
+        'name': quote.name or name,
+        'current_price': quote.price,
+        'previous_close': quote.previous_close,
+        'price_change': quote.change,
+        'price_change_percent': quote.change_percent,
+        # Stored naive, in UTC, like every other timestamp column
+        'last_updated': timestamp.astimezone(timezone.utc).replace(tzinfo=None) if timestamp is not None
+        else datetime.utcnow(),
+    }
+
+
+def add_symbols(user_id: int, symbols: Sequence[str], catalog: Optional[Mapping[str, str]],
+                fetch_quotes: Callable[[List[str]], Mapping[str, Any]]) -> List[Dict[str, str]]:
+    """Add ``symbols`` to a user's watchlist; one ``{symbol, status, message}`` per symbol, in order
+
+    Symbols not yet in ``stocks`` must be in ``catalog``, when there is one,
+    and get their first quote from one ``fetch_quotes(symbols)`` call. The
+    caller commits.
+    """
+    symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols))
+    status = {symbol: INVALID for symbol in symbols if not SYMBOL.fullmatch(symbol)}
+    valid = [symbol for symbol in symbols if symbol not in status]
+
+    tracked = set()
+    for start in range(0, len(valid), 500):
+        tracked.update(db.session.execute(
+            select(Stock.symbol).join(UserStock, UserStock.stock_id == Stock.id)
+            .where(UserStock.user_id == user_id, Stock.symbol.in_(valid[start:start + 500]))).scalars())
+    status.update(dict.fromkeys(tracked, TRACKED))
+    wanted = [symbol for symbol in valid if symbol not in tracked]
+
+    ids = _stock_ids(wanted)
+    new = [symbol for symbol in wanted if symbol not in ids]
+    if catalog is not None:
+        status.update((symbol, UNKNOWN) for symbol in new if symbol not in catalog)
+        new = [symbol for symbol in new if symbol in catalog]
+    if new:
+        quotes = fetch_quotes(new) or {}
+        rows = []
+        for symbol in new:
+            quote = Quote.coerce(symbol, quotes.get(symbol))
+            if quote is None:
+                status[symbol] = NO_DATA
+            else:
+                rows.append(_stock_row(symbol, quote, catalog.get(symbol) if catalog else None))
+        if rows:
+            insert_ignoring_duplicates(Stock.__table__, rows, ['symbol'])
+            ids.update(_stock_ids([row['symbol'] for row in rows]))
+
+    links = [symbol for symbol in wanted if symbol in ids]
+    if links:
+        now = datetime.utcnow()
+        insert_ignoring_duplicates(UserStock.__table__, [
+            {'user_id': user_id, 'stock_id': ids[symbol], 'created_at': now} for symbol in links
+        ], ['user_id', 'stock_id'])
+        status.update(dict.fromkeys(links, ADDED))
+    return [{'symbol': symbol, 'status': status[symbol], 'message': MESSAGES[status[symbol]]}
+            for symbol in symbols]
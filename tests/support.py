@@ -0,0 +1,53 @@
+"""Shared setup for tests that run the app against a temporary database"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import create_app, update_stock_prices
+from config import TestConfig
+from models import Stock, User, UserStock, db
+from services.quotes import Quote
+
+
+class AppTestCase(unittest.TestCase):
+    """A fresh simulation-mode app per test, on its own SQLite file
+
+    ``settings`` are applied on top of TestConfig. Subclasses seed their
+    data after calling ``super().setUp()``.
+    """
+
+    settings = {}
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.config = type('Config', (TestConfig,), {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmpdir.name, 'app.db')}",
+            'SIMULATION_MODE': True,
+            **self.settings,
+        })
+        self.app = create_app(self.config)
+        self.client = self.app.test_client()
+
+    def add_user(self, email, *stocks):
+        """Add a user tracking ``stocks``, as symbols or Stock rows, and return the user's id"""
+        with self.app.app_context():
+            user = User(email, 'secret')
+            stocks = [Stock(stock) if isinstance(stock, str) else stock for stock in stocks]
+            db.session.add_all([user, *stocks])
+            db.session.flush()
+            db.session.add_all([UserStock(user_id=user.id, stock_id=stock.id) for stock in stocks])
+            db.session.commit()
+            return user.id
+
+    def login(self, user_id):
+        with self.client.session_transaction() as session:
+            session['user_id'] = user_id
+
+    def refresh(self, price, previous_close=150.0, app=None):
+        """Run one refresh cycle with AAPL and the indexes quoted at ``price``"""
+        app = app or self.app
+        quotes = {symbol: Quote(symbol, price, previous_close) for symbol in ['AAPL', *TestConfig.INDEX_SYMBOLS]}
+        with app.test_request_context(), patch('app.fetch_stock_data', return_value=quotes):
+            self.assertTrue(update_stock_prices())
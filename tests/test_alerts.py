@@ -0,0 +1,160 @@
+"""Tests for the price alert index and its evaluation in the refresh cycle"""
+import unittest
+from unittest.mock import patch
+
+from models import AlertEvent, PriceAlert, Stock, User, UserStock, db
+from services.alerts import (PERCENT_BELOW, PRICE_ABOVE, PRICE_BELOW, AlertIndex, PriceMove,
+                             describe)
+from support import AppTestCase
+
+
+class TestAlertIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = AlertIndex()
+        self.index.load([
+            (1, 'AAPL', PRICE_ABOVE, 150.0),
+            (2, 'AAPL', PRICE_ABOVE, 155.0),
+            (3, 'AAPL', PRICE_ABOVE, 160.0),
+            (4, 'AAPL', PRICE_BELOW, 140.0),
+            (5, 'AAPL', PERCENT_BELOW, -3.0),
+            (6, 'MSFT', PRICE_ABOVE, 150.0),
+        ])
+
+    def fired(self, *moves):
+        return sorted(alert.alert_id for alert in self.index.evaluate(moves))
+
+    def test_rising_move_fires_crossed_thresholds_once(self):
+        self.assertEqual(self.fired(PriceMove('AAPL', 149.0, 155.0, 0.0, 1.0)), [1, 2])
+        self.assertEqual(self.fired(PriceMove('AAPL', 155.0, 149.0, 1.0, 0.0)), [])
+        self.assertEqual(self.fired(PriceMove('AAPL', 149.0, 156.0, 0.0, 1.0)), [])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.loaded_through, 6)
+
+    def test_boundaries(self):
+        """Test that reaching a threshold fires but starting on it does not"""
+        self.assertEqual(self.fired(PriceMove('AAPL', 145.0, 140.0, 0.0, 0.0)), [4])
+        self.assertEqual(self.fired(PriceMove('AAPL', 150.0, 151.0, 0.0, 0.0)), [])
+
+    def test_percent_alerts_use_day_change(self):
+        self.assertEqual(self.fired(PriceMove('AAPL', 145.0, 145.5, -2.5, -3.5)), [5])
+
+    def test_only_moved_symbols_are_evaluated(self):
+        self.assertEqual(self.fired(PriceMove('MSFT', 149.0, 151.0, 0.0, 0.0)), [6])
+        self.assertEqual(self.fired(PriceMove('GOOGL', 1.0, 1000.0, 0.0, 50.0)), [])
+
+    def test_add_and_remove(self):
+        self.index.add(7, 'AAPL', PRICE_ABOVE, 150.0)
+        self.assertTrue(self.index.remove(1, 'AAPL', PRICE_ABOVE, 150.0))
+        self.assertFalse(self.index.remove(1, 'AAPL', PRICE_ABOVE, 150.0))
+        self.assertEqual(self.fired(PriceMove('AAPL', 149.0, 151.0, 0.0, 0.0)), [7])
+        with self.assertRaises(ValueError):
+            self.index.add(8, 'AAPL', 'sideways', 1.0)
+
+    def test_describe(self):
+        self.assertEqual(describe('AAPL', PRICE_ABOVE, 150, 151.2), 'AAPL crossed above $150.00 (now $151.20)')
+        self.assertEqual(describe('AAPL', PERCENT_BELOW, -3, -3.5),
+                         'AAPL moved down past -3.00% on the day (now -3.50%)')
+
+
+class TestRefreshAlerts(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        stock = Stock('AAPL')
+        stock.update_price(149.0, 148.0)
+        self.user_id = self.add_user('alerts@example.com', stock)
+        with self.app.app_context():
+            user_stock = UserStock.query.one()
+            db.session.add_all([
+                PriceAlert(user_stock_id=user_stock.id, kind=PRICE_ABOVE, threshold=150.0),
+                PriceAlert(user_stock_id=user_stock.id, kind=PRICE_ABOVE, threshold=200.0),
+            ])
+            db.session.commit()
+
+    def refresh(self, price):
+        super().refresh(price, 148.0)
+
+    def test_fired_alert_is_queued_and_delivered_once(self):
+        self.refresh(151.0)
+        self.refresh(149.0)
+        self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual(AlertEvent.query.count(), 1)
+            self.assertEqual(PriceAlert.query.filter_by(active=True).count(), 1)
+
+        self.login(self.user_id)
+        events = self.client.get('/api/alerts').get_json()
+        self.assertEqual([(e['symbol'], e['threshold'], e['value']) for e in events], [('AAPL', 150.0, 151.0)])
+        self.assertIn('crossed above $150.00', events[0]['message'])
+        self.assertEqual(self.client.get('/api/alerts').get_json(), [])
+
+    def test_deleted_user_takes_pending_events(self):
+        self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual(AlertEvent.query.count(), 1)
+            db.session.delete(db.session.get(User, self.user_id))
+            db.session.commit()
+            self.assertEqual(AlertEvent.query.count(), 0)
+
+    def test_deleted_alert_does_not_fire(self):
+        self.refresh(149.5)  # loads the index
+        with self.app.app_context():
+            db.session.delete(PriceAlert.query.filter_by(threshold=150.0).one())
+            db.session.commit()
+        self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual(AlertEvent.query.count(), 0)
+
+    def test_failed_commit_keeps_alerts(self):
+        with patch.object(db.session, 'commit', side_effect=RuntimeError('disk I/O error')):
+            self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual((AlertEvent.query.count(), PriceAlert.query.filter_by(active=True).count()), (0, 2))
+        self.refresh(149.0)
+        self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual([(e.kind, e.threshold) for e in AlertEvent.query], [(PRICE_ABOVE, 150.0)])
+
+    def test_failed_evaluation_keeps_alerts(self):
+        self.refresh(149.5)
+        with patch('app.AlertEvent', side_effect=RuntimeError('bad row')):
+            self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual(AlertEvent.query.count(), 0)
+        self.refresh(149.0)
+        self.refresh(151.0)
+        with self.app.app_context():
+            self.assertEqual([(e.kind, e.threshold) for e in AlertEvent.query], [(PRICE_ABOVE, 150.0)])
+
+    def test_alert_ids_are_not_reused(self):
+        self.refresh(149.5)
+        with self.app.app_context():
+            latest = PriceAlert.query.filter_by(threshold=200.0).one()
+            user_stock_id, latest_id = latest.user_stock_id, latest.id
+            db.session.delete(latest)
+            db.session.flush()
+            replacement = PriceAlert(user_stock_id=user_stock_id, kind=PRICE_BELOW, threshold=100.0)
+            db.session.add(replacement)
+            db.session.commit()
+            self.assertGreater(replacement.id, latest_id)
+        self.refresh(99.0)
+        with self.app.app_context():
+            self.assertEqual([(e.kind, e.threshold) for e in AlertEvent.query], [(PRICE_BELOW, 100.0)])
+
+    def test_reused_id_fires_only_as_stored(self):
+        # A database created before ids were kept unique can hand out a deleted id again
+        self.refresh(149.5)
+        with self.app.app_context():
+            stale = PriceAlert.query.filter_by(threshold=200.0).one()
+            stale.kind, stale.threshold = PRICE_BELOW, 100.0
+            db.session.commit()
+        self.refresh(201.0)
+        with self.app.app_context():
+            self.assertEqual([(e.kind, e.threshold) for e in AlertEvent.query], [(PRICE_ABOVE, 150.0)])
+        self.refresh(99.0)
+        with self.app.app_context():
+            self.assertEqual([(e.kind, e.threshold) for e in AlertEvent.query.order_by(AlertEvent.id)],
+                             [(PRICE_ABOVE, 150.0), (PRICE_BELOW, 100.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+"""Tests for bar bucketing and aggregation across timeframes"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app import create_app
+from config import TestConfig
+from models import db
+from services.bars import (DAY, FIVE_MINUTE, HOUR, MINUTE, TIMEFRAMES, WEEK, Bars, TickAggregator, aggregate,
+                           bucket_start, bucket_starts)
+from services.history import HistoryStore
+from services.mock_alpaca import MockAlpacaService
+
+
+def utc(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+# Friday 2024-03-08 through Tuesday 2024-03-12; clocks went forward on Sunday the 10th
+FRIDAY = utc(2024, 3, 8, 12, 0)
+TUESDAY = utc(2024, 3, 12, 20, 0)
+
+
+def random_ticks(seed=7):
+    rng = np.random.default_rng(seed)
+    ts = np.sort(rng.integers(FRIDAY, TUESDAY, 3000))
+    price = 100 + np.cumsum(rng.normal(0, 0.1, len(ts)))
+    size = rng.integers(1, 500, len(ts)).astype(float)
+    return ts, price, size
+
+
+class TestBuckets(unittest.TestCase):
+    def test_sessions_follow_new_york_daylight_saving(self):
+        # Midnight New York is 05:00 UTC before the switch and 04:00 UTC after
+        self.assertEqual(bucket_start(utc(2024, 3, 8, 23, 0), DAY), utc(2024, 3, 8, 5, 0))
+        self.assertEqual(bucket_start(utc(2024, 3, 11, 14, 0), DAY), utc(2024, 3, 11, 4, 0))
+        # 02:00 UTC Tuesday is still Monday evening in New York
+        self.assertEqual(bucket_start(utc(2024, 3, 12, 2, 0), DAY), utc(2024, 3, 11, 4, 0))
+        self.assertEqual(bucket_start(utc(2024, 3, 14, 14, 0), WEEK), utc(2024, 3, 11, 4, 0))
+        self.assertEqual(bucket_start(utc(2024, 3, 8, 23, 0), WEEK), utc(2024, 3, 4, 5, 0))
+
+    def test_weekends_only_in_intraday_bars(self):
+        saturday = utc(2024, 3, 9, 15, 7)
+        self.assertIsNone(bucket_start(saturday, DAY))
+        self.assertIsNone(bucket_start(saturday, WEEK))
+        self.assertEqual(bucket_start(saturday, FIVE_MINUTE), utc(2024, 3, 9, 15, 5))
+        self.assertEqual(bucket_start(saturday, HOUR), utc(2024, 3, 9, 15, 0))
+
+    def test_vectorized_matches_scalar(self):
+        ts = np.arange(FRIDAY - 86400 * 9, TUESDAY + 86400 * 9, 1799)
+        for timeframe in TIMEFRAMES:
+            expected = [bucket_start(t, timeframe) for t in ts.tolist()]
+            expected = [-1 if start is None else start for start in expected]
+            self.assertEqual(bucket_starts(ts, timeframe).tolist(), expected, timeframe)
+
+
+class TestAggregation(unittest.TestCase):
+    def test_batch_matches_incremental(self):
+        ts, price, size = random_ticks()
+        aggregator = TickAggregator()
+        for t, p, s in zip(ts.tolist(), price.tolist(), size.tolist()):
+            aggregator.add('AAPL', t, p, s)
+        incremental = {}
+        for symbol, timeframe, start, *bar in aggregator.drain():
+            incremental.setdefault(timeframe, []).append((start, *bar))
+        self.assertEqual(len(aggregator), 0)
+
+        ticks = Bars(ts, price, price, price, price, size)
+        for timeframe in TIMEFRAMES:
+            batch = aggregate(ticks, timeframe)
+            expected = Bars.from_rows(sorted(incremental[timeframe]))
+            for name in Bars.__slots__:
+                np.testing.assert_allclose(getattr(batch, name), getattr(expected, name), err_msg=timeframe)
+
+        # Coarser bars from 1-minute bars equal those straight from the ticks
+        minutes = aggregate(ticks, MINUTE)
+        for timeframe in (FIVE_MINUTE, HOUR, DAY, WEEK):
+            for name in Bars.__slots__:
+                np.testing.assert_allclose(getattr(aggregate(minutes, timeframe), name),
+                                           getattr(aggregate(ticks, timeframe), name), err_msg=timeframe)
+
+    def test_partial_leading_buckets_dropped(self):
+        minutes = Bars(np.arange(10) * 60 + 120, *([np.arange(10.0)] * 4), np.ones(10))
+        self.assertEqual(aggregate(minutes, FIVE_MINUTE).ts.tolist(), [0, 300, 600])
+        bars = aggregate(minutes, FIVE_MINUTE, complete_from=120)
+        self.assertEqual(bars.ts.tolist(), [300, 600])
+        self.assertEqual((bars.open[0], bars.close[0], bars.volume[0]), (3.0, 7.0, 5.0))
+        self.assertEqual(len(aggregate(Bars.empty(), WEEK)), 0)
+
+
+class TestAggregatedHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class Config(TestConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmpdir.name, 'bars.db')}"
+
+        self.app = create_app(Config)
+        self.context = self.app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+        self.tmpdir.cleanup()
+
+    def test_ticks_merge_into_every_timeframe(self):
+        store = HistoryStore()
+        ts, price, size = random_ticks()
+        ticks = list(zip(['AAPL'] * len(ts), ts.tolist(), price.tolist(), size.tolist()))
+        # Recorded over several cycles, so later ticks merge into stored bars
+        for offset in range(0, len(ticks), 700):
+            store.record_ticks(ticks[offset:offset + 700])
+        db.session.commit()
+
+        expected = Bars(ts, price, price, price, price, size)
+        for timeframe in TIMEFRAMES:
+            stored, batch = store.load('AAPL', timeframe), aggregate(expected, timeframe)
+            for name in Bars.__slots__:
+                np.testing.assert_allclose(getattr(stored, name), getattr(batch, name), err_msg=timeframe)
+
+    def test_backfill_derives_coarser_timeframes(self):
+        mock = MockAlpacaService(universe_size=0, seed=3)
+        calls = []
+
+        def fetch(symbols, timeframe, start, end):
+            calls.append(timeframe)
+            if timeframe == DAY:
+                return mock.get_daily_bars(symbols, days=1300, end=end)
+            return mock.get_intraday_bars(symbols, bars=3000, end=end)
+
+        store = HistoryStore(fetch)
+        timeframe, weeks = store.load_range('AAPL', '5Y')
+        self.assertEqual(timeframe, WEEK)
+        self.assertTrue(250 < len(weeks) < 262)
+        days = store.load('AAPL', DAY)
+        # The first, partial week is left out; the last one closes with the latest day
+        self.assertGreater(weeks.ts[0], days.ts[0])
+        self.assertEqual(weeks.close[-1], days.close[-1])
+        self.assertEqual(weeks.high.max(), days.since(int(weeks.ts[0])).high.max())
+
+        timeframe, bars = store.load_range('AAPL', '5D')
+        self.assertEqual(timeframe, FIVE_MINUTE)
+        self.assertTrue(np.all(bars.ts % 300 == 0))
+        self.assertEqual(len(store.load('AAPL', HOUR)), 3000 // 60)
+        store.load_range('AAPL', '1Y')
+        self.assertEqual(calls, [DAY, MINUTE])
+
+    def test_derive_rebuilds_from_stored_source(self):
+        store = HistoryStore()
+        minutes = Bars(np.arange(120) * 60 + utc(2024, 3, 11, 14, 0), *([np.arange(120.0)] * 4), np.ones(120))
+        store.write('AAPL', MINUTE, minutes)
+        self.assertEqual(store.derive('AAPL', HOUR), 2)
+        self.assertEqual(store.load('AAPL', HOUR).volume.tolist(), [60.0, 60.0])
+        self.assertEqual(store.derive('MSFT', HOUR), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+"""Tests for the benchmark harness"""
+import unittest
+
+from benchmarks.harness import compare, measure
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def test_measure_reports_percentiles(self):
+        """Test the shape of a measurement"""
+        stats = measure(lambda: sum(range(1000)), iterations=10, warmup=1, alloc_iterations=1)
+        self.assertEqual(stats['iterations'], 10)
+        self.assertLessEqual(stats['min_ms'], stats['p50_ms'])
+        self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+        self.assertLessEqual(stats['p95_ms'], stats['max_ms'])
+        self.assertIn('peak_alloc_kib', stats)
+
+    def test_compare_flags_regressions(self):
+        """Test baseline comparison"""
+        params = {'users': 1}
+        baseline = {'params': params, 'results': {'a': {'p50_ms': 1.0, 'p95_ms': 2.0},
+                                                   'b': {'p50_ms': 1.0, 'p95_ms': 2.0}}}
+        run = {'params': params, 'results': {'a': {'p50_ms': 1.1, 'p95_ms': 2.0},
+                                              'b': {'p50_ms': 2.0, 'p95_ms': 2.0}}}
+        report = compare(run, baseline, threshold=1.25)
+        self.assertEqual(report['regressions'], ['b'])
+        self.assertEqual(report['ratios']['a']['p50_ms'], 1.1)
+
+    def test_compare_skips_different_params(self):
+        """Test that runs with different inputs are not compared"""
+        report = compare({'params': {'users': 2}, 'results': {}}, {'params': {'users': 1}})
+        self.assertIn('skipped', report)
+        self.assertEqual(report['regressions'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
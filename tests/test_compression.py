@@ -0,0 +1,108 @@
+"""Tests for Accept-Encoding negotiation and response compression"""
+import gzip
+import os
+import tempfile
+import unittest
+
+from flask import Flask, jsonify, send_from_directory
+
+from services.compression import Compressor, parse_accept_encoding
+
+
+def make_app(compressor, static_dir=None):
+    app = Flask(__name__)
+
+    @app.route('/big')
+    def big():
+        return jsonify(prices=[{'symbol': f"S{i}", 'price': 100.0 + i} for i in range(200)])
+
+    @app.route('/small')
+    def small():
+        return jsonify(ok=True)
+
+    @app.route('/file/<name>')
+    def file(name):
+        return send_from_directory(static_dir, name)
+
+    compressor.init_app(app)
+    return app
+
+
+class TestNegotiation(unittest.TestCase):
+    def test_parse_q_values(self):
+        self.assertEqual(parse_accept_encoding('gzip, br;q=0.5, *;q=0'), {'gzip': 1.0, 'br': 0.5, '*': 0.0})
+
+    def test_choose(self):
+        """Test that the highest q wins, brotli breaks ties and q=0 refuses"""
+        compressor = Compressor()
+        compressor._brotli = object()
+        self.assertEqual(compressor.choose('gzip, deflate, br'), 'br')
+        self.assertEqual(compressor.choose('gzip;q=1, br;q=0.5'), 'gzip')
+        self.assertEqual(compressor.choose('br;q=0, gzip'), 'gzip')
+        self.assertEqual(compressor.choose('*'), 'br')
+        self.assertIsNone(compressor.choose('identity'))
+        self.assertIsNone(compressor.choose(''))
+
+        compressor._brotli = None
+        self.assertEqual(compressor.choose('br, gzip;q=0.1'), 'gzip')
+        self.assertIsNone(compressor.choose('br'))
+
+
+class TestCompressResponse(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmpdir.name, 'app.css'), 'w') as f:
+            f.write('.p-4{padding:1rem}\n' * 200)
+        self.compressor = Compressor(min_size=512)
+        self.compressor._brotli = None
+        self.client = make_app(self.compressor, self.tmpdir.name).test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_gzip_json(self):
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIn(b'"symbol":"S199"', gzip.decompress(response.data))
+
+    def test_identity_when_not_accepted_or_small(self):
+        response = self.client.get('/big')
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+
+    def test_static_file_compressed_once(self):
+        """Test that files are compressed once per ETag and the ETag is weakened"""
+        first = self.client.get('/file/app.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(first.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(first.data), b'.p-4{padding:1rem}\n' * 200)
+        self.assertTrue(first.headers['ETag'].startswith('W/'))
+        self.assertEqual(len(self.compressor._cache), 1)
+
+        second = self.client.get('/file/app.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.compressor._cache), 1)
+
+        # The weak validator still revalidates
+        revalidated = self.client.get('/file/app.css', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_brotli_when_available(self):
+        try:
+            import brotli
+        except ImportError:
+            self.skipTest('brotli not installed')
+        self.compressor._brotli = brotli
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertIn(b'"symbol":"S199"', brotli.decompress(response.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
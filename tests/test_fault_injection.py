@@ -0,0 +1,103 @@
+"""Tests for upstream fault injection in simulation mode"""
+import unittest
+
+from services.fault_injection import (FaultInjector, FaultProfile, RateLimited, UpstreamError,
+                                      UpstreamTimeout, load_profile)
+from services.alpaca_factory import AlpacaFactory
+from services.mock_alpaca import MockAlpacaService
+
+
+class FakeClock:
+    """Records sleeps and advances time without actually waiting"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def __call__(self):
+        return self.now
+
+
+class TestFaultInjection(unittest.TestCase):
+    def make_injector(self, **fields):
+        self.clock = FakeClock()
+        return FaultInjector(FaultProfile('test', **fields), seed=1,
+                             sleep=self.clock.sleep, clock=self.clock)
+
+    def test_load_profile(self):
+        """Test resolving named profiles with overrides"""
+        profile = load_profile('flaky', '{"error_rate": 0.5}')
+        self.assertEqual(profile.name, 'flaky')
+        self.assertEqual(profile.error_rate, 0.5)
+        with self.assertRaises(ValueError):
+            load_profile('missing')
+        with self.assertRaises(ValueError):
+            load_profile('none', '{"bogus": 1}')
+
+    def test_fixed_latency(self):
+        """Test that fixed latency sleeps on every call"""
+        injector = self.make_injector(latency='fixed', latency_ms=250)
+        injector.before_call('bars')
+        injector.before_call('news')
+        self.assertEqual(self.clock.sleeps, [0.25, 0.25])
+        self.assertEqual(injector.stats.calls, {'bars': 1, 'news': 1})
+
+    def test_errors_and_timeouts(self):
+        """Test that every call fails when the rates say so"""
+        injector = self.make_injector(error_rate=1.0)
+        with self.assertRaises(UpstreamError):
+            injector.before_call('bars')
+
+        injector = self.make_injector(timeout_rate=1.0, timeout_ms=2000)
+        with self.assertRaises(UpstreamTimeout):
+            injector.before_call('bars')
+        self.assertEqual(self.clock.sleeps, [2.0])
+        self.assertEqual(injector.stats.timeouts, {'bars': 1})
+
+    def test_rate_limit(self):
+        """Test the token bucket and its refill"""
+        injector = self.make_injector(rate_limit_per_minute=2)
+        injector.before_call('bars')
+        injector.before_call('bars')
+        with self.assertRaises(RateLimited) as raised:
+            injector.before_call('bars')
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertAlmostEqual(raised.exception.retry_after, 30.0)
+
+        self.clock.now += 30.0
+        injector.before_call('bars')
+        self.assertEqual(injector.stats.rate_limited, {'bars': 1})
+
+    def test_partial_coverage_is_stable(self):
+        """Test that the same symbols go missing on every call"""
+        injector = self.make_injector(coverage=0.5)
+        symbols = [f"S{i}" for i in range(200)]
+        covered = injector.filter_symbols(symbols)
+        self.assertLess(len(covered), 200)
+        self.assertGreater(len(covered), 0)
+        self.assertEqual(covered, injector.filter_symbols(symbols))
+
+    def test_mock_service_applies_faults(self):
+        """Test that the mock upstream raises injected errors"""
+        service = MockAlpacaService(seed=1, faults=self.make_injector(error_rate=1.0))
+        with self.assertRaises(UpstreamError):
+            service.get_stock_bars(['AAPL'])
+        with self.assertRaises(UpstreamError):
+            service.get_news(['AAPL'])
+
+    def test_factory_applies_overrides_to_none_profile(self):
+        """Test that overrides on the default profile still inject faults"""
+        factory = AlpacaFactory.get_instance()
+        factory.initialize(True, seed=1, fault_profile=load_profile('none', '{"error_rate": 1.0}'))
+        with self.assertRaises(UpstreamError):
+            factory.get_news(['AAPL'])
+        factory.initialize(True, seed=1, fault_profile=load_profile('none'))
+        self.assertIsNone(factory._mock_service.faults)
+
+
+if __name__ == '__main__':
+    unittest.main()
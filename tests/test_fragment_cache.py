@@ -0,0 +1,106 @@
+"""Tests for versioned template fragment caching"""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask, render_template_string
+
+from app import get_articles_by_symbol
+from models import db
+from services.fragment_cache import FragmentCache
+from services.news import save_articles
+from support import AppTestCase
+
+
+class TestFragmentCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.shared = 0
+        self.cache = FragmentCache(version=lambda: self.shared, max_age=60, clock=lambda: self.now)
+        self.renders = 0
+
+    def render(self):
+        self.renders += 1
+        return f"<b>{self.renders}</b>"
+
+    def test_renders_once_per_version(self):
+        self.assertEqual(self.cache.get_or_render(('panel',), self.render), '<b>1</b>')
+        self.assertEqual(self.cache.get_or_render(('panel',), self.render), '<b>1</b>')
+        self.assertEqual(self.cache.get_or_render(('panel', 'other'), self.render), '<b>2</b>')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_invalidation(self):
+        """Test that refresher invalidation, a shared version bump and age all re-render"""
+        self.cache.get_or_render(('panel',), self.render)
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get_or_render(('panel',), self.render), '<b>2</b>')
+        self.shared += 2
+        self.assertEqual(self.cache.get_or_render(('panel',), self.render), '<b>3</b>')
+        self.now += 60
+        self.assertEqual(self.cache.get_or_render(('panel',), self.render), '<b>4</b>')
+
+    def test_disabled(self):
+        self.cache.enabled = False
+        self.cache.get_or_render(('panel',), self.render)
+        self.cache.get_or_render(('panel',), self.render)
+        self.assertEqual(self.renders, 2)
+
+    def test_concurrent_misses_render_once(self):
+        def slow_render():
+            time.sleep(0.05)
+            return self.render()
+
+        threads = [threading.Thread(target=self.cache.get_or_render, args=(('panel',), slow_render))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.renders, 1)
+
+
+class TestCacheTag(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.cache = FragmentCache()
+        self.cache.init_app(self.app)
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return '<script>'
+
+    def render(self, **context):
+        template = "{% cache 'shared', key %}{% set value = load() %}{{ value }}{% endcache %}|{{ user }}"
+        with self.app.app_context():
+            return render_template_string(template, load=self.load, **context)
+
+    def test_block_cached_outside_stays_dynamic(self):
+        """Test that only the block is cached, its data is loaded once and escaping holds"""
+        self.assertEqual(self.render(key='a', user='ann'), '&lt;script&gt;|ann')
+        self.assertEqual(self.render(key='a', user='bob'), '&lt;script&gt;|bob')
+        self.assertEqual(self.loads, 1)
+        self.render(key='b', user='bob')
+        self.assertEqual(self.loads, 2)
+
+
+class TestNewsPage(AppTestCase):
+    def test_news_read_once_per_refresh(self):
+        article = {'id': 1, 'headline': 'Shared headline', 'summary': '', 'author': 'A', 'url': 'http://x',
+                   'created_at': '2024-01-01T00:00:00Z', 'updated_at': '2024-01-01T00:00:00Z', 'symbols': ['SPY']}
+        with self.app.app_context():
+            save_articles([article])
+            db.session.commit()
+        with patch('app.get_articles_by_symbol', wraps=get_articles_by_symbol) as load:
+            for _ in range(3):
+                self.assertIn(b'Shared headline', self.client.get('/news').data)
+            self.assertEqual(load.call_count, 1)
+
+            self.app.fragment_cache.invalidate()
+            self.client.get('/news')
+            self.assertEqual(load.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
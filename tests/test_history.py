@@ -0,0 +1,228 @@
+"""Tests for the price history store, downsampling and the chart history API"""
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from models import PriceBar, Stock, db
+from services.bars import DAY, FIVE_MINUTE, MINUTE, Bars, session_start
+from services.downsampling import downsample, lttb, minmax
+from services.history import HistoryStore, series_payload
+from services.mock_alpaca import MockAlpacaService
+from services.quotes import Quote
+from support import AppTestCase
+
+
+def reference_lttb(x, y, threshold):
+    """Straightforward per-point LTTB to check the vectorized one against"""
+    length = len(y)
+    every = (length - 2) / (threshold - 2)
+    keep, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, length) if i < threshold - 3 else length
+        next_start = end if i < threshold - 3 else length - 1
+        cx = sum(x[next_start:next_end]) / (next_end - next_start)
+        cy = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(length - 1)
+    return keep
+
+
+class TestDownsampling(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.x = np.arange(1000, dtype=np.float64)
+        self.y = np.cumsum(rng.normal(size=1000))
+
+    def test_lttb_keeps_endpoints_and_budget(self):
+        keep = lttb(self.x, self.y, 100)
+        self.assertEqual(len(keep), 100)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_lttb_matches_reference(self):
+        x, y = self.x[:203], self.y[:203]
+        self.assertEqual(lttb(x, y, 20).tolist(), reference_lttb(x.tolist(), y.tolist(), 20))
+
+    def test_minmax_keeps_extremes(self):
+        y = self.y.copy()
+        y[500] = 1000.0
+        keep = minmax(y, 50)
+        self.assertLessEqual(len(keep), 50)
+        self.assertIn(500, keep)
+        self.assertIn(int(np.argmin(y)), keep)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+
+    def test_small_budgets_keep_endpoints(self):
+        for threshold in (2, 3):
+            self.assertEqual(minmax(self.y, threshold).tolist(), [0, len(self.y) - 1])
+        self.assertLessEqual(len(minmax(self.y, 4)), 4)
+        self.assertLessEqual(len(minmax(self.y, 5)), 5)
+
+    def test_short_series_returned_whole(self):
+        self.assertEqual(downsample(self.x[:10], self.y[:10], 50).tolist(), list(range(10)))
+        self.assertEqual(downsample(self.x[:10], self.y[:10], 50, 'minmax').tolist(), list(range(10)))
+        with self.assertRaises(ValueError):
+            downsample(self.x, self.y, 50, 'mean')
+
+
+class TestHistoryStore(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.context = self.app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def test_quotes_fold_into_minute_bars(self):
+        store = HistoryStore()
+        minute = datetime(2024, 3, 4, 15, 30, tzinfo=timezone.utc)
+        for second, price in ((5, 10.0), (20, 12.0), (40, 9.0), (55, 11.0)):
+            store.record_quotes({'AAPL': Quote('AAPL', price, 10.0)}, minute.replace(second=second))
+        store.record_quotes({'AAPL': {'price': 20.0}}, minute.replace(minute=31))
+        db.session.commit()
+
+        bars = store.load('AAPL', MINUTE)
+        start = int(minute.timestamp())
+        self.assertEqual(bars.ts.tolist(), [start, start + 60])
+        self.assertEqual((bars.open[0], bars.high[0], bars.low[0], bars.close[0]), (10.0, 12.0, 9.0, 11.0))
+        self.assertEqual(bars.close[1], 20.0)
+
+    def test_unchanged_bars_not_merged_again(self):
+        store = HistoryStore()
+        minute = datetime(2024, 3, 4, 15, 30, tzinfo=timezone.utc)
+        self.assertEqual(store.record_quotes({'AAPL': {'price': 10.0}}, minute), 5)
+        self.assertEqual(store.record_quotes({'AAPL': {'price': 10.0}}, minute.replace(second=30)), 0)
+        # A new minute touches only the minute bar
+        self.assertEqual(store.record_quotes({'AAPL': {'price': 10.0}}, minute.replace(minute=31)), 1)
+        self.assertEqual(store.record_quotes({'AAPL': {'price': 11.0}}, minute.replace(minute=31)), 5)
+        db.session.rollback()
+        store.forget()
+        self.assertEqual(store.record_quotes({'AAPL': {'price': 11.0}}, minute.replace(minute=31)), 5)
+
+    def test_quotes_recorded_at_their_own_timestamp(self):
+        store = HistoryStore()
+        close = datetime(2024, 3, 8, 20, 59, tzinfo=timezone.utc)  # Friday's last minute
+        quote = Quote('AAPL', 10.0, 9.0, timestamp=close)
+        self.assertEqual(store.record_quotes({'AAPL': quote}, close + timedelta(hours=6)), 5)
+        # The same bar repeated over the weekend and on Monday morning opens nothing
+        for hours in (30, 60):
+            self.assertEqual(store.record_quotes({'AAPL': quote}, close + timedelta(hours=hours)), 0)
+        # A revised price for the same bar folds into it
+        revised = Quote('AAPL', 10.5, 9.0, timestamp=close)
+        self.assertEqual(store.record_quotes({'AAPL': revised}, close + timedelta(hours=61)), 5)
+        db.session.commit()
+
+        self.assertEqual(store.load('AAPL', DAY).ts.tolist(), [session_start(close)])
+        minutes = store.load('AAPL', MINUTE)
+        self.assertEqual((minutes.ts.tolist(), minutes.close.tolist()), ([int(close.timestamp())], [10.5]))
+
+    def test_daily_bars_start_at_new_york_midnight_on_weekdays(self):
+        # 04:00 UTC in summer, 05:00 UTC in winter
+        self.assertEqual(session_start(datetime(2024, 7, 1, 2, 0, tzinfo=timezone.utc)),
+                         int(datetime(2024, 6, 30, 4, 0, tzinfo=timezone.utc).timestamp()))
+        self.assertEqual(session_start(datetime(2024, 1, 2, 15, 0, tzinfo=timezone.utc)),
+                         int(datetime(2024, 1, 2, 5, 0, tzinfo=timezone.utc).timestamp()))
+
+        store = HistoryStore()
+        monday, saturday = (datetime(2024, 3, d, 15, 0, tzinfo=timezone.utc) for d in (4, 9))
+        store.record_quotes({'AAPL': {'price': 10.0}}, monday)
+        store.record_quotes({'AAPL': {'price': 11.0}}, monday.replace(hour=18))
+        store.record_quotes({'AAPL': {'price': 12.0}}, saturday)
+        bars = store.load('AAPL', DAY)
+        self.assertEqual(bars.ts.tolist(), [session_start(monday)])
+        self.assertEqual((bars.open[0], bars.close[0]), (10.0, 11.0))
+
+    def test_write_replaces_and_prunes_minutes(self):
+        store = HistoryStore(minute_retention=timedelta(hours=1))
+        store.write('AAPL', MINUTE, Bars([0, 60], [1, 2], [1, 2], [1, 2], [1, 2], [5, 5]))
+        store.write('AAPL', MINUTE, Bars([60, 7200], [3, 4], [3, 4], [3, 4], [3, 4], [5, 5]))
+        store.write('AAPL', DAY, Bars([0], [1], [1], [1], [1], [5]))
+        self.assertEqual(store.load('AAPL', MINUTE).close.tolist(), [1.0, 3.0, 4.0])
+
+        self.assertEqual(store.prune(now=7200 + 3600), 2)
+        self.assertEqual(store.prune(now=7200 + 3601), 0)
+        self.assertEqual(store.load('AAPL', MINUTE).ts.tolist(), [7200])
+        self.assertEqual(len(store.load('AAPL', DAY)), 1)
+
+    def test_backfill_from_mock_frames(self):
+        mock = MockAlpacaService(universe_size=0, seed=3)
+        calls = []
+
+        def fetch(symbols, timeframe, start, end):
+            calls.append(timeframe)
+            if timeframe == DAY:
+                return mock.get_daily_bars(symbols, days=300, end=end)
+            return mock.get_intraday_bars(symbols, bars=600, end=end)
+
+        store = HistoryStore(fetch)
+        timeframe, bars = store.load_range('AAPL', '3M')
+        self.assertEqual(timeframe, DAY)
+        self.assertTrue(40 < len(bars) < 80)
+        self.assertTrue(np.all(np.diff(bars.ts) > 0))
+        # Daily bars start at midnight New York time
+        self.assertIn(datetime.fromtimestamp(int(bars.ts[-1]), timezone.utc).hour, (4, 5))
+        store.load_range('AAPL', '1Y')
+        store.load_range('AAPL', '1D')
+        self.assertEqual(calls, [DAY, MINUTE])
+
+    def test_payload_is_columnar(self):
+        bars = Bars(np.arange(500) * 60, *([np.linspace(1, 2, 500)] * 4), np.ones(500))
+        payload = json.loads(series_payload('AAPL', '1D', MINUTE, bars, 50, 'lttb'))
+        self.assertEqual((payload['points'], payload['source_points']), (50, 500))
+        self.assertEqual((len(payload['t']), len(payload['c'])), (50, 50))
+        self.assertEqual((payload['t'][0], payload['t'][-1]), (0, 499 * 60))
+
+
+class TestHistoryRoutes(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.add_user('charts@example.com'))
+        with self.app.app_context():
+            db.session.add(Stock('AAPL'))
+            db.session.commit()
+
+    def test_history_is_downsampled_and_cached(self):
+        response = self.client.get('/api/stocks/aapl/history?range=5D&points=120')
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        self.assertEqual((payload['symbol'], payload['timeframe'], payload['points']), ('AAPL', FIVE_MINUTE, 120))
+        self.assertGreater(payload['source_points'], 1000)
+
+        cache = self.app.history_cache
+        self.assertEqual(self.client.get('/api/stocks/AAPL/history?range=5D&points=120').data, response.data)
+        self.assertEqual(cache.hits, 1)
+        self.client.get('/api/stocks/AAPL/history?range=5D&points=120&method=minmax')
+        self.assertEqual(cache.misses, 2)
+
+    def test_refresh_records_bars_and_invalidates(self):
+        self.client.get('/api/stocks/AAPL/history?range=1D')
+        self.refresh(999.0)
+        with self.app.app_context():
+            latest = PriceBar.query.filter_by(symbol='AAPL', timeframe=MINUTE).order_by(PriceBar.ts.desc()).first()
+            self.assertEqual(latest.close, 999.0)
+        payload = self.client.get('/api/stocks/AAPL/history?range=1D').get_json()
+        self.assertEqual(payload['c'][-1], 999.0)
+        self.assertEqual(self.app.history_cache.hits, 0)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/stocks/AAPL/history?range=2W').status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/AAPL/history?method=mean').status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/AAPL/history?points=many').status_code, 400)
+        self.assertEqual(self.client.get('/api/stocks/NOPE/history').status_code, 404)
+        points = self.client.get('/api/stocks/AAPL/history?range=5D&points=1').get_json()['points']
+        self.assertEqual(points, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Tests for the rolling technical indicators and their refresh-cycle upkeep"""
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+
+from app import create_app
+from models import IndicatorState, db
+from services.bars import Bars, session_start
+from services.indicators import NAMES, IndicatorEngine, RollingState, batch_states
+from support import AppTestCase
+
+
+def random_bars(length, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, length)))
+    return Bars(np.arange(length) * 86400, close, close * 1.01, close * 0.99, close,
+                rng.uniform(1e5, 1e6, length))
+
+
+def folded(bars):
+    state = RollingState()
+    for row in zip(bars.ts.tolist(), bars.high.tolist(), bars.low.tolist(), bars.close.tolist(),
+                   bars.volume.tolist()):
+        state.fold(*row)
+    return state
+
+
+def assert_values_equal(test, actual, expected):
+    for name in NAMES:
+        if expected[name] is None:
+            test.assertIsNone(actual[name], name)
+        else:
+            test.assertAlmostEqual(actual[name], expected[name], places=9, msg=name)
+
+
+class TestRollingState(unittest.TestCase):
+    def test_matches_full_recomputation(self):
+        bars = random_bars(120)
+        values = folded(bars).values()
+        close = bars.close
+        self.assertAlmostEqual(values['sma_20'], close[-20:].mean(), places=9)
+        self.assertAlmostEqual(values['sma_50'], close[-50:].mean(), places=9)
+
+        ema = close[0]
+        for x in close[1:]:
+            ema += 2 / 21 * (x - ema)
+        self.assertAlmostEqual(values['ema_20'], ema, places=9)
+
+        change = np.diff(close)
+        gain, loss = np.clip(change, 0, None), np.clip(-change, 0, None)
+        avg_gain, avg_loss = gain[:14].mean(), loss[:14].mean()
+        for g, l in zip(gain[14:], loss[14:]):
+            avg_gain, avg_loss = (avg_gain * 13 + g) / 14, (avg_loss * 13 + l) / 14
+        self.assertAlmostEqual(values['rsi_14'], 100 - 100 / (1 + avg_gain / avg_loss), places=9)
+
+        typical = (bars.high + bars.low + bars.close) / 3
+        vwap = (typical[-20:] * bars.volume[-20:]).sum() / bars.volume[-20:].sum()
+        self.assertAlmostEqual(values['vwap_20'], vwap, places=9)
+
+    def test_values_need_enough_bars(self):
+        values = folded(random_bars(15)).values()
+        self.assertIsNone(values['sma_20'])
+        self.assertIsNone(values['vwap_20'])
+        self.assertIsNotNone(values['rsi_14'])
+        self.assertEqual(RollingState().values(), dict.fromkeys(NAMES))
+
+    def test_live_price_matches_folding_it(self):
+        for length in (0, 13, 14, 19, 49, 50, 51, 130):
+            state = folded(random_bars(length, seed=length))
+            live = state.values(123.0)
+            after = RollingState.from_json(state.to_json())
+            after.fold(10 ** 9, 123.0, 123.0, 123.0, 0.0)
+            expected = after.values()
+            # A live price has no volume, so the VWAP stays at the completed bars'
+            expected['vwap_20'] = state.values()['vwap_20']
+            assert_values_equal(self, live, expected)
+            self.assertEqual(state.to_json(), RollingState.from_json(state.to_json()).to_json())
+
+    def test_batch_matches_incremental(self):
+        series = {f"S{length}": random_bars(length, seed=length) for length in (1, 14, 15, 20, 49, 50, 51, 200)}
+        series['EMPTY'] = Bars.empty()
+        states = batch_states(series)
+        self.assertNotIn('EMPTY', states)
+        for symbol, bars in series.items():
+            if len(bars):
+                state = folded(bars)
+                self.assertEqual((states[symbol].count, states[symbol].through), (state.count, state.through))
+                assert_values_equal(self, states[symbol].values(), state.values())
+                assert_values_equal(self, states[symbol].values(99.0), state.values(99.0))
+
+    def test_engine_folds_only_new_bars(self):
+        bars = random_bars(60)
+        engine = IndicatorEngine()
+        engine.warm_up({'AAPL': bars})
+        self.assertFalse(engine.advance('AAPL', bars))
+
+        engine = IndicatorEngine()
+        engine.warm_up({'AAPL': Bars(*(getattr(bars, name)[:40] for name in bars.__slots__))})
+        self.assertTrue(engine.advance('AAPL', bars))
+        assert_values_equal(self, engine.values('AAPL'), folded(bars).values())
+        self.assertEqual(engine.values('MSFT'), dict.fromkeys(NAMES))
+
+
+class TestIndicatorRefresh(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.add_user('indicators@example.com', 'AAPL'))
+
+    def test_refresh_warms_up_and_persists_state(self):
+        self.refresh(160.0)
+        today = session_start(datetime.now(timezone.utc))
+        with self.app.app_context():
+            row = db.session.get(IndicatorState, 'AAPL')
+            self.assertLess(row.through, today)
+            # Backfilled from the simulated upstream, then warmed up in one batch
+            self.assertGreaterEqual(RollingState.from_json(row.state).count, 200)
+
+        indicators = self.client.get('/api/stocks').get_json()[0]['indicators']
+        self.assertEqual(set(indicators), set(NAMES))
+        self.assertTrue(all(value is not None for value in indicators.values()))
+        self.assertIn(b'RSI 14', self.client.get('/').data)
+
+        # A restarted app resumes from the saved state instead of warming up again
+        restarted = create_app(self.config)
+        with patch('services.history.HistoryStore.backfill') as backfill:
+            self.refresh(161.0, app=restarted)
+        backfill.assert_not_called()
+        self.assertTrue(restarted.indicators.loaded)
+        self.assertEqual(restarted.indicators.states['AAPL'].through, row.through)
+
+    def test_completed_bars_are_folded_once_per_session(self):
+        self.refresh(160.0)
+        engine = self.app.indicators
+        with patch.object(engine, 'advance') as advance:
+            self.refresh(161.0)
+        advance.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for the metrics registry and its Flask/SQLAlchemy hooks"""
+import unittest
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from services.fault_injection import UpstreamError
+from services.metrics import AppMetrics, Registry
+from services.mock_alpaca import MockAlpacaService
+
+
+class TestRegistry(unittest.TestCase):
+    def test_counter_and_gauge_exposition(self):
+        """Test Prometheus text output for labelled counters and gauges"""
+        registry = Registry()
+        counter = registry.counter('requests_total', 'Requests', ('route',))
+        counter.inc(route='/a')
+        counter.inc(2, route='/b"x')
+        registry.gauge('temperature', 'Temp').set(21.5)
+
+        output = registry.render()
+        self.assertIn('# TYPE requests_total counter', output)
+        self.assertIn('requests_total{route="/a"} 1', output)
+        self.assertIn('requests_total{route="/b\\"x"} 2', output)
+        self.assertIn('temperature 21.5', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket boundaries, +Inf, sum and count"""
+        histogram = Registry().histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        output = '\n'.join(histogram.render())
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', output)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', output)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', output)
+        self.assertIn('latency_seconds_sum 3.65', output)
+        self.assertIn('latency_seconds_count 4', output)
+
+    def test_label_mismatch_and_reregistration(self):
+        """Test that labels are validated and metrics are registered once"""
+        registry = Registry()
+        counter = registry.counter('hits_total', 'Hits', ('result',))
+        with self.assertRaises(ValueError):
+            counter.inc(outcome='hit')
+        self.assertIs(registry.counter('hits_total', 'Hits', ('result',)), counter)
+        with self.assertRaises(ValueError):
+            registry.gauge('hits_total', 'Hits')
+
+
+class TestAppMetrics(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.metrics = AppMetrics(clock=lambda: self.now)
+
+    def test_request_and_query_hooks(self):
+        """Test route latency and per-request SQL statement counts"""
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db = SQLAlchemy()
+        db.init_app(app)
+
+        @app.route('/items/<int:item_id>')
+        def item(item_id):
+            db.session.execute(text('SELECT 1'))
+            db.session.execute(text('SELECT 2'))
+            return 'ok'
+
+        self.metrics.init_app(app, db)
+        client = app.test_client()
+        self.assertEqual(client.get('/items/1').status_code, 200)
+        client.get('/items/2')
+        client.get('/missing')
+
+        labels = {'route': '/items/<int:item_id>', 'method': 'GET', 'status': '200'}
+        self.assertEqual(self.metrics.http_latency.count(**labels), 2)
+        self.assertEqual(self.metrics.http_queries.total(route='/items/<int:item_id>'), 4)
+        self.assertEqual(self.metrics.http_latency.count(route='unmatched', method='GET', status='404'), 1)
+
+        response = client.get('/metrics')
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds_bucket{route="/items/<int:item_id>"', response.data)
+        self.assertIn(b'db_queries_total 4', response.data)
+
+        # Disabled metrics record nothing
+        self.metrics.enabled = False
+        client.get('/items/3')
+        self.assertEqual(self.metrics.http_latency.count(**labels), 2)
+
+    def test_upstream_proxy(self):
+        """Test upstream latency and error counts by endpoint"""
+        service = self.metrics.wrap_upstream(MockAlpacaService(seed=1))
+        service.get_stock_bars(['AAPL'])
+        self.assertEqual(self.metrics.upstream_latency.count(endpoint='get_stock_bars'), 1)
+        self.assertEqual(service.get_asset_names(), service._inner.get_asset_names())
+
+        class Failing:
+            def get_news(self, symbols):
+                raise UpstreamError('news')
+
+        with self.assertRaises(UpstreamError):
+            self.metrics.wrap_upstream(Failing()).get_news(['AAPL'])
+        self.assertEqual(self.metrics.upstream_errors.value(endpoint='get_news', error='UpstreamError'), 1)
+        self.assertEqual(self.metrics.upstream_latency.count(endpoint='get_news'), 1)
+
+    def test_refresh_and_staleness(self):
+        """Test refresh cycle timing and per-symbol staleness at scrape time"""
+        self.metrics.record_refresh(0.2, 'ok', ['AAPL', 'MSFT'])
+        self.now += 30
+        self.metrics.record_refresh(0.1, 'ok', ['AAPL'])
+        self.metrics.record_refresh(0.05, 'error')
+        self.now += 5
+
+        output = self.metrics.registry.render()
+        self.assertIn('quote_staleness_seconds{symbol="AAPL"} 5', output)
+        self.assertIn('quote_staleness_seconds{symbol="MSFT"} 35', output)
+        self.assertIn('refresh_symbols 1', output)
+        self.assertEqual(self.metrics.refresh_latency.count(outcome='ok'), 2)
+        self.assertEqual(self.metrics.refresh_latency.count(outcome='error'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
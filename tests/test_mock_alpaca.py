@@ -0,0 +1,73 @@
+"""Tests for the simulated market in MockAlpacaService"""
+import unittest
+
+import numpy as np
+
+from services.mock_alpaca import MockAlpacaService, MAX_UNIVERSE_SIZE
+
+
+class TestMockAlpacaService(unittest.TestCase):
+    def test_default_universe(self):
+        """Test that the named assets are always available"""
+        service = MockAlpacaService(seed=1)
+        self.assertEqual(len(service), 9)
+        self.assertEqual(service.get_asset_names()['AAPL'], 'Apple Inc.')
+
+    def test_synthetic_universe(self):
+        """Test generating a large synthetic universe"""
+        service = MockAlpacaService(universe_size=5000, seed=1)
+        names = service.get_asset_names()
+        self.assertEqual(len(names), 5000)
+        self.assertIn('SPY', names)
+        self.assertEqual(len(service.get_assets()), 5000)
+
+    def test_universe_limit(self):
+        """Test that the universe size is bounded"""
+        with self.assertRaises(ValueError):
+            MockAlpacaService(universe_size=MAX_UNIVERSE_SIZE + 1)
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed produces the same prices"""
+        symbols = ['AAPL', 'MSFT', 'XAAAB']
+        first = MockAlpacaService(universe_size=100, seed=42)
+        second = MockAlpacaService(universe_size=100, seed=42)
+        for _ in range(3):
+            np.testing.assert_array_equal(
+                first.get_stock_bars(symbols)['close'].to_numpy(),
+                second.get_stock_bars(symbols)['close'].to_numpy()
+            )
+
+    def test_stock_bars_shape(self):
+        """Test the two-bar daily frame per known symbol"""
+        service = MockAlpacaService(seed=1)
+        bars = service.get_stock_bars(['AAPL', 'UNKNOWN', 'AAPL', 'SPY'])
+        self.assertEqual(bars.index.names, ['symbol', 'timestamp'])
+        self.assertEqual(list(bars.index.get_level_values('symbol')), ['AAPL', 'AAPL', 'SPY', 'SPY'])
+        self.assertTrue(service.get_stock_bars(['UNKNOWN']).empty)
+
+    def test_prices_stay_in_band(self):
+        """Test that mean reversion and clipping keep prices near base"""
+        service = MockAlpacaService(seed=3)
+        for _ in range(200):
+            bars = service.get_stock_bars(['MSFT'])
+        price = bars['close'].iloc[-1]
+        self.assertGreaterEqual(price, 400.0 * 0.8)
+        self.assertLessEqual(price, 400.0 * 1.2)
+
+    def test_intraday_bars(self):
+        """Test intraday OHLCV bars ending at the current price"""
+        service = MockAlpacaService(seed=1)
+        latest = service.get_stock_bars(['AAPL'])['close'].iloc[-1]
+        bars = service.get_intraday_bars(['AAPL', 'MSFT'], bars=30, timeframe_minutes=5)
+
+        self.assertEqual(len(bars), 60)
+        aapl = bars.loc['AAPL']
+        self.assertAlmostEqual(aapl['close'].iloc[-1], latest, places=2)
+        self.assertTrue((aapl['high'] >= aapl[['open', 'close']].max(axis=1)).all())
+        self.assertTrue((aapl['low'] <= aapl[['open', 'close']].min(axis=1)).all())
+        deltas = aapl.index.to_series().diff().dropna().dt.total_seconds()
+        self.assertTrue((deltas == 300).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
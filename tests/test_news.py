@@ -0,0 +1,128 @@
+"""Tests for the stored news: saving, keyset pages, search and the news routes"""
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from app import store_news
+from models import NewsArticle, NewsSymbol, db
+from services.news import article_uid, match_query, page, parse_cursor, save_articles
+from support import AppTestCase
+
+BASE = 1_700_000_000
+
+
+def article(i, symbols, headline=None, summary='Quarterly results', ts=None):
+    published = BASE + (i * 60 if ts is None else ts)
+    return {'id': i, 'headline': headline or f"Headline {i}", 'summary': summary, 'author': 'Desk',
+            'url': f"http://example.com/{i}", 'created_at': published,
+            'updated_at': datetime.utcfromtimestamp(published).isoformat() + 'Z', 'symbols': symbols}
+
+
+class TestNewsStore(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.context = self.app.app_context()
+        self.context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        self.context.pop()
+
+    def test_saved_once_with_a_row_per_symbol(self):
+        articles = [article(1, ['AAPL', 'MSFT']), article(2, ['aapl'])]
+        self.assertEqual(save_articles(articles), 2)
+        self.assertEqual(save_articles(articles + [article(3, [])]), 1)
+        db.session.commit()
+        self.assertEqual(NewsArticle.query.count(), 3)
+        self.assertEqual(sorted((row.symbol, row.article_id) for row in NewsSymbol.query),
+                         [('AAPL', 1), ('AAPL', 2), ('MSFT', 1)])
+        # Sources without ids are told apart by url and headline
+        self.assertNotEqual(article_uid({'url': 'u', 'headline': 'a'}), article_uid({'url': 'u', 'headline': 'b'}))
+
+    def test_keyset_pages_cover_every_article_once(self):
+        # Several articles share a timestamp, so pages must split ties by id
+        save_articles([article(i, ['AAPL'] if i % 3 else ['MSFT'], ts=i // 4 * 60) for i in range(30)])
+        db.session.commit()
+        seen, before = [], None
+        while True:
+            rows, cursor = page('AAPL', before=before, limit=4)
+            seen.extend(rows)
+            if cursor is None:
+                break
+            before = parse_cursor(cursor)
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(len({row.id for row in seen}), 20)
+        keys = [(row.published_at, row.id) for row in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+        rows, _ = page(before=(BASE + 60, 0), limit=100)
+        self.assertEqual(sorted(row.id for row in rows), [1, 2, 3, 4])
+        with self.assertRaises(ValueError):
+            parse_cursor('yesterday')
+
+    def test_search(self):
+        save_articles([
+            article(1, ['AAPL'], 'Apple unveils new iPhone', 'Shares rose'),
+            article(2, ['MSFT'], 'Microsoft earnings beat', 'Cloud growth'),
+            article(3, ['AAPL', 'MSFT'], 'Apple and Microsoft settle', 'Cloud lawsuit ends'),
+        ])
+        db.session.commit()
+        ids = lambda rows: [row.id for row in rows[0]]
+        self.assertEqual(ids(page(query='cloud')), [3, 2])
+        self.assertEqual(ids(page(query='appl clou')), [3])
+        self.assertEqual(ids(page('AAPL', 'cloud')), [3])
+        self.assertEqual(ids(page(query='iphone')), [1])
+        # FTS5 syntax in the query is taken as plain words
+        self.assertEqual(match_query('AT&T "OR'), '"at"* "t"* "or"*')
+        self.assertEqual(page(query='"*'), ([], None))
+
+
+class TestNewsRoutes(AppTestCase):
+    settings = {'NEWS_PAGE_SIZE': 2, 'NEWS_OVERVIEW_SIZE': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.login(self.add_user('news@example.com'))
+        with self.app.app_context():
+            save_articles([article(i, ['SPY'], f"Market update {i}") for i in range(1, 4)])
+            db.session.commit()
+
+    def test_api_pages(self):
+        payload = self.client.get('/api/news?symbol=spy').get_json()
+        self.assertEqual([item['headline'] for item in payload['articles']], ['Market update 3', 'Market update 2'])
+        self.assertEqual(payload['articles'][0]['symbols'], ['SPY'])
+        payload = self.client.get(f"/api/news?symbol=SPY&before={payload['next_before']}").get_json()
+        self.assertEqual(([item['headline'] for item in payload['articles']], payload['next_before']),
+                         (['Market update 1'], None))
+        self.assertEqual(len(self.client.get('/api/news?q=market&limit=10').get_json()['articles']), 3)
+        self.assertEqual(self.client.get('/api/news?before=soon').status_code, 400)
+
+    def test_page_search_and_overview(self):
+        response = self.client.get('/news?q=update')
+        self.assertIn(b'Market update 3', response.data)
+        self.assertIn(b'Older articles', response.data)
+        self.assertEqual(self.client.get('/news?before=x').status_code, 400)
+
+        # The overview shows each symbol's newest stored articles, without calling upstream
+        fetched = [article(9, ['SPY'], 'Fresh headline')]
+        with patch('app.get_news_for_symbols', return_value=fetched) as get_news:
+            response = self.client.get('/news')
+            self.assertIn(b'Market update 3', response.data)
+            self.assertNotIn(b'Market update 1', response.data)
+            self.assertIn(b'All SPY news', response.data)
+            get_news.assert_not_called()
+            self.client.get('/')
+            with self.app.app_context():
+                self.assertEqual(NewsArticle.query.count(), 3)
+
+            # The refresher stores it, at most once per interval
+            with self.app.app_context():
+                self.assertEqual(store_news(['SPY']), 1)
+                self.assertEqual(store_news(['SPY']), 0)
+                self.assertEqual(NewsArticle.query.count(), 4)
+        self.app.fragment_cache.invalidate()
+        self.assertIn(b'Fresh headline', self.client.get('/news').data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests for the multi-period performance summaries"""
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+
+from models import PerformanceSummary, db
+from services.bars import NEW_YORK, Bars, session_start
+from services.performance import ANCHORS, FIELDS, bounds, compute_anchors, summarize, summary_rows
+from support import AppTestCase
+
+
+def new_york(*args) -> int:
+    return int(NEW_YORK.localize(datetime(*args)).timestamp())
+
+
+def daily_bars(first, last, seed=1):
+    """Weekday bars at New York midnight from ``first`` to ``last``, as (year, month, day)"""
+    days = np.arange(np.datetime64('%04d-%02d-%02d' % first), np.datetime64('%04d-%02d-%02d' % last))
+    days = days[np.is_busday(days)]
+    ts = np.array([new_york(*map(int, str(day).split('-'))) for day in days])
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(ts))))
+    return Bars(ts, close, close * 1.01, close * 0.99, close, np.ones(len(ts)))
+
+
+def reference(bars, today):
+    """Anchors for one symbol, found with a plain scan"""
+    week, month, year, window = bounds(today)
+    rows = [row for row in zip(bars.ts.tolist(), bars.high.tolist(), bars.low.tolist(), bars.close.tolist())
+            if row[0] < today]
+
+    def close_before(bound):
+        closes = [close for ts, _, _, close in rows if ts < bound]
+        return closes[-1] if closes else None
+
+    recent = [row for row in rows if row[0] >= window]
+    return (close_before(week), close_before(month), close_before(year),
+            max(row[1] for row in recent) if recent else None, min(row[2] for row in recent) if recent else None)
+
+
+class TestAnchors(unittest.TestCase):
+    def test_bounds(self):
+        # Thursday 2024-03-14: last Thursday's close, Feb 14's, the 2023 year end's
+        today = new_york(2024, 3, 14)
+        self.assertEqual(bounds(today), (new_york(2024, 3, 8), new_york(2024, 2, 15), new_york(2024, 1, 1),
+                                         new_york(2023, 3, 14)))
+        # March 31 reaches back to February's last day
+        self.assertEqual(bounds(new_york(2024, 3, 31))[1], new_york(2024, 3, 1))
+        self.assertEqual(bounds(new_york(2024, 1, 5))[1], new_york(2023, 12, 6))
+        self.assertEqual(bounds(new_york(2024, 2, 29))[3], new_york(2023, 2, 28))
+
+    def test_batch_matches_scan(self):
+        today = new_york(2024, 3, 14)
+        series = {
+            'LONG': daily_bars((2022, 11, 1), (2024, 3, 20), seed=1),
+            'YEAR': daily_bars((2023, 6, 1), (2024, 3, 14), seed=2),
+            'NEW': daily_bars((2024, 3, 1), (2024, 3, 14), seed=3),
+            'TODAY': daily_bars((2024, 3, 14), (2024, 3, 15), seed=4),
+            'EMPTY': Bars.empty(),
+        }
+        symbols, anchors = compute_anchors(series, today)
+        self.assertEqual(symbols, ['LONG', 'YEAR', 'NEW'])
+        for symbol, row in zip(symbols, anchors):
+            expected = [np.nan if value is None else value for value in reference(series[symbol], today)]
+            np.testing.assert_array_equal(row, expected, err_msg=symbol)
+        # Two weeks of history give a 1-week return but no 1-month or YTD one
+        self.assertFalse(np.isnan(anchors[2, 0]))
+        self.assertTrue(np.isnan(anchors[2, 1:3]).all())
+
+    def test_summarize(self):
+        anchors = np.array([[100.0, 50.0, np.nan, 120.0, 90.0], [10.0, 10.0, 10.0, 12.0, 9.0]])
+        figures = summarize(anchors, np.array([110.0, 8.0]))
+        np.testing.assert_allclose(figures[0], [10.0, 120.0, np.nan, 120.0, 90.0])
+        np.testing.assert_allclose(figures[1], [-20.0, -20.0, -20.0, 12.0, 8.0])
+
+    def test_rows_only_for_changes(self):
+        today = new_york(2024, 3, 14)
+        history = {'AAPL': daily_bars((2023, 1, 1), (2024, 3, 14)), 'MSFT': daily_bars((2023, 1, 1), (2024, 3, 14))}
+        loads = []
+
+        def load(symbols):
+            loads.append(symbols)
+            return {symbol: history[symbol] for symbol in symbols}
+
+        inserts, updates = summary_rows({'AAPL': 150.0, 'MSFT': 300.0}, {}, today, load)
+        self.assertEqual(([row['symbol'] for row in inserts], updates), (['AAPL', 'MSFT'], []))
+        self.assertEqual(set(inserts[0]), {'symbol', 'session', 'price', *ANCHORS, *FIELDS})
+        stored = {row['symbol']: (row['session'], row['price'], *(row[name] for name in ANCHORS))
+                  for row in inserts}
+
+        # Same session: anchors are reused, and only the moved price is written
+        inserts, updates = summary_rows({'AAPL': 150.0, 'MSFT': 310.0}, stored, today, load)
+        self.assertEqual((inserts, [row['symbol'] for row in updates]), ([], ['MSFT']))
+        self.assertEqual(loads, [['AAPL', 'MSFT']])
+        self.assertNotIn('session', updates[0])
+        # History too short for anchors isn't looked at again until the next session
+        short = {'TSLA': (today, 200.0, None, None, None, None, None)}
+        inserts, updates = summary_rows({'TSLA': 210.0}, short, today, load)
+        self.assertEqual(([row['symbol'] for row in updates], updates[0]['change_1w']), (['TSLA'], None))
+        self.assertEqual(len(loads), 1)
+        # The next session recomputes them
+        tomorrow = new_york(2024, 3, 15)
+        summary_rows({'AAPL': 150.0, 'MSFT': 300.0}, stored, tomorrow, load)
+        self.assertEqual(loads[-1], ['AAPL', 'MSFT'])
+
+
+class TestPerformanceRefresh(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.add_user('performance@example.com', 'AAPL'))
+
+    def test_refresh_stores_summaries_read_by_api(self):
+        self.refresh(160.0)
+        with self.app.app_context():
+            row = db.session.get(PerformanceSummary, 'AAPL')
+            self.assertEqual((row.session, row.price), (session_start(datetime.now(timezone.utc)), 160.0))
+            self.assertAlmostEqual(row.change_1w, (160.0 / row.close_1w - 1) * 100)
+            self.assertGreaterEqual(row.high_52w, 160.0)
+
+        performance = self.client.get('/api/stocks').get_json()[0]['performance']
+        self.assertEqual(set(performance), set(FIELDS))
+        self.assertTrue(all(value is not None for value in performance.values()))
+        self.assertIn(b'52W Range', self.client.get('/').data)
+
+        # Later cycles in the session reuse the anchors and only move the figures
+        with patch.object(self.app.history, 'load_many') as load_many:
+            self.refresh(170.0)
+        load_many.assert_not_called()
+        with self.app.app_context():
+            updated = db.session.get(PerformanceSummary, 'AAPL')
+            self.assertEqual((updated.close_1w, updated.price), (row.close_1w, 170.0))
+            self.assertAlmostEqual(updated.change_1w, (170.0 / row.close_1w - 1) * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
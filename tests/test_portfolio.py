@@ -0,0 +1,129 @@
+"""Tests for holdings aggregation and the vectorized portfolio valuation"""
+import math
+import unittest
+import uuid
+
+import numpy as np
+
+from models import HoldingLot, HoldingsRevision, Stock
+from services.portfolio import PortfolioValuer, PositionBook, Valuation, prices_from_table
+from services.quote_table import QuoteTable
+from services.quotes import Quote
+from support import AppTestCase
+
+LOTS = [
+    (1, 'AAPL', 10, 100.0),
+    (2, 'MSFT', 5, 200.0),
+    (1, 'AAPL', 10, 120.0),
+    (1, 'MSFT', 1, 300.0),
+    (3, 'ZZZZ', 2, 50.0),
+]
+
+
+class TestValuation(unittest.TestCase):
+    def setUp(self):
+        self.book = PositionBook.from_lots(LOTS)
+        # Symbols in first-seen order: AAPL, MSFT, ZZZZ (unpriced)
+        self.valuation = Valuation(self.book, np.array([130.0, 210.0, np.nan]),
+                                   np.array([125.0, 220.0, np.nan]))
+
+    def test_lots_aggregate_into_positions_sorted_by_user(self):
+        self.assertEqual(self.book.users.tolist(), [1, 1, 2, 3])
+        self.assertEqual([self.book.symbols[c] for c in self.book.symbol_codes], ['AAPL', 'MSFT', 'MSFT', 'ZZZZ'])
+        self.assertEqual(self.book.quantity.tolist(), [20, 1, 5, 2])
+        self.assertEqual(self.book.cost.tolist(), [2200.0, 300.0, 1000.0, 100.0])
+
+    def test_user_totals(self):
+        summary = self.valuation.summary(1)
+        self.assertEqual(summary['market_value'], 20 * 130.0 + 210.0)
+        self.assertEqual(summary['cost_basis'], 2500.0)
+        self.assertEqual(summary['unrealized_pnl'], 310.0)
+        self.assertEqual(summary['day_change'], 20 * 5.0 - 10.0)
+        self.assertAlmostEqual(summary['day_change_percent'], 90.0 / (2810.0 - 90.0) * 100)
+        self.assertEqual(summary['positions'], 2)
+        self.assertIsNone(self.valuation.summary(99))
+        self.assertEqual(self.valuation.positions(99), [])
+
+    def test_unpriced_positions_count_at_cost(self):
+        summary = self.valuation.summary(3)
+        self.assertEqual((summary['market_value'], summary['unrealized_pnl'], summary['unpriced']), (100.0, 0.0, 1))
+        self.assertIsNone(self.valuation.positions(3)[0]['price'])
+
+    def test_empty_book(self):
+        valuation = Valuation(PositionBook.from_lots([]), np.empty(0), np.empty(0))
+        self.assertIsNone(valuation.summary(1))
+
+
+class TestPortfolioValuer(unittest.TestCase):
+    def test_cached_per_revision_and_version(self):
+        revision, loads, prices = [0], [], []
+        valuer = PortfolioValuer(
+            lambda: loads.append(1) or LOTS,
+            lambda symbols: prices.append(1) or (np.ones(len(symbols)), np.ones(len(symbols))),
+            lambda: revision[0])
+        first = valuer.valuation()
+        self.assertIs(valuer.valuation(), first)
+        valuer.invalidate()
+        self.assertIsNot(valuer.valuation(), first)
+        self.assertEqual((len(loads), len(prices)), (1, 2))
+        revision[0] += 1
+        valuer.valuation()
+        self.assertEqual((len(loads), len(prices)), (2, 3))
+
+
+class TestPricesFromTable(unittest.TestCase):
+    def test_joins_symbols_against_the_snapshot(self):
+        table = QuoteTable.open(f"dadstocks-test-{uuid.uuid4().hex[:12]}", capacity=4)
+        try:
+            table.try_acquire_writer()
+            table.publish({'MSFT': Quote('MSFT', 410.0, 400.0), 'AAPL': Quote('AAPL', 150.0, 149.0)})
+            prices, previous = prices_from_table(table, ['AAPL', 'GOOG', 'MSFT'])
+            self.assertEqual(prices[[0, 2]].tolist(), [150.0, 410.0])
+            self.assertEqual(previous[[0, 2]].tolist(), [149.0, 400.0])
+            self.assertTrue(math.isnan(prices[1]))
+        finally:
+            table.close(unlink=True)
+        self.assertTrue(np.isnan(prices_from_table(None, ['AAPL'])[0]).all())
+
+
+class TestPortfolioRoutes(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        stock = Stock('AAPL')
+        stock.update_price(150.0, 145.0)
+        self.login(self.add_user('holder@example.com', stock))
+
+    def add_lot(self, quantity, unit_cost):
+        return self.client.post('/user/dashboard', data={
+            'action': 'add_lot', 'symbol': 'AAPL', 'quantity': quantity, 'unit_cost': unit_cost}).data
+
+    def test_lots_are_valued_and_revalued_on_refresh(self):
+        self.assertIsNone(self.client.get('/api/portfolio').get_json()['summary'])
+        self.assertIn(b'Added 10 shares of AAPL', self.add_lot('10', '100'))
+        self.add_lot('10', '120')
+        summary = self.client.get('/api/portfolio').get_json()['summary']
+        self.assertEqual((summary['market_value'], summary['unrealized_pnl'], summary['day_change']),
+                         (3000.0, 800.0, 100.0))
+        self.assertIn(b'Unrealized P&amp;L', self.client.get('/').data)
+
+        self.refresh(160.0)
+        summary = self.client.get('/api/portfolio').get_json()['summary']
+        self.assertEqual((summary['market_value'], summary['day_change']), (3200.0, 200.0))
+
+    def test_invalid_lot_rejected(self):
+        self.assertIn(b'positive quantity', self.add_lot('-1', '100'))
+        self.assertIn(b'positive quantity', self.add_lot('1', 'abc'))
+        with self.app.app_context():
+            self.assertEqual(HoldingLot.query.count(), 0)
+            self.assertEqual(HoldingsRevision.current(), 0)
+
+    def test_removing_lot_bumps_revision(self):
+        self.add_lot('10', '100')
+        with self.app.app_context():
+            lot_id = HoldingLot.query.one().id
+        self.client.post('/user/dashboard', data={'action': 'remove_lot', 'lot_id': lot_id})
+        self.assertIsNone(self.client.get('/api/portfolio').get_json()['summary'])
+
+
+if __name__ == '__main__':
+    unittest.main()
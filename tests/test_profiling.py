@@ -0,0 +1,108 @@
+"""Tests for on-demand request and refresh profiling"""
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+
+from services.profiling import REFRESH_TARGET, Profiler
+
+
+def busy(seconds=0.03):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(self.tmpdir.name, sample_interval=0.001)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disarmed_by_default(self):
+        """Test that nothing is captured until armed"""
+        self.assertFalse(self.profiler.armed)
+        self.assertIsNone(self.profiler.take('/api/stocks'))
+        self.assertEqual(self.profiler.results(), [])
+
+    def test_arm_counts_down(self):
+        """Test that an armed target is captured exactly N times, one at a time"""
+        self.profiler.arm('/api/stocks', 2)
+        first = self.profiler.take('/api/stocks')
+        self.assertIsNotNone(first)
+        first.start()
+        # A concurrent run waits its turn rather than overlapping
+        self.assertIsNone(self.profiler.take('/api/stocks'))
+        first.stop()
+
+        second = self.profiler.take('/api/stocks')
+        second.start()
+        second.stop()
+        self.assertIsNone(self.profiler.take('/api/stocks'))
+        self.assertFalse(self.profiler.armed)
+        self.assertEqual(len(self.profiler.results()), 2)
+
+    def test_cprofile_output_loads_as_pstats(self):
+        """Test that cProfile captures are valid pstats files"""
+        self.profiler.arm(REFRESH_TARGET, mode='cprofile')
+        capture = self.profiler.take(REFRESH_TARGET)
+        capture.start()
+        busy()
+        name = capture.stop()
+
+        self.assertTrue(name.endswith('.pstats'))
+        stats = pstats.Stats(os.path.join(self.tmpdir.name, name))
+        self.assertTrue(any(func[2] == 'busy' for func in stats.stats))
+
+    def test_sampling_output_is_folded_stacks(self):
+        """Test that sampling captures write collapsed stacks with counts"""
+        self.profiler.arm(REFRESH_TARGET, mode='sampling')
+        capture = self.profiler.take(REFRESH_TARGET)
+        capture.start()
+        busy(0.05)
+        name = capture.stop()
+
+        self.assertTrue(name.endswith('.folded'))
+        with open(os.path.join(self.tmpdir.name, name)) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any('busy (test_profiling.py' in line for line in lines))
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            self.profiler.arm('/', mode='perf')
+
+    def test_request_hooks(self):
+        """Test that only the armed route is profiled"""
+        app = Flask(__name__)
+
+        @app.route('/slow')
+        def slow():
+            busy()
+            return 'ok'
+
+        @app.route('/other')
+        def other():
+            return 'ok'
+
+        self.profiler.init_app(app)
+        client = app.test_client()
+        self.profiler.arm('/slow', 1)
+        client.get('/other')
+        client.get('/slow')
+        client.get('/slow')
+
+        results = self.profiler.results()
+        self.assertEqual(len(results), 1)
+        self.assertIn('-slow-', results[0]['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
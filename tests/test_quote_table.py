@@ -0,0 +1,122 @@
+"""Tests for the shared-memory quote table"""
+import multiprocessing
+import unittest
+import uuid
+from datetime import datetime, timezone
+
+from services.quote_table import QuoteTable, QuoteTableFull
+from services.quotes import QuoteBatch
+
+
+def _read_in_child(name, symbol, queue):
+    table = QuoteTable.open(name)
+    queue.put(table.get(symbol)['price'])
+    table.close()
+
+
+class TestQuoteTable(unittest.TestCase):
+    def setUp(self):
+        """Create a fresh, uniquely named table for each test"""
+        self.name = f"dadstocks-test-{uuid.uuid4().hex[:12]}"
+        self.table = QuoteTable.open(self.name, capacity=4)
+
+    def tearDown(self):
+        """Destroy the shared segment"""
+        self.table.close(unlink=True)
+
+    def test_publish_and_read(self):
+        """Test publishing quotes and reading them back"""
+        self.assertTrue(self.table.try_acquire_writer())
+        timestamp = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        version = self.table.publish({
+            'AAPL': {'price': 150.0, 'previous_close': 145.0, 'timestamp': timestamp}
+        })
+
+        quote = self.table.get('AAPL')
+        self.assertEqual(quote['price'], 150.0)
+        self.assertEqual(quote['previous_close'], 145.0)
+        self.assertEqual(quote['timestamp'], timestamp)
+        self.assertEqual(quote['version'], version)
+        self.assertIsNone(self.table.get('MSFT'))
+        self.assertEqual(self.table.sequence % 2, 0)
+
+    def test_publish_batch(self):
+        """Test publishing a QuoteBatch, stamping undated quotes with the publish time"""
+        self.table.try_acquire_writer()
+        self.table.publish({'MSFT': {'price': 400.0, 'previous_close': 390.0}})
+        batch = QuoteBatch(['AAPL', 'MSFT'], [150.0, 410.0], [145.0, 400.0], [1704110400.0, float('nan')])
+        version = self.table.publish(batch)
+
+        quotes = self.table.get_many(['AAPL', 'MSFT'])
+        self.assertEqual([(q.price, q.previous_close, q.version) for q in quotes.values()],
+                         [(150.0, 145.0, version), (410.0, 400.0, version)])
+        self.assertEqual(quotes['AAPL'].timestamp, datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc))
+        self.assertAlmostEqual(quotes['MSFT'].timestamp.timestamp(), self.table.published_at, delta=1)
+        self.assertEqual(len(self.table), 2)
+
+    def test_publish_requires_writer_lock(self):
+        """Test that only the lock holder may write"""
+        with self.assertRaises(RuntimeError):
+            self.table.publish({'AAPL': {'price': 1.0, 'previous_close': 1.0}})
+
+        other = QuoteTable.open(self.name)
+        try:
+            self.assertTrue(self.table.try_acquire_writer())
+            self.assertFalse(other.try_acquire_writer())
+        finally:
+            other.close()
+
+    def test_second_handle_sees_updates(self):
+        """Test that another attachment reads the same memory"""
+        self.table.try_acquire_writer()
+        other = QuoteTable.open(self.name)
+        try:
+            self.table.publish({'AAPL': {'price': 150.0, 'previous_close': 145.0}})
+            self.assertEqual(other.get('AAPL')['price'], 150.0)
+            self.table.publish({'AAPL': {'price': 151.0, 'previous_close': 145.0}})
+            self.assertEqual(other.get('AAPL')['price'], 151.0)
+            self.assertEqual(len(other), 1)
+        finally:
+            other.close()
+
+    def test_visible_across_processes(self):
+        """Test that a separate process reads the published quote"""
+        self.table.try_acquire_writer()
+        self.table.publish({'MSFT': {'price': 400.0, 'previous_close': 390.0}})
+
+        queue = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_read_in_child, args=(self.name, 'MSFT', queue))
+        child.start()
+        child.join(10)
+        self.assertEqual(queue.get(timeout=5), 400.0)
+
+    def test_capacity_limit(self):
+        """Test that overflowing the fixed layout raises"""
+        self.table.try_acquire_writer()
+        quotes = {f"SYM{i}": {'price': 1.0, 'previous_close': 1.0} for i in range(5)}
+        with self.assertRaises(QuoteTableFull):
+            self.table.publish(quotes)
+        # The seqlock must be left consistent after a failed write
+        self.assertEqual(self.table.sequence % 2, 0)
+
+    def test_new_writer_recovers_from_dead_writer(self):
+        """Test that a writer that died mid-publish doesn't block readers for good"""
+        self.table.try_acquire_writer()
+        self.table.publish({'AAPL': {'price': 150.0, 'previous_close': 145.0}})
+        # Die between the two sequence increments
+        self.table._header[3] += 1
+        self.table.release_writer()
+        with self.assertRaises(TimeoutError):
+            self.table.get_many(['AAPL'])
+
+        other = QuoteTable.open(self.name)
+        try:
+            self.assertTrue(other.try_acquire_writer())
+            self.assertEqual(other.sequence % 2, 0)
+            self.assertEqual(self.table.get('AAPL')['price'], 150.0)
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Tests for Quote records and QuoteBatch"""
+import unittest
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+
+from services.quotes import Quote, QuoteBatch, quotes_from_bars
+
+
+class TestQuote(unittest.TestCase):
+    def test_derived_fields(self):
+        """Test lazily computed change fields"""
+        quote = Quote('AAPL', 150.0, 145.0, 'Apple Inc.')
+        self.assertEqual(quote.change, 5.0)
+        self.assertAlmostEqual(quote.change_percent, (5.0 / 145.0) * 100)
+
+    def test_zero_previous_close(self):
+        """Test that a zero previous close does not divide by zero"""
+        self.assertEqual(Quote('NEW', 10.0, 0.0).change_percent, 0.0)
+
+    def test_immutable(self):
+        """Test that quotes cannot be modified"""
+        quote = Quote('AAPL', 150.0, 145.0)
+        with self.assertRaises(AttributeError):
+            quote.price = 1.0
+        with self.assertRaises(AttributeError):
+            quote.extra = 1
+
+    def test_legacy_item_access(self):
+        """Test the dict-style access older callers rely on"""
+        quote = Quote('AAPL', 150.0, 145.0, 'Apple Inc.', '2024-01-01T12:00:00Z')
+        self.assertEqual(quote['price'], 150.0)
+        self.assertEqual(quote['name'], 'Apple Inc.')
+        self.assertEqual(quote['timestamp'], datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+        self.assertIsNone(quote.get('missing'))
+        with self.assertRaises(KeyError):
+            quote['missing']
+
+    def test_coerce_legacy_dict(self):
+        """Test converting the old dict shape"""
+        quote = Quote.coerce('AAPL', {'price': 150.0, 'previous_close': 145.0, 'name': 'Apple Inc.'})
+        self.assertIsInstance(quote, Quote)
+        self.assertEqual(quote.symbol, 'AAPL')
+        self.assertIs(Quote.coerce('AAPL', quote), quote)
+
+
+class TestQuotesFromBars(unittest.TestCase):
+    def test_frame_and_bar_set(self):
+        """Test reading a bars frame directly and through a BarSet's ``df``"""
+        index = pd.MultiIndex.from_arrays(
+            [['AAPL', 'AAPL', 'MSFT'], pd.to_datetime([1704067200, 1704153600, 1704153600], unit='s', utc=True)],
+            names=['symbol', 'timestamp'])
+        frame = pd.DataFrame({'close': [145.0, 150.0, 400.0]}, index=index)
+        names = {'AAPL': 'Apple Inc.', 'MSFT': 'Microsoft Corporation'}
+        quotes = quotes_from_bars(frame, names)
+        self.assertEqual((quotes['AAPL'].price, quotes['AAPL'].previous_close), (150.0, 145.0))
+        self.assertEqual(quotes['MSFT'].previous_close, 400.0)
+        self.assertEqual(quotes_from_bars(SimpleNamespace(df=frame), names), quotes)
+        self.assertEqual(quotes_from_bars(SimpleNamespace(df=pd.DataFrame()), names), {})
+
+
+class TestQuoteBatch(unittest.TestCase):
+    def setUp(self):
+        self.batch = QuoteBatch(['AAPL', 'MSFT'], [150.0, 400.0], [145.0, 410.0],
+                                names=['Apple Inc.', 'Microsoft Corporation'])
+
+    def test_lookup(self):
+        """Test materializing a Quote by symbol"""
+        quote = self.batch['MSFT']
+        self.assertEqual(quote.price, 400.0)
+        self.assertEqual(quote.name, 'Microsoft Corporation')
+        self.assertIsNone(quote.timestamp)
+        self.assertIn('AAPL', self.batch)
+        self.assertIsNone(self.batch.get('META'))
+
+    def test_vectorized_changes(self):
+        """Test array-wide change columns"""
+        self.assertEqual(list(self.batch.changes), [5.0, -10.0])
+        self.assertAlmostEqual(self.batch.change_percents[1], -10.0 / 410.0 * 100)
+
+    def test_round_trip(self):
+        """Test building a batch from quotes and back"""
+        quotes = [Quote('AAPL', 150.0, 145.0, 'Apple Inc.', 1704110400.0)]
+        batch = QuoteBatch.from_quotes(quotes)
+        self.assertEqual(batch.to_dict(), {'AAPL': quotes[0]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for the sparkline rings and their upkeep across refresh cycles"""
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+import numpy as np
+
+from app import sync_sparklines
+from models import db
+from services.bars import FIVE_MINUTE, Bars
+from services.quote_table import QuoteTable
+from services.quotes import Quote
+from services.sparklines import HEIGHT, SparklineBook, encode
+from support import AppTestCase
+
+
+class TestSparklineBook(unittest.TestCase):
+    def test_ring_keeps_the_latest_prices(self):
+        book = SparklineBook(length=4)
+        book.seed({'AAPL': [1.0, 2.0], 'MSFT': []})
+        self.assertEqual(book.values('AAPL').tolist(), [1.0, 2.0])
+        for price in (3.0, 4.0, 5.0, 6.0, 7.0):
+            book.append({'AAPL': price, 'MSFT': price * 10, 'GOOG': 1.0})
+        self.assertEqual(book.values('AAPL').tolist(), [4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(book.values('MSFT').tolist(), [40.0, 50.0, 60.0, 70.0])
+        # Only seeded symbols get a ring
+        self.assertNotIn('GOOG', book)
+        self.assertEqual(len(book.values('GOOG')), 0)
+
+        book.seed({'AAPL': np.arange(10.0)})
+        self.assertEqual(book.values('AAPL').tolist(), [6.0, 7.0, 8.0, 9.0])
+        book.reset()
+        self.assertEqual((len(book), book.version), (0, None))
+
+    def test_rows_grow_but_rings_stay_bounded(self):
+        book = SparklineBook(length=8)
+        symbols = [f"S{i}" for i in range(200)]
+        book.seed({symbol: [] for symbol in symbols})
+        for step in range(50):
+            book.append({symbol: float(step) for symbol in symbols})
+        self.assertEqual(book._prices.shape[1], 8)
+        self.assertEqual(book.values('S199').tolist(), list(map(float, range(42, 50))))
+
+    def test_encoding(self):
+        self.assertEqual(encode(np.array([1.0, 3.0, 2.0]), 5), f"M2 {HEIGHT} 3 0 4 {HEIGHT // 2}")
+        self.assertEqual(encode(np.array([2.0, 2.0]), 2), f"M0 {HEIGHT // 2} 1 {HEIGHT // 2}")
+        self.assertIsNone(encode(np.array([2.0]), 5))
+
+    def test_paths_are_encoded_once_per_change(self):
+        book = SparklineBook(length=4)
+        book.seed({'AAPL': [1.0, 2.0], 'MSFT': [3.0, 1.0]})
+        with patch('services.sparklines.encode', wraps=encode) as encoder:
+            first = book.paths(['AAPL', 'MSFT'])
+            self.assertEqual(book.paths(['AAPL', 'MSFT']), first)
+            book.append({'AAPL': 5.0})
+            book.paths(['AAPL', 'MSFT'])
+        self.assertEqual(encoder.call_count, 3)
+
+
+class TestSparklineRefresh(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.add_user('sparklines@example.com', 'AAPL'))
+
+    def test_refreshes_feed_the_payload(self):
+        for price in (150.0, 160.0, 155.0):
+            self.refresh(price)
+        self.assertEqual(self.app.sparklines.values('AAPL').tolist(), [150.0, 160.0, 155.0])
+        payload = self.client.get('/api/stocks').get_json()
+        self.assertEqual(payload[0]['sparkline'], encode(np.array([150.0, 160.0, 155.0]), 78))
+        self.assertIn('sparkline', payload[-1])
+        page = self.client.get('/').data
+        self.assertIn(b'viewBox="0 0 77 20"', page)
+        self.assertIn(payload[0]['sparkline'].encode(), page)
+
+        # Serving the payload again encodes nothing
+        with patch('services.sparklines.encode') as encoder:
+            self.client.get('/api/stocks')
+        encoder.assert_not_called()
+
+    def test_seeded_from_stored_bars(self):
+        now = int(time.time()) // 300 * 300
+        with self.app.app_context():
+            self.app.history.write('AAPL', FIVE_MINUTE, Bars([now - 600, now - 300, now], [1, 2, 3], [1, 2, 3],
+                                                             [1, 2, 3], [1.0, 2.0, 3.0], [0, 0, 0]))
+            db.session.commit()
+        self.client.get('/api/stocks')
+        self.assertEqual(self.app.sparklines.values('AAPL').tolist(), [1.0, 2.0, 3.0])
+
+    def test_other_processes_follow_the_quote_table(self):
+        name = f"dadstocks-test-{uuid.uuid4().hex[:12]}"
+        writer, reader = QuoteTable.open(name, capacity=4), QuoteTable.open(name, capacity=4)
+        try:
+            writer.try_acquire_writer()
+            self.app.quote_table = reader
+            book = self.app.sparklines
+            with self.app.app_context():
+                writer.publish({'AAPL': Quote('AAPL', 150.0, 149.0)})
+                sync_sparklines(['AAPL'])
+                self.assertEqual(len(book.values('AAPL')), 0)
+                writer.publish({'AAPL': Quote('AAPL', 151.0, 149.0)})
+                sync_sparklines(['AAPL'])
+                writer.publish({'AAPL': Quote('AAPL', 152.0, 149.0)})
+                sync_sparklines(['AAPL'])
+                self.assertEqual(book.values('AAPL').tolist(), [151.0, 152.0])
+                # A missed cycle starts over from the stored bars
+                writer.publish({'AAPL': Quote('AAPL', 153.0, 149.0)})
+                writer.publish({'AAPL': Quote('AAPL', 154.0, 149.0)})
+                sync_sparklines(['AAPL'])
+                self.assertEqual(len(book.values('AAPL')), 0)
+        finally:
+            self.app.quote_table = None
+            reader.close()
+            writer.close(unlink=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
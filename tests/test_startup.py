@@ -0,0 +1,70 @@
+"""Tests for cold-start cost: import budget and no import-time side effects"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative `python -X importtime -c "import app"` budget. Flask and
+# SQLAlchemy account for most of it; pandas or the Alpaca SDK would blow it.
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1500'))
+
+# Only loaded on first use: real-mode upstream calls, or the simulator
+LAZY_MODULES = ('pandas', 'alpaca', 'requests', 'services.mock_alpaca', 'services.upstream_capture')
+
+
+def run_python(code, **env):
+    environment = dict(os.environ, SIMULATION_MODE='false', **env)
+    result = subprocess.run([sys.executable, *code], cwd=ROOT, env=environment,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise AssertionError(result.stderr)
+    return result
+
+
+def loaded_modules(script, **env):
+    code = f"import json, sys\n{script}\nprint(json.dumps(sorted(sys.modules)))"
+    return set(json.loads(run_python(['-c', code], **env).stdout.splitlines()[-1]))
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.env = {'DATABASE_URL': f"sqlite:///{self.db_path}", 'QUOTE_TABLE_ENABLED': 'false'}
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_import_has_no_side_effects(self):
+        """Test that importing app creates no database and loads no heavy dependencies"""
+        modules = loaded_modules('import app', **self.env)
+        self.assertEqual([m for m in LAZY_MODULES if m in modules], [])
+        self.assertFalse(os.path.exists(self.db_path))
+
+    def test_real_mode_app_defers_the_sdk(self):
+        """Test that a real-mode app starts without importing the Alpaca SDK"""
+        modules = loaded_modules('import app\napp.create_app()', **self.env)
+        self.assertNotIn('alpaca', modules)
+        self.assertNotIn('pandas', modules)
+        self.assertTrue(os.path.exists(self.db_path))
+
+    def test_import_time_budget(self):
+        """Test the measured import time of app against the budget"""
+        result = run_python(['-X', 'importtime', '-c', 'import app'], **self.env)
+        cumulative_us = None
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if name.strip() == 'app' and name.startswith(' ') and not name.startswith('  '):
+                cumulative_us = int(cumulative)
+        self.assertIsNotNone(cumulative_us, 'app not found in -X importtime output')
+        self.assertLess(cumulative_us / 1000, IMPORT_BUDGET_MS)
+
+
+if __name__ == '__main__':
+    unittest.main()
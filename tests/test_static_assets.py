@@ -0,0 +1,78 @@
+"""Tests for content-hashed static URLs and their cache headers"""
+import os
+import re
+import tempfile
+import unittest
+
+from flask import Flask, url_for
+
+from services.static_assets import StaticAssets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'logo.svg')
+        with open(self.path, 'w') as f:
+            f.write('<svg></svg>')
+        self.app = Flask(__name__, static_folder=self.tmpdir.name, static_url_path='/static')
+        self.assets = StaticAssets(max_age=3600)
+        self.assets.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def static_url(self, filename):
+        with self.app.test_request_context():
+            return url_for('static', filename=filename)
+
+    def test_url_carries_content_hash(self):
+        url = self.static_url('logo.svg')
+        self.assertRegex(url, r'^/static/logo\.svg\?v=[0-9a-f]{12}$')
+        # Missing files are left unversioned
+        self.assertEqual(self.static_url('missing.svg'), '/static/missing.svg')
+
+    def test_hash_changes_with_content(self):
+        before = self.static_url('logo.svg')
+        with open(self.path, 'w') as f:
+            f.write('<svg><rect/></svg>')
+        os.utime(self.path, ns=(0, 1))
+        self.assertNotEqual(self.static_url('logo.svg'), before)
+
+    def test_cache_headers(self):
+        """Test immutable caching only for the current hash"""
+        response = self.client.get(self.static_url('logo.svg'))
+        self.assertEqual(response.status_code, 200)
+        cache_control = response.cache_control
+        self.assertTrue(cache_control.public)
+        self.assertTrue(cache_control.immutable)
+        self.assertEqual(cache_control.max_age, 3600)
+
+        for url in ('/static/logo.svg', '/static/logo.svg?v=000000000000'):
+            response = self.client.get(url)
+            self.assertTrue(response.cache_control.no_cache)
+            self.assertFalse(response.cache_control.immutable)
+            self.assertIsNone(response.cache_control.max_age)
+
+
+class TestTemplates(unittest.TestCase):
+    def test_no_runtime_css_compiler(self):
+        """Test that pages use the prebuilt stylesheet, not the Tailwind CDN"""
+        with open(os.path.join(ROOT, 'templates', 'base.html')) as f:
+            base = f.read()
+        self.assertNotIn('cdn.tailwindcss.com', base)
+        self.assertIn("filename='css/app.css'", base)
+        self.assertTrue(os.path.exists(os.path.join(ROOT, 'static', 'css', 'app.css')))
+
+    def test_static_references_exist(self):
+        for name in os.listdir(os.path.join(ROOT, 'templates')):
+            with open(os.path.join(ROOT, 'templates', name)) as f:
+                for filename in re.findall(r"url_for\('static', filename='([^']+)'\)", f.read()):
+                    self.assertTrue(os.path.exists(os.path.join(ROOT, 'static', filename)), f"{name}: {filename}")
+
+
+if __name__ == '__main__':
+    unittest.main()
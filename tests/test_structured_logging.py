@@ -0,0 +1,82 @@
+"""Tests for queued JSON logging and error sampling"""
+import io
+import json
+import logging
+import unittest
+
+from services.structured_logging import ErrorSampler, JsonFormatter, configure_logging, shutdown_logging
+
+
+def make_record(msg, *args, level=logging.WARNING, name='dadstocks.test', **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_fields_and_extra(self):
+        """Test the JSON shape, with extra fields at the top level"""
+        entry = json.loads(JsonFormatter().format(
+            make_record('Updated %s', 'AAPL', level=logging.INFO, updated=3, duration_ms=1.5)))
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'dadstocks.test')
+        self.assertEqual(entry['msg'], 'Updated AAPL')
+        self.assertEqual(entry['updated'], 3)
+        self.assertEqual(entry['duration_ms'], 1.5)
+        self.assertIn('ts', entry)
+        self.assertNotIn('args', entry)
+
+
+class TestErrorSampler(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.sampler = ErrorSampler(burst=2, window=60, clock=lambda: self.now)
+
+    def test_samples_per_template(self):
+        """Test that each message template gets its own burst"""
+        passed = [self.sampler.filter(make_record('Error updating %s: %s', f"S{i}", 'boom')) for i in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.assertTrue(self.sampler.filter(make_record('Error committing updates: %s', 'locked')))
+        # Below WARNING is never sampled
+        self.assertTrue(all(self.sampler.filter(make_record('x', level=logging.INFO)) for _ in range(5)))
+
+    def test_reports_suppressed_count(self):
+        """Test that the next window's first record carries the dropped count"""
+        for i in range(5):
+            self.sampler.filter(make_record('Error updating %s', i))
+        self.now = 61
+        record = make_record('Error updating %s', 'next')
+        self.assertTrue(self.sampler.filter(record))
+        self.assertEqual(record.suppressed, 3)
+        self.assertFalse(hasattr(make_record('Error updating %s', 'x'), 'suppressed'))
+
+
+class TestConfigureLogging(unittest.TestCase):
+    def tearDown(self):
+        shutdown_logging()
+
+    def test_queued_json_output(self):
+        """Test records flow through the queue to the stream as JSON lines"""
+        stream = io.StringIO()
+        configure_logging('DEBUG', 'json', error_burst=1, stream=stream)
+        log = logging.getLogger('dadstocks.test.queue')
+        log.info('cycle done', extra={'updated': 7})
+        for i in range(3):
+            log.warning('Error updating %s', i)
+        try:
+            raise ValueError('bad quote')
+        except ValueError:
+            log.exception('Error in update process')
+        shutdown_logging()
+
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        ours = [e for e in entries if e['logger'] == 'dadstocks.test.queue']
+        self.assertEqual([e['msg'] for e in ours],
+                         ['cycle done', 'Error updating 0', 'Error in update process'])
+        self.assertEqual(ours[0]['updated'], 7)
+        self.assertIn('ValueError: bad quote', ours[2]['exc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
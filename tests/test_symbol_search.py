@@ -0,0 +1,91 @@
+"""Tests for the symbol search index and endpoint"""
+import unittest
+from unittest.mock import Mock
+
+from services.symbol_search import SymbolIndex, SymbolSearch, tokenize
+from support import AppTestCase
+
+NAMES = {
+    'A': 'Agilent Technologies Inc.',
+    'AA': 'Alcoa Corporation',
+    'AAPL': 'Apple Inc.',
+    'APLE': 'Apple Hospitality REIT Inc.',
+    'PAPL': 'Pineapple Inc.',
+    'T': 'AT&T Inc.',
+    'BRK.B': 'Berkshire Hathaway Inc. Class B',
+    'HPT': 'Hospitality Properties Trust',
+}
+
+
+def symbols(results):
+    return [result['symbol'] for result in results]
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SymbolIndex(NAMES)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('AT&T Inc.'), ['at', 't', 'inc'])
+
+    def test_symbols_before_names(self):
+        self.assertEqual(symbols(self.index.search('a')), ['A', 'AA', 'AAPL', 'APLE', 'T'])
+        self.assertEqual(symbols(self.index.search('brk.b')), ['BRK.B'])
+        self.assertEqual(self.index.search('aapl')[0], {'symbol': 'AAPL', 'name': 'Apple Inc.'})
+
+    def test_names_match_every_word_by_prefix(self):
+        self.assertEqual(symbols(self.index.search('apple')), ['AAPL', 'APLE'])
+        self.assertEqual(symbols(self.index.search('apple hosp')), ['APLE'])
+        self.assertEqual(symbols(self.index.search('hathaway berk')), ['BRK.B'])
+        self.assertEqual(symbols(self.index.search('inc')), ['A', 'AAPL', 'APLE', 'BRK.B', 'PAPL', 'T'])
+        # Names whose first word matches rank before those where a later word does
+        self.assertEqual(symbols(self.index.search('hosp')), ['HPT', 'APLE'])
+        self.assertEqual(symbols(self.index.search('at&t')), ['T'])
+        self.assertEqual(self.index.search('zzz'), [])
+        self.assertEqual(self.index.search('  '), [])
+
+    def test_limit(self):
+        self.assertEqual(symbols(self.index.search('inc', limit=2)), ['A', 'AAPL'])
+        self.assertEqual(symbols(self.index.search('a', limit=3)), ['A', 'AA', 'AAPL'])
+        self.assertEqual(self.index.search('a', limit=0), [])
+        self.assertEqual(SymbolIndex({}).search('a'), [])
+
+
+class TestSymbolSearch(unittest.TestCase):
+    def test_reindexed_when_the_catalog_changes(self):
+        names = Mock(return_value=None)
+        search = SymbolSearch(names)
+        self.assertEqual(search.search('aapl'), [])
+
+        names.return_value = {'AAPL': 'Apple Inc.'}
+        index = search.index()
+        self.assertEqual(symbols(search.search('apple')), ['AAPL'])
+        self.assertIs(search.index(), index)
+        names.return_value = {'MSFT': 'Microsoft Corporation'}
+        self.assertEqual(symbols(search.search('micro')), ['MSFT'])
+        self.assertIsNot(search.index(), index)
+
+
+class TestSymbolSearchRoute(AppTestCase):
+    settings = {'SYMBOL_SEARCH_MAX_RESULTS': 3}
+
+    def setUp(self):
+        super().setUp()
+        self.user_id = self.add_user('search@example.com')
+
+    def test_search(self):
+        self.assertEqual(self.client.get('/api/symbols/search?q=apple').status_code, 302)
+        self.login(self.user_id)
+
+        payload = self.client.get('/api/symbols/search?q=apple').get_json()
+        self.assertEqual(payload['results'][0], {'symbol': 'AAPL', 'name': 'Apple Inc.'})
+        self.assertEqual(symbols(self.client.get('/api/symbols/search?q=micro').get_json()['results']), ['MSFT'])
+        # Results are capped however many are asked for
+        payload = self.client.get('/api/symbols/search?q=s&limit=500').get_json()
+        self.assertLessEqual(len(payload['results']), 3)
+        self.assertEqual(self.client.get('/api/symbols/search?q=a&limit=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/symbols/search').get_json()['results'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
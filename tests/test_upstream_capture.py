@@ -0,0 +1,144 @@
+"""Tests for upstream record and replay"""
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from services.fault_injection import FaultInjector, FaultProfile, UpstreamError
+from services.mock_alpaca import MockAlpacaService
+from services.quotes import quotes_from_bars
+from services.upstream_capture import CaptureRecorder, ReplayAlpacaService, load_archive
+
+
+class TestUpstreamCapture(unittest.TestCase):
+    def setUp(self):
+        """Record a short session against the mock upstream"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'session.jsonl.gz')
+
+        recorder = CaptureRecorder(self.path)
+        service = recorder.wrap(MockAlpacaService(seed=5))
+        self.recorded_bars = [service.get_stock_bars(['AAPL', 'SPY']) for _ in range(2)]
+        self.recorded_names = service.get_asset_names()
+        service.get_asset_names()
+        self.recorded_news = service.get_news(['AAPL', 'MSFT', 'SPY', 'QQQ'])
+        recorder.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_archive_records(self):
+        """Test that every call was written, with repeats deduplicated"""
+        records = load_archive(self.path)
+        self.assertEqual([r['kind'] for r in records], ['bars', 'bars', 'assets', 'assets', 'news'])
+        self.assertEqual(records[0]['symbols'], ['AAPL', 'SPY'])
+        # The second asset list is identical and shares the decoded payload
+        self.assertIs(records[2]['payload'], records[3]['payload'])
+
+    def test_replay_returns_recorded_responses(self):
+        """Test that replay serves the same data in the same order"""
+        replay = ReplayAlpacaService(self.path)
+        for expected in self.recorded_bars:
+            pd.testing.assert_frame_equal(replay.get_stock_bars(['AAPL', 'SPY']), expected,
+                                          check_freq=False, check_index_type=False)
+        self.assertEqual(replay.get_asset_names(), self.recorded_names)
+        self.assertEqual(replay.get_news(['AAPL', 'MSFT', 'SPY', 'QQQ']), self.recorded_news)
+
+    def test_replay_filters_and_loops(self):
+        """Test symbol filtering and wrap-around once the archive is exhausted"""
+        replay = ReplayAlpacaService(self.path)
+        names = replay.get_asset_names()
+        first = quotes_from_bars(replay.get_stock_bars(['AAPL']), names)
+        self.assertEqual(list(first), ['AAPL'])
+        replay.get_stock_bars(['AAPL'])
+        again = quotes_from_bars(replay.get_stock_bars(['AAPL']), names)
+        self.assertEqual(again['AAPL'].price, first['AAPL'].price)
+
+        strict = ReplayAlpacaService(self.path, loop=False)
+        strict.get_stock_bars(['AAPL'])
+        strict.get_stock_bars(['AAPL'])
+        with self.assertRaises(UpstreamError):
+            strict.get_stock_bars(['AAPL'])
+
+    def test_original_timing_and_errors(self):
+        """Test replaying recorded latency and recorded failures"""
+        path = os.path.join(self.tmpdir.name, 'errors.jsonl.gz')
+        recorder = CaptureRecorder(path)
+        faults = FaultInjector(FaultProfile('test', latency='fixed', latency_ms=1, error_rate=1.0))
+        service = recorder.wrap(MockAlpacaService(seed=5, faults=faults))
+        with self.assertRaises(UpstreamError):
+            service.get_stock_bars(['AAPL'])
+        recorder.close()
+
+        sleeps = []
+        replay = ReplayAlpacaService(path, timing='original', sleep=sleeps.append)
+        with self.assertRaises(UpstreamError):
+            replay.get_stock_bars(['AAPL'])
+        self.assertEqual(len(sleeps), 1)
+        self.assertGreaterEqual(sleeps[0], 0.001)
+
+    def test_replay_matches_request_symbols(self):
+        """Test that interleaved calls for different symbols get their own responses"""
+        path = os.path.join(self.tmpdir.name, 'batches.jsonl.gz')
+        recorder = CaptureRecorder(path)
+        service = recorder.wrap(MockAlpacaService(seed=5))
+        tech = service.get_stock_bars(['AAPL', 'MSFT'])
+        index = service.get_stock_bars(['SPY'])
+        recorder.close()
+
+        replay = ReplayAlpacaService(path)
+        pd.testing.assert_frame_equal(replay.get_stock_bars(['SPY']), index,
+                                      check_freq=False, check_index_type=False)
+        pd.testing.assert_frame_equal(replay.get_stock_bars(['MSFT', 'AAPL']), tech,
+                                      check_freq=False, check_index_type=False)
+        # Unrecorded symbol sets take the next response of the kind, filtered
+        self.assertEqual(set(replay.get_stock_bars(['AAPL', 'SPY']).index.get_level_values('symbol')), {'AAPL'})
+
+    def test_original_timing_keeps_offsets(self):
+        """Test that replay waits for each call's recorded offset as well as its latency"""
+        path = os.path.join(self.tmpdir.name, 'schedule.jsonl.gz')
+        recorder = CaptureRecorder(path)
+        names = MockAlpacaService(seed=5).get_asset_names()
+        for offset in (0.0, 2.0):
+            recorder.record('assets', None, recorder._started + offset, 0.1, result=names, method='get_asset_names')
+        recorder.close()
+
+        now, sleeps = [100.0], []
+
+        def sleep(seconds):
+            sleeps.append(round(seconds, 6))
+            now[0] += seconds
+
+        replay = ReplayAlpacaService(path, timing='original', sleep=sleep, clock=lambda: now[0])
+        for _ in range(3):
+            replay.get_asset_names()
+        # The second call waits for its offset; the loop starts again after the last response
+        self.assertEqual(sleeps, [0.1, 2.0, 0.1])
+        now[0] += 10
+        replay.get_asset_names()
+        self.assertEqual(sleeps[-1], 0.1)
+
+    def test_history_replayed_apart_from_quotes(self):
+        """Test that chart history calls are recorded and replayed from their own queue"""
+        path = os.path.join(self.tmpdir.name, 'history.jsonl.gz')
+        recorder = CaptureRecorder(path)
+        service = recorder.wrap(MockAlpacaService(seed=5))
+        daily = service.get_daily_bars(['AAPL', 'SPY'], days=5)
+        service.get_stock_bars(['AAPL'])
+        intraday = service.get_intraday_bars(['AAPL'], bars=30)
+        recorder.close()
+
+        records = load_archive(path)
+        self.assertEqual([(r['kind'], r['method']) for r in records],
+                         [('bars', 'get_daily_bars'), ('bars', 'get_stock_bars'), ('bars', 'get_intraday_bars')])
+        replay = ReplayAlpacaService(path)
+        self.assertEqual(len(replay.get_stock_bars(['AAPL'])), 2)
+        pd.testing.assert_frame_equal(replay.get_intraday_bars(['AAPL'], bars=30), intraday,
+                                      check_freq=False, check_index_type=False)
+        pd.testing.assert_frame_equal(replay.get_daily_bars(['AAPL'], days=5), daily.loc[['AAPL']],
+                                      check_freq=False, check_index_type=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
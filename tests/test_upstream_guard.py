@@ -0,0 +1,176 @@
+"""Tests for upstream circuit breakers, deadlines and last-known-good fallbacks"""
+import threading
+import time
+import unittest
+
+from app import get_news_for_symbols, get_stock_data
+from services.quotes import Quote
+from services.upstream_guard import (STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker,
+                                     CircuitOpenError, UpstreamCallTimeout, UpstreamGuard)
+from support import AppTestCase
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker('bars', failure_threshold=3, reset_timeout=10, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_trial(self):
+        """Test that one trial goes through after the reset timeout and decides the state"""
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now = 10
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+        self.now = 20
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+
+class FakeClient:
+    def __init__(self):
+        self.delay = 0.0
+        self.error = None
+        self.name = 'fake'
+
+    def get_stock_bars(self, symbols):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return list(symbols)
+
+
+class TestUpstreamGuard(unittest.TestCase):
+    def setUp(self):
+        self.guard = UpstreamGuard(timeout=0.05, failure_threshold=2, reset_timeout=60)
+        self.client = FakeClient()
+        self.wrapped = self.guard.wrap(self.client)
+
+    def test_proxy_routes_endpoint_calls(self):
+        self.assertEqual(self.wrapped.get_stock_bars(['AAPL']), ['AAPL'])
+        self.assertEqual(self.wrapped.name, 'fake')
+
+    def test_timeout_frees_caller_and_opens_breaker(self):
+        self.client.delay = 0.5
+        started = time.perf_counter()
+        with self.assertRaises(UpstreamCallTimeout):
+            self.wrapped.get_stock_bars(['AAPL'])
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+        self.client.delay = 0.0
+        self.client.error = ConnectionError('reset')
+        with self.assertRaises(ConnectionError):
+            self.wrapped.get_stock_bars(['AAPL'])
+        self.assertEqual(self.guard.breakers['bars'].state, STATE_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.wrapped.get_stock_bars(['AAPL'])
+
+    def test_last_known_good(self):
+        quote = Quote('AAPL', 150.0, 149.0)
+        self.guard.remember_quotes({'AAPL': quote})
+        stale = self.guard.stale_quotes(['AAPL', 'MSFT'], 'open')
+        self.assertEqual(dict(stale), {'AAPL': quote})
+        self.assertTrue(stale.stale)
+        self.assertEqual(stale.reason, 'open')
+
+        self.guard.stale_max_age = -1
+        self.assertEqual(dict(self.guard.stale_quotes(['AAPL'], 'open')), {})
+
+    def test_stale_news_deduplicated_and_marked(self):
+        shared = {'id': 1, 'headline': 'Both', 'symbols': ['AAPL', 'MSFT']}
+        self.guard.remember_news(['AAPL', 'MSFT'], [shared, {'id': 2, 'symbols': ['MSFT']}])
+        articles = self.guard.stale_news(['AAPL', 'MSFT'])
+        self.assertEqual([a['id'] for a in articles], [1, 2])
+        self.assertTrue(all(a['stale'] for a in articles))
+        self.assertNotIn('stale', shared)
+
+    def test_revalidation_is_single_flight(self):
+        release = threading.Event()
+        runs = []
+
+        def slow():
+            runs.append(1)
+            release.wait(5)
+
+        self.assertTrue(self.guard.revalidate('bars', slow))
+        self.assertFalse(self.guard.revalidate('bars', slow))
+        release.set()
+        deadline = time.monotonic() + 5
+        while self.guard._revalidating and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.guard.revalidate('bars', lambda: None))
+        self.assertEqual(len(runs), 1)
+
+
+class TestStaleWhileRevalidate(AppTestCase):
+    settings = {'SIMULATION_SEED': 7, 'UPSTREAM_BREAKER_THRESHOLD': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.context = self.app.test_request_context()
+        self.context.push()
+        # The mock behind the recording and metrics proxies
+        self.mock = self.app.alpaca_factory._mock_service._inner._inner
+
+    def tearDown(self):
+        self.context.pop()
+
+    def fail(self, method):
+        def broken(*args, **kwargs):
+            raise ConnectionError('upstream down')
+        setattr(self.mock, method, broken)
+
+    def test_quotes_fall_back_to_last_known(self):
+        fresh = get_stock_data(['AAPL', 'SPY'])
+        self.assertFalse(getattr(fresh, 'stale', False))
+
+        self.fail('get_stock_bars')
+        for _ in range(3):
+            stale = get_stock_data(['AAPL', 'SPY'])
+            self.assertTrue(stale.stale)
+            self.assertEqual(stale['AAPL'].price, fresh['AAPL'].price)
+        self.assertEqual(self.app.upstream_guard.breakers['bars'].state, STATE_OPEN)
+        self.assertEqual(stale.reason, 'open')
+
+        scrape = self.app.test_client().get('/metrics').get_data(as_text=True)
+        self.assertIn('upstream_circuit_state{endpoint="bars"} 2', scrape)
+        self.assertIn('upstream_fallbacks_total{endpoint="bars",reason="error"} 2', scrape)
+        self.assertIn('upstream_fallbacks_total{endpoint="bars",reason="open"} 1', scrape)
+
+    def test_dashboard_without_any_index_data(self):
+        """Test that the dashboard renders when upstream fails before any quote was seen"""
+        self.fail('get_stock_bars')
+        self.login(self.add_user('guard@example.com'))
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Index data is unavailable', response.data)
+
+    def test_news_falls_back_to_last_known(self):
+        symbols = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'SPY', 'DIA', 'QQQ']
+        articles = get_news_for_symbols(symbols)
+        self.assertTrue(articles)
+        self.fail('get_news')
+        stale = get_news_for_symbols(symbols)
+        self.assertEqual([a['headline'] for a in stale], [a['headline'] for a in articles])
+        self.assertTrue(all(a['stale'] for a in stale))
+
+
+if __name__ == '__main__':
+    unittest.main()
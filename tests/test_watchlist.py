@@ -0,0 +1,107 @@
+"""Tests for bulk watchlist imports"""
+import io
+import unittest
+from unittest.mock import Mock, patch
+
+from app import get_stock_data
+from models import Stock, UserStock, db
+from services.quotes import Quote
+from services.watchlist import (ADDED, INVALID, NO_DATA, TRACKED, UNKNOWN, AssetCatalog, add_symbols, parse_csv,
+                                parse_symbols)
+from support import AppTestCase
+
+
+class TestParsing(unittest.TestCase):
+    def test_symbol_lists(self):
+        self.assertEqual(parse_symbols(' aapl, MSFT;goog\n\tAAPL  brk.b,,'), ['AAPL', 'MSFT', 'GOOG', 'BRK.B'])
+        self.assertEqual(parse_symbols(''), [])
+
+    def test_csv_symbol_column(self):
+        text = 'Account,Ticker,Quantity\n1,aapl,10\n1,MSFT,5\n\n2,AAPL,1\n3,,4\n'
+        self.assertEqual(parse_csv(text), ['AAPL', 'MSFT'])
+
+    def test_csv_without_header(self):
+        self.assertEqual(parse_csv('AAPL,Apple\nmsft,Microsoft\n'), ['AAPL', 'MSFT'])
+        self.assertEqual(parse_csv(''), [])
+
+
+class TestAssetCatalog(unittest.TestCase):
+    def test_fetched_once_per_ttl_and_kept_on_failure(self):
+        fetch = Mock(return_value={'AAPL': 'Apple Inc.'})
+        catalog = AssetCatalog(fetch, ttl=0)
+        self.assertEqual(catalog.names(), {'AAPL': 'Apple Inc.'})
+        fetch.side_effect = RuntimeError('upstream down')
+        self.assertEqual(catalog.names(), {'AAPL': 'Apple Inc.'})
+
+        cached = AssetCatalog(Mock(return_value={}), ttl=3600)
+        cached.names()
+        cached.names()
+        self.assertEqual(cached.fetch.call_count, 1)
+        self.assertIsNone(AssetCatalog(Mock(return_value=None)).names())
+
+
+class TestWatchlistImport(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user_id = self.add_user('watchlist@example.com', 'AAPL')
+        self.login(self.user_id)
+        with self.app.app_context():
+            db.session.add(Stock('MSFT'))
+            db.session.commit()
+
+    def watchlist(self):
+        with self.app.app_context():
+            return sorted(stock.symbol for stock in Stock.query.join(UserStock)
+                          .filter(UserStock.user_id == self.user_id))
+
+    def test_statuses_and_one_batched_lookup(self):
+        catalog = {'GOOGL': 'Alphabet Inc.', 'AMZN': 'Amazon.com Inc.', 'MSFT': 'Microsoft Corporation'}
+        fetch_quotes = Mock(return_value={'GOOGL': Quote('GOOGL', 140.0, 138.0, name='Alphabet Inc.')})
+        with self.app.app_context():
+            results = add_symbols(self.user_id, ['aapl', 'MSFT', 'GOOGL', 'AMZN', 'NOPE', '1BAD', 'GOOGL'],
+                                  catalog, fetch_quotes)
+            db.session.commit()
+            googl = Stock.query.filter_by(symbol='GOOGL').one()
+            self.assertEqual((googl.name, googl.current_price, googl.previous_close),
+                             ('Alphabet Inc.', 140.0, 138.0))
+            self.assertAlmostEqual(googl.price_change, 2.0)
+            self.assertIsNone(Stock.query.filter_by(symbol='AMZN').first())
+        self.assertEqual([(result['symbol'], result['status']) for result in results], [
+            ('AAPL', TRACKED), ('MSFT', ADDED), ('GOOGL', ADDED), ('AMZN', NO_DATA), ('NOPE', UNKNOWN),
+            ('1BAD', INVALID),
+        ])
+        # Only symbols new to the stocks table are quoted, all in one call
+        fetch_quotes.assert_called_once_with(['GOOGL', 'AMZN'])
+        self.assertEqual(self.watchlist(), ['AAPL', 'GOOGL', 'MSFT'])
+
+    def test_api_adds_in_bulk(self):
+        with patch('app.get_stock_data', wraps=get_stock_data) as lookup:
+            response = self.client.post('/api/stocks', json={'symbols': ['GOOGL', 'META', 'AAPL', 'ZZZZZZ']})
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        self.assertEqual([result['status'] for result in payload['results']], [ADDED, ADDED, TRACKED, UNKNOWN])
+        self.assertEqual(payload['counts'], {ADDED: 2, TRACKED: 1, UNKNOWN: 1})
+        lookup.assert_called_once_with(['GOOGL', 'META'])
+        self.assertEqual(self.watchlist(), ['AAPL', 'GOOGL', 'META'])
+
+        upload = {'file': (io.BytesIO(b'\xef\xbb\xbfSymbol,Shares\nAMZN,3\n'), 'positions.csv')}
+        response = self.client.post('/api/stocks', data=upload, content_type='multipart/form-data')
+        self.assertEqual(response.get_json()['counts'], {ADDED: 1})
+        self.assertEqual(self.client.post('/api/stocks', json={'symbols': []}).status_code, 400)
+        self.app.config['WATCHLIST_IMPORT_MAX'] = 2
+        self.assertEqual(self.client.post('/api/stocks', data='SPY DIA QQQ').status_code, 400)
+
+    def test_form_import(self):
+        upload = (io.BytesIO(b'ticker\nAMZN\nAAPL\n'), 'watchlist.csv')
+        response = self.client.post('/watchlist/import', data={'symbols': 'googl, msft', 'file': upload},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 302)
+        with self.client.session_transaction() as session:
+            flashes = session['_flashes']
+        self.assertEqual(flashes, [('success', 'Added 3 stocks: GOOGL, MSFT, AMZN'),
+                                   ('error', 'Not added: AAPL (already tracked)')])
+        self.assertEqual(self.watchlist(), ['AAPL', 'AMZN', 'GOOGL', 'MSFT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for the production server config and per-process app lifecycle"""
+import os
+import runpy
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app import background_update_task, create_app, reset_after_fork, stop_background_refresh
+from config import TestConfig
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+def load_conf(**env):
+    clean = {k: v for k, v in os.environ.items() if not k.startswith('GUNICORN_') and k != 'UPSTREAM_RECORD_PATH'}
+    with patch.dict(os.environ, dict(clean, **env), clear=True):
+        return runpy.run_path(CONF)
+
+
+class TestGunicornConfig(unittest.TestCase):
+    def test_sizing_follows_cpus(self):
+        """Test that workers scale with available CPUs, capped, each with threads"""
+        conf = load_conf()
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.assertEqual(conf['workers'], min(cpus * 2 + 1, 9))
+        self.assertEqual(conf['worker_class'], 'gthread')
+        self.assertGreater(conf['threads'], 1)
+        self.assertTrue(conf['preload_app'])
+
+    def test_env_overrides(self):
+        conf = load_conf(GUNICORN_WORKERS='2', GUNICORN_THREADS='8', PORT='8000')
+        self.assertEqual((conf['workers'], conf['threads']), (2, 8))
+        self.assertEqual(conf['bind'], '0.0.0.0:8000')
+
+    def test_recording_uses_one_worker(self):
+        """Test that a capture archive gets a single, non-preloaded writer"""
+        conf = load_conf(GUNICORN_WORKERS='4', UPSTREAM_RECORD_PATH='/tmp/capture.jsonl.gz')
+        self.assertEqual(conf['workers'], 1)
+        self.assertFalse(conf['preload_app'])
+
+
+class FakeQuoteTable:
+    def __init__(self, writer):
+        self.writer = writer
+        self.released = False
+
+    def try_acquire_writer(self):
+        return self.writer
+
+    def release_writer(self):
+        self.released = True
+
+
+class TestRefresherLifecycle(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class Config(TestConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(self.tmpdir.name, 'wsgi.db')}"
+            SIMULATION_MODE = True
+            BACKGROUND_REFRESH_ENABLED = True
+
+        self.app = create_app(Config)
+
+    def tearDown(self):
+        stop_background_refresh(self.app, timeout=5)
+        self.tmpdir.cleanup()
+
+    def run_refresher(self, seconds=0.2):
+        stop = threading.Event()
+        thread = threading.Thread(target=background_update_task, args=(self.app, stop))
+        thread.start()
+        time.sleep(seconds)
+        stop.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_stop_joins_refresher(self):
+        """Test that shutdown stops the refresher thread and frees the writer lock"""
+        self.app.quote_table = FakeQuoteTable(writer=True)
+        self.app.test_client().get('/admin/login')
+        thread = self.app.extensions['refresher']
+        self.assertTrue(thread.is_alive())
+
+        stop_background_refresh(self.app, timeout=5)
+        self.assertFalse(thread.is_alive())
+        self.assertNotIn('refresher', self.app.extensions)
+        self.assertTrue(self.app.quote_table.released)
+
+    def test_only_writer_refreshes(self):
+        """Test that a process without the writer lock stands by"""
+        with patch('app.update_stock_prices', return_value=True) as update:
+            self.app.quote_table = FakeQuoteTable(writer=False)
+            self.run_refresher()
+            self.assertEqual(update.call_count, 0)
+
+            self.app.quote_table = FakeQuoteTable(writer=True)
+            self.run_refresher()
+            self.assertEqual(update.call_count, 1)
+
+    def test_reset_after_fork(self):
+        """Test that inherited threads and upstream clients are dropped"""
+        self.app.extensions['refresher'] = threading.Thread(target=lambda: None)
+        self.app.alpaca_factory._data_client = object()
+        reset_after_fork(self.app)
+        self.assertNotIn('refresher', self.app.extensions)
+        self.assertIsNone(self.app.alpaca_factory._data_client)
+        with self.app.app_context():
+            self.assertEqual(self.app.extensions['sqlalchemy'].engine.pool.checkedout(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()